@@ -0,0 +1,53 @@
+"""
+Email login for the API.
+
+EmailBackend finds the user with one case-insensitive lookup on
+LOWER(email), which the accounts_user_email_lower index covers, and checks
+the password once. ModelBackend stays configured after it for username
+logins (the admin).
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models.functions import Lower
+
+
+EMAIL_INDEX_NAME = 'accounts_user_email_lower'
+
+
+def users_by_email(email: str):
+    """Users whose email matches case-insensitively, oldest first (an index lookup)."""
+    UserModel = get_user_model()
+    return (
+        UserModel._default_manager
+        .alias(email_lower=Lower('email'))
+        .filter(email_lower=email.strip().lower())
+        .order_by('pk')
+    )
+
+
+class EmailBackend(ModelBackend):
+    """Authenticates authenticate(request, email=..., password=...) calls."""
+
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        if email is None or password is None:
+            return None
+        user = users_by_email(email).first()
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user
+            get_user_model()().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, email=None, **kwargs):
+        if email is None or password is None:
+            return None
+        user = await users_by_email(email).afirst()
+        if user is None:
+            get_user_model()().set_password(password)
+            return None
+        if await user.acheck_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
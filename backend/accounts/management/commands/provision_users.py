@@ -0,0 +1,77 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import provisioning
+
+
+class Command(BaseCommand):
+    help = "Create user accounts in bulk from a CSV (header row) or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="Path to the file, or - for standard input")
+        parser.add_argument(
+            '--format',
+            choices=[provisioning.FORMAT_CSV, provisioning.FORMAT_NDJSON],
+            help="Input format (default: from the file extension, CSV otherwise)"
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Users hashed and inserted together (default: 1000)"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Validate and allocate usernames without creating anyone"
+        )
+        parser.add_argument(
+            '--report',
+            help="Write created users, skipped emails and errors to this NDJSON file"
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be positive")
+        fmt = options['format'] or provisioning.detect_format(options['file'])
+        try:
+            source = sys.stdin if options['file'] == '-' else open(options['file'], encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(str(e))
+        report = open(options['report'], 'w') if options['report'] else None
+
+        totals = {'created': 0, 'skipped': 0, 'errors': 0}
+        offset = 0
+        # Users a dry run would have created, so later batches see them as taken
+        planned = {} if options['dry_run'] else None
+        try:
+            for batch in provisioning.batched(provisioning.parse_rows(source, fmt), options['batch_size']):
+                result = provisioning.provision_users(batch, dry_run=options['dry_run'], planned=planned)
+                for error in result['errors']:
+                    error['row'] += offset
+                    self.stderr.write(f"Row {error['row']} ({error['email'] or 'no email'}): {'; '.join(error['errors'])}")
+                offset += len(batch)
+                totals['created'] += len(result['created'])
+                totals['skipped'] += len(result['skipped'])
+                totals['errors'] += len(result['errors'])
+                if report:
+                    for user in result['created']:
+                        report.write(json.dumps({'created': user}) + '\n')
+                    for email in result['skipped']:
+                        report.write(json.dumps({'skipped': email}) + '\n')
+                    for error in result['errors']:
+                        report.write(json.dumps({'error': error}) + '\n')
+                self.stdout.write(f"{offset} row(s) read, {totals['created']} user(s) created")
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if report:
+                report.close()
+
+        prefix = "Would create" if options['dry_run'] else "Created"
+        self.stdout.write(
+            f"{prefix} {totals['created']} user(s); {totals['skipped']} skipped as existing or repeated, "
+            f"{totals['errors']} invalid"
+        )
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.tokens import prune_tokens, table_sizes
+
+
+class Command(BaseCommand):
+    help = "Delete expired refresh tokens and their blacklist entries in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Tokens deleted per transaction (default: 1000)"
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help="Seconds to sleep between batches (default: 0)"
+        )
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=0,
+            help="Keep tokens for this many hours after they expire (default: 0)"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Count what would be deleted without deleting"
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0 or options['pause'] < 0 or options['grace'] < 0:
+            raise CommandError("--batch-size must be positive, --pause and --grace not negative")
+        before = table_sizes()
+        totals = prune_tokens(
+            before=timezone.now() - timedelta(hours=options['grace']),
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+        prefix = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(
+            f"{prefix} {totals['outstanding']} outstanding and {totals['blacklisted']} blacklisted token(s) "
+            f"in {totals['batches']} batch(es), {totals['seconds']}s; "
+            f"tables had {before['outstanding']} outstanding, {before['blacklisted']} blacklisted"
+        )
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+# auth.User belongs to django.contrib.auth, so the index is created directly
+# rather than through the model's Meta (which this app cannot change)
+
+def _index():
+    return models.Index(Lower('email'), name='accounts_user_email_lower')
+
+
+def add_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('auth', 'User'), _index())
+
+
+def remove_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('auth', 'User'), _index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
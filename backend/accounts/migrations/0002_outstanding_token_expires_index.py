@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+# OutstandingToken belongs to simplejwt's token_blacklist app, so the index is
+# created directly rather than through the model's Meta. prune_tokens() walks it.
+
+def _index():
+    return models.Index(fields=['expires_at'], name='accounts_outstanding_expires')
+
+
+def add_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('token_blacklist', 'OutstandingToken'), _index())
+
+
+def remove_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('token_blacklist', 'OutstandingToken'), _index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_user_email_lower_index'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
@@ -0,0 +1,306 @@
+"""
+Creating user accounts, one at a time or in batches of thousands.
+
+A username is the email's local part, made unique with the smallest free
+numeric suffix (ann, ann1, ann2, ...). allocate_usernames() works that out
+for a whole batch from one prefix query per chunk of local parts, instead of
+probing one candidate name per query.
+
+provision_users() validates a batch of rows (email, optional password,
+first_name, last_name), skips emails that already have an account, hashes
+passwords in a process pool (PBKDF2 is CPU-bound and holds the GIL) and
+inserts the users with bulk_create. If a concurrent registration takes one
+of the allocated usernames first, the batch's usernames are allocated again
+and the insert retried.
+
+RegisterSerializer, POST /api/auth/provision/ and the provision_users
+management command all go through here. Rows come from parse_rows(), which
+reads CSV (with a header row) and NDJSON.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+
+FIELDS = ('email', 'password', 'first_name', 'last_name')
+
+# Local parts per prefix query; keeps the OR of LIKE clauses within SQLite's expression depth
+PREFIX_CHUNK = 200
+
+# Emails per existence query, within SQLite's parameter limit
+EMAIL_CHUNK = 500
+
+# Below this many passwords, hashing in the caller beats starting work on the pool
+POOL_THRESHOLD = 8
+
+INSERT_ATTEMPTS = 3
+
+
+def username_base(email: str) -> str:
+    """The email's local part, trimmed to leave room for a suffix."""
+    max_length = get_user_model()._meta.get_field('username').max_length
+    return email.split('@')[0][:max_length - 6] or 'user'
+
+
+def _suffix(name: str, base: str) -> Optional[int]:
+    """0 for base itself, n for base<n>, None for anything else."""
+    if name == base:
+        return 0
+    rest = name[len(base):]
+    if name.startswith(base) and rest.isdigit() and not rest.startswith('0'):
+        return int(rest)
+    return None
+
+
+def allocate_usernames(emails: List[str], reserved: Iterable[str] = ()) -> List[str]:
+    """
+    A unique username for each email, in order.
+
+    Takes existing usernames into account (one LIKE-prefix query per
+    PREFIX_CHUNK distinct local parts) as well as earlier emails in the
+    same list and the reserved usernames (not yet in the database).
+    """
+    User = get_user_model()
+    bases = [username_base(email) for email in emails]
+    distinct = sorted(set(bases))
+    taken: Dict[str, set] = {base: set() for base in distinct}
+
+    def take(name):
+        # Local parts can be prefixes of each other (ann, anna); check each candidate
+        for length in range(1, len(name) + 1):
+            base = name[:length]
+            if base in taken:
+                suffix = _suffix(name, base)
+                if suffix is not None:
+                    taken[base].add(suffix)
+
+    for start in range(0, len(distinct), PREFIX_CHUNK):
+        chunk = distinct[start:start + PREFIX_CHUNK]
+        prefixes = Q()
+        for base in chunk:
+            prefixes |= Q(username__startswith=base)
+        for name in User._default_manager.filter(prefixes).values_list('username', flat=True).iterator():
+            take(name)
+    for name in reserved:
+        take(name)
+
+    usernames = []
+    for base in bases:
+        used = taken[base]
+        suffix = 0
+        while suffix in used:
+            suffix += 1
+        used.add(suffix)
+        usernames.append(f'{base}{suffix}' if suffix else base)
+    return usernames
+
+
+def existing_emails(emails: Iterable[str]) -> set:
+    """The lowercased emails, from emails, that already have an account (index lookups)."""
+    User = get_user_model()
+    emails = sorted({email.lower() for email in emails})
+    found = set()
+    for start in range(0, len(emails), EMAIL_CHUNK):
+        found.update(
+            User._default_manager
+            .annotate(email_lower=Lower('email'))
+            .filter(email_lower__in=emails[start:start + EMAIL_CHUNK])
+            .values_list('email_lower', flat=True)
+        )
+    return found
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _hash_workers() -> int:
+    workers = getattr(settings, 'PROVISIONING_HASH_WORKERS', 0)
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+def _hash_pool() -> Optional[ProcessPoolExecutor]:
+    """The shared hashing pool, started on first use (None with PROVISIONING_HASH_WORKERS=1)."""
+    global _pool
+    workers = _hash_workers()
+    if workers <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: web servers call this from threaded processes
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def hash_passwords(passwords: List[Optional[str]]) -> List[str]:
+    """make_password() for each password (None gives an unusable password)."""
+    pool = _hash_pool() if len(passwords) >= POOL_THRESHOLD else None
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (_hash_workers() * 4))
+    return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def create_user(email: str, password: Optional[str], **fields):
+    """Create one user with the shared username rules (a retry covers a concurrent taker)."""
+    User = get_user_model()
+    password = make_password(password)
+    for attempt in range(INSERT_ATTEMPTS):
+        username = allocate_usernames([email])[0]
+        try:
+            with transaction.atomic():
+                return User._default_manager.create(username=username, email=email, password=password, **fields)
+        except IntegrityError:
+            if attempt == INSERT_ATTEMPTS - 1:
+                raise
+
+
+def parse_rows(data, fmt: str) -> Iterator[Dict]:
+    """Rows from CSV text (header row with FIELDS columns) or NDJSON text (one object per line)."""
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if fmt == FORMAT_CSV:
+        for row in csv.DictReader(io.StringIO(data) if isinstance(data, str) else data):
+            yield {key.strip(): (value or '').strip() for key, value in row.items() if key}
+    elif fmt == FORMAT_NDJSON:
+        lines = data.splitlines() if isinstance(data, str) else data
+        for line in lines:
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield {'_error': f"Invalid JSON: {e}"}
+                    continue
+                yield row if isinstance(row, dict) else {'_error': "Each line must be a JSON object"}
+    else:
+        raise ValueError(f"Unknown format {fmt!r}; expected {FORMAT_CSV} or {FORMAT_NDJSON}")
+
+
+def _clean(row: Dict) -> Dict:
+    """Normalised fields of one row; raises ValidationError with the problems."""
+    if '_error' in row:
+        raise ValidationError(row['_error'])
+    email = str(row.get('email') or '').strip().lower()
+    validate_email(email)
+    password = row.get('password') or None
+    first_name = str(row.get('first_name') or '')[:150]
+    last_name = str(row.get('last_name') or '')[:150]
+    if password is not None:
+        password = str(password)
+        validate_password(password, get_user_model()(email=email, first_name=first_name, last_name=last_name))
+    return {'email': email, 'password': password, 'first_name': first_name, 'last_name': last_name}
+
+
+def provision_users(rows: Iterable[Dict], dry_run: bool = False, planned: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Create users for one batch of rows.
+
+    Returns {'created': [{'id', 'email', 'username'}], 'skipped': [emails
+    that already had an account or repeat an earlier row], 'errors':
+    [{'row', 'email', 'errors'}]}. Rows are numbered from 1.
+
+    A dry run creates nobody, so a later batch cannot see its users in the
+    database. Pass the same planned dict (email -> username, filled in here)
+    to every batch of a dry run so later batches skip those emails and do
+    not allocate those usernames again.
+    """
+    User = get_user_model()
+    result = {'created': [], 'skipped': [], 'errors': []}
+    valid = []
+    for number, row in enumerate(rows, 1):
+        try:
+            valid.append(_clean(row))
+        except ValidationError as e:
+            result['errors'].append({'row': number, 'email': row.get('email'), 'errors': e.messages})
+
+    existing = existing_emails(row['email'] for row in valid)
+    if planned is None:
+        planned = {}
+    pending, seen = [], set()
+    for row in valid:
+        if row['email'] in existing or row['email'] in seen or row['email'] in planned:
+            result['skipped'].append(row['email'])
+        else:
+            seen.add(row['email'])
+            pending.append(row)
+    if not pending:
+        return result
+
+    hashes = hash_passwords([row['password'] for row in pending])
+    for attempt in range(INSERT_ATTEMPTS):
+        usernames = allocate_usernames([row['email'] for row in pending], planned.values())
+        users = [
+            User(username=username, email=row['email'], password=password,
+                 first_name=row['first_name'], last_name=row['last_name'])
+            for row, username, password in zip(pending, usernames, hashes)
+        ]
+        if dry_run:
+            planned.update(zip((row['email'] for row in pending), usernames))
+            break
+        try:
+            with transaction.atomic():
+                User._default_manager.bulk_create(users, batch_size=500)
+            break
+        except IntegrityError:
+            if attempt == INSERT_ATTEMPTS - 1:
+                raise
+    result['created'] = [{'id': user.pk, 'email': user.email, 'username': user.username} for user in users]
+    return result
+
+
+def batched(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def detect_format(name: str) -> str:
+    """FORMAT_CSV or FORMAT_NDJSON from a file name or content type."""
+    return FORMAT_NDJSON if 'json' in (name or '').lower() else FORMAT_CSV
+
+
+__all__ = [
+    'FORMAT_CSV',
+    'FORMAT_NDJSON',
+    'username_base',
+    'allocate_usernames',
+    'existing_emails',
+    'hash_passwords',
+    'create_user',
+    'parse_rows',
+    'provision_users',
+    'batched',
+    'detect_format',
+]
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from .backends import users_by_email
+from .provisioning import create_user
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -25,8 +27,8 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ['first_name', 'last_name', 'email', 'password', 'password_confirm']
 
     def validate_email(self, value):
-        """Ensure email is unique"""
-        if User.objects.filter(email=value).exists():
+        """Ensure email is unique, ignoring case"""
+        if users_by_email(value).exists():
             raise serializers.ValidationError("A user with this email already exists.")
         return value.lower()
 
@@ -39,34 +41,13 @@ class RegisterSerializer(serializers.ModelSerializer):
         return attrs
 
     def create(self, validated_data):
-        """Create user with hashed password"""
-        # Remove password_confirm as it's not needed for user creation
-        validated_data.pop('password_confirm')
-        
-        # Create username from email
-        email = validated_data['email']
-        username = email.split('@')[0]
-        
-        # Ensure username is unique
-        base_username = username
-        counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}{counter}"
-            counter += 1
-        
-        # Create user
-        user = User.objects.create(
-            username=username,
-            email=validated_data['email'],
+        """Create user with hashed password and a unique username derived from the email"""
+        return create_user(
+            validated_data['email'],
+            validated_data['password'],
             first_name=validated_data['first_name'],
             last_name=validated_data['last_name']
         )
-        
-        # Hash password using set_password
-        user.set_password(validated_data['password'])
-        user.save()
-        
-        return user
 
 
 class UserSerializer(serializers.ModelSerializer):
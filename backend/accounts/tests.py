@@ -1,3 +1,121 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .tokens import REFRESH_OVERLAP, BloomFilter, RefreshToken, blacklist_filter
+
+
+class BloomFilterTests(TestCase):
+    def test_concurrent_adds_keep_every_key(self):
+        bloom = BloomFilter(40000)
+        keys = [[f'{thread}-{i}' for i in range(5000)] for thread in range(8)]
+        threads = [threading.Thread(target=lambda batch=batch: [bloom.add(key) for key in batch]) for batch in keys]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(bloom.count, 40000)
+        self.assertTrue(all(key in bloom for batch in keys for key in batch))
+
+
+class BlacklistFilterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ann', 'ann@example.com', 'S3cure-pass-xy')
+        self.client = APIClient()
+        blacklist_filter.clear()
+        blacklist_filter.enabled = True
+        blacklist_filter.interval = 5
+        self.addCleanup(blacklist_filter.clear)
+
+    def refresh(self, token: str):
+        return self.client.post('/api/auth/token/refresh/', {'refresh': token}, format='json')
+
+    def blacklist_elsewhere(self, token: RefreshToken) -> None:
+        """Blacklist token the way another worker would: in the database only."""
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+
+    def test_unseen_token_skips_the_database(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertFalse(blacklist_filter.might_contain(token['jti']))
+        self.assertEqual(self.refresh(str(token)).status_code, 200)
+        self.assertGreaterEqual(blacklist_filter.stats()['passed'], 2)
+
+    def test_rotated_token_is_rejected(self):
+        token = str(RefreshToken.for_user(self.user))
+        self.assertEqual(self.refresh(token).status_code, 200)
+        self.assertTrue(blacklist_filter.might_contain(RefreshToken(token, verify=False)['jti']))
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_refresh_picks_up_tokens_blacklisted_elsewhere(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertFalse(blacklist_filter.might_contain(token['jti']))
+        self.blacklist_elsewhere(token)
+        # Seen only once the interval has passed
+        self.assertFalse(blacklist_filter.might_contain(token['jti']))
+        blacklist_filter._refreshed_at = time.monotonic() - blacklist_filter.interval
+        self.assertTrue(blacklist_filter.might_contain(token['jti']))
+        self.assertEqual(self.refresh(str(token)).status_code, 401)
+
+    def test_refresh_rereads_rows_committed_below_the_last_id(self):
+        blacklist_filter.might_contain('load')
+        token = RefreshToken.for_user(self.user)
+        # A slow transaction commits a row below an id this process has already read
+        blacklist_filter._last_id += REFRESH_OVERLAP // 2
+        self.blacklist_elsewhere(token)
+        blacklist_filter._refreshed_at = time.monotonic() - blacklist_filter.interval
+        self.assertTrue(blacklist_filter.might_contain(token['jti']))
+
+
+@override_settings(PROVISIONING_HASH_WORKERS=1)
+class ProvisioningTests(TestCase):
+    def provision_file(self, rows, *args):
+        directory = tempfile.mkdtemp()
+        source, report = os.path.join(directory, 'users.ndjson'), os.path.join(directory, 'report.ndjson')
+        with open(source, 'w') as f:
+            f.writelines(json.dumps(row) + '\n' for row in rows)
+        call_command('provision_users', source, '--report', report, *args, stdout=io.StringIO())
+        with open(report) as f:
+            return [json.loads(line) for line in f]
+
+    def test_dry_run_allocates_across_batches_like_a_real_run(self):
+        User.objects.create_user('ann', 'ann@example.com')
+        rows = [{'email': email} for email in ('ann@a.com', 'ann@b.com', 'ann@c.com', 'ann@a.com', 'bob@a.com')]
+        dry = self.provision_file(rows, '--dry-run', '--batch-size', '2')
+        self.assertEqual(User.objects.count(), 1)
+        real = self.provision_file(rows, '--batch-size', '2')
+        usernames = lambda report: [(line['created']['email'], line['created']['username']) for line in report if 'created' in line]
+        self.assertEqual(usernames(dry), [('ann@a.com', 'ann1'), ('ann@b.com', 'ann2'), ('ann@c.com', 'ann3'), ('bob@a.com', 'bob')])
+        self.assertEqual(usernames(dry), usernames(real))
+        self.assertEqual([line for line in dry if 'skipped' in line], [{'skipped': 'ann@a.com'}])
+        self.assertEqual([line for line in real if 'skipped' in line], [{'skipped': 'ann@a.com'}])
+
+    def post(self, rows):
+        admin = User.objects.create_user('admin', 'admin@example.com', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        return client.post('/api/auth/provision/', rows, format='json')
+
+    @override_settings(PROVISIONING_MAX_PASSWORDS=2)
+    def test_request_with_too_many_passwords_is_refused(self):
+        rows = [{'email': f'user{i}@example.com', 'password': 'S3cure-pass-xy'} for i in range(3)]
+        response = self.post(rows)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(email__startswith='user').exists())
+
+    @override_settings(PROVISIONING_MAX_PASSWORDS=2)
+    def test_rows_without_passwords_do_not_count_toward_the_password_cap(self):
+        rows = [{'email': f'user{i}@example.com'} for i in range(3)] + [{'email': 'pat@example.com', 'password': 'S3cure-pass-xy'}]
+        response = self.post(rows)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 4)
+        self.assertTrue(User.objects.get(email='pat@example.com').check_password('S3cure-pass-xy'))
+        self.assertFalse(User.objects.get(email='user0@example.com').has_usable_password())
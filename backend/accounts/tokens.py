@@ -0,0 +1,287 @@
+"""
+Refresh tokens with a cheaper blacklist.
+
+With ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION, every refresh adds
+an OutstandingToken row for the new token and a BlacklistedToken row for the
+old one, and every refresh or logout checks the blacklist first. Two things
+keep that from growing without bound:
+
+- prune_tokens() deletes tokens that have expired (a blacklisted token that
+  has expired is rejected on its exp claim anyway), in batches of its own
+  short transactions. The prune_tokens management command runs it, from
+  cron or a scheduler. The accounts_outstanding_expires index makes each
+  batch an index range scan.
+- BlacklistFilter keeps a Bloom filter of blacklisted token ids in each
+  process. A token the filter has never seen is certainly not blacklisted,
+  so the database is only asked about the rare ones it might have seen.
+  It loads fully once, then picks up new BlacklistedToken rows by id every
+  TOKEN_BLACKLIST_FILTER_INTERVAL seconds and is rebuilt (dropping pruned
+  tokens) every TOKEN_BLACKLIST_FILTER_REBUILD seconds. Tokens blacklisted
+  by this process are added at once; ones blacklisted by another process
+  are missed until the next refresh, so for up to the interval a rotated
+  refresh token could be used again on another worker. Set the interval to
+  0 to refresh before every check (one small indexed query).
+
+RefreshToken and TokenRefreshSerializer use the filter, and skip the user
+lookups simplejwt makes when blacklisting and re-registering a rotated
+token; SIMPLE_JWT's TOKEN_REFRESH_SERIALIZER points at the serializer.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework_simplejwt import serializers, tokens
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+
+EXPIRES_INDEX_NAME = 'accounts_outstanding_expires'
+
+# Rows re-read below the highest id seen on each refresh. Ids are assigned at
+# insert, not commit, so a slow transaction can commit below the last id read.
+REFRESH_OVERLAP = 100
+
+LOAD_CHUNK = 10000
+
+
+class BloomFilter:
+    """
+    Set membership with false positives only, in about 10 bits per entry at a 1% rate.
+
+    add() is a read-modify-write of shared bytes, so it holds the filter's
+    lock: request threads add while a refresh loads into the same filter,
+    and a lost bit would be a false negative (a blacklisted token let
+    through). Membership tests read without it.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        positions = self._positions(key)
+        with self._lock:
+            bits = self.bits
+            for position in positions:
+                bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class BlacklistFilter:
+    """Per-process Bloom filter over blacklisted refresh token ids (jti)."""
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'TOKEN_BLACKLIST_FILTER', True)
+        self.interval = getattr(settings, 'TOKEN_BLACKLIST_FILTER_INTERVAL', 5)
+        self.rebuild_interval = getattr(settings, 'TOKEN_BLACKLIST_FILTER_REBUILD', 3600)
+        self.capacity = getattr(settings, 'TOKEN_BLACKLIST_FILTER_CAPACITY', 100000)
+        self._bloom: Optional[BloomFilter] = None
+        self._last_id = 0
+        self._refreshed_at = float('-inf')
+        self._built_at = float('-inf')
+        self._lock = threading.Lock()
+        self._stats = {'checks': 0, 'passed': 0, 'refreshes': 0, 'rebuilds': 0, 'errors': 0}
+        self._timings = {'refresh_ms': 0.0, 'rebuild_ms': 0.0}
+
+    def might_contain(self, jti: str) -> bool:
+        """False when the token is certainly not blacklisted; True means ask the database."""
+        if not self.enabled:
+            return True
+        self._stats['checks'] += 1
+        now = time.monotonic()
+        if now - self._refreshed_at >= self.interval:
+            self._refresh(now)
+        bloom = self._bloom
+        if bloom is None or jti in bloom:
+            return True
+        self._stats['passed'] += 1
+        return False
+
+    def add(self, jti: str) -> None:
+        """Record a token this process has just blacklisted."""
+        bloom = self._bloom
+        if bloom is not None:
+            bloom.add(jti)
+
+    def _refresh(self, now: float) -> None:
+        # One thread refreshes; the others keep answering from the current filter
+        # (unless there is none yet, or every check must see the latest rows)
+        if not self._lock.acquire(blocking=self._bloom is None or not self.interval):
+            return
+        if now - self._refreshed_at < self.interval:
+            # Another thread refreshed while this one waited
+            self._lock.release()
+            return
+        try:
+            if self._bloom is None or now - self._built_at >= self.rebuild_interval:
+                self.rebuild()
+            else:
+                started = time.perf_counter()
+                self._load(self._bloom, BlacklistedToken.objects.filter(id__gt=self._last_id - REFRESH_OVERLAP))
+                self._stats['refreshes'] += 1
+                self._timings['refresh_ms'] = (time.perf_counter() - started) * 1000
+        except Exception:
+            # Until the next attempt, checks the filter cannot answer fall through to the database
+            self._stats['errors'] += 1
+        finally:
+            self._refreshed_at = now
+            self._lock.release()
+
+    def _load(self, bloom: BloomFilter, queryset) -> None:
+        rows = queryset.order_by().values_list('id', 'token__jti')
+        for row_id, jti in rows.iterator(chunk_size=LOAD_CHUNK):
+            bloom.add(jti)
+            if row_id > self._last_id:
+                self._last_id = row_id
+
+    def rebuild(self) -> None:
+        """Load every unexpired blacklisted token into a new filter and swap it in."""
+        started = time.perf_counter()
+        live = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        highest = BlacklistedToken.objects.aggregate(highest=Max('id'))['highest'] or 0
+        bloom = BloomFilter(max(self.capacity, 2 * live.count()))
+        self._load(bloom, live.filter(id__lte=highest))
+        self._last_id = max(self._last_id, highest)
+        # Anything added while loading
+        self._load(bloom, BlacklistedToken.objects.filter(id__gt=highest))
+        self._bloom = bloom
+        self._built_at = self._refreshed_at = time.monotonic()
+        self._stats['rebuilds'] += 1
+        self._timings['rebuild_ms'] = (time.perf_counter() - started) * 1000
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bloom = None
+            self._last_id = 0
+            self._refreshed_at = self._built_at = float('-inf')
+
+    def stats(self) -> Dict:
+        bloom = self._bloom
+        return {
+            **self._stats,
+            **{name: round(ms, 3) for name, ms in self._timings.items()},
+            'entries': bloom.count if bloom else 0,
+            'capacity': bloom.capacity if bloom else 0,
+            'bytes': len(bloom.bits) if bloom else 0,
+        }
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class RefreshToken(tokens.RefreshToken):
+    """simplejwt's refresh token, checking blacklist_filter before the database."""
+
+    def check_blacklist(self) -> None:
+        if blacklist_filter.might_contain(self.payload[jwt_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        # The outstanding row almost always exists (for_user() and rotation
+        # create it), so skip simplejwt's user lookup unless it does not
+        jti = self.payload[jwt_settings.JTI_CLAIM]
+        token_id = OutstandingToken.objects.filter(jti=jti).values_list('id', flat=True).first()
+        if token_id is None:
+            result = super().blacklist()
+        else:
+            result = BlacklistedToken.objects.get_or_create(token_id=token_id)
+        blacklist_filter.add(jti)
+        return result
+
+    def outstand(self):
+        # Rotation has just given the token a new jti, so insert the row
+        # without simplejwt's user lookup and existence check
+        if jwt_settings.USER_ID_FIELD == get_user_model()._meta.pk.name:
+            try:
+                with transaction.atomic():
+                    return OutstandingToken.objects.create(
+                        jti=self.payload[jwt_settings.JTI_CLAIM],
+                        user_id=self.payload.get(jwt_settings.USER_ID_CLAIM),
+                        created_at=self.current_time,
+                        token=str(self),
+                        expires_at=datetime_from_epoch(self.payload['exp']),
+                    ), True
+            except IntegrityError:
+                pass
+        return super().outstand()
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+def prune_tokens(before: Optional[datetime] = None, batch_size: int = 1000,
+                 pause: float = 0.0, dry_run: bool = False) -> Dict:
+    """
+    Delete outstanding tokens that expired before `before` (default: now),
+    with their blacklist rows, batch_size at a time.
+
+    Each batch is its own transaction, so locks are held for one batch;
+    pause sleeps between batches to leave room for other writers. Returns
+    {'outstanding', 'blacklisted', 'batches', 'seconds'}.
+    """
+    cutoff = before or timezone.now()
+    expired = OutstandingToken.objects.filter(expires_at__lte=cutoff)
+    totals = {'outstanding': 0, 'blacklisted': 0, 'batches': 0}
+    started = time.perf_counter()
+    if dry_run:
+        totals['outstanding'] = expired.count()
+        totals['blacklisted'] = BlacklistedToken.objects.filter(token__expires_at__lte=cutoff).count()
+    else:
+        while True:
+            with transaction.atomic():
+                ids = list(expired.order_by('expires_at').values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    break
+                # only('id'): the collector fetches rows to cascade, and the token text is large
+                _, deleted = OutstandingToken.objects.filter(id__in=ids).only('id').delete()
+            totals['outstanding'] += deleted.get(OutstandingToken._meta.label, 0)
+            totals['blacklisted'] += deleted.get(BlacklistedToken._meta.label, 0)
+            totals['batches'] += 1
+            if len(ids) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+    totals['seconds'] = round(time.perf_counter() - started, 3)
+    return totals
+
+
+def table_sizes() -> Dict:
+    return {'outstanding': OutstandingToken.objects.count(), 'blacklisted': BlacklistedToken.objects.count()}
+
+
+__all__ = [
+    'EXPIRES_INDEX_NAME',
+    'BloomFilter',
+    'BlacklistFilter',
+    'blacklist_filter',
+    'RefreshToken',
+    'TokenRefreshSerializer',
+    'prune_tokens',
+    'table_sizes',
+]
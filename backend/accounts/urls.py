@@ -1,6 +1,6 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
-from .views import RegisterView, LoginView, MeView, LogoutView
+from .views import RegisterView, LoginView, MeView, LogoutView, ProvisionUsersView
 
 urlpatterns = [
     # Authentication endpoints
@@ -9,5 +9,6 @@ urlpatterns = [
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('me/', MeView.as_view(), name='me'),
     path('logout/', LogoutView.as_view(), name='logout'),
+    path('provision/', ProvisionUsersView.as_view(), name='provision_users'),
 ]
 
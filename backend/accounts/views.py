@@ -1,11 +1,13 @@
 from rest_framework import status, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from django.contrib.auth.models import User
+from django.conf import settings
 from django.contrib.auth import authenticate
 from .serializers import RegisterSerializer, UserSerializer
+from .tokens import RefreshToken
+from . import provisioning
 
 
 class RegisterView(generics.CreateAPIView):
@@ -64,37 +66,23 @@ class LoginView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            # Find user by email
-            user = User.objects.get(email=email.lower())
-            
-            # Authenticate with username and password
-            authenticated_user = authenticate(
-                username=user.username,
-                password=password
-            )
-            
-            if authenticated_user is not None:
-                # Generate JWT tokens
-                refresh = RefreshToken.for_user(authenticated_user)
-                
-                return Response({
-                    'user': UserSerializer(authenticated_user).data,
-                    'access': str(refresh.access_token),
-                    'refresh': str(refresh),
-                }, status=status.HTTP_200_OK)
-            else:
-                return Response(
-                    {'detail': 'Invalid credentials'},
-                    status=status.HTTP_401_UNAUTHORIZED
-                )
-        
-        except User.DoesNotExist:
+        # One indexed, case-insensitive lookup and one password check (accounts.backends.EmailBackend)
+        user = authenticate(request, email=email, password=password)
+        if user is None:
             return Response(
                 {'detail': 'Invalid credentials'},
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
+        # Generate JWT tokens
+        refresh = RefreshToken.for_user(user)
+
+        return Response({
+            'user': UserSerializer(user).data,
+            'access': str(refresh.access_token),
+            'refresh': str(refresh),
+        }, status=status.HTTP_200_OK)
+
 
 class LogoutView(APIView):
     """
@@ -126,3 +114,52 @@ class LogoutView(APIView):
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+
+class ProvisionUsersView(APIView):
+    """
+    POST /auth/provision
+    Create many user accounts at once (staff only)
+
+    The body is CSV with a header row (Content-Type: text/csv), NDJSON
+    (application/x-ndjson) or a JSON list of objects, each with email and
+    optionally password, first_name and last_name. Rows without a password
+    get an unusable one. Existing emails are skipped, not updated.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        content_type = request.content_type.split(';')[0].strip().lower()
+        if content_type in ('text/csv', 'application/x-ndjson', 'application/jsonl'):
+            rows = list(provisioning.parse_rows(request.body, provisioning.detect_format(content_type)))
+        else:
+            rows = request.data
+            if not isinstance(rows, list):
+                return Response(
+                    {'error': 'Expected a JSON list of users, CSV or NDJSON'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        max_rows = getattr(settings, 'PROVISIONING_MAX_ROWS', 5000)
+        if len(rows) > max_rows:
+            return Response(
+                {'error': f'At most {max_rows} users per request; use the provision_users command for more'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # Hashing is what makes a batch slow; keep the request well inside a proxy timeout
+        max_passwords = getattr(settings, 'PROVISIONING_MAX_PASSWORDS', 50)
+        if sum(1 for row in rows if isinstance(row, dict) and row.get('password')) > max_passwords:
+            return Response(
+                {'error': f'At most {max_passwords} users with a password per request; leave passwords out '
+                          f'(users then set one through a reset) or use the provision_users command'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = [row if isinstance(row, dict) else {'_error': 'Each user must be an object'} for row in rows]
+        result = provisioning.provision_users(rows)
+        return Response({
+            'created': len(result['created']),
+            'users': result['created'],
+            'skipped': result['skipped'],
+            'errors': result['errors'],
+        }, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
@@ -0,0 +1,80 @@
+"""
+Compare the WSGI (gunicorn, sync DRF views) and ASGI (uvicorn, native async
+views) paths for the AI endpoints under the same upstream latency.
+
+Both servers talk to the local fake LLM, so the numbers reflect how many
+in-flight LLM calls each serving model can hold, not OpenAI itself.
+
+Usage (from backend/):
+    python benchmarks/async_vs_sync.py --requests 200 --concurrency 100 --latency-ms 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+
+def generate_request(token):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def make_request(path):
+        async def request(client, i):
+            return await client.post(path, json={'idea': f'Benchmark idea {i}'}, headers=headers)
+        return request
+    return make_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=1000.0, help="Fake upstream latency")
+    parser.add_argument('--wsgi-workers', type=int, default=2)
+    parser.add_argument('--wsgi-threads', type=int, default=4)
+    parser.add_argument('--asgi-workers', type=int, default=1)
+    parser.add_argument('--output', help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    llm_port = harness.free_port()
+    env = harness.app_env(llm_port)
+    harness.prepare_database(env)
+    token = harness.create_user_tokens(env)[0]
+    make_request = generate_request(token)
+
+    results = {
+        'benchmark': 'async_vs_sync',
+        'latency_ms': args.latency_ms,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+    }
+
+    with harness.fake_llm(llm_port, args.latency_ms):
+        port = harness.free_port()
+        with harness.wsgi_server(port, env, args.wsgi_workers, args.wsgi_threads):
+            results['wsgi'] = asyncio.run(harness.drive(
+                f'http://127.0.0.1:{port}',
+                make_request('/api/specs/generate/'),
+                args.requests,
+                args.concurrency,
+            ))
+            results['wsgi']['server'] = f'gunicorn {args.wsgi_workers}x{args.wsgi_threads} threads'
+
+        port = harness.free_port()
+        with harness.asgi_server(port, env, args.asgi_workers):
+            results['asgi'] = asyncio.run(harness.drive(
+                f'http://127.0.0.1:{port}',
+                make_request('/api/async/specs/generate/'),
+                args.requests,
+                args.concurrency,
+            ))
+            results['asgi']['server'] = f'uvicorn {args.asgi_workers} worker(s)'
+
+    harness.emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Queries and latency per request for JWT authentication modes.
+
+Runs polling-style GET requests in-process (Django test client, no network)
+against a throwaway SQLite database under each AUTH_USER_CACHE mode:
+- off: simplejwt's User lookup on every request
+- memory / cache: cached user lookups (see specs/authentication.py)
+- claims: memory, plus AUTH_TRUST_TOKEN_CLAIMS on the read-only endpoints
+
+For each endpoint it reports the SQL queries one request makes and the
+mean/p50/p95 latency, plus the auth and db phases from Server-Timing.
+
+Usage (from backend/):
+    python benchmarks/auth.py --rounds 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+from fake_llm import build_spec  # noqa: E402
+
+
+MODES = {
+    'off': {'AUTH_USER_CACHE': 'off'},
+    'memory': {'AUTH_USER_CACHE': 'memory'},
+    'cache': {'AUTH_USER_CACHE': 'cache'},
+    'claims': {'AUTH_USER_CACHE': 'memory', 'AUTH_TRUST_TOKEN_CLAIMS': True},
+}
+
+
+def fixtures(specs: int) -> dict:
+    """A user with some blueprints and a finished job; returns the URLs to poll and a token."""
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from specs.models import Job, Spec
+
+    user, _ = User.objects.get_or_create(username='bench-auth', defaults={'email': 'bench-auth@example.com'})
+    spec = None
+    for i in range(specs):
+        spec = Spec.objects.create(user=user, idea=f'Benchmark idea {i}', spec_json=build_spec(3, 3, 6))
+    job = Job.objects.create(user=user, kind=Job.KIND_GENERATE, status=Job.STATUS_SUCCEEDED, progress=100)
+    return {
+        'token': str(RefreshToken.for_user(user).access_token),
+        'endpoints': {
+            'list': '/api/specs/',
+            'get': f'/api/specs/{spec.id}/',
+            'job': f'/api/jobs/{job.id}/',
+            'me': '/api/auth/me/',
+        },
+    }
+
+
+def bench_endpoint(client, url: str, headers: dict, rounds: int) -> dict:
+    from django.db import connection
+
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    client.get(url, **headers)
+    # An execute wrapper survives the connection being closed at the end of the request
+    with connection.execute_wrapper(count):
+        response = client.get(url, **headers)
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {url} returned {response.status_code}")
+
+    timings, phases = [], {'auth': [], 'db': []}
+    for _ in range(rounds):
+        started = time.perf_counter()
+        response = client.get(url, **headers)
+        timings.append(time.perf_counter() - started)
+        server_timing = harness.parse_server_timing(response.get('Server-Timing', ''))
+        for phase in phases:
+            phases[phase].append(server_timing.get(phase, 0.0))
+    return {
+        'queries': len(queries),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'p50_ms': round(harness.percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(harness.percentile(timings, 95) * 1000, 3),
+        'auth_ms': round(statistics.fmean(phases['auth']), 3),
+        'db_ms': round(statistics.fmean(phases['db']), 3),
+    }
+
+
+def bench_mode(overrides: dict, data: dict, rounds: int) -> dict:
+    from django.test import Client
+    from django.test.utils import override_settings
+    from specs import authentication
+
+    with override_settings(**overrides):
+        # The cache is built from settings at import; rebuild it for this mode
+        authentication.user_cache = authentication.UserCache()
+        client = Client(HTTP_HOST='127.0.0.1')
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {data['token']}"}
+        return {
+            name: bench_endpoint(client, url, headers, rounds)
+            for name, url in data['endpoints'].items()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=300, help="Requests per endpoint and mode")
+    parser.add_argument('--specs', type=int, default=10, help="Blueprints owned by the benchmark user")
+    parser.add_argument('--modes', default=','.join(MODES), help="Comma-separated subset of " + ','.join(MODES))
+    parser.add_argument('--output', help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+    env = harness.app_env(harness.free_port())
+    harness.prepare_database(env)
+    harness.setup_django(env)
+    data = fixtures(args.specs)
+
+    results = {
+        'benchmark': 'auth',
+        'rounds': args.rounds,
+        'modes': {mode: bench_mode(MODES[mode], data, args.rounds) for mode in modes},
+    }
+    harness.emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
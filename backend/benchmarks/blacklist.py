@@ -0,0 +1,171 @@
+"""
+Refresh token blacklist growth, pruning and lookup cost over time.
+
+Simulates --days days of refresh token rotation against a throwaway SQLite
+database: each day adds --rotations-per-day outstanding tokens, each living
+REFRESH_TOKEN_LIFETIME, and blacklists all but the newest. Two scenarios run
+on the same churn:
+- unpruned: nothing is ever deleted (simplejwt's default)
+- pruned: accounts.tokens.prune_tokens() runs at the end of every day
+
+After each simulated day it records the table sizes and, for real requests
+in-process:
+- refresh: POST /api/auth/token/refresh/ (check, rotate, blacklist), with
+  the blacklist filter off and on
+- logout: POST /api/auth/logout/
+- filter_rebuild_ms / filter_refresh_ms: a full filter load, and picking up
+  one more batch of --refresh-batch newly blacklisted tokens
+- prune: seconds and batches for that day's prune (pruned scenario)
+
+Usage (from backend/):
+    python benchmarks/blacklist.py --days 14 --rotations-per-day 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+
+def add_day(user, day_start, rotations: int, lifetime: timedelta, batch: int = 5000) -> None:
+    """One day of rotations: outstanding rows for each token, all but the last blacklisted."""
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+    step = timedelta(days=1) / max(1, rotations)
+    for start in range(0, rotations, batch):
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(user=user, jti=uuid.uuid4().hex, token='x' * 250,
+                             created_at=day_start + i * step, expires_at=day_start + i * step + lifetime)
+            for i in range(start, min(start + batch, rotations))
+        ])
+        blacklisted = tokens if start + batch < rotations else tokens[:-1]
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in blacklisted])
+
+
+def blacklist_n(user, count: int) -> None:
+    from django.utils import timezone
+    add_day(user, timezone.now(), count + 1, timedelta(days=7))
+
+
+def timed(fn, rounds: int) -> dict:
+    from django.db import connection
+
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        fn()
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {
+        'queries': len(queries),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'p50_ms': round(harness.percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(harness.percentile(timings, 95) * 1000, 3),
+    }
+
+
+def measure(user, rounds: int, refresh_batch: int) -> dict:
+    from django.test import Client
+    from accounts.tokens import RefreshToken, blacklist_filter
+
+    client = Client(HTTP_HOST='127.0.0.1')
+    state = {'refresh': str(RefreshToken.for_user(user))}
+
+    def refresh():
+        response = client.post('/api/auth/token/refresh/', {'refresh': state['refresh']}, content_type='application/json')
+        assert response.status_code == 200, response.content
+        state['refresh'] = response.json()['refresh']
+
+    def logout():
+        token = RefreshToken.for_user(user)
+        response = client.post('/api/auth/logout/', {'refresh_token': str(token)}, content_type='application/json',
+                               HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+        assert response.status_code == 205, response.content
+
+    results = {}
+    blacklist_filter.enabled = False
+    results['refresh_filter_off'] = timed(refresh, rounds)
+
+    blacklist_filter.enabled = True
+    blacklist_filter.clear()
+    started = time.perf_counter()
+    blacklist_filter.rebuild()
+    results['filter_rebuild_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    results['refresh_filter_on'] = timed(refresh, rounds)
+    results['logout'] = timed(logout, max(1, rounds // 4))
+
+    blacklist_n(user, refresh_batch)
+    blacklist_filter._refresh(time.monotonic() + blacklist_filter.interval)
+    results['filter_refresh_ms'] = blacklist_filter.stats()['refresh_ms']
+    results['filter'] = {key: blacklist_filter.stats()[key] for key in ('entries', 'bytes')}
+    return results
+
+
+def reset() -> None:
+    from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+    OutstandingToken.objects.all().delete()
+
+
+def scenario(user, days: int, rotations: int, prune: bool, rounds: int, refresh_batch: int) -> list:
+    from django.conf import settings
+    from django.utils import timezone
+    from accounts.tokens import prune_tokens, table_sizes
+
+    lifetime = settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME']
+    start = timezone.now() - timedelta(days=days)
+    reset()
+    series = []
+    for day in range(days):
+        day_start = start + timedelta(days=day)
+        add_day(user, day_start, rotations, lifetime)
+        point = {'day': day + 1}
+        if prune:
+            point['prune'] = prune_tokens(before=day_start + timedelta(days=1))
+        point['tables'] = table_sizes()
+        point.update(measure(user, rounds, refresh_batch))
+        series.append(point)
+    return series
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--rotations-per-day', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=200, help="Refresh requests per measurement")
+    parser.add_argument('--refresh-batch', type=int, default=100, help="Tokens blacklisted before timing a filter refresh")
+    parser.add_argument('--output', help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    env = harness.app_env(harness.free_port(), TOKEN_BLACKLIST_FILTER_INTERVAL='60')
+    harness.prepare_database(env)
+    harness.setup_django(env)
+
+    from django.contrib.auth.models import User
+    user, _ = User.objects.get_or_create(username='bench-blacklist', defaults={'email': 'bench-blacklist@example.com'})
+
+    results = {
+        'benchmark': 'blacklist',
+        'days': args.days,
+        'rotations_per_day': args.rotations_per_day,
+        'rounds': args.rounds,
+        'unpruned': scenario(user, args.days, args.rotations_per_day, False, args.rounds, args.refresh_batch),
+        'pruned': scenario(user, args.days, args.rotations_per_day, True, args.rounds, args.refresh_batch),
+    }
+    harness.emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
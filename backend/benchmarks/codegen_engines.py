@@ -0,0 +1,221 @@
+"""
+Compare the code-generation engines (llm, local, hybrid) on the same
+blueprint: wall-clock latency per bundle and structural parity of the output.
+
+The llm engine talks to the local fake LLM, so its numbers reflect upstream
+latency rather than OpenAI itself. Parity is checked by parsing the generated
+files with ast and comparing model classes, field names and types, viewsets
+and router registrations against the blueprint. Pass --reference with a zip
+saved from /api/code-stubs/?bundle=zip (real LLM output) and --spec with the
+blueprint it was generated from to also diff the local output against it
+module by module.
+
+Usage (from backend/):
+    python benchmarks/codegen_engines.py --modules 6 --latency-ms 1500 --rounds 3
+    python benchmarks/codegen_engines.py --spec blueprint.json --reference code_bundle.zip
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import sys
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+from fake_llm import build_spec  # noqa: E402
+
+
+def _call_name(node) -> str:
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Name):
+        return node.id
+    return ''
+
+
+def structure(implementation: dict) -> dict:
+    """Extract models/fields, viewsets and router registrations from generated files."""
+    result = {'models': {}, 'viewsets': [], 'routes': {}, 'syntax_errors': []}
+    trees = {}
+    for key in ('models_py', 'views_py', 'urls_py'):
+        try:
+            trees[key] = ast.parse(implementation.get(key) or '')
+        except SyntaxError as e:
+            result['syntax_errors'].append(f"{key}: {e}")
+            trees[key] = ast.Module(body=[], type_ignores=[])
+
+    for node in trees['models_py'].body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        abstract = any(
+            isinstance(item, ast.ClassDef) and item.name == 'Meta' and 'abstract = True' in ast.unparse(item)
+            for item in node.body
+        )
+        if abstract:
+            continue
+        fields = {}
+        for item in node.body:
+            if isinstance(item, ast.Assign) and isinstance(item.value, ast.Call):
+                for target in item.targets:
+                    if isinstance(target, ast.Name):
+                        fields[target.id] = _call_name(item.value.func)
+        result['models'][node.name] = fields
+
+    result['viewsets'] = sorted(
+        node.name for node in ast.walk(trees['views_py'])
+        if isinstance(node, ast.ClassDef) and any('ViewSet' in _call_name(base) for base in node.bases)
+    )
+
+    for node in ast.walk(trees['urls_py']):
+        if isinstance(node, ast.Call) and _call_name(node.func) == 'register' and len(node.args) >= 2:
+            prefix = node.args[0].value if isinstance(node.args[0], ast.Constant) else ast.unparse(node.args[0])
+            result['routes'][prefix] = _call_name(node.args[1])
+    return result
+
+
+def expected_structure(module: dict) -> dict:
+    """What SYSTEM_CODE_PROMPT's rules imply the generated code should contain."""
+    from specs import local_codegen
+    models = {}
+    for entity in module.get('entities') or []:
+        models[local_codegen._class_name(entity['name'])] = {
+            local_codegen._identifier(field['name']): local_codegen.FIELD_TEMPLATES.get(field['type'], ('?',))[0]
+            for field in entity.get('fields') or []
+        }
+    return {'models': models, 'viewsets': sorted(f'{name}ViewSet' for name in models)}
+
+
+def compare(expected: dict, actual: dict) -> dict:
+    """Count matching models, fields (name and type) and viewsets."""
+    report = {
+        'models': len(expected['models']),
+        'models_matched': 0,
+        'fields': 0,
+        'fields_matched': 0,
+        'field_type_mismatches': [],
+        'viewsets_matched': len(set(expected['viewsets']) & set(actual['viewsets'])),
+        'viewsets': len(expected['viewsets']),
+        'routes': len(actual['routes']),
+        'syntax_errors': actual.get('syntax_errors', []),
+    }
+    for model, fields in expected['models'].items():
+        actual_fields = actual['models'].get(model)
+        if actual_fields is not None:
+            report['models_matched'] += 1
+        for name, field_type in fields.items():
+            report['fields'] += 1
+            if actual_fields is None or name not in actual_fields:
+                continue
+            if actual_fields[name] == field_type:
+                report['fields_matched'] += 1
+            else:
+                report['field_type_mismatches'].append(f"{model}.{name}: {actual_fields[name]} != {field_type}")
+    return report
+
+
+def load_reference(path: str) -> dict:
+    """Read a /api/code-stubs/?bundle=zip archive into {app_name: implementation}."""
+    from specs.codegen import CODE_FILES
+    apps = {}
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            app, _, filename = name.partition('/')
+            for key, code_file in CODE_FILES.items():
+                if filename == code_file:
+                    apps.setdefault(app, {})[key] = archive.read(name).decode()
+    return apps
+
+
+def time_engine(spec_json: dict, modules: list, engine: str, rounds: int) -> dict:
+    from specs import codegen
+    timings = []
+    statuses = {}
+    for _ in range(rounds):
+        started = time.perf_counter()
+        results = codegen.generate_modules(spec_json, modules, engine=engine)
+        timings.append(time.perf_counter() - started)
+    for result in results:
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+    return {
+        'rounds': rounds,
+        'mean_ms': round(statistics.fmean(timings) * 1000, 2),
+        'min_ms': round(min(timings) * 1000, 2),
+        'max_ms': round(max(timings) * 1000, 2),
+        'statuses': statuses,
+        'engines_used': sorted({result['engine'] for result in results}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', type=int, default=6)
+    parser.add_argument('--entities', type=int, default=3)
+    parser.add_argument('--fields', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--latency-ms', type=float, default=1500.0, help="Fake upstream latency")
+    parser.add_argument('--concurrency', type=int, default=4, help="AI_CODEGEN_CONCURRENCY")
+    parser.add_argument('--spec', help="Blueprint JSON to use instead of the synthetic one")
+    parser.add_argument('--reference', help="Zip from /api/code-stubs/?bundle=zip for --spec to diff local output against")
+    parser.add_argument('--output', help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    llm_port = harness.free_port()
+    harness.setup_django(harness.app_env(llm_port, AI_CODEGEN_CONCURRENCY=args.concurrency))
+
+    from specs import codegen, local_codegen
+
+    if args.spec:
+        with open(args.spec) as f:
+            spec_json = json.load(f)
+    else:
+        spec_json = build_spec(args.modules, args.entities, args.fields)
+    modules = spec_json['modules']
+    results = {
+        'benchmark': 'codegen_engines',
+        'latency_ms': args.latency_ms,
+        'modules': len(modules),
+        'entities_per_module': args.entities,
+        'fields_per_entity': args.fields,
+        'concurrency': args.concurrency,
+        'renderable_locally': sum(local_codegen.can_render(module) for module in modules),
+        'engines': {},
+    }
+
+    with harness.fake_llm(llm_port, args.latency_ms):
+        for engine in codegen.ENGINES:
+            results['engines'][engine] = time_engine(spec_json, modules, engine, args.rounds)
+
+    parity = []
+    for result in codegen.generate_modules(spec_json, modules, engine=codegen.ENGINE_LOCAL):
+        module = next(module for module in modules if module['name'] == result['name'])
+        if result['status'] == codegen.STATUS_OK:
+            parity.append({'module': result['module_name'], **compare(expected_structure(module), structure(result['implementation']))})
+        else:
+            parity.append({'module': result['module_name'], 'error': result['error']})
+    results['parity_vs_blueprint'] = parity
+
+    if args.reference:
+        reference = load_reference(args.reference)
+        local = {
+            result['module_name']: result
+            for result in codegen.generate_modules(spec_json, modules, engine=codegen.ENGINE_LOCAL)
+        }
+        diffs = []
+        for app, implementation in sorted(reference.items()):
+            result = local.get(app)
+            if result is None or result['status'] != codegen.STATUS_OK:
+                diffs.append({'module': app, 'error': result['error'] if result else "module not in --spec"})
+                continue
+            # Local output is the baseline; the report counts how much of it the LLM reproduced
+            diffs.append({'module': app, **compare(structure(result['implementation']), structure(implementation))})
+        results['parity_vs_reference'] = diffs
+
+    harness.emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare two JSON result files written by the benchmark scripts.
+
+Walks both documents and prints every numeric metric present in both, with
+the relative change. Latency metrics (*_ms, *_s) are regressions when they
+grow; throughput (*_rps) is a regression when it shrinks. Exits with status
+1 if any change passes --threshold in the bad direction, so it can gate CI.
+
+Usage (from backend/):
+    python benchmarks/endpoints.py --output before.json
+    # ... change something ...
+    python benchmarks/endpoints.py --output after.json
+    python benchmarks/compare.py before.json after.json --threshold 0.15
+"""
+import argparse
+import json
+import sys
+
+
+def flatten(value, prefix: str = '') -> dict:
+    """{'a.b.c': number} for every numeric leaf (lists are keyed by index)."""
+    if isinstance(value, bool):
+        return {}
+    if isinstance(value, (int, float)):
+        return {prefix: value}
+    items = value.items() if isinstance(value, dict) else enumerate(value) if isinstance(value, list) else ()
+    flat = {}
+    for key, child in items:
+        flat.update(flatten(child, f'{prefix}.{key}' if prefix else str(key)))
+    return flat
+
+
+def direction(metric: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 if not a performance metric."""
+    name = metric.rsplit('.', 1)[-1]
+    if name.endswith('_rps'):
+        return 1
+    if name.endswith('_ms') or name.endswith('_s') or name == 'errors':
+        return -1
+    return 0
+
+
+def compare(before: dict, after: dict, threshold: float) -> tuple:
+    """Rows of (metric, before, after, change, regressed) for shared metrics."""
+    old, new = flatten(before), flatten(after)
+    rows = []
+    for metric in old:
+        if metric not in new or direction(metric) == 0:
+            continue
+        a, b = old[metric], new[metric]
+        change = (b - a) / a if a else (0.0 if b == a else float('inf'))
+        regressed = change * direction(metric) < -threshold
+        rows.append((metric, a, b, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative change that counts as a regression")
+    parser.add_argument('--json', action='store_true', help="Print the comparison as JSON")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    rows = compare(before, after, args.threshold)
+    if args.json:
+        print(json.dumps([
+            {'metric': metric, 'before': a, 'after': b, 'change': round(change, 4), 'regressed': regressed}
+            for metric, a, b, change, regressed in rows
+        ], indent=2))
+    else:
+        width = max((len(row[0]) for row in rows), default=10)
+        for metric, a, b, change, regressed in rows:
+            flag = '  REGRESSION' if regressed else ''
+            print(f"{metric:<{width}}  {a:>12g}  {b:>12g}  {change:+8.1%}{flag}")
+
+    sys.exit(1 if any(row[4] for row in rows) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Bandwidth and latency saved by conditional GETs on blueprint reads.
+
+Runs in-process (Django test client, no network) against a throwaway SQLite
+database. For blueprints of each of --sizes modules it polls get and list
+three ways:
+- full: no validators, so every response is a 200 with the whole body
+- etag: If-None-Match with the ETag of the previous response (304)
+- last_modified: If-Modified-Since with its Last-Modified (304)
+
+For each it reports the status, response bytes, SQL queries and the
+mean/p50/p95 latency, plus the bytes and time saved against full. Real
+clients also save the transfer time of the body, which is not measured here.
+
+Usage (from backend/):
+    python benchmarks/conditional.py --sizes 3,25,100 --rounds 300
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+from fake_llm import build_spec  # noqa: E402
+
+
+def fixtures(modules: int, specs: int) -> dict:
+    """A user owning specs blueprints of the given size; returns the URLs to poll and a token."""
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from specs.models import Spec
+
+    user, _ = User.objects.get_or_create(
+        username=f'bench-conditional-{modules}',
+        defaults={'email': f'bench-conditional-{modules}@example.com'}
+    )
+    spec = None
+    for i in range(specs):
+        spec = Spec.objects.create(user=user, idea=f'Benchmark idea {i}', spec_json=build_spec(modules, 3, 6))
+    return {
+        'token': str(RefreshToken.for_user(user).access_token),
+        'endpoints': {
+            'get': f'/api/specs/{spec.id}/',
+            'list': '/api/specs/',
+        },
+    }
+
+
+def bench_request(client, url: str, headers: dict, rounds: int) -> dict:
+    from django.db import connection
+
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    client.get(url, **headers)
+    with connection.execute_wrapper(count):
+        response = client.get(url, **headers)
+
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        client.get(url, **headers)
+        timings.append(time.perf_counter() - started)
+    return {
+        'status': response.status_code,
+        'bytes': len(response.content),
+        'queries': len(queries),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'p50_ms': round(harness.percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(harness.percentile(timings, 95) * 1000, 3),
+    }
+
+
+def bench_endpoint(client, url: str, token: str, rounds: int) -> dict:
+    auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    first = client.get(url, **auth)
+    if first.status_code != 200 or 'ETag' not in first:
+        raise RuntimeError(f"GET {url} returned {first.status_code} without an ETag")
+
+    results = {
+        'full': bench_request(client, url, auth, rounds),
+        'etag': bench_request(client, url, {**auth, 'HTTP_IF_NONE_MATCH': first['ETag']}, rounds),
+        'last_modified': bench_request(client, url, {**auth, 'HTTP_IF_MODIFIED_SINCE': first['Last-Modified']}, rounds),
+    }
+    full = results['full']
+    for name in ('etag', 'last_modified'):
+        result = results[name]
+        result['bytes_saved_pct'] = round(100 * (1 - result['bytes'] / full['bytes']), 1) if full['bytes'] else 0.0
+        result['time_saved_pct'] = round(100 * (1 - result['mean_ms'] / full['mean_ms']), 1) if full['mean_ms'] else 0.0
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='3,25,100', help="Comma-separated module counts per blueprint")
+    parser.add_argument('--specs', type=int, default=20, help="Blueprints owned by each benchmark user")
+    parser.add_argument('--rounds', type=int, default=300, help="Requests per endpoint and mode")
+    parser.add_argument('--output', help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    env = harness.app_env(harness.free_port())
+    harness.prepare_database(env)
+    harness.setup_django(env)
+
+    from django.test import Client
+    client = Client(HTTP_HOST='127.0.0.1')
+
+    sizes = {}
+    for modules in (int(size) for size in args.sizes.split(',') if size.strip()):
+        data = fixtures(modules, args.specs)
+        sizes[str(modules)] = {
+            name: bench_endpoint(client, url, data['token'], args.rounds)
+            for name, url in data['endpoints'].items()
+        }
+
+    results = {
+        'benchmark': 'conditional',
+        'rounds': args.rounds,
+        'specs': args.specs,
+        'sizes': sizes,
+    }
+    harness.emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+End-to-end latency and throughput of every API endpoint against the fake LLM.
+
+Boots the project (gunicorn or uvicorn) on a throwaway SQLite database,
+points it at benchmarks/fake_llm.py, and runs one phase per endpoint in
+order, each one feeding the next:
+
+    register -> login -> generate -> list -> get -> refine -> code_stubs
+
+Every phase issues --requests requests with at most --concurrency in flight
+and reports throughput and p50/p95/p99 latency. The AI response cache and
+rate limits are off so every AI call reaches the fake server. Results are
+JSON; compare two runs with benchmarks/compare.py.
+
+SQLite serialises writes, so write-heavy phases at high concurrency measure
+lock contention as much as the app; pass a Postgres DATABASE_URL through the
+environment for production-like numbers.
+
+Usage (from backend/):
+    python benchmarks/endpoints.py --requests 100 --concurrency 8 --latency-ms 800 --jitter-ms 300
+    python benchmarks/endpoints.py --latency-dist lognormal --modules 12 --endpoints generate,get,list
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+from fake_llm import LATENCY_DISTRIBUTIONS  # noqa: E402
+
+
+PHASES = ['register', 'login', 'generate', 'list', 'get', 'refine', 'code_stubs']
+PASSWORD = 'bench-password-123'
+
+
+class Run:
+    """State shared between phases: registered users, their tokens and specs."""
+
+    def __init__(self):
+        self.emails = []
+        self.tokens = []
+        # (token, spec id) pairs, so reads and refines act on the caller's own spec
+        self.specs = []
+
+    def auth(self, i: int) -> dict:
+        return {'Authorization': f'Bearer {self.tokens[i % len(self.tokens)]}'}
+
+    def owned_spec(self, i: int) -> tuple:
+        token, spec_id = self.specs[i % len(self.specs)]
+        return {'Authorization': f'Bearer {token}'}, spec_id
+
+
+def phase_request(phase: str, run: Run, args):
+    """make_request(client, i) for harness.drive(), recording what later phases need."""
+
+    async def register(client, i):
+        email = f'bench-{os.getpid()}-{i}@example.com'
+        response = await client.post('/api/auth/register/', json={
+            'email': email, 'password': PASSWORD, 'password_confirm': PASSWORD,
+            'first_name': 'Bench', 'last_name': str(i),
+        })
+        if response.status_code == 201:
+            run.emails.append(email)
+            run.tokens.append(response.json()['tokens']['access'])
+        return response
+
+    async def login(client, i):
+        email = run.emails[i % len(run.emails)]
+        return await client.post('/api/auth/login/', json={'email': email, 'password': PASSWORD})
+
+    async def generate(client, i):
+        headers = run.auth(i)
+        response = await client.post('/api/specs/generate/', json={'idea': f'Benchmark idea {i}'}, headers=headers)
+        if response.status_code == 201:
+            run.specs.append((headers['Authorization'][len('Bearer '):], response.json()['id']))
+        return response
+
+    async def list_specs(client, i):
+        return await client.get('/api/specs/', headers=run.auth(i))
+
+    async def get(client, i):
+        headers, spec_id = run.owned_spec(i)
+        return await client.get(f'/api/specs/{spec_id}/', headers=headers)
+
+    async def refine(client, i):
+        headers, spec_id = run.owned_spec(i)
+        return await client.post(f'/api/specs/refine/{spec_id}/', json={
+            'feedback': f'Add a reporting KPI ({i})', 'mode': args.refine_mode,
+        }, headers=headers)
+
+    async def code_stubs(client, i):
+        headers, spec_id = run.owned_spec(i)
+        return await client.post('/api/code-stubs/', json={
+            'spec_id': spec_id, 'engine': args.codegen_engine,
+        }, headers=headers)
+
+    return {
+        'register': register,
+        'login': login,
+        'generate': generate,
+        'list': list_specs,
+        'get': get,
+        'refine': refine,
+        'code_stubs': code_stubs,
+    }[phase]
+
+
+async def run_phases(base_url: str, phases: list, args) -> dict:
+    run = Run()
+    results = {}
+    for phase in PHASES:
+        if phase not in phases and not _needed_by(phase, phases):
+            continue
+        make_request = phase_request(phase, run, args)
+        summary = await harness.drive(base_url, make_request, args.requests, args.concurrency)
+        if phase in phases:
+            results[phase] = summary
+        if phase in ('register', 'generate') and not (run.tokens if phase == 'register' else run.specs):
+            raise RuntimeError(f"No successful {phase} requests; later phases cannot run")
+    return results
+
+
+def _needed_by(phase: str, phases: list) -> bool:
+    """Whether a phase that was not asked for must still run to set up later ones."""
+    if phase == 'register':
+        return True
+    if phase == 'generate':
+        return any(p in phases for p in ('get', 'refine', 'code_stubs'))
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100, help="Requests per endpoint")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--endpoints', default=','.join(PHASES), help="Comma-separated subset of " + ','.join(PHASES))
+    parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help="Threads per WSGI worker")
+    parser.add_argument('--latency-ms', type=float, default=800.0, help="Mean fake upstream latency")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Latency spread (see fake_llm.py)")
+    parser.add_argument('--latency-dist', choices=LATENCY_DISTRIBUTIONS, default='normal')
+    parser.add_argument('--modules', type=int, default=3, help="Modules per generated blueprint")
+    parser.add_argument('--entities', type=int, default=3, help="Entities per module")
+    parser.add_argument('--fields', type=int, default=6, help="Fields per entity")
+    parser.add_argument('--code-lines', type=int, default=80, help="Lines per generated code file")
+    parser.add_argument('--refine-mode', choices=['patch', 'full'], default='patch')
+    parser.add_argument('--codegen-engine', choices=['llm', 'local', 'hybrid'], default='llm')
+    parser.add_argument('--output', help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    phases = [phase.strip() for phase in args.endpoints.split(',') if phase.strip()]
+    unknown = set(phases) - set(PHASES)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    llm_port = harness.free_port()
+    env = harness.app_env(llm_port)
+    harness.prepare_database(env)
+
+    results = {
+        'benchmark': 'endpoints',
+        'server': args.server,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms,
+        'latency_dist': args.latency_dist,
+        'payload': {
+            'modules': args.modules,
+            'entities': args.entities,
+            'fields': args.fields,
+            'code_lines': args.code_lines,
+        },
+    }
+
+    fake_llm_args = [
+        '--latency-dist', args.latency_dist,
+        '--modules', str(args.modules), '--entities', str(args.entities), '--fields', str(args.fields),
+        '--code-lines', str(args.code_lines),
+    ]
+    with harness.fake_llm(llm_port, args.latency_ms, args.jitter_ms, *fake_llm_args):
+        port = harness.free_port()
+        if args.server == 'asgi':
+            server = harness.asgi_server(port, env, args.workers)
+        else:
+            server = harness.wsgi_server(port, env, args.workers, args.threads)
+        with server:
+            results['endpoints'] = asyncio.run(run_phases(f'http://127.0.0.1:{port}', phases, args))
+
+    harness.emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
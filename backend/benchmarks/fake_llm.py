@@ -0,0 +1,296 @@
+"""
+Local stand-in for the OpenAI chat-completions API.
+
+Serves POST /v1/chat/completions on an asyncio socket server so benchmarks
+can run without network access or API spend. Point the backend at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 and any OPENAI_API_KEY.
+
+Responses are canned blueprints (for the spec prompt), JSON Patches (for the
+patch-refine prompt) or code files (for the code prompt); --modules,
+--entities, --fields and --code-lines set their size. Latency is sampled per
+request from a distribution (--latency-dist) with mean --latency-ms:
+- normal: standard deviation --jitter-ms
+- lognormal: standard deviation --jitter-ms, long right tail
+- exponential: memoryless; --jitter-ms is ignored
+- uniform: between latency-ms - jitter-ms and latency-ms + jitter-ms
+- fixed: always latency-ms
+
+Faults can be injected to exercise the client's retries and circuit breaker:
+a fraction (or the first N) of requests answer with an error status (with an
+optional Retry-After header), and a fraction have their connection dropped
+without a response.
+
+Usage:
+    python benchmarks/fake_llm.py --port 8100 --latency-ms 800 --jitter-ms 200
+    python benchmarks/fake_llm.py --latency-dist lognormal --latency-ms 1500 --jitter-ms 1000 --modules 12
+    python benchmarks/fake_llm.py --error-rate 0.3 --error-status 429 --retry-after 1
+    python benchmarks/fake_llm.py --fail-first 5 --error-status 503 --drop-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from http import HTTPStatus
+
+
+def build_spec(modules: int = 3, entities: int = 3, fields: int = 6) -> dict:
+    """Build a blueprint in the shape the spec prompt asks for."""
+    field_types = ['string', 'text', 'integer', 'number', 'boolean', 'date', 'datetime', 'email']
+    return {
+        "title": "Benchmark ERP",
+        "description": "Synthetic blueprint produced by the fake LLM server",
+        "modules": [
+            {
+                "name": f"Module {m}",
+                "purpose": f"Purpose of module {m}",
+                "entities": [
+                    {
+                        "name": f"Entity{m}_{e}",
+                        "fields": [
+                            {"name": f"field_{f}", "type": field_types[f % len(field_types)], "required": f == 0}
+                            for f in range(fields)
+                        ],
+                    }
+                    for e in range(entities)
+                ],
+                "apis": [
+                    {"method": "GET", "path": f"/module-{m}/entity-{e}/", "entity": f"Entity{m}_{e}"}
+                    for e in range(entities)
+                ],
+                "ui": [
+                    {"type": "Table", "entity": f"Entity{m}_{e}", "columns": [f"field_{f}" for f in range(fields)]}
+                    for e in range(entities)
+                ],
+            }
+            for m in range(modules)
+        ],
+        "kpis": ["Throughput", "Latency"],
+    }
+
+
+LATENCY_DISTRIBUTIONS = ('normal', 'lognormal', 'exponential', 'uniform', 'fixed')
+
+
+def sample_latency(distribution: str, mean: float, spread: float) -> float:
+    """One latency sample (same unit as mean), never negative."""
+    if mean <= 0:
+        return 0.0
+    if distribution == 'lognormal':
+        sigma2 = math.log(1 + (spread / mean) ** 2)
+        return random.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+    if distribution == 'exponential':
+        return random.expovariate(1.0 / mean)
+    if distribution == 'uniform':
+        return max(0.0, random.uniform(mean - spread, mean + spread))
+    if distribution == 'fixed':
+        return mean
+    return max(0.0, random.gauss(mean, spread))
+
+
+def build_patch() -> dict:
+    """A small JSON Patch in the shape the patch-refine prompt asks for."""
+    return {"patch": [
+        {"op": "replace", "path": "/description", "value": "Refined by the fake LLM server"},
+        {"op": "add", "path": "/kpis/-", "value": "Refinements"},
+    ]}
+
+
+def build_code(lines: int = 80) -> dict:
+    """Build the four code files the code prompt asks for."""
+    body = "\n".join(f"# line {i}" for i in range(lines))
+    return {key: body for key in ('models_py', 'serializers_py', 'views_py', 'urls_py')}
+
+
+class FakeLLM:
+    """Request handler state: canned payloads and latency settings."""
+
+    def __init__(
+        self, latency_ms: float, jitter_ms: float, modules: int, entities: int, fields: int,
+        error_rate: float = 0.0, error_status: int = 503, retry_after: float = None,
+        drop_rate: float = 0.0, fail_first: int = 0, latency_dist: str = 'normal', code_lines: int = 80,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.latency_dist = latency_dist
+        self.spec_content = json.dumps(build_spec(modules, entities, fields))
+        self.patch_content = json.dumps(build_patch())
+        self.code_content = json.dumps(build_code(code_lines))
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.drop_rate = drop_rate
+        self.fail_first = fail_first
+        self.requests = 0
+        self.errors = 0
+        self.drops = 0
+
+    def delay(self) -> float:
+        return sample_latency(self.latency_dist, self.latency_ms, self.jitter_ms) / 1000.0
+
+    def fault(self) -> str:
+        """Decide what happens to the current request: 'ok', 'error' or 'drop'."""
+        if self.requests <= self.fail_first or random.random() < self.error_rate:
+            return 'error'
+        if random.random() < self.drop_rate:
+            return 'drop'
+        return 'ok'
+
+    def content_for(self, body: dict) -> str:
+        messages = body.get('messages') or [{}]
+        system = messages[0].get('content', '')
+        if 'Django/DRF' in system:
+            return self.code_content
+        if 'JSON Patch' in system:
+            return self.patch_content
+        return self.spec_content
+
+    def completion(self, body: dict, content: str) -> dict:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get('model', 'fake'),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": self.usage(body, content),
+        }
+
+    def usage(self, body: dict, content: str) -> dict:
+        """Token counts at roughly four characters per token."""
+        prompt = sum(len(m.get('content', '')) for m in body.get('messages', [])) // 4
+        completion = len(content) // 4
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                method, path, _ = lines[0].split(' ', 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                raw = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                if method != 'POST' or not path.rstrip('/').endswith('/chat/completions'):
+                    await self.respond(writer, 404, {"error": {"message": "not found"}})
+                    continue
+
+                self.requests += 1
+                body = json.loads(raw or b'{}')
+                content = self.content_for(body)
+                await asyncio.sleep(self.delay())
+
+                fault = self.fault()
+                if fault == 'drop':
+                    self.drops += 1
+                    break
+                if fault == 'error':
+                    self.errors += 1
+                    extra_headers = {}
+                    if self.retry_after is not None:
+                        extra_headers['Retry-After'] = f"{self.retry_after:g}"
+                    await self.respond(writer, self.error_status, {
+                        "error": {"message": "Injected fault", "type": "server_error", "code": None}
+                    }, extra_headers)
+                    continue
+
+                if body.get('stream'):
+                    await self.stream(writer, body, content)
+                else:
+                    await self.respond(writer, 200, self.completion(body, content))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, payload: dict, headers: dict = None) -> None:
+        data = json.dumps(payload).encode()
+        extra = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        writer.write(
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n{extra}Connection: keep-alive\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+
+    async def stream(self, writer: asyncio.StreamWriter, body: dict, content: str) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n"
+        )
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        for start in range(0, len(content), 16):
+            event = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get('model', 'fake'),
+                "choices": [{"index": 0, "delta": {"content": content[start:start + 16]}, "finish_reason": None}],
+            }
+            await self.write_chunk(writer, f"data: {json.dumps(event)}\n\n".encode())
+        if (body.get('stream_options') or {}).get('include_usage'):
+            event = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get('model', 'fake'),
+                "choices": [],
+                "usage": self.usage(body, content),
+            }
+            await self.write_chunk(writer, f"data: {json.dumps(event)}\n\n".encode())
+        await self.write_chunk(writer, b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def write_chunk(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        await writer.drain()
+
+
+async def serve(app: FakeLLM, host: str, port: int) -> None:
+    server = await asyncio.start_server(app.handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency-ms', type=float, default=800.0, help="Mean upstream latency")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Spread of latency (see --latency-dist)")
+    parser.add_argument('--latency-dist', choices=LATENCY_DISTRIBUTIONS, default='normal')
+    parser.add_argument('--modules', type=int, default=3, help="Modules per generated blueprint")
+    parser.add_argument('--entities', type=int, default=3, help="Entities per module")
+    parser.add_argument('--fields', type=int, default=6, help="Fields per entity")
+    parser.add_argument('--code-lines', type=int, default=80, help="Lines per generated code file")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with --error-status")
+    parser.add_argument('--error-status', type=int, default=503, help="Status code of injected errors (e.g. 429, 500, 503)")
+    parser.add_argument('--retry-after', type=float, default=None, help="Retry-After seconds sent with injected errors")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="Fraction of requests whose connection is dropped")
+    parser.add_argument('--fail-first', type=int, default=0, help="Answer the first N requests with --error-status")
+    args = parser.parse_args()
+
+    app = FakeLLM(
+        args.latency_ms, args.jitter_ms, args.modules, args.entities, args.fields,
+        error_rate=args.error_rate, error_status=args.error_status, retry_after=args.retry_after,
+        drop_rate=args.drop_rate, fail_first=args.fail_first,
+        latency_dist=args.latency_dist, code_lines=args.code_lines,
+    )
+    print(f"Fake LLM listening on http://{args.host}:{args.port}/v1", flush=True)
+    try:
+        asyncio.run(serve(app, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+"""
+Shared plumbing for the benchmark scripts: booting the fake LLM and the
+Django app as subprocesses, preparing a throwaway database and driving
+HTTP load with latency percentiles.
+"""
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+class Service:
+    """A subprocess that is ready once it accepts connections on port."""
+
+    def __init__(self, args, port: int, env: dict = None):
+        self.args = args
+        self.port = port
+        self.env = env
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            self.args,
+            cwd=BACKEND_DIR,
+            env=self.env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        wait_for_port(self.port)
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def fake_llm(port: int, latency_ms: float, jitter_ms: float = 0.0, *extra) -> Service:
+    return Service(
+        [sys.executable, 'benchmarks/fake_llm.py', '--port', str(port),
+         '--latency-ms', str(latency_ms), '--jitter-ms', str(jitter_ms), *extra],
+        port,
+    )
+
+
+def app_env(llm_port: int, db_path: str = None, **overrides) -> dict:
+    """Environment for a backend process talking to the fake LLM on llm_port."""
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='erp-bench-'), 'bench.sqlite3')
+    env = dict(os.environ)
+    env.update({
+        'DJANGO_SETTINGS_MODULE': 'erp_ai.settings',
+        'DATABASE_URL': f'sqlite:///{db_path}',
+        'OPENAI_API_KEY': 'sk-benchmark',
+        'OPENAI_BASE_URL': f'http://127.0.0.1:{llm_port}/v1',
+        'DEBUG': 'False',
+        'ALLOWED_HOSTS': '127.0.0.1,localhost',
+        'AI_CACHE_ENABLED': 'False',
+        'AI_RATE_LIMIT_ENABLED': 'False',
+    })
+    env.update({key: str(value) for key, value in overrides.items()})
+    return env
+
+
+def setup_django(env: dict) -> None:
+    """Configure Django in this process (for in-process benchmarks) with env."""
+    os.environ.update(env)
+    sys.path.insert(0, str(BACKEND_DIR))
+    import django
+    django.setup()
+
+
+def manage(env: dict, *args) -> str:
+    result = subprocess.run(
+        [sys.executable, 'manage.py', *args],
+        cwd=BACKEND_DIR,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout
+
+
+def prepare_database(env: dict) -> None:
+    manage(env, 'migrate', '--noinput', '-v', '0')
+
+
+def create_user_tokens(env: dict, count: int = 1) -> list:
+    """Create benchmark users and return an access token for each."""
+    script = (
+        "import json\n"
+        "from django.contrib.auth.models import User\n"
+        "from rest_framework_simplejwt.tokens import RefreshToken\n"
+        "tokens = []\n"
+        f"for i in range({count}):\n"
+        "    user, _ = User.objects.get_or_create(username=f'bench{i}', defaults={'email': f'bench{i}@example.com'})\n"
+        "    user.set_password('bench-password-123')\n"
+        "    user.save()\n"
+        "    tokens.append(str(RefreshToken.for_user(user).access_token))\n"
+        "print(json.dumps(tokens))\n"
+    )
+    output = manage(env, 'shell', '-c', script)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def wsgi_server(port: int, env: dict, workers: int = 2, threads: int = 4) -> Service:
+    return Service(
+        [sys.executable, '-m', 'gunicorn', 'erp_ai.wsgi:application',
+         '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+         '--threads', str(threads), '--timeout', '120'],
+        port,
+        env,
+    )
+
+
+def asgi_server(port: int, env: dict, workers: int = 1) -> Service:
+    return Service(
+        [sys.executable, '-m', 'uvicorn', 'erp_ai.asgi:application',
+         '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+         '--no-access-log', '--log-level', 'warning'],
+        port,
+        env,
+    )
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed: float, errors: int, **extra) -> dict:
+    """Throughput and latency percentiles (milliseconds) for one scenario."""
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        **extra,
+    }
+
+
+def parse_server_timing(header: str) -> dict:
+    """{'db': 1.2, 'llm': 800.0, ...} (milliseconds) from a Server-Timing header."""
+    durations = {}
+    for metric in filter(None, (part.strip() for part in header.split(','))):
+        name, *params = metric.split(';')
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'dur':
+                try:
+                    durations[name.strip()] = float(value)
+                except ValueError:
+                    pass
+    return durations
+
+
+async def drive(base_url: str, make_request, total: int, concurrency: int, timeout: float = 120.0) -> dict:
+    """
+    Issue `total` requests with at most `concurrency` in flight.
+
+    make_request(client, i) is a coroutine returning an httpx.Response; any
+    status >= 400 or exception counts as an error. Failed requests are
+    tallied by status code (or exception name) under 'error_statuses', and
+    the mean of each Server-Timing phase of successful ones is reported
+    under 'server_timing_ms'.
+    """
+    latencies = []
+    errors = 0
+    error_statuses = {}
+    phases = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await make_request(client, i)
+                    if response.status_code >= 400:
+                        errors += 1
+                        error_statuses[str(response.status_code)] = error_statuses.get(str(response.status_code), 0) + 1
+                        return
+                except httpx.HTTPError as e:
+                    errors += 1
+                    error_statuses[type(e).__name__] = error_statuses.get(type(e).__name__, 0) + 1
+                    return
+                latencies.append(time.perf_counter() - started)
+                for name, duration in parse_server_timing(response.headers.get('server-timing', '')).items():
+                    phases.setdefault(name, []).append(duration)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    extra = {'error_statuses': error_statuses} if error_statuses else {}
+    if phases:
+        # Phases a request skipped count as 0 so the means add up per request
+        extra['server_timing_ms'] = {
+            name: round(sum(values) / len(latencies), 2) for name, values in phases.items()
+        }
+    return summarize(latencies, elapsed, errors, concurrency=concurrency, **extra)
+
+
+def emit(results: dict, output: str = None) -> None:
+    """Print results as JSON and optionally write them to a file."""
+    text = json.dumps(results, indent=2)
+    print(text)
+    if output:
+        Path(output).write_text(text + "\n")
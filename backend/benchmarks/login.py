@@ -0,0 +1,169 @@
+"""
+Email login cost against a large user table.
+
+Fills a throwaway SQLite database with --users accounts (1M by default),
+then times, in-process:
+- lookup_legacy: User.objects.get(email=...), the old unindexed,
+  case-sensitive lookup
+- lookup_indexed: accounts.backends.users_by_email(), one lookup on the
+  LOWER(email) index
+- login_legacy: the old LoginView flow, that lookup plus
+  authenticate(username=...), which loads the user a second time
+- login_backend: authenticate(email=...) through EmailBackend
+- login_endpoint: POST /api/auth/login/ end to end, including issuing tokens
+
+Each reports queries, mean/p50/p95 milliseconds and single-threaded
+operations per second (_rps). Password hashing would dominate every login
+at the default PBKDF2 cost and hide the database work, so accounts use MD5
+hashes unless --hasher default is given. The query plans are included to
+show which lookups use an index.
+
+Usage (from backend/):
+    python benchmarks/login.py --users 1000000 --rounds 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+
+PASSWORD = 'bench-password-123'
+HASHERS = {
+    'md5': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+    'default': None,
+}
+
+
+def email_for(i: int) -> str:
+    # Mixed case in storage, as users typed it; logins use lower case
+    return f'Bench.User{i}@Example.com' if i % 10 == 0 else f'bench.user{i}@example.com'
+
+
+def populate(count: int, batch: int = 10000) -> float:
+    """Insert count users sharing one password hash; returns the seconds taken."""
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    password = make_password(PASSWORD)
+    now = timezone.now()
+    started = time.perf_counter()
+    for start in range(0, count, batch):
+        User.objects.bulk_create([
+            User(username=f'bench{i}', email=email_for(i), password=password, date_joined=now)
+            for i in range(start, min(start + batch, count))
+        ])
+    return time.perf_counter() - started
+
+
+def measure(fn, emails, rounds: int) -> dict:
+    from django.db import connection
+
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        fn(emails[0])
+    timings = []
+    for i in range(rounds):
+        started = time.perf_counter()
+        fn(emails[i % len(emails)])
+        timings.append(time.perf_counter() - started)
+    mean = statistics.fmean(timings)
+    return {
+        'queries': len(queries),
+        'mean_ms': round(mean * 1000, 3),
+        'p50_ms': round(harness.percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(harness.percentile(timings, 95) * 1000, 3),
+        'ops_rps': round(1 / mean, 1) if mean else None,
+    }
+
+
+def query_plan(queryset) -> str:
+    from django.db import connection
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '; '.join(str(row[-1]) for row in cursor.fetchall())
+
+
+def run(users: int, rounds: int) -> dict:
+    from django.contrib.auth import authenticate
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from accounts.backends import users_by_email
+
+    emails = [email_for(random.randrange(users)).lower() for _ in range(min(rounds, 1000))]
+    # The old lookup was case-sensitive, so give it the stored spelling
+    stored = [email_for(int(email.split('user')[1].split('@')[0])) for email in emails]
+
+    def lookup_legacy(email):
+        return User.objects.get(email=email)
+
+    def lookup_indexed(email):
+        return users_by_email(email).first()
+
+    def login_legacy(email):
+        user = User.objects.get(email=email)
+        assert authenticate(username=user.username, password=PASSWORD) is not None
+
+    def login_backend(email):
+        assert authenticate(email=email, password=PASSWORD) is not None
+
+    client = Client(HTTP_HOST='127.0.0.1')
+
+    def login_endpoint(email):
+        response = client.post('/api/auth/login/', {'email': email, 'password': PASSWORD}, content_type='application/json')
+        assert response.status_code == 200, response.status_code
+
+    return {
+        'plans': {
+            'lookup_legacy': query_plan(User.objects.filter(email=stored[0])),
+            'lookup_indexed': query_plan(users_by_email(emails[0])[:1]),
+        },
+        # The legacy lookup scans the table, so it gets fewer rounds
+        'lookup_legacy': measure(lookup_legacy, stored, max(1, rounds // 10)),
+        'lookup_indexed': measure(lookup_indexed, emails, rounds),
+        'login_legacy': measure(login_legacy, stored, max(1, rounds // 10)),
+        'login_backend': measure(login_backend, emails, rounds),
+        'login_endpoint': measure(login_endpoint, emails, rounds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--rounds', type=int, default=200, help="Logins per measurement")
+    parser.add_argument('--hasher', choices=HASHERS, default='md5', help="Password hasher for the accounts")
+    parser.add_argument('--output', help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    env = harness.app_env(harness.free_port())
+    harness.prepare_database(env)
+    harness.setup_django(env)
+
+    from django.test.utils import override_settings
+    overrides = {'PASSWORD_HASHERS': HASHERS[args.hasher]} if HASHERS[args.hasher] else {}
+    with override_settings(**overrides):
+        populate_s = populate(args.users)
+        results = {
+            'benchmark': 'login',
+            'users': args.users,
+            'hasher': args.hasher,
+            'populate_s': round(populate_s, 1),
+            **run(args.users, args.rounds),
+        }
+    harness.emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
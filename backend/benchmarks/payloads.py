@@ -0,0 +1,165 @@
+"""
+JSON engine and response compression on large blueprint and code-stub payloads.
+
+For blueprints of each of --sizes modules (50-500 KB rendered with the
+defaults) and a code-stubs response for the same modules, times in-process:
+- render: DRF's JSONRenderer vs FastJSONRenderer, and whether their bytes
+  are identical
+- parse: JSONParser vs FastJSONParser on the rendered body
+- gzip / br: compress() at the configured level, with the compressed size
+  (br only when the brotli package is installed)
+- http: GET /api/specs/<id>/ through the full middleware stack, without
+  Accept-Encoding and with each available encoding, against a throwaway
+  SQLite database
+
+Reports mean, p50 and p95 milliseconds per operation and the bytes sent.
+FastJSON numbers are those of the standard library when orjson is not
+installed.
+
+Usage (from backend/):
+    python benchmarks/payloads.py --sizes 12,50,120 --rounds 50
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+from fake_llm import build_code, build_spec  # noqa: E402
+
+
+def measure(fn, rounds: int) -> dict:
+    """Time fn() rounds times after one warm-up call."""
+    fn()
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'p50_ms': round(harness.percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(harness.percentile(timings, 95) * 1000, 3),
+    }
+
+
+def stubs_payload(modules: int, code_lines: int) -> dict:
+    """A code-stubs response shaped like generate_code_stubs' for this many modules."""
+    return {
+        'language': 'python',
+        'framework': 'django',
+        'modules': [
+            {'module': f'Module {i}', 'cached': False, 'files': build_code(code_lines)}
+            for i in range(modules)
+        ],
+    }
+
+
+def bench_payload(data, rounds: int) -> dict:
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from specs import compression
+    from specs.fastjson import FastJSONParser, FastJSONRenderer
+
+    stdlib, fast = JSONRenderer(), FastJSONRenderer()
+    body = stdlib.render(data)
+    results = {
+        'bytes': len(body),
+        'identical': fast.render(data) == body,
+        'render_stdlib': measure(lambda: stdlib.render(data), rounds),
+        'render_fast': measure(lambda: fast.render(data), rounds),
+        'parse_stdlib': measure(lambda: JSONParser().parse(io.BytesIO(body)), rounds),
+        'parse_fast': measure(lambda: FastJSONParser().parse(io.BytesIO(body)), rounds),
+    }
+    for name in ('render', 'parse'):
+        before, after = results[f'{name}_stdlib']['mean_ms'], results[f'{name}_fast']['mean_ms']
+        results[f'{name}_speedup'] = round(before / after, 2) if after else 0.0
+    for encoding in compression.available_encodings():
+        results[encoding] = {
+            'bytes': len(compression.compress(body, encoding)),
+            **measure(lambda: compression.compress(body, encoding), rounds),
+        }
+        results[encoding]['ratio'] = round(len(body) / results[encoding]['bytes'], 2)
+    return results
+
+
+def bench_http(client, url: str, token: str, rounds: int) -> dict:
+    from specs import compression
+
+    auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    results = {}
+    for encoding in ('identity', *compression.available_encodings()):
+        headers = {**auth, 'HTTP_ACCEPT_ENCODING': encoding}
+        response = client.get(url, **headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        results[encoding] = {
+            'content_encoding': response.get('Content-Encoding', 'identity'),
+            'bytes': len(response.content),
+            'server_timing': response.get('Server-Timing', ''),
+            **measure(lambda: client.get(url, **headers), rounds),
+        }
+    return results
+
+
+def bench_size(client, modules: int, entities: int, fields: int, code_lines: int, rounds: int) -> dict:
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from specs.models import Spec
+    from specs.serializers import SpecSerializer
+
+    user, _ = User.objects.get_or_create(
+        username=f'bench-payloads-{modules}',
+        defaults={'email': f'bench-payloads-{modules}@example.com'}
+    )
+    spec = Spec.objects.create(user=user, idea='Benchmark idea', spec_json=build_spec(modules, entities, fields))
+    token = str(RefreshToken.for_user(user).access_token)
+
+    return {
+        'modules': modules,
+        'spec': bench_payload(SpecSerializer(spec).data, rounds),
+        'code_stubs': bench_payload(stubs_payload(modules, code_lines), rounds),
+        'http': bench_http(client, f'/api/specs/{spec.id}/', token, rounds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='12,50,120', help="Comma-separated module counts")
+    parser.add_argument('--entities', type=int, default=5, help="Entities per module")
+    parser.add_argument('--fields', type=int, default=10, help="Fields per entity")
+    parser.add_argument('--code-lines', type=int, default=40, help="Lines per generated code file")
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--output', help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    env = harness.app_env(harness.free_port())
+    harness.prepare_database(env)
+    harness.setup_django(env)
+
+    from django.conf import settings
+    from django.test import Client
+    from specs import compression, fastjson
+    client = Client(HTTP_HOST='127.0.0.1')
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    results = {
+        'benchmark': 'payloads',
+        'rounds': args.rounds,
+        'json_engine': fastjson.engine(),
+        'encodings': list(compression.available_encodings()),
+        'compression_min_size': getattr(settings, 'RESPONSE_COMPRESSION_MIN_SIZE', 1024),
+        'sizes': [
+            bench_size(client, modules, args.entities, args.fields, args.code_lines, args.rounds)
+            for modules in sizes
+        ],
+    }
+    harness.emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Load-test the per-user rate limiter on the AI endpoints.
+
+Runs the same generate load against a WSGI server with rate limiting
+disabled and with it enabled for each store, using a plan that is never
+exceeded, so the latency difference is the limiter's overhead on the hot
+path. A final scenario uses a tight plan to check that exactly the allowed
+number of requests get through and the rest are answered with 429.
+
+SQLite serialises writes, so under load much of the latency is waiting for
+the write lock whether or not the limiter is on; pass a Postgres
+DATABASE_URL through the environment for cleaner numbers.
+
+Usage (from backend/):
+    python benchmarks/rate_limit.py --requests 400 --concurrency 4 --users 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+
+UNTHROTTLED_PLAN = {'default': {'generate': '1000000/hour', 'concurrency': 1000}}
+
+
+def generate_request(tokens):
+    async def request(client, i):
+        headers = {'Authorization': f'Bearer {tokens[i % len(tokens)]}'}
+        return await client.post('/api/specs/generate/', json={'idea': f'Benchmark idea {i}'}, headers=headers)
+    return request
+
+
+async def count_statuses(base_url: str, token: str, total: int, concurrency: int) -> dict:
+    """Fire total generate requests for one user and tally the status codes."""
+    counts = {}
+    retry_after = set()
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+        async def one(i):
+            async with semaphore:
+                response = await client.post('/api/specs/generate/', json={'idea': f'Burst idea {i}'}, headers=headers)
+                counts[response.status_code] = counts.get(response.status_code, 0) + 1
+                if 'Retry-After' in response.headers:
+                    retry_after.add(response.headers['Retry-After'])
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        'elapsed_s': round(elapsed, 3),
+        # Every request that was not limited took a token, whatever its outcome
+        'admitted': total - counts.get(429, 0),
+        'statuses': {str(code): count for code, count in sorted(counts.items())},
+        'retry_after_values': sorted(retry_after),
+    }
+
+
+def run_scenario(llm_port: int, args, users: int, **overrides) -> tuple:
+    """Prepare a database and users for a WSGI server with overrides; returns (server, base_url, tokens)."""
+    env = harness.app_env(llm_port, **overrides)
+    harness.prepare_database(env)
+    tokens = harness.create_user_tokens(env, users)
+    port = harness.free_port()
+    server = harness.wsgi_server(port, env, args.wsgi_workers, args.wsgi_threads)
+    return server, f'http://127.0.0.1:{port}', tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--users', type=int, default=8, help="Users the load is spread over")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Fake upstream latency")
+    parser.add_argument('--wsgi-workers', type=int, default=1)
+    parser.add_argument('--wsgi-threads', type=int, default=4)
+    parser.add_argument('--stores', default='memory,cache,database', help="Comma-separated stores to measure")
+    parser.add_argument('--burst-limit', type=int, default=20, help="Allowed requests in the enforcement scenario")
+    parser.add_argument('--output', help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    llm_port = harness.free_port()
+    results = {
+        'benchmark': 'rate_limit',
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'users': args.users,
+        'latency_ms': args.latency_ms,
+    }
+
+    with harness.fake_llm(llm_port, args.latency_ms):
+        scenarios = [('disabled', {'AI_RATE_LIMIT_ENABLED': 'False'})]
+        for store in filter(None, args.stores.split(',')):
+            scenarios.append((store, {
+                'AI_RATE_LIMIT_ENABLED': 'True',
+                'AI_RATE_LIMIT_STORE': store,
+                'AI_RATE_LIMIT_PLANS': json.dumps(UNTHROTTLED_PLAN),
+            }))
+
+        for name, overrides in scenarios:
+            server, base_url, tokens = run_scenario(llm_port, args, args.users, **overrides)
+            with server:
+                results[name] = asyncio.run(harness.drive(
+                    base_url, generate_request(tokens), args.requests, args.concurrency,
+                ))
+
+        # One user, a tight bucket: exactly burst_limit requests should succeed
+        plan = {'default': {'generate': f'{args.burst_limit}/hour'}}
+        server, base_url, tokens = run_scenario(
+            llm_port, args, 1,
+            AI_RATE_LIMIT_ENABLED='True', AI_RATE_LIMIT_PLANS=json.dumps(plan),
+        )
+        with server:
+            results['enforcement'] = {
+                'limit': args.burst_limit,
+                **asyncio.run(count_statuses(base_url, tokens[0], args.burst_limit * 5, args.concurrency)),
+            }
+
+    harness.emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Micro-benchmarks for the spec serializers on large spec_json documents.
+
+For blueprints of increasing size (modules x entities x fields, built like
+the fake LLM's), times in-process, without HTTP or a database:
+- represent: SpecSerializer(spec).data
+- render: JSONRenderer().render() of that data (what a GET response costs)
+- validate: SpecSerializer(data=...).is_valid() on an incoming document
+- summary: Spec.refresh_summary(), which runs on every save
+- list_full / list_summary: serializing a page of specs with
+  SpecSerializer vs SpecSummarySerializer
+
+Reports mean, p50 and p95 milliseconds per operation plus the rendered size.
+
+Usage (from backend/):
+    python benchmarks/serializers.py --sizes 3,25,100 --rounds 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+from fake_llm import build_spec  # noqa: E402
+
+
+def measure(fn, rounds: int) -> dict:
+    """Time fn() rounds times after one warm-up call."""
+    fn()
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'p50_ms': round(harness.percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(harness.percentile(timings, 95) * 1000, 3),
+    }
+
+
+def bench_size(modules: int, entities: int, fields: int, rounds: int, page_size: int) -> dict:
+    from django.utils import timezone
+    from rest_framework.renderers import JSONRenderer
+    from specs.models import Spec
+    from specs.serializers import SpecSerializer, SpecSummarySerializer
+
+    blueprint = build_spec(modules, entities, fields)
+    now = timezone.now()
+
+    def make_spec():
+        spec = Spec(id=uuid.uuid4(), idea='Benchmark idea', spec_json=blueprint, created_at=now, updated_at=now)
+        spec.refresh_summary()
+        return spec
+
+    spec = make_spec()
+    page = [make_spec() for _ in range(page_size)]
+    data = SpecSerializer(spec).data
+    renderer = JSONRenderer()
+    rendered = renderer.render(data)
+
+    return {
+        'modules': modules,
+        'entities': entities,
+        'fields': fields,
+        'spec_bytes': len(rendered),
+        'represent': measure(lambda: SpecSerializer(spec).data, rounds),
+        'render': measure(lambda: renderer.render(data), rounds),
+        'validate': measure(
+            lambda: SpecSerializer(data={'idea': 'Benchmark idea', 'spec_json': blueprint}).is_valid(raise_exception=True),
+            rounds,
+        ),
+        'summary': measure(spec.refresh_summary, rounds),
+        'list_full': {
+            'page_bytes': len(renderer.render(SpecSerializer(page, many=True).data)),
+            **measure(lambda: renderer.render(SpecSerializer(page, many=True).data), rounds),
+        },
+        'list_summary': {
+            'page_bytes': len(renderer.render(SpecSummarySerializer(page, many=True).data)),
+            **measure(lambda: renderer.render(SpecSummarySerializer(page, many=True).data), rounds),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='3,25,100', help="Comma-separated module counts")
+    parser.add_argument('--entities', type=int, default=6, help="Entities per module")
+    parser.add_argument('--fields', type=int, default=12, help="Fields per entity")
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--page-size', type=int, default=20, help="Specs per page for the list benchmarks")
+    parser.add_argument('--output', help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    harness.setup_django(harness.app_env(harness.free_port()))
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    results = {
+        'benchmark': 'serializers',
+        'rounds': args.rounds,
+        'page_size': args.page_size,
+        'sizes': [bench_size(modules, args.entities, args.fields, args.rounds, args.page_size) for modules in sizes],
+    }
+    harness.emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Similar-idea lookups at scale.
+
+Builds an IdeaIndex in memory from --specs synthetic ideas (1M by default):
+a business function, an industry and a few extra words each, drawn from
+Zipf-like distributions so some words are in most ideas and most are
+rare, owned by --users users. Then times lookups for:
+- duplicate: an indexed idea reworded ("<industry> <function> app")
+- near: an indexed idea with one extra word
+- novel: words the index has never seen
+- common: only the most frequent words, the worst case for the index
+- own: duplicate, restricted to the owner's blueprints, as find() searches
+and the same duplicate queries by scoring every idea (--brute-rounds), as
+a lookup without the index would.
+
+Reports build time, index size and the growth in process RSS, and mean/p50/p95/p99
+milliseconds and match rate per kind. With --db-specs it also stores that
+many blueprints in a throwaway SQLite database and times
+SimilarIdeas.rebuild() and find(), which re-reads matches from the
+database.
+
+Usage (from backend/):
+    python benchmarks/similarity.py --specs 1000000 --queries 2000
+"""
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+
+FUNCTIONS = [
+    'inventory', 'payroll', 'crm', 'booking', 'invoicing', 'scheduling', 'accounting', 'hr', 'recruiting',
+    'procurement', 'warehouse', 'fleet', 'maintenance', 'ticketing', 'helpdesk', 'ecommerce', 'pos', 'loyalty',
+    'membership', 'attendance', 'timesheet', 'expense', 'budgeting', 'asset', 'compliance', 'audit', 'quality',
+    'shipping', 'logistics', 'dispatch', 'rental', 'subscription', 'donor', 'volunteer', 'patient', 'student',
+    'course', 'grading', 'menu', 'reservation',
+]
+INDUSTRIES = [
+    'bakery', 'restaurant', 'dentist', 'clinic', 'school', 'gym', 'salon', 'hotel', 'farm', 'brewery', 'winery',
+    'florist', 'pharmacy', 'garage', 'plumber', 'electrician', 'law firm', 'library', 'museum', 'church', 'charity',
+    'startup', 'agency', 'factory', 'construction company', 'cleaning company', 'daycare', 'veterinary clinic',
+    'bookstore', 'boutique', 'cafe', 'food truck', 'hostel', 'marina', 'golf club', 'dance studio', 'yoga studio',
+    'tutoring center', 'car dealership', 'print shop',
+]
+
+
+def zipf(words, exponent: float = 1.0):
+    """(words, cumulative weights) for drawing the r-th word with weight 1/r**exponent."""
+    total, cumulative = 0.0, []
+    for rank in range(1, len(words) + 1):
+        total += 1 / rank ** exponent
+        cumulative.append(total)
+    return list(words), cumulative
+
+
+def draw(rng: random.Random, distribution) -> str:
+    words, cumulative = distribution
+    return rng.choices(words, cum_weights=cumulative)[0]
+
+
+def make_idea(rng: random.Random, extras) -> str:
+    words = [draw(rng, FUNCTION_WORDS), 'system for a', draw(rng, INDUSTRY_WORDS)]
+    for _ in range(rng.randrange(4)):
+        words.append(draw(rng, extras))
+    return ' '.join(words)
+
+
+FUNCTION_WORDS = zipf(FUNCTIONS)
+INDUSTRY_WORDS = zipf(INDUSTRIES)
+
+
+def measure(fn, queries) -> dict:
+    timings, matched = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        result = fn(query)
+        timings.append(time.perf_counter() - started)
+        matched += bool(result)
+    return {
+        'queries': len(queries),
+        'match_rate': round(matched / len(queries), 3) if queries else 0.0,
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'p50_ms': round(harness.percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(harness.percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(harness.percentile(timings, 99) * 1000, 3),
+    }
+
+
+def rss_mb() -> float:
+    # ru_maxrss is kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def bench_index(args, rng: random.Random) -> dict:
+    from specs.similarity import IdeaIndex, similarity, terms
+
+    extras = zipf([f'feature{i}' for i in range(args.vocabulary)])
+    index = IdeaIndex()
+    ideas, owners = [], []
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    for _ in range(args.specs):
+        idea, owner = make_idea(rng, extras), rng.randrange(1, args.users + 1)
+        index.add(uuid.uuid4(), owner, idea)
+        ideas.append(idea)
+        owners.append(owner)
+    build_s = time.perf_counter() - started
+    # Includes the benchmark's own lists of ideas and owners
+    rss_growth = rss_mb() - rss_before
+
+    picks = [rng.randrange(len(ideas)) for _ in range(args.queries)]
+    duplicate = []
+    for i in picks:
+        words = ideas[i].split(' system for a ')
+        duplicate.append(f'{words[1]} {words[0]} app')
+    queries = {
+        'duplicate': duplicate,
+        'near': [f'{ideas[i]} {draw(rng, extras)}' for i in picks],
+        'novel': [f'{rng.randrange(10 ** 9)}x inventory for a nowhere{rng.randrange(10 ** 9)}' for _ in picks],
+        'common': [f'{FUNCTIONS[0]} for a {INDUSTRIES[0]}' for _ in picks],
+    }
+    threshold = args.threshold
+    lookups = {
+        kind: measure(lambda query: index.search(query, threshold, max_candidates=args.max_candidates), batch)
+        for kind, batch in queries.items()
+    }
+    own = list(zip(duplicate, (owners[i] for i in picks)))
+    lookups['own'] = measure(
+        lambda pair: index.search(pair[0], threshold, user_id=pair[1], max_candidates=args.max_candidates), own
+    )
+
+    # The same duplicate queries against every idea, without the index
+    indexed_terms = [terms(idea) for idea in ideas[:args.specs]] if args.brute_rounds else []
+    brute = measure(
+        lambda query: max((similarity(terms(query), other) for other in indexed_terms), default=0) >= threshold,
+        duplicate[:args.brute_rounds]
+    ) if args.brute_rounds else None
+
+    return {
+        'specs': args.specs,
+        'users': args.users,
+        'threshold': threshold,
+        'build_s': round(build_s, 2),
+        'index': index.stats(),
+        'build_rss_growth_mb': round(rss_growth, 1),
+        'lookups': lookups,
+        'brute_force': brute,
+    }
+
+
+def bench_database(args, rng: random.Random) -> dict:
+    from django.contrib.auth.models import User
+    from specs.models import Spec
+    from specs.similarity import SimilarIdeas
+
+    extras = zipf([f'feature{i}' for i in range(args.vocabulary)])
+    user, _ = User.objects.get_or_create(username='bench-similarity', defaults={'email': 'bench-similarity@example.com'})
+    ideas = [make_idea(rng, extras) for _ in range(args.db_specs)]
+    for start in range(0, len(ideas), 1000):
+        Spec.objects.bulk_create(
+            Spec(user=user, idea=idea, spec_json={'title': 'Benchmark', 'modules': []})
+            for idea in ideas[start:start + 1000]
+        )
+
+    finder = SimilarIdeas()
+    started = time.perf_counter()
+    finder.rebuild()
+    rebuild_s = time.perf_counter() - started
+
+    picks = [ideas[rng.randrange(len(ideas))] for _ in range(min(args.queries, 500))]
+    duplicate = [f'{idea.split(" system for a ")[1]} {idea.split(" system for a ")[0]} app' for idea in picks]
+    return {
+        'specs': args.db_specs,
+        'rebuild_s': round(rebuild_s, 2),
+        'find': measure(lambda query: finder.find(user, query), duplicate),
+        'stats': finder.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--specs', type=int, default=1000000, help="Ideas in the in-memory index")
+    parser.add_argument('--users', type=int, default=100000, help="Owners the ideas are spread over")
+    parser.add_argument('--vocabulary', type=int, default=20000, help="Distinct extra words ideas draw from")
+    parser.add_argument('--queries', type=int, default=2000, help="Lookups per kind")
+    parser.add_argument('--threshold', type=float, default=0.8, help="SPEC_REUSE_MIN_SIMILARITY")
+    parser.add_argument('--max-candidates', type=int, default=2000, help="SPEC_SIMILARITY_MAX_CANDIDATES")
+    parser.add_argument('--brute-rounds', type=int, default=3, help="Lookups timed without the index (0 to skip)")
+    parser.add_argument('--db-specs', type=int, default=0, help="Also time rebuild/find on this many stored blueprints")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    env = harness.app_env(harness.free_port())
+    if args.db_specs:
+        harness.prepare_database(env)
+    harness.setup_django(env)
+
+    rng = random.Random(args.seed)
+    results = {
+        'benchmark': 'similarity',
+        'memory': bench_index(args, rng),
+        'database': bench_database(args, rng) if args.db_specs else None,
+    }
+    harness.emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
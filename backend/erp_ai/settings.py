@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 from dotenv import load_dotenv
 
@@ -52,6 +53,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'specs.telemetry.ServerTimingMiddleware',
+    'specs.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -118,6 +121,17 @@ else:
             }
         }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Take the write lock when a transaction starts and wait for it, instead of
+    # failing with "database is locked" when concurrent requests write
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': int(os.getenv('SQLITE_TIMEOUT', '20')),
+    })
+    # specs_spec_version_idx uses INCLUDE, which is PostgreSQL-only; SQLite
+    # skips that index and looks blueprints up by primary key instead
+    SILENCED_SYSTEM_CHECKS = ['models.W040']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,6 +151,12 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Email login for the API (one indexed lookup on LOWER(email)); username login for the admin
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -163,11 +183,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'specs.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
-        'rest_framework.permissions.AllowAny',  # Changed for public API endpoints
+        'rest_framework.permissions.IsAuthenticated',  # Public endpoints (register, login) opt in with AllowAny
+    ],
+    # orjson-backed drop-ins for JSONRenderer/JSONParser (see specs/fastjson.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'specs.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'specs.fastjson.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -183,6 +213,18 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Response headers the frontend reads (browsers hide anything not listed here)
+CORS_EXPOSE_HEADERS = [
+    'X-AI-Cache',
+    'ETag',
+    'Retry-After',
+    'Location',
+    'Content-Disposition',
+    'Server-Timing',
+    'X-Spec-Reused-From',
+    'X-Spec-Similarity',
+]
+
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
@@ -191,6 +233,144 @@ if not OPENAI_API_KEY:
     print("WARNING: OPENAI_API_KEY not found in environment variables.")
     print("AI features will be disabled. Set OPENAI_API_KEY in your .env file to enable.")
 
+# AI response cache (see specs/cache.py)
+AI_CACHE_ENABLED = os.getenv('AI_CACHE_ENABLED', 'True').lower() == 'true'
+AI_CACHE_LRU_SIZE = int(os.getenv('AI_CACHE_LRU_SIZE', '256'))
+# Seconds an entry is served from process memory at most (bounds staleness after another process clears the cache)
+AI_CACHE_LRU_TTL = float(os.getenv('AI_CACHE_LRU_TTL', '300'))
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', str(7 * 24 * 3600)))
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '10000'))
+# Seconds between evictions after a cache write, per process; 0 leaves it to `manage.py evict_ai_cache`
+AI_CACHE_EVICT_INTERVAL = int(os.getenv('AI_CACHE_EVICT_INTERVAL', '300'))
+
+# Coalescing of identical in-flight AI calls (see specs/singleflight.py)
+AI_SINGLEFLIGHT_ENABLED = os.getenv('AI_SINGLEFLIGHT_ENABLED', 'True').lower() == 'true'
+# local: within one process; database: also across processes via the AIInFlightRequest table
+AI_SINGLEFLIGHT_BACKEND = os.getenv('AI_SINGLEFLIGHT_BACKEND', 'local')
+AI_SINGLEFLIGHT_TIMEOUT = float(os.getenv('AI_SINGLEFLIGHT_TIMEOUT', '120'))
+AI_SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv('AI_SINGLEFLIGHT_POLL_INTERVAL', '0.2'))
+
+# Upstream OpenAI transport (see specs/transport.py)
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv('AI_HTTP_MAX_CONNECTIONS', '20'))
+AI_HTTP_MAX_KEEPALIVE = int(os.getenv('AI_HTTP_MAX_KEEPALIVE', '10'))
+AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('AI_HTTP_KEEPALIVE_EXPIRY', '30'))
+AI_HTTP_CONNECT_TIMEOUT = float(os.getenv('AI_HTTP_CONNECT_TIMEOUT', '5'))
+AI_HTTP_READ_TIMEOUT = float(os.getenv('AI_HTTP_READ_TIMEOUT', '120'))
+AI_HTTP_WRITE_TIMEOUT = float(os.getenv('AI_HTTP_WRITE_TIMEOUT', '30'))
+AI_HTTP_POOL_TIMEOUT = float(os.getenv('AI_HTTP_POOL_TIMEOUT', '10'))
+# Retries of 429/5xx/connection errors: exponential backoff with full jitter, honouring Retry-After
+AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', '3'))
+AI_RETRY_BACKOFF_BASE = float(os.getenv('AI_RETRY_BACKOFF_BASE', '0.5'))
+AI_RETRY_MAX_DELAY = float(os.getenv('AI_RETRY_MAX_DELAY', '20'))
+# Retries allowed per original request (token bucket), and the bucket size
+AI_RETRY_BUDGET_RATIO = float(os.getenv('AI_RETRY_BUDGET_RATIO', '0.2'))
+AI_RETRY_BUDGET_CAPACITY = float(os.getenv('AI_RETRY_BUDGET_CAPACITY', '10'))
+# Fail fast for AI_BREAKER_RESET_TIMEOUT seconds once at least AI_BREAKER_FAILURE_THRESHOLD
+# (0 disables) and AI_BREAKER_FAILURE_RATE of the last AI_BREAKER_WINDOW attempts failed
+AI_BREAKER_FAILURE_THRESHOLD = int(os.getenv('AI_BREAKER_FAILURE_THRESHOLD', '5'))
+AI_BREAKER_FAILURE_RATE = float(os.getenv('AI_BREAKER_FAILURE_RATE', '0.5'))
+AI_BREAKER_WINDOW = int(os.getenv('AI_BREAKER_WINDOW', '20'))
+AI_BREAKER_RESET_TIMEOUT = float(os.getenv('AI_BREAKER_RESET_TIMEOUT', '30'))
+
+# Per-user rate limits for AI endpoints (see specs/ratelimit.py)
+AI_RATE_LIMIT_ENABLED = os.getenv('AI_RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+# database (shared by all processes), cache (Django cache AI_RATE_LIMIT_CACHE) or memory (per process)
+AI_RATE_LIMIT_STORE = os.getenv('AI_RATE_LIMIT_STORE', 'database')
+AI_RATE_LIMIT_CACHE = os.getenv('AI_RATE_LIMIT_CACHE', 'default')
+# Seconds after which a concurrency slot is assumed leaked by a dead process (cache/database stores)
+AI_RATE_LIMIT_SLOT_TTL = int(os.getenv('AI_RATE_LIMIT_SLOT_TTL', '900'))
+# Plans: token bucket per scope ("N/period") and max in-flight AI operations; missing keys are unlimited.
+# Users get the plan of their "plan:<name>" group, "staff" if staff, else AI_RATE_LIMIT_DEFAULT_PLAN.
+AI_RATE_LIMIT_PLANS = json.loads(os.getenv('AI_RATE_LIMIT_PLANS', 'null')) or {
+    'default': {'generate': '30/hour', 'refine': '60/hour', 'code_stubs': '20/hour', 'concurrency': 2},
+    'pro': {'generate': '300/hour', 'refine': '600/hour', 'code_stubs': '200/hour', 'concurrency': 8},
+    'staff': {},
+}
+AI_RATE_LIMIT_DEFAULT_PLAN = os.getenv('AI_RATE_LIMIT_DEFAULT_PLAN', 'default')
+
+# Request timing: Server-Timing header, histograms and GET /metrics (see specs/telemetry.py)
+TELEMETRY_ENABLED = os.getenv('TELEMETRY_ENABLED', 'True').lower() == 'true'
+TELEMETRY_SERVER_TIMING = os.getenv('TELEMETRY_SERVER_TIMING', 'True').lower() == 'true'
+# When set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# JSON encoding for API responses and request bodies (see specs/fastjson.py): orjson or stdlib
+API_JSON_ENGINE = os.getenv('API_JSON_ENGINE', 'orjson')
+
+# Response compression (see specs/compression.py): br if brotli is installed, else gzip
+RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'True').lower() == 'true'
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', '1024'))
+RESPONSE_COMPRESSION_GZIP_LEVEL = int(os.getenv('RESPONSE_COMPRESSION_GZIP_LEVEL', '6'))
+RESPONSE_COMPRESSION_BROTLI_QUALITY = int(os.getenv('RESPONSE_COMPRESSION_BROTLI_QUALITY', '4'))
+
+# Token usage ledger and daily rollups (see specs/usage.py)
+AI_USAGE_ENABLED = os.getenv('AI_USAGE_ENABLED', 'True').lower() == 'true'
+AI_USAGE_FLUSH_INTERVAL = float(os.getenv('AI_USAGE_FLUSH_INTERVAL', '5'))
+AI_USAGE_BATCH_SIZE = int(os.getenv('AI_USAGE_BATCH_SIZE', '200'))
+AI_USAGE_MAX_BUFFER = int(os.getenv('AI_USAGE_MAX_BUFFER', '10000'))
+
+# Background AI jobs (see specs/jobs.py)
+AI_JOB_WORKERS = int(os.getenv('AI_JOB_WORKERS', '4'))
+AI_JOB_RUN_IN_PROCESS = os.getenv('AI_JOB_RUN_IN_PROCESS', 'True').lower() == 'true'
+
+# Multi-module code generation (see specs/codegen.py)
+AI_CODEGEN_CONCURRENCY = int(os.getenv('AI_CODEGEN_CONCURRENCY', '4'))
+AI_CODEGEN_MODULE_TIMEOUT = float(os.getenv('AI_CODEGEN_MODULE_TIMEOUT', '90'))
+# Default engine when a request doesn't pick one: llm, local or hybrid
+AI_CODEGEN_ENGINE = os.getenv('AI_CODEGEN_ENGINE', 'llm')
+
+# Batch generation (POST /api/specs/generate/batch/): ideas generated at once, and per request
+AI_BATCH_CONCURRENCY = int(os.getenv('AI_BATCH_CONCURRENCY', '8'))
+AI_BATCH_MAX_IDEAS = int(os.getenv('AI_BATCH_MAX_IDEAS', '50'))
+
+# Blueprint refinement (see specs/patching.py): patch or full
+AI_REFINE_MODE = os.getenv('AI_REFINE_MODE', 'patch')
+# Retry as a full refine when the model's patch does not apply
+AI_REFINE_PATCH_FALLBACK = os.getenv('AI_REFINE_PATCH_FALLBACK', 'True').lower() == 'true'
+
+# Blueprint history (see specs/revisions.py): full snapshot every N revisions, diffs in between
+SPEC_REVISION_SNAPSHOT_INTERVAL = int(os.getenv('SPEC_REVISION_SNAPSHOT_INTERVAL', '10'))
+
+# NDJSON export/import (see specs/portability.py): rows fetched per query, rows inserted per batch
+SPEC_EXPORT_CHUNK_SIZE = int(os.getenv('SPEC_EXPORT_CHUNK_SIZE', '500'))
+SPEC_IMPORT_BATCH_SIZE = int(os.getenv('SPEC_IMPORT_BATCH_SIZE', '500'))
+
+# Reusing similar blueprints on generate (see specs/similarity.py)
+# Default for requests without "reuse": off, return (the similar blueprint itself) or clone (a copy)
+SPEC_REUSE_MODE = os.getenv('SPEC_REUSE_MODE', 'off')
+# Lowest similarity (Jaccard index of the ideas' terms, 0-1) that counts as a match
+SPEC_REUSE_MIN_SIMILARITY = float(os.getenv('SPEC_REUSE_MIN_SIMILARITY', '0.8'))
+# Per-process idea index: seconds between picking up new blueprints, between full rebuilds,
+# and candidates scored per lookup at most
+SPEC_SIMILARITY_INDEX = os.getenv('SPEC_SIMILARITY_INDEX', 'True').lower() == 'true'
+SPEC_SIMILARITY_REFRESH_INTERVAL = float(os.getenv('SPEC_SIMILARITY_REFRESH_INTERVAL', '5'))
+SPEC_SIMILARITY_REBUILD_INTERVAL = int(os.getenv('SPEC_SIMILARITY_REBUILD_INTERVAL', '3600'))
+SPEC_SIMILARITY_MAX_CANDIDATES = int(os.getenv('SPEC_SIMILARITY_MAX_CANDIDATES', '2000'))
+
+# Cached user lookups for JWT authentication (see specs/authentication.py)
+# memory (per process), cache (Django cache AUTH_USER_CACHE_ALIAS) or off
+AUTH_USER_CACHE = os.getenv('AUTH_USER_CACHE', 'memory')
+AUTH_USER_CACHE_ALIAS = os.getenv('AUTH_USER_CACHE_ALIAS', 'default')
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '1024'))
+# Read-only endpoints take the user id from the signed token without any lookup
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv('AUTH_TRUST_TOKEN_CLAIMS', 'False').lower() == 'true'
+
+# Bulk user provisioning (see accounts/provisioning.py)
+# Processes hashing passwords for a batch (0 = one per CPU, 1 = hash in the calling process)
+PROVISIONING_HASH_WORKERS = int(os.getenv('PROVISIONING_HASH_WORKERS', '0'))
+# Largest batch POST /api/auth/provision/ accepts; use the provision_users command beyond that
+PROVISIONING_MAX_ROWS = int(os.getenv('PROVISIONING_MAX_ROWS', '1000'))
+# Most rows with a password it accepts: each costs a PBKDF2 hash (a few hundred ms of CPU)
+PROVISIONING_MAX_PASSWORDS = int(os.getenv('PROVISIONING_MAX_PASSWORDS', '50'))
+
+# Per-process Bloom filter over blacklisted refresh tokens (see accounts/tokens.py)
+TOKEN_BLACKLIST_FILTER = os.getenv('TOKEN_BLACKLIST_FILTER', 'True').lower() == 'true'
+# Seconds between picking up tokens blacklisted by other processes (0 = before every check)
+TOKEN_BLACKLIST_FILTER_INTERVAL = float(os.getenv('TOKEN_BLACKLIST_FILTER_INTERVAL', '5'))
+TOKEN_BLACKLIST_FILTER_REBUILD = int(os.getenv('TOKEN_BLACKLIST_FILTER_REBUILD', '3600'))
+TOKEN_BLACKLIST_FILTER_CAPACITY = int(os.getenv('TOKEN_BLACKLIST_FILTER_CAPACITY', '100000'))
+
 # Simple JWT Configuration
 from datetime import timedelta
 
@@ -208,4 +388,5 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.tokens.TokenRefreshSerializer',
 }
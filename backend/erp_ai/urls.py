@@ -16,9 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from specs.telemetry import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('specs.urls')),
+    path('api/async/', include('specs.async_urls')),
     path('api/auth/', include('accounts.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
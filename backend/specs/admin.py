@@ -1,14 +1,92 @@
 from django.contrib import admin
-from .models import Spec
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from .models import (
+    Spec, SpecRevision, AIResponseCache, AIInFlightRequest, RateLimitState, Job, AIUsageRecord, AIUsageDaily,
+)
+from . import search
 
 
 @admin.register(Spec)
 class SpecAdmin(admin.ModelAdmin):
-    list_display = ['id', 'concept_preview', 'created_at', 'updated_at']
+    list_display = ['id', 'title', 'concept_preview', 'module_count', 'created_at', 'updated_at']
     list_filter = ['created_at', 'updated_at']
-    search_fields = ['idea', 'spec_json']
+    search_fields = ['title', 'idea']
     readonly_fields = ['id', 'created_at', 'updated_at']
     
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of icontains over every row
+        if not search.query_terms(search_term):
+            return queryset, False
+        return queryset.filter(pk__in=search.matching_ids(search_term)), False
+    
     def concept_preview(self, obj):
         return obj.idea[:50] + '...' if len(obj.idea) > 50 else obj.idea
     concept_preview.short_description = 'Concept Preview'
+
+
+@admin.register(SpecRevision)
+class SpecRevisionAdmin(admin.ModelAdmin):
+    list_display = ['spec', 'number', 'kind', 'source', 'created_at']
+    list_filter = ['kind', 'source', 'created_at']
+    readonly_fields = ['spec', 'number', 'kind', 'snapshot', 'patch', 'source', 'instruction', 'created_at']
+
+
+@admin.register(AIResponseCache)
+class AIResponseCacheAdmin(admin.ModelAdmin):
+    list_display = ['key', 'created_at', 'expires_at']
+    list_filter = ['expires_at']
+    readonly_fields = ['key', 'response', 'created_at']
+
+
+@admin.register(AIInFlightRequest)
+class AIInFlightRequestAdmin(admin.ModelAdmin):
+    list_display = ['key', 'owner', 'created_at', 'expires_at']
+    readonly_fields = ['key', 'owner', 'response', 'created_at', 'expires_at']
+
+
+@admin.register(RateLimitState)
+class RateLimitStateAdmin(admin.ModelAdmin):
+    list_display = ['key', 'tat', 'in_flight', 'updated_at']
+    search_fields = ['key']
+    readonly_fields = ['key', 'updated_at']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'progress', 'user', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status', 'created_at']
+    readonly_fields = ['id', 'created_at', 'started_at', 'finished_at']
+
+
+class CappedCountPaginator(Paginator):
+    """Counts at most CAP + 1 rows, so paging a huge table never runs a full COUNT(*)."""
+    CAP = 10000
+
+    @cached_property
+    def count(self):
+        return self.object_list.values('pk')[:self.CAP + 1].count()
+
+
+@admin.register(AIUsageRecord)
+class AIUsageRecordAdmin(admin.ModelAdmin):
+    list_display = ['id', 'created_at', 'user', 'endpoint', 'model', 'outcome', 'total_tokens', 'latency_ms']
+    # Filters and search would scan the whole ledger; use AIUsageDaily for analysis
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ['user']
+    readonly_fields = [field.name for field in AIUsageRecord._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AIUsageDaily)
+class AIUsageDailyAdmin(admin.ModelAdmin):
+    list_display = ['day', 'user', 'endpoint', 'model', 'calls', 'errors', 'total_tokens']
+    list_filter = ['day', 'endpoint', 'model']
+    raw_id_fields = ['user']
+    date_hierarchy = 'day'
@@ -1,14 +1,22 @@
 """
 AI Service for generating and refining technical blueprints and code implementations.
 
-This module provides two main system prompts:
+This module provides three main system prompts:
 - SYSTEM_SPEC_PROMPT: For generating JSON specifications from business ideas
+- SYSTEM_PATCH_PROMPT: For refining a specification as an RFC 6902 JSON Patch
 - SYSTEM_CODE_PROMPT: For generating Django/DRF implementation code from specifications
 """
 import json
+import time
 import openai
-from typing import Dict, List, Tuple
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
 from django.conf import settings
+from .cache import AIResponseCacheStore, make_cache_key
+from .singleflight import SingleFlight
+from .transport import CircuitOpenError, UpstreamTransport, deadline_after, remaining
+from . import patching, telemetry
+from .usage import ledger as usage_ledger
 
 
 # System prompt for specification generation
@@ -20,6 +28,16 @@ apis define method/path/entity; ui defines Table/Form components pointing to ent
 No prose. Return VALID JSON only."""
 
 
+# System prompt for patch-based specification refinement
+SYSTEM_PATCH_PROMPT = """You are an expert product/solution architect editing an existing JSON spec
+(keys: title, description, modules[], kpis[]; each module: name, purpose, entities[], apis[], ui[]).
+Entity fields use types: string|text|integer|number|boolean|date|datetime|email.
+Return ONLY the changes as an RFC 6902 JSON Patch: {"patch": [{"op": ..., "path": ..., "value": ...}]}.
+Paths are JSON Pointers into the full spec (e.g. /modules/2/entities/0/fields/-).
+Modules not shown in full still exist at their outline paths; do not recreate them.
+No prose. Return VALID JSON only."""
+
+
 # System prompt for Django/DRF code generation
 SYSTEM_CODE_PROMPT = """You are a senior Django/DRF engineer. Given a JSON app spec and a module name, generate PYTHON code strings for:
 - models.py (Django models),
@@ -34,6 +52,10 @@ Follow:
 - Clean imports, PEP8, no comments except section headers."""
 
 
+# Whether the most recent AI call in the current request context was served from cache
+_last_cache_hit: ContextVar[bool] = ContextVar('ai_last_cache_hit', default=False)
+
+
 class AIService:
     """Service class for OpenAI operations with technical blueprint generation."""
     
@@ -45,11 +67,196 @@ class AIService:
             self.api_key = None
         
         self.client = None
+        self.async_client = None
+        self.transport = UpstreamTransport()
         if self.api_key:
-            self.client = openai.OpenAI(api_key=self.api_key)
+            self.client = openai.OpenAI(api_key=self.api_key, **self.transport.client_options())
+            self.async_client = openai.AsyncOpenAI(api_key=self.api_key, **self.transport.async_client_options())
         self.model = "gpt-4o-mini"  # Use gpt-4-turbo for production
         self.temperature = 0.2
         self.max_tokens = 4000
+        self.cache = AIResponseCacheStore()
+        self.singleflight = SingleFlight()
+    
+    def _blueprint_prompt(self, concept: str) -> str:
+        return f"Generate a technical specification for: {concept}"
+    
+    def _refine_prompt(self, current_blueprint: Dict, instruction: str) -> str:
+        return f"""
+        Current Specification:
+        {json.dumps(current_blueprint, indent=2)}
+        
+        Refinement Instruction:
+        {instruction}
+        
+        Return the refined specification maintaining the exact same JSON schema with keys: title, description, modules[], kpis[].
+        """
+    
+    def _patch_prompt(self, current_blueprint: Dict, instruction: str) -> str:
+        return f"""
+        {patching.patch_context(current_blueprint, instruction)}
+        
+        Refinement Instruction:
+        {instruction}
+        
+        Return a JSON Patch that applies this instruction to the specification.
+        """
+    
+    def _implementation_prompt(self, blueprint: Dict, module_name: str) -> str:
+        return f"""
+        Generate Django REST Framework implementation for module '{module_name}' from this specification:
+        
+        Specification:
+        {json.dumps(blueprint, indent=2)}
+        
+        Map entity field types to Django fields:
+        - string -> CharField(max_length=255)
+        - text -> TextField()
+        - integer -> IntegerField()
+        - number -> DecimalField(max_digits=10, decimal_places=2)
+        - boolean -> BooleanField()
+        - date -> DateField()
+        - datetime -> DateTimeField()
+        - email -> EmailField()
+        
+        Return JSON with four keys: models_py, serializers_py, views_py, urls_py
+        Each value should contain the complete Python code as a string.
+        """
+    
+    def _completion_kwargs(self, system_prompt: str, user_prompt: str, timeout: Optional[float] = None) -> Dict:
+        kwargs = dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            response_format={"type": "json_object"}
+        )
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        return kwargs
+    
+    def _complete_json(self, system_prompt: str, user_prompt: str, timeout: Optional[float] = None) -> Dict:
+        """
+        Run a JSON-mode chat completion, serving repeated prompts from the response cache.
+        
+        Concurrent misses for the same prompt are coalesced: one caller makes the
+        request and the others receive its response (see singleflight).
+        
+        Args:
+            system_prompt: System message for the model
+            user_prompt: User message for the model
+            timeout: Optional limit in seconds on the upstream call, retries included
+            
+        Returns:
+            Dict: Parsed JSON content of the completion
+        """
+        cache_key = make_cache_key(self.model, self.temperature, system_prompt, user_prompt)
+        started = time.perf_counter()
+        with telemetry.phase('cache'):
+            cached = self.cache.get(cache_key)
+        if cached is not None:
+            _last_cache_hit.set(True)
+            telemetry.observe_ai_call(self.model, 'cache_hit', time.perf_counter() - started)
+            return self._parse(cached)
+        _last_cache_hit.set(False)
+        
+        if not self.client:
+            raise Exception("OpenAI client not initialized - API key not configured")
+        
+        def call_upstream() -> str:
+            deadline = deadline_after(timeout)
+            started, response, sent, ok = time.perf_counter(), None, True, False
+            try:
+                response = self.transport.call(lambda: self.client.chat.completions.create(
+                    **self._completion_kwargs(system_prompt, user_prompt, remaining(deadline))
+                ), deadline)
+                content = response.choices[0].message.content
+                json.loads(content)
+                ok = True
+            except json.JSONDecodeError:
+                raise ValueError("Invalid JSON response from AI service")
+            except openai.APITimeoutError:
+                raise TimeoutError("AI service request timed out")
+            except CircuitOpenError:
+                sent = False
+                raise
+            except Exception as e:
+                raise Exception(f"AI service error: {str(e)}")
+            finally:
+                if sent:
+                    self._record_usage(getattr(response, 'usage', None), started, system_prompt, user_prompt, ok)
+            self.cache.set(cache_key, content)
+            return content
+        
+        # Identical prompts already in flight share one upstream call
+        with telemetry.ai_call(self.model):
+            content = self.singleflight.do(cache_key, call_upstream)
+        return self._parse(content)
+    
+    async def _acomplete_json(self, system_prompt: str, user_prompt: str, timeout: Optional[float] = None) -> Dict:
+        """Async counterpart of _complete_json built on the AsyncOpenAI client."""
+        cache_key = make_cache_key(self.model, self.temperature, system_prompt, user_prompt)
+        started = time.perf_counter()
+        with telemetry.phase('cache'):
+            cached = await self.cache.aget(cache_key)
+        if cached is not None:
+            _last_cache_hit.set(True)
+            telemetry.observe_ai_call(self.model, 'cache_hit', time.perf_counter() - started)
+            return self._parse(cached)
+        _last_cache_hit.set(False)
+        
+        if not self.async_client:
+            raise Exception("OpenAI client not initialized - API key not configured")
+        
+        async def call_upstream() -> str:
+            deadline = deadline_after(timeout)
+            started, response, sent, ok = time.perf_counter(), None, True, False
+            try:
+                response = await self.transport.acall(lambda: self.async_client.chat.completions.create(
+                    **self._completion_kwargs(system_prompt, user_prompt, remaining(deadline))
+                ), deadline)
+                content = response.choices[0].message.content
+                json.loads(content)
+                ok = True
+            except json.JSONDecodeError:
+                raise ValueError("Invalid JSON response from AI service")
+            except openai.APITimeoutError:
+                raise TimeoutError("AI service request timed out")
+            except CircuitOpenError:
+                sent = False
+                raise
+            except Exception as e:
+                raise Exception(f"AI service error: {str(e)}")
+            finally:
+                if sent:
+                    self._record_usage(getattr(response, 'usage', None), started, system_prompt, user_prompt, ok)
+            await self.cache.aset(cache_key, content)
+            return content
+        
+        with telemetry.ai_call(self.model):
+            content = await self.singleflight.ado(cache_key, call_upstream)
+        return self._parse(content)
+    
+    def _record_usage(self, usage, started: float, system_prompt: str, user_prompt: str, ok: bool) -> None:
+        """Add an upstream call to the usage ledger (buffered, no database access here)."""
+        usage_ledger.record(
+            self.model,
+            usage,
+            time.perf_counter() - started,
+            prompt_chars=len(system_prompt) + len(user_prompt),
+            outcome='ok' if ok else 'error',
+        )
+    
+    def _parse(self, content: str) -> Dict:
+        with telemetry.phase('parse'):
+            return json.loads(content)
+    
+    def last_cache_hit(self) -> bool:
+        """Return True if the last AI call in this request context was a cache hit."""
+        return _last_cache_hit.get()
     
     def generate_blueprint(self, concept: str) -> Dict:
         """
@@ -61,30 +268,71 @@ class AIService:
         Returns:
             Dict: Technical specification with structured schema
         """
-        user_prompt = f"Generate a technical specification for: {concept}"
+        return self._complete_json(SYSTEM_SPEC_PROMPT, self._blueprint_prompt(concept))
+    
+    def stream_blueprint(self, concept: str) -> Iterator[str]:
+        """
+        Stream the raw JSON text of a new specification as the model produces it.
+        
+        Args:
+            concept: The business idea or requirement description
+            
+        Yields:
+            str: Successive chunks of the JSON document (a single chunk on a cache hit)
+        """
+        user_prompt = self._blueprint_prompt(concept)
+        
+        cache_key = make_cache_key(self.model, self.temperature, SYSTEM_SPEC_PROMPT, user_prompt)
+        started = time.perf_counter()
+        with telemetry.phase('cache'):
+            cached = self.cache.get(cache_key)
+        if cached is not None:
+            _last_cache_hit.set(True)
+            telemetry.observe_ai_call(self.model, 'cache_hit', time.perf_counter() - started)
+            yield cached
+            return
+        _last_cache_hit.set(False)
         
         if not self.client:
             raise Exception("OpenAI client not initialized - API key not configured")
         
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_SPEC_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                response_format={"type": "json_object"}
-            )
-            
-            blueprint_json = response.choices[0].message.content
-            return json.loads(blueprint_json)
-            
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON response from AI service")
-        except Exception as e:
-            raise Exception(f"AI service error: {str(e)}")
+        parts = []
+        started, usage, sent, ok = time.perf_counter(), None, True, False
+        # Timed until the last chunk, so it includes the client reading the stream
+        with telemetry.ai_call(self.model):
+            try:
+                try:
+                    # Only opening the stream is retried; a stream that breaks midway fails
+                    stream = self.transport.call(lambda: self.client.chat.completions.create(
+                        **self._completion_kwargs(SYSTEM_SPEC_PROMPT, user_prompt),
+                        stream=True,
+                        # The final chunk then carries token counts (and no choices)
+                        stream_options={"include_usage": True}
+                    ))
+                    for chunk in stream:
+                        usage = getattr(chunk, 'usage', None) or usage
+                        if not chunk.choices:
+                            continue
+                        text = chunk.choices[0].delta.content
+                        if text:
+                            parts.append(text)
+                            yield text
+                except CircuitOpenError:
+                    sent = False
+                    raise
+                except Exception as e:
+                    raise Exception(f"AI service error: {str(e)}")
+                
+                content = ''.join(parts)
+                try:
+                    self._parse(content)
+                except json.JSONDecodeError:
+                    raise ValueError("Invalid JSON response from AI service")
+                ok = True
+            finally:
+                if sent:
+                    self._record_usage(usage, started, SYSTEM_SPEC_PROMPT, user_prompt, ok)
+        self.cache.set(cache_key, content)
     
     def refine_blueprint(self, current_blueprint: Dict, instruction: str) -> Dict:
         """
@@ -97,92 +345,64 @@ class AIService:
         Returns:
             Dict: Refined technical specification maintaining schema integrity
         """
-        user_prompt = f"""
-        Current Specification:
-        {json.dumps(current_blueprint, indent=2)}
-        
-        Refinement Instruction:
-        {instruction}
-        
-        Return the refined specification maintaining the exact same JSON schema with keys: title, description, modules[], kpis[].
+        user_prompt = self._refine_prompt(current_blueprint, instruction)
+        return self._complete_json(SYSTEM_SPEC_PROMPT, user_prompt)
+    
+    def patch_blueprint(self, current_blueprint: Dict, instruction: str) -> Dict:
         """
+        Refine a specification by asking for a JSON Patch and applying it locally.
         
-        if not self.client:
-            raise Exception("OpenAI client not initialized - API key not configured")
+        Only the modules the instruction refers to are sent when it can be
+        localized, and the model returns just the changed paths.
         
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_SPEC_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                response_format={"type": "json_object"}
-            )
+        Args:
+            current_blueprint: The existing specification to modify
+            instruction: Specific feedback or modification request
             
-            refined_json = response.choices[0].message.content
-            return json.loads(refined_json)
+        Returns:
+            Dict: Refined technical specification
             
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON response from AI service")
-        except Exception as e:
-            raise Exception(f"AI service error: {str(e)}")
+        Raises:
+            PatchError: If the patch is malformed, does not apply or breaks the schema
+        """
+        response = self._complete_json(SYSTEM_PATCH_PROMPT, self._patch_prompt(current_blueprint, instruction))
+        return patching.apply_refinement(current_blueprint, response)
     
-    def generate_implementation(self, blueprint: Dict, module_name: str) -> Dict[str, str]:
+    def generate_implementation(self, blueprint: Dict, module_name: str, timeout: Optional[float] = None) -> Dict[str, str]:
         """
         Generate Django REST Framework implementation code from a technical specification.
         
         Args:
             blueprint: The technical specification containing modules, entities, and APIs
             module_name: Name for the Django module (e.g., 'products', 'orders')
+            timeout: Optional limit in seconds on the upstream call, retries included
             
         Returns:
             Dict: Code files as strings - models_py, serializers_py, views_py, urls_py
         """
-        user_prompt = f"""
-        Generate Django REST Framework implementation for module '{module_name}' from this specification:
-        
-        Specification:
-        {json.dumps(blueprint, indent=2)}
-        
-        Map entity field types to Django fields:
-        - string -> CharField(max_length=255)
-        - text -> TextField()
-        - integer -> IntegerField()
-        - number -> DecimalField(max_digits=10, decimal_places=2)
-        - boolean -> BooleanField()
-        - date -> DateField()
-        - datetime -> DateTimeField()
-        - email -> EmailField()
-        
-        Return JSON with four keys: models_py, serializers_py, views_py, urls_py
-        Each value should contain the complete Python code as a string.
-        """
-        
-        if not self.client:
-            raise Exception("OpenAI client not initialized - API key not configured")
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_CODE_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                response_format={"type": "json_object"}
-            )
-            
-            implementation_json = response.choices[0].message.content
-            return json.loads(implementation_json)
-            
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON response from AI service")
-        except Exception as e:
-            raise Exception(f"AI service error: {str(e)}")
+        user_prompt = self._implementation_prompt(blueprint, module_name)
+        return self._complete_json(SYSTEM_CODE_PROMPT, user_prompt, timeout)
+    
+    async def agenerate_blueprint(self, concept: str) -> Dict:
+        """Async version of generate_blueprint."""
+        return await self._acomplete_json(SYSTEM_SPEC_PROMPT, self._blueprint_prompt(concept))
+    
+    async def arefine_blueprint(self, current_blueprint: Dict, instruction: str) -> Dict:
+        """Async version of refine_blueprint."""
+        user_prompt = self._refine_prompt(current_blueprint, instruction)
+        return await self._acomplete_json(SYSTEM_SPEC_PROMPT, user_prompt)
+    
+    async def apatch_blueprint(self, current_blueprint: Dict, instruction: str) -> Dict:
+        """Async version of patch_blueprint."""
+        response = await self._acomplete_json(SYSTEM_PATCH_PROMPT, self._patch_prompt(current_blueprint, instruction))
+        return patching.apply_refinement(current_blueprint, response)
+    
+    async def agenerate_implementation(
+        self, blueprint: Dict, module_name: str, timeout: Optional[float] = None
+    ) -> Dict[str, str]:
+        """Async version of generate_implementation."""
+        user_prompt = self._implementation_prompt(blueprint, module_name)
+        return await self._acomplete_json(SYSTEM_CODE_PROMPT, user_prompt, timeout)
     
     def validate_api_key(self) -> bool:
         """Check if OpenAI API key is properly configured."""
@@ -194,4 +414,4 @@ ai_service = AIService()
 
 
 # Export constants and service for external use
-__all__ = ['SYSTEM_SPEC_PROMPT', 'SYSTEM_CODE_PROMPT', 'AIService', 'ai_service']
+__all__ = ['SYSTEM_SPEC_PROMPT', 'SYSTEM_PATCH_PROMPT', 'SYSTEM_CODE_PROMPT', 'AIService', 'ai_service']
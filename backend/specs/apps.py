@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class SpecsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'specs'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_migrate, post_save
+        from .authentication import invalidate_user
+        from .fastjson import check_engine
+        from .models import Spec
+        from .search import ensure_index
+        from .similarity import index_created_spec
+        from .telemetry import install_query_timer
+        post_migrate.connect(ensure_index, sender=self)
+        connection_created.connect(install_query_timer)
+        post_save.connect(invalidate_user, sender=get_user_model(), dispatch_uid='specs.invalidate_user')
+        post_delete.connect(invalidate_user, sender=get_user_model(), dispatch_uid='specs.invalidate_user_delete')
+        post_save.connect(index_created_spec, sender=Spec, dispatch_uid='specs.index_created_spec')
+        check_engine()
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import async_views
+
+# Native async variants of the AI endpoints, mounted under /api/async/
+urlpatterns = [
+    path('specs/generate/', async_views.generate_spec, name='async_generate_spec'),
+    path('specs/generate/batch/', async_views.generate_spec_batch, name='async_generate_spec_batch'),
+    path('specs/refine/<uuid:spec_id>/', async_views.refine_spec, name='async_refine_spec'),
+    path('code-stubs/', async_views.generate_code_stubs, name='async_generate_code_stubs'),
+]
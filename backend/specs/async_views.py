@@ -0,0 +1,287 @@
+"""
+Native async counterparts of the AI endpoints in views.py.
+
+DRF's @api_view does not support coroutine views, so these are plain Django
+async views. They authenticate the Bearer token without blocking, await the
+AsyncOpenAI client and use the async ORM, so a single event-loop worker
+(uvicorn erp_ai.asgi:application) can hold many in-flight LLM calls.
+Request and response bodies match the synchronous endpoints.
+"""
+import functools
+import json
+import math
+
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import status
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .models import Spec
+from .serializers import (
+    SpecSerializer,
+    SpecGenerateSerializer,
+    SpecBatchGenerateSerializer,
+    SpecBatchResultSerializer,
+    SpecRefineSerializer,
+    CodeStubSerializer,
+)
+from .ai_service import ai_service
+from .authentication import aresolve_user
+from .ratelimit import RateLimited, _release_when_done, charged, limiter
+from .transport import CircuitOpenError
+from . import codegen, services, similarity, telemetry
+
+
+_jwt_auth = JWTAuthentication()
+
+
+async def _aauthenticate(request):
+    """Resolve the user for a Bearer token, or None if missing/invalid."""
+    header = _jwt_auth.get_header(request)
+    if header is None:
+        return None
+    raw_token = _jwt_auth.get_raw_token(header)
+    if raw_token is None:
+        return None
+    try:
+        validated_token = _jwt_auth.get_validated_token(raw_token)
+    except (InvalidToken, TokenError):
+        return None
+    return await aresolve_user(validated_token)
+
+
+def _json_body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+def _unauthorized():
+    return JsonResponse(
+        {"detail": "Authentication credentials were not provided."},
+        status=status.HTTP_401_UNAUTHORIZED
+    )
+
+
+def _error(message, code):
+    return JsonResponse({"error": message}, status=code)
+
+
+def _upstream_unavailable(error):
+    response = _error(str(error), status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = str(math.ceil(error.retry_after))
+    return response
+
+
+def _ai_rate_limit(scope, cost=None):
+    """Authenticate, then apply ratelimit's limits (cost(request) tokens); the view receives the user."""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with telemetry.phase('auth'):
+                user = await _aauthenticate(request)
+            if user is None:
+                return _unauthorized()
+            # Lets telemetry (and usage accounting) attribute the work to the user
+            request.user = user
+            tokens = cost(request) if cost else 1
+            try:
+                await limiter.aenter(user, scope, tokens)
+            except RateLimited as e:
+                response = _error(str(e), status.HTTP_429_TOO_MANY_REQUESTS)
+                response['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+                return response
+            try:
+                response = await view(request, user, *args, **kwargs)
+            except BaseException:
+                await limiter.arelease_slot(user)
+                raise
+            if not charged(response):
+                await limiter.arefund(user, scope, tokens)
+            if getattr(response, 'streaming', False):
+                return _release_when_done(response, functools.partial(limiter.release_slot, user))
+            await limiter.arelease_slot(user)
+            return response
+        return wrapper
+    return decorator
+
+
+def _reused(spec, source, score):
+    response = JsonResponse(
+        SpecSerializer(spec).data,
+        status=status.HTTP_200_OK if spec.pk == source.pk else status.HTTP_201_CREATED
+    )
+    response['X-Spec-Reused-From'] = str(source.pk)
+    response['X-Spec-Similarity'] = f'{score:.3f}'
+    return response
+
+
+def _with_cache_status(response, hit=None):
+    if hit is None:
+        hit = ai_service.last_cache_hit()
+    response['X-AI-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+@csrf_exempt
+@require_POST
+@_ai_rate_limit('generate')
+async def generate_spec(request, user):
+    """Async version of views.generate_spec"""
+    serializer = SpecGenerateSerializer(data=_json_body(request))
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    concept = serializer.validated_data['idea']
+    try:
+        reused = await services.areuse_spec(
+            user, concept, serializer.validated_data.get('reuse') or similarity.reuse_mode()
+        )
+    except Exception as e:
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+    if reused is not None:
+        return _reused(*reused)
+
+    if not ai_service.validate_api_key():
+        return _error("OpenAI API key not configured", status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    try:
+        spec = await services.acreate_spec(user, concept)
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
+    except ValueError as e:
+        return _error(f"Invalid response from AI service: {str(e)}", status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except Exception as e:
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return _with_cache_status(
+        JsonResponse(SpecSerializer(spec).data, status=status.HTTP_201_CREATED)
+    )
+
+
+@csrf_exempt
+@require_POST
+@_ai_rate_limit('generate', cost=lambda request: services.batch_cost(_json_body(request)))
+async def generate_spec_batch(request, user):
+    """Async version of views.generate_spec_batch (JSON response only)"""
+    serializer = SpecBatchGenerateSerializer(data=_json_body(request))
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    if not ai_service.validate_api_key():
+        return _error("OpenAI API key not configured", status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    try:
+        results = await services.agenerate_batch(user, serializer.validated_data['ideas'])
+    except Exception as e:
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    counts = services.batch_counts(results)
+    retry_after = services.batch_retry_after(results)
+    if counts['created']:
+        code = status.HTTP_201_CREATED
+    elif retry_after is not None:
+        code = status.HTTP_503_SERVICE_UNAVAILABLE
+    else:
+        code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    response = JsonResponse({"results": SpecBatchResultSerializer(results, many=True).data, **counts}, status=code)
+    if retry_after is not None:
+        response['Retry-After'] = str(retry_after)
+    return _with_cache_status(
+        response,
+        hit=bool(counts['created']) and all(result['cached'] for result in results if result['status'] == services.BATCH_OK)
+    )
+
+
+@csrf_exempt
+@require_POST
+@_ai_rate_limit('refine')
+async def refine_spec(request, user, spec_id):
+    """Async version of views.refine_spec"""
+    try:
+        spec = await Spec.objects.aget(id=spec_id, user=user)
+    except Spec.DoesNotExist:
+        return _error("Blueprint not found", status.HTTP_404_NOT_FOUND)
+
+    serializer = SpecRefineSerializer(data=_json_body(request))
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    if not ai_service.validate_api_key():
+        return _error("OpenAI API key not configured", status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    try:
+        spec = await services.arefine_spec(
+            spec, serializer.validated_data['feedback'], serializer.validated_data.get('mode')
+        )
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
+    except ValueError as e:
+        return _error(f"Invalid response from AI service: {str(e)}", status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except Exception as e:
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return _with_cache_status(JsonResponse(SpecSerializer(spec).data))
+
+
+@csrf_exempt
+@require_POST
+@_ai_rate_limit('code_stubs')
+async def generate_code_stubs(request, user):
+    """Async version of views.generate_code_stubs"""
+    serializer = CodeStubSerializer(data=_json_body(request))
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        spec = await Spec.objects.aget(id=serializer.validated_data['spec_id'], user=user)
+    except Spec.DoesNotExist:
+        return _error("Blueprint not found", status.HTTP_404_NOT_FOUND)
+
+    language = serializer.validated_data['language']
+    framework = serializer.validated_data.get('framework', '')
+    module_names = serializer.validated_data.get('modules')
+    engine = serializer.validated_data.get('engine') or codegen.default_engine()
+    modules, missing = codegen.select_modules(spec.spec_json, module_names)
+    if missing:
+        return JsonResponse(
+            {"modules": [f"Unknown module(s): {', '.join(missing)}"]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if codegen.needs_llm(modules, engine) and not ai_service.validate_api_key():
+        return _error("OpenAI API key not configured", status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    if serializer.validated_data['bundle'] == 'zip':
+        manifest = {
+            "blueprint_id": str(spec.id),
+            "title": spec.spec_json.get('title', ''),
+            "language": language,
+            "framework": framework,
+        }
+        # Each app is sent as soon as its module is ready, as in views.generate_code_stubs
+        response = StreamingHttpResponse(
+            codegen.astream_bundle_zip(
+                codegen.aiter_module_implementations(spec.spec_json, modules, engine=engine), manifest
+            ),
+            content_type='application/zip'
+        )
+        response['Content-Disposition'] = f'attachment; filename="blueprint-{spec.id}.zip"'
+        return response
+
+    try:
+        stubs = await services.agenerate_code_stubs(spec, language, framework, module_names, engine)
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
+    except ValueError as e:
+        return _error(f"Invalid response from AI service: {str(e)}", status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except Exception as e:
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return _with_cache_status(
+        JsonResponse(stubs),
+        hit=all(module['cached'] for module in stubs['modules'])
+    )
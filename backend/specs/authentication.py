@@ -0,0 +1,229 @@
+"""
+DRF authentication classes used by the API.
+
+simplejwt looks the token's user up in the database on every request, which
+for polling clients is most of the queries they cause. JWTAuthentication
+here keeps resolved users in a short-lived cache (AUTH_USER_CACHE):
+- 'memory': per-process LRU of up to AUTH_USER_CACHE_SIZE users
+- 'cache': the Django cache AUTH_USER_CACHE_ALIAS, shared by every process
+  using it
+- 'off': simplejwt's lookup on every request
+
+Entries expire after AUTH_USER_CACHE_TTL seconds and are dropped as soon as
+the user is saved or deleted (post_save/post_delete, so deactivation and
+password changes take effect at once). With the memory store, other
+processes only notice when their entry expires; bulk QuerySet.update()
+calls on users send no signals and wait out the TTL everywhere.
+
+ClaimsJWTAuthentication goes further for read-only endpoints: with
+AUTH_TRUST_TOKEN_CLAIMS on, it trusts the signed token and builds the user
+from its user id claim with no lookup at all. A deactivated user then keeps
+read access until their access token expires.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from . import telemetry
+
+
+STORE_MEMORY = 'memory'
+STORE_CACHE = 'cache'
+STORE_OFF = 'off'
+
+
+class UserCache:
+    """Resolved users by id, for AUTH_USER_CACHE_TTL seconds."""
+
+    def __init__(self):
+        self.store = getattr(settings, 'AUTH_USER_CACHE', STORE_MEMORY)
+        self.ttl = getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+        self.size = getattr(settings, 'AUTH_USER_CACHE_SIZE', 1024)
+        self.enabled = self.store != STORE_OFF and self.ttl > 0
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache = caches[getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default')] if self.store == STORE_CACHE else None
+
+    @staticmethod
+    def _key(user_id) -> str:
+        return f'auth-user:{user_id}'
+
+    def get(self, user_id):
+        """A private copy of the cached user, or None."""
+        if not self.enabled:
+            return None
+        if self.cache is not None:
+            return self.cache.get(self._key(user_id))
+        key = self._key(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # Callers may modify request.user; never hand out the shared instance
+        return copy.copy(entry[0])
+
+    def set(self, user) -> None:
+        if not self.enabled:
+            return
+        user_id = getattr(user, jwt_settings.USER_ID_FIELD)
+        if self.cache is not None:
+            self.cache.set(self._key(user_id), user, timeout=self.ttl)
+            return
+        with self._lock:
+            self._entries[self._key(user_id)] = (copy.copy(user), time.monotonic() + self.ttl)
+            self._entries.move_to_end(self._key(user_id))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id) -> None:
+        if self.cache is not None:
+            self.cache.delete(self._key(user_id))
+            return
+        with self._lock:
+            self._entries.pop(self._key(user_id), None)
+
+    async def aget(self, user_id):
+        if self.enabled and self.cache is not None:
+            return await self.cache.aget(self._key(user_id))
+        return self.get(user_id)
+
+    async def aset(self, user) -> None:
+        if self.enabled and self.cache is not None:
+            await self.cache.aset(self._key(getattr(user, jwt_settings.USER_ID_FIELD)), user, timeout=self.ttl)
+            return
+        self.set(user)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def invalidate_user(sender, instance, **kwargs):
+    """post_save/post_delete receiver: forget a changed or deleted user."""
+    user_cache.invalidate(getattr(instance, jwt_settings.USER_ID_FIELD))
+
+
+def check_user(user, validated_token) -> None:
+    """simplejwt's per-request checks, for users that did not come from its own lookup."""
+    if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed("User is inactive", code="user_inactive")
+    if jwt_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """simplejwt's JWTAuthentication with cached user lookups, timed as the request's auth phase."""
+
+    def authenticate(self, request):
+        with telemetry.phase('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if not user_cache.enabled:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user)
+            return user
+        check_user(user, validated_token)
+        return user
+
+
+def _read_only(*args, **kwargs):
+    raise TypeError("Users built from token claims cannot be saved or deleted")
+
+
+def token_user(validated_token):
+    """
+    A User carrying only the token's user id, built without a query.
+
+    It compares equal to the real user and works in queryset filters
+    (Spec.objects.filter(user=request.user)); every other field has its
+    default, and save()/delete() refuse to run.
+    """
+    try:
+        user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken("Token contained no recognizable user identification")
+    user = get_user_model()(**{jwt_settings.USER_ID_FIELD: user_id})
+    user._state.adding = False
+    user.save = user.delete = _read_only
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    For read-only endpoints that only need the user's id.
+
+    With AUTH_TRUST_TOKEN_CLAIMS on, the user comes from the token alone
+    (see token_user); otherwise this is JWTAuthentication.
+    """
+
+    def get_user(self, validated_token):
+        if getattr(settings, 'AUTH_TRUST_TOKEN_CLAIMS', False):
+            return token_user(validated_token)
+        return super().get_user(validated_token)
+
+
+# For @authentication_classes on read-only views in place of the defaults
+READ_ONLY_AUTHENTICATION_CLASSES = [ClaimsJWTAuthentication, SessionAuthentication]
+
+
+async def aresolve_user(validated_token) -> Optional[object]:
+    """Async counterpart of JWTAuthentication.get_user; None instead of raising."""
+    try:
+        user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        return None
+    user = await user_cache.aget(user_id)
+    if user is None:
+        User = get_user_model()
+        try:
+            user = await User.objects.aget(**{jwt_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            return None
+        if user.is_active:
+            await user_cache.aset(user)
+    try:
+        check_user(user, validated_token)
+    except AuthenticationFailed:
+        return None
+    return user
+
+
+__all__ = [
+    'JWTAuthentication',
+    'ClaimsJWTAuthentication',
+    'READ_ONLY_AUTHENTICATION_CLASSES',
+    'UserCache',
+    'user_cache',
+    'invalidate_user',
+    'check_user',
+    'token_user',
+    'aresolve_user',
+]
@@ -0,0 +1,202 @@
+"""
+Content-addressed cache for AI completions.
+
+Responses are keyed by a SHA-256 hash of (model, temperature, system prompt,
+user prompt) and stored in two tiers:
+- an in-process LRU bounded by AI_CACHE_LRU_SIZE entries, each kept until
+  its row expires or for AI_CACHE_LRU_TTL seconds, whichever is sooner, so
+  another process's clear() is seen within that time
+- the AIResponseCache table, with a TTL of AI_CACHE_TTL seconds and at most
+  AI_CACHE_MAX_ENTRIES rows (oldest rows are evicted first)
+
+Eviction (a DELETE of expired rows and a COUNT over the table) runs at most
+every AI_CACHE_EVICT_INTERVAL seconds per process, after a write, or from
+the evict_ai_cache management command.
+
+Only the raw JSON text is cached, so every hit hands out a fresh object.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(model: str, temperature: float, system_prompt: str, user_prompt: str) -> str:
+    """Build the content address for a completion request."""
+    payload = json.dumps([model, temperature, system_prompt, user_prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()  # key -> (value, time.monotonic() it expires at)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        """Store value for ttl seconds."""
+        if self.max_size <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class AIResponseCacheStore:
+    """Two-tier (memory + database) cache for AI JSON responses."""
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'AI_CACHE_ENABLED', True)
+        self.ttl = getattr(settings, 'AI_CACHE_TTL', 7 * 24 * 3600)
+        self.max_entries = getattr(settings, 'AI_CACHE_MAX_ENTRIES', 10000)
+        self.memory = LRUCache(getattr(settings, 'AI_CACHE_LRU_SIZE', 256))
+        self.memory_ttl = getattr(settings, 'AI_CACHE_LRU_TTL', 300)
+        self.evict_interval = getattr(settings, 'AI_CACHE_EVICT_INTERVAL', 300)
+        self._evicted_at = float('-inf')
+        self._evict_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached JSON text for key, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        from .models import AIResponseCache
+        try:
+            entry = AIResponseCache.objects.filter(key=key, expires_at__gt=timezone.now()).first()
+        except DatabaseError:
+            logger.warning("AI cache lookup failed; treating as a miss", exc_info=True)
+            return None
+
+        if entry is None:
+            return None
+
+        self._remember(key, entry.response, entry.expires_at)
+        return entry.response
+
+    def set(self, key: str, value: str) -> None:
+        """Store JSON text under key in both tiers."""
+        if not self.enabled:
+            return
+
+        self.memory.set(key, value, min(self.ttl, self.memory_ttl))
+
+        from .models import AIResponseCache
+        try:
+            AIResponseCache.objects.update_or_create(
+                key=key,
+                defaults={
+                    'response': value,
+                    'expires_at': timezone.now() + timedelta(seconds=self.ttl),
+                },
+            )
+        except DatabaseError:
+            logger.warning("AI cache write failed", exc_info=True)
+            return
+        self._evict_periodically()
+
+    def _evict_periodically(self) -> None:
+        # One thread per process evicts, at most every evict_interval seconds
+        if self.evict_interval <= 0 or time.monotonic() - self._evicted_at < self.evict_interval:
+            return
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            self._evicted_at = time.monotonic()
+            self.evict()
+        except DatabaseError:
+            logger.warning("AI cache eviction failed", exc_info=True)
+        finally:
+            self._evict_lock.release()
+
+    def _remember(self, key: str, value: str, expires_at) -> None:
+        # Never past the row's own expiry
+        remaining = (expires_at - timezone.now()).total_seconds()
+        self.memory.set(key, value, min(remaining, self.memory_ttl))
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Async version of get() using Django's async ORM."""
+        if not self.enabled:
+            return None
+
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        from .models import AIResponseCache
+        try:
+            entry = await AIResponseCache.objects.filter(key=key, expires_at__gt=timezone.now()).afirst()
+        except DatabaseError:
+            logger.warning("AI cache lookup failed; treating as a miss", exc_info=True)
+            return None
+
+        if entry is None:
+            return None
+
+        self._remember(key, entry.response, entry.expires_at)
+        return entry.response
+
+    async def aset(self, key: str, value: str) -> None:
+        """Async version of set()."""
+        await sync_to_async(self.set)(key, value)
+
+    def evict(self) -> int:
+        """Delete expired rows and trim the table to max_entries. Returns rows removed."""
+        from .models import AIResponseCache
+        removed, _ = AIResponseCache.objects.filter(expires_at__lte=timezone.now()).delete()
+
+        overflow = AIResponseCache.objects.count() - self.max_entries
+        if overflow > 0:
+            stale_keys = list(
+                AIResponseCache.objects.order_by('created_at').values_list('key', flat=True)[:overflow]
+            )
+            deleted, _ = AIResponseCache.objects.filter(key__in=stale_keys).delete()
+            removed += deleted
+        return removed
+
+    def clear(self) -> None:
+        """Drop every cached response from both tiers."""
+        from .models import AIResponseCache
+        self.memory.clear()
+        AIResponseCache.objects.all().delete()
+
+
+__all__ = ['make_cache_key', 'LRUCache', 'AIResponseCacheStore']
@@ -0,0 +1,445 @@
+"""
+Multi-module code generation.
+
+Every module of a blueprint is generated with its own generate_implementation
+call. Calls run concurrently (AI_CODEGEN_CONCURRENCY at a time), each limited
+to AI_CODEGEN_MODULE_TIMEOUT seconds including upstream retries, so wall-clock
+time tracks the slowest module rather than the sum. A failing module is reported
+in its result entry instead of failing the whole bundle.
+
+Each module is rendered by one of three engines:
+- llm: always call the model
+- local: render with the deterministic templates in local_codegen
+- hybrid: templates where they can express the module, the model otherwise
+
+Bundles can be returned as JSON or streamed as a zip with one Django app
+per module.
+"""
+import asyncio
+import contextvars
+import json
+import keyword
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+from .ai_service import ai_service
+from . import local_codegen
+
+
+STATUS_OK = 'ok'
+STATUS_FAILED = 'failed'
+STATUS_TIMEOUT = 'timeout'
+
+ENGINE_LLM = 'llm'
+ENGINE_LOCAL = 'local'
+ENGINE_HYBRID = 'hybrid'
+ENGINES = [ENGINE_LLM, ENGINE_LOCAL, ENGINE_HYBRID]
+
+CODE_FILES = {
+    'models_py': 'models.py',
+    'serializers_py': 'serializers.py',
+    'views_py': 'views.py',
+    'urls_py': 'urls.py',
+}
+
+
+def module_slug(name: str) -> str:
+    """
+    Django app name for a module, e.g. 'Sales Orders' -> 'sales_orders'.
+
+    Module names come from user-editable blueprints, so anything outside
+    [a-z0-9_] is replaced; the result is also a safe zip directory name.
+    """
+    text = re.sub(r'[^a-z0-9]+', '_', str(name).lower()).strip('_') or 'module'
+    if text[0].isdigit():
+        text = f'm_{text}'
+    if keyword.iskeyword(text):
+        text = f'{text}_'
+    return text
+
+
+def module_slugs(modules: List[Dict]) -> List[str]:
+    """
+    module_slug() of each module, with _2, _3... added to repeats so every app name is unique.
+
+    A module without a name is module_<index>, its position in modules.
+    """
+    slugs, seen = [], set()
+    for index, module in enumerate(modules):
+        base = module_slug(module['name']) if module.get('name') else f'module_{index}'
+        slug, suffix = base, 2
+        while slug in seen:
+            slug, suffix = f'{base}_{suffix}', suffix + 1
+        seen.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def select_modules(spec_json: Dict, names: Optional[List[str]] = None) -> Tuple[List[Dict], List[str]]:
+    """
+    Pick the modules to generate.
+
+    Args:
+        spec_json: The blueprint
+        names: Module names or slugs to include; None means every module
+
+    Returns:
+        Tuple of (selected modules, requested names that matched nothing)
+    """
+    modules = spec_json.get('modules') or []
+    if not modules:
+        # Legacy behaviour for module-less blueprints: one app from the whole spec
+        return [{'name': 'api_module'}], []
+    if not names:
+        return modules, []
+
+    wanted = {name: False for name in names}
+    selected = []
+    for module in modules:
+        keys = {module.get('name', ''), module_slug(module.get('name', ''))}
+        matches = [name for name in wanted if name in keys]
+        if matches:
+            selected.append(module)
+            for name in matches:
+                wanted[name] = True
+    return selected, [name for name, found in wanted.items() if not found]
+
+
+def _module_blueprint(spec_json: Dict, module: Dict) -> Dict:
+    """Blueprint scoped to a single module, so each prompt only carries what it needs."""
+    if not spec_json.get('modules'):
+        return spec_json
+    return {
+        'title': spec_json.get('title', ''),
+        'description': spec_json.get('description', ''),
+        'modules': [module],
+        'kpis': spec_json.get('kpis', []),
+    }
+
+
+def _result(
+    module: Dict, slug: str, started: float, status: str, implementation=None, error='', cached=False,
+    engine=ENGINE_LLM
+) -> Dict:
+    return {
+        'module_name': slug,
+        'name': module.get('name') or slug,
+        'status': status,
+        'engine': engine,
+        'implementation': implementation,
+        'error': error,
+        'cached': cached,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def _checked_implementation(implementation) -> Dict[str, str]:
+    """
+    The code files of a model response, so a bad one fails its module rather than the zip.
+
+    Raises:
+        ValueError: if the response is not an object or a code file is not a string
+    """
+    if not isinstance(implementation, dict):
+        raise ValueError(f"expected a JSON object, got {type(implementation).__name__}")
+    files = {}
+    for key in CODE_FILES:
+        value = implementation.get(key)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{key} must be a string, got {type(value).__name__}")
+        files[key] = value or ''
+    return files
+
+
+def default_engine() -> str:
+    return getattr(settings, 'AI_CODEGEN_ENGINE', ENGINE_LLM)
+
+
+def uses_local(module: Dict, engine: str) -> bool:
+    """Whether engine renders module with the templates rather than the model."""
+    return engine == ENGINE_LOCAL or (engine == ENGINE_HYBRID and local_codegen.can_render(module))
+
+
+def needs_llm(modules: List[Dict], engine: str) -> bool:
+    return any(not uses_local(module, engine) for module in modules)
+
+
+def _render_local(module: Dict, slug: str) -> Dict:
+    started = time.perf_counter()
+    try:
+        implementation = local_codegen.render_module(module)
+    except ValueError as e:
+        return _result(module, slug, started, STATUS_FAILED, error=str(e), engine=ENGINE_LOCAL)
+    return _result(module, slug, started, STATUS_OK, implementation, engine=ENGINE_LOCAL)
+
+
+def _generate_module(spec_json: Dict, module: Dict, slug: str, timeout: float, engine: str = ENGINE_LLM) -> Dict:
+    if uses_local(module, engine):
+        return _render_local(module, slug)
+
+    started = time.perf_counter()
+    try:
+        implementation = _checked_implementation(ai_service.generate_implementation(
+            _module_blueprint(spec_json, module),
+            slug,
+            timeout=timeout
+        ))
+        return _result(module, slug, started, STATUS_OK, implementation, cached=ai_service.last_cache_hit())
+    except TimeoutError as e:
+        return _result(module, slug, started, STATUS_TIMEOUT, error=str(e))
+    except ValueError as e:
+        return _result(module, slug, started, STATUS_FAILED, error=f"Invalid response from AI service: {str(e)}")
+    except Exception as e:
+        return _result(module, slug, started, STATUS_FAILED, error=str(e))
+    finally:
+        # Runs in a pool thread; don't leak its database connection
+        connections.close_all()
+
+
+def _limits(concurrency: Optional[int], timeout: Optional[float]) -> Tuple[int, float]:
+    if concurrency is None:
+        concurrency = getattr(settings, 'AI_CODEGEN_CONCURRENCY', 4)
+    if timeout is None:
+        timeout = getattr(settings, 'AI_CODEGEN_MODULE_TIMEOUT', 90.0)
+    return max(1, concurrency), timeout
+
+
+def iter_module_implementations(
+    spec_json: Dict,
+    modules: List[Dict],
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+    engine: Optional[str] = None,
+) -> Iterator[Dict]:
+    """Generate modules concurrently, yielding each result as soon as it finishes."""
+    concurrency, timeout = _limits(concurrency, timeout)
+    engine = engine or default_engine()
+    remote = []
+    for module, slug in zip(modules, module_slugs(modules)):
+        if uses_local(module, engine):
+            yield _render_local(module, slug)
+        else:
+            remote.append((module, slug))
+    if not remote:
+        return
+    pool = ThreadPoolExecutor(max_workers=min(concurrency, len(remote)), thread_name_prefix='codegen')
+    try:
+        # Each module runs in a copy of this context so its AI calls count toward the request
+        futures = [
+            pool.submit(contextvars.copy_context().run, _generate_module, spec_json, module, slug, timeout)
+            for module, slug in remote
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # If the consumer stops early (client disconnect), drop modules not yet
+        # started instead of blocking until every one has been generated
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_modules(
+    spec_json: Dict,
+    modules: List[Dict],
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+    engine: Optional[str] = None,
+) -> List[Dict]:
+    """Generate modules concurrently and return results in blueprint order."""
+    concurrency, timeout = _limits(concurrency, timeout)
+    engine = engine or default_engine()
+    slugs = module_slugs(modules)
+    if not needs_llm(modules, engine):
+        return [_render_local(module, slug) for module, slug in zip(modules, slugs)]
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(modules)), thread_name_prefix='codegen') as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _generate_module, spec_json, module, slug, timeout, engine)
+            for module, slug in zip(modules, slugs)
+        ]
+        return [future.result() for future in futures]
+
+
+async def agenerate_modules(
+    spec_json: Dict,
+    modules: List[Dict],
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+    engine: Optional[str] = None,
+) -> List[Dict]:
+    """Async version of generate_modules."""
+    concurrency, timeout = _limits(concurrency, timeout)
+    engine = engine or default_engine()
+    semaphore = asyncio.Semaphore(concurrency)
+    return list(await asyncio.gather(*(
+        _agenerate_module(spec_json, module, slug, timeout, engine, semaphore)
+        for module, slug in zip(modules, module_slugs(modules))
+    )))
+
+
+async def aiter_module_implementations(
+    spec_json: Dict,
+    modules: List[Dict],
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+    engine: Optional[str] = None,
+) -> AsyncIterator[Dict]:
+    """Async version of iter_module_implementations."""
+    concurrency, timeout = _limits(concurrency, timeout)
+    engine = engine or default_engine()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [
+        asyncio.ensure_future(_agenerate_module(spec_json, module, slug, timeout, engine, semaphore))
+        for module, slug in zip(modules, module_slugs(modules))
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The consumer stopped early (client disconnect): don't keep generating
+        for task in tasks:
+            task.cancel()
+
+
+async def _agenerate_module(
+    spec_json: Dict, module: Dict, slug: str, timeout: float, engine: str, semaphore: asyncio.Semaphore
+) -> Dict:
+    if uses_local(module, engine):
+        return _render_local(module, slug)
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            implementation = _checked_implementation(await asyncio.wait_for(
+                ai_service.agenerate_implementation(
+                    _module_blueprint(spec_json, module),
+                    slug,
+                    timeout=timeout
+                ),
+                timeout
+            ))
+            return _result(module, slug, started, STATUS_OK, implementation, cached=ai_service.last_cache_hit())
+        except (TimeoutError, asyncio.TimeoutError) as e:
+            return _result(module, slug, started, STATUS_TIMEOUT, error=str(e) or "AI service request timed out")
+        except ValueError as e:
+            return _result(module, slug, started, STATUS_FAILED, error=f"Invalid response from AI service: {str(e)}")
+        except Exception as e:
+            return _result(module, slug, started, STATUS_FAILED, error=str(e))
+
+
+def bundle_payload(spec_id, language: str, framework: str, results: List[Dict]) -> Dict:
+    """
+    Code-stubs response body.
+
+    module_name/implementation mirror the first successfully generated module,
+    matching the original single-module response; `modules` holds every result.
+    """
+    first_ok = next((result for result in results if result['status'] == STATUS_OK), None)
+    return {
+        "blueprint_id": str(spec_id),
+        "module_name": first_ok['module_name'] if first_ok else None,
+        "language": language,
+        "framework": framework,
+        "implementation": first_ok['implementation'] if first_ok else None,
+        "modules": results,
+    }
+
+
+def _apps_py(app_name: str) -> str:
+    class_name = ''.join(part.capitalize() for part in app_name.split('_')) + 'Config'
+    return (
+        "from django.apps import AppConfig\n\n\n"
+        f"class {class_name}(AppConfig):\n"
+        "    default_auto_field = 'django.db.models.BigAutoField'\n"
+        f"    name = '{app_name}'\n"
+    )
+
+
+class _ZipBuffer:
+    """Write-only sink that lets zipfile emit an archive incrementally."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _BundleZip:
+    """A bundle zip built one module result at a time; each step returns the bytes it produced."""
+
+    def __init__(self, manifest: Dict):
+        self.manifest = manifest
+        self.modules = []
+        self.buffer = _ZipBuffer()
+        self.archive = zipfile.ZipFile(self.buffer, mode='w', compression=zipfile.ZIP_DEFLATED)
+
+    def add(self, result: Dict) -> bytes:
+        self.modules.append({key: value for key, value in result.items() if key != 'implementation'})
+        if result['status'] == STATUS_OK:
+            app = result['module_name']
+            self.archive.writestr(f"{app}/__init__.py", "")
+            self.archive.writestr(f"{app}/apps.py", _apps_py(app))
+            for key, filename in CODE_FILES.items():
+                self.archive.writestr(f"{app}/{filename}", result['implementation'].get(key, ''))
+        return self.buffer.drain()
+
+    def close(self) -> bytes:
+        """Write manifest.json and the zip's central directory."""
+        self.archive.writestr('manifest.json', json.dumps({**self.manifest, 'modules': self.modules}, indent=2))
+        self.archive.close()
+        return self.buffer.drain()
+
+
+def stream_bundle_zip(results: Iterator[Dict], manifest: Dict) -> Iterator[bytes]:
+    """
+    Stream a zip with one Django app per generated module.
+
+    Each app directory holds __init__.py, apps.py and the four generated files.
+    manifest.json at the root lists every module with its status and error.
+    """
+    bundle = _BundleZip(manifest)
+    for result in results:
+        yield bundle.add(result)
+    yield bundle.close()
+
+
+async def astream_bundle_zip(results: AsyncIterator[Dict], manifest: Dict) -> AsyncIterator[bytes]:
+    """Async version of stream_bundle_zip."""
+    bundle = _BundleZip(manifest)
+    async for result in results:
+        yield bundle.add(result)
+    yield bundle.close()
+
+
+__all__ = [
+    'STATUS_OK',
+    'STATUS_FAILED',
+    'STATUS_TIMEOUT',
+    'ENGINES',
+    'default_engine',
+    'uses_local',
+    'needs_llm',
+    'module_slug',
+    'module_slugs',
+    'select_modules',
+    'iter_module_implementations',
+    'aiter_module_implementations',
+    'generate_modules',
+    'agenerate_modules',
+    'bundle_payload',
+    'stream_bundle_zip',
+    'astream_bundle_zip',
+]
@@ -0,0 +1,160 @@
+"""
+Negotiated response compression.
+
+CompressionMiddleware compresses response bodies of at least
+RESPONSE_COMPRESSION_MIN_SIZE bytes with the best encoding the client
+accepts: Brotli (br) when the brotli package is installed, else gzip.
+Blueprints and code stubs are repetitive JSON and shrink several times
+over; smaller bodies are sent as they are, since compressing them saves
+less than it costs.
+
+Only text-like content types (COMPRESSIBLE_TYPES) are touched. Streamed
+responses (Server-Sent Events, zip bundles, exports) pass through
+untouched, so events are still flushed as they happen. A compressed
+response's strong ETag becomes weak, as the bytes on the wire differ;
+If-None-Match compares weakly, so 304s still work. Time spent compressing
+shows up as the "compress" phase in Server-Timing.
+
+Responses that carry a secret next to text an attacker can choose are
+exposed to BREACH-style length attacks when compressed. Token responses
+are smaller than the default threshold; raise it, or set
+RESPONSE_COMPRESSION=False, if that changes.
+"""
+import gzip
+from typing import Dict, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import telemetry
+
+try:
+    import brotli
+except ImportError:  # in requirements.txt; gzip only without it
+    brotli = None
+
+
+ENCODING_BROTLI = 'br'
+ENCODING_GZIP = 'gzip'
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/',
+)
+
+
+def available_encodings():
+    """Encodings this process can produce, most preferred first."""
+    return (ENCODING_BROTLI, ENCODING_GZIP) if brotli is not None else (ENCODING_GZIP,)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """{'gzip': 1.0, 'br': 0.5, ...} from an Accept-Encoding header (codings lowercased)."""
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def negotiate(header: str) -> Optional[str]:
+    """The encoding to use for a request's Accept-Encoding, or None for none."""
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        # Ties go to the earlier (preferred) encoding
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == ENCODING_BROTLI:
+        return brotli.compress(body, quality=getattr(settings, 'RESPONSE_COMPRESSION_BROTLI_QUALITY', 4))
+    # mtime=0 keeps the output the same for the same body
+    return gzip.compress(body, compresslevel=getattr(settings, 'RESPONSE_COMPRESSION_GZIP_LEVEL', 6), mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Compress large text responses with br or gzip, as the request accepts.
+
+    Place it after ServerTimingMiddleware (so its time is measured) and
+    before anything else that reads or changes response bodies.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'RESPONSE_COMPRESSION', True)
+        self.min_size = getattr(settings, 'RESPONSE_COMPRESSION_MIN_SIZE', 1024)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if (
+            not self.enabled
+            or getattr(response, 'streaming', False)
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
+            or len(response.content) < self.min_size
+        ):
+            return response
+
+        # The body depends on Accept-Encoding from here on, whatever this client sent
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        with telemetry.phase('compress'):
+            compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+__all__ = [
+    'ENCODING_BROTLI',
+    'ENCODING_GZIP',
+    'COMPRESSIBLE_TYPES',
+    'available_encodings',
+    'parse_accept_encoding',
+    'negotiate',
+    'compress',
+    'CompressionMiddleware',
+]
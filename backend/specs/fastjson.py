@@ -0,0 +1,146 @@
+"""
+Faster JSON rendering and parsing for the API.
+
+FastJSONRenderer and FastJSONParser are drop-in replacements for DRF's
+JSONRenderer and JSONParser (REST_FRAMEWORK's DEFAULT_RENDERER_CLASSES and
+DEFAULT_PARSER_CLASSES). With API_JSON_ENGINE=orjson and orjson installed
+they encode and decode with orjson, several times faster than the standard
+library on large blueprints and code stubs; with API_JSON_ENGINE=stdlib, or
+without orjson, they are DRF's classes unchanged.
+
+The output is byte for byte what JSONRenderer produces (compact separators,
+UTF-8 rather than \\u escapes, U+2028/U+2029 escaped, dates and decimals
+through DRF's encoder). Anything orjson would encode differently or refuses
+is handed to JSONRenderer: non-string keys, integers over 64 bits, deep
+nesting and ?indent= raise or are checked up front, and floats Python
+writes with an exponent (1e+16, 1e-05; orjson writes 1e16, 0.00001) are
+spotted in orjson's output with a translate() and a search, a fraction of
+the encoding time. The one difference left is NaN, which orjson writes as
+null where JSONRenderer fails the response.
+
+The parser returns what JSONParser would: bodies with a run of 19 or more
+digits (orjson reads integers past 64 bits as floats) and anything orjson
+rejects are parsed by JSONParser, so error messages and edge cases (lone
+surrogates, huge integers) are unchanged.
+"""
+import io
+import logging
+import re
+
+from django.conf import settings
+from rest_framework import parsers, renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # in requirements.txt; the standard library is used without it
+    orjson = None
+
+
+logger = logging.getLogger(__name__)
+
+ENGINE_ORJSON = 'orjson'
+ENGINE_STDLIB = 'stdlib'
+
+# Dates, decimals, UUIDs and the rest go through DRF's encoder, as with JSONRenderer;
+# dataclasses are refused like the standard library does
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson else 0
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+_encoder = encoders.JSONEncoder()
+
+# For spotting exponent floats in orjson output: digits, '.' and '-' become 9,
+# what can precede a number (':', ',', '[') becomes a, e stays, the rest is blank
+_NUMBER_SHAPES = bytes(
+    ord('9') if char in b'0123456789.-' else ord('a') if char in b':,[' else ord('e') if char in b'eE' else ord(' ')
+    for char in range(256)
+)
+_EXPONENT = re.compile(rb'a9+e')
+_SMALL_FIXED = b'0.0000'
+
+# For spotting integers too long for orjson in request bodies: digits become 9
+_DIGITS = bytes(ord('9') if char in b'0123456789' else ord(' ') for char in range(256))
+_LONG_INTEGER = b'9' * 19
+
+
+def _floats_differ(rendered: bytes) -> bool:
+    """
+    Whether rendered (orjson output) may hold a float json.dumps writes differently.
+
+    Python switches to exponent notation below 1e-4 and from 1e16; orjson
+    writes those with a bare exponent or in full (0.00001). Strings that
+    merely look like such numbers only cost a fallback.
+    """
+    if _SMALL_FIXED in rendered:
+        return True
+    # The leading a stands in for the start of the output, before a bare number
+    return _EXPONENT.search(b'a' + rendered.translate(_NUMBER_SHAPES)) is not None
+
+
+def engine() -> str:
+    """The JSON engine in use: API_JSON_ENGINE if it is available, else stdlib."""
+    if orjson is not None and getattr(settings, 'API_JSON_ENGINE', ENGINE_ORJSON) == ENGINE_ORJSON:
+        return ENGINE_ORJSON
+    return ENGINE_STDLIB
+
+
+def check_engine() -> None:
+    """Log a warning (once, at startup) if API_JSON_ENGINE asks for orjson and it is not installed."""
+    if orjson is None and getattr(settings, 'API_JSON_ENGINE', ENGINE_ORJSON) == ENGINE_ORJSON:
+        logger.warning("API_JSON_ENGINE=orjson but orjson is not installed; using the standard library json")
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer, encoding with orjson where that gives the same bytes."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            data is None
+            or engine() != ENGINE_ORJSON
+            # orjson writes only compact, UTF-8 output, unindented or indented by 2
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+        except TypeError:
+            # orjson.JSONEncodeError: a type or value orjson does not encode like json.dumps
+            return super().render(data, accepted_media_type, renderer_context)
+        if _floats_differ(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like JSONRenderer, keep the output a strict JavaScript subset
+        if not ret.isascii():
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028').replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+
+class FastJSONParser(parsers.JSONParser):
+    """JSONParser, decoding with orjson when the body is UTF-8 and orjson accepts it."""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if engine() != ENGINE_ORJSON or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if _LONG_INTEGER in body.translate(_DIGITS):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # Let JSONParser give its usual result or error for what orjson rejects
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+__all__ = [
+    'ENGINE_ORJSON',
+    'ENGINE_STDLIB',
+    'engine',
+    'check_engine',
+    'FastJSONRenderer',
+    'FastJSONParser',
+]
@@ -0,0 +1,207 @@
+"""
+Database-backed job queue for long-running AI operations.
+
+Jobs are rows in the Job table. Workers claim the oldest queued job with a
+conditional UPDATE, so any number of threads or processes can drain the same
+queue without an external broker:
+- in the web process, a bounded thread pool (AI_JOB_WORKERS) is woken whenever
+  a job is enqueued (disable with AI_JOB_RUN_IN_PROCESS=False)
+- standalone, `python manage.py run_ai_jobs` polls the queue
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+
+from .models import Job, Spec
+from .serializers import SpecSerializer
+from . import services, telemetry
+
+
+logger = logging.getLogger(__name__)
+
+
+def _run_generate(job: Job) -> dict:
+    spec = services.create_spec(job.user, job.payload['idea'])
+    job.spec = spec
+    return SpecSerializer(spec).data
+
+
+def _run_refine(job: Job) -> dict:
+    spec = Spec.objects.get(id=job.payload['spec_id'], user=job.user)
+    services.refine_spec(spec, job.payload['feedback'], job.payload.get('mode'))
+    return SpecSerializer(spec).data
+
+
+def _run_code_stubs(job: Job) -> dict:
+    spec = Spec.objects.get(id=job.payload['spec_id'], user=job.user)
+    return services.generate_code_stubs(
+        spec,
+        job.payload['language'],
+        job.payload.get('framework', ''),
+        job.payload.get('modules'),
+        job.payload.get('engine')
+    )
+
+
+JOB_HANDLERS = {
+    Job.KIND_GENERATE: _run_generate,
+    Job.KIND_REFINE: _run_refine,
+    Job.KIND_CODE_STUBS: _run_code_stubs,
+}
+
+
+def claim_next_job() -> Optional[Job]:
+    """Atomically move the oldest queued job to running and return it."""
+    while True:
+        job_id = (
+            Job.objects.filter(status=Job.STATUS_QUEUED)
+            .order_by('created_at')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+
+        claimed = Job.objects.filter(id=job_id, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING,
+            progress=10,
+            started_at=timezone.now(),
+        )
+        if claimed:
+            return Job.objects.select_related('user').get(id=job_id)
+        # Another worker won the race; try the next one
+
+
+def run_job(job: Job) -> None:
+    """Execute a claimed job and record its outcome."""
+    handler = JOB_HANDLERS[job.kind]
+    try:
+        with telemetry.track(f'job:{job.kind}', user_id=job.user_id):
+            result = handler(job)
+    except Spec.DoesNotExist:
+        job.status = Job.STATUS_FAILED
+        job.error = "Blueprint not found"
+    except ValueError as e:
+        job.status = Job.STATUS_FAILED
+        job.error = f"Invalid response from AI service: {str(e)}"
+    except Exception as e:
+        logger.exception("Job %s failed", job.id)
+        job.status = Job.STATUS_FAILED
+        job.error = str(e)
+    except BaseException:
+        # SystemExit, KeyboardInterrupt, a cancelled thread: don't leave the job
+        # running until requeue_stale_jobs() notices, and don't retry it either
+        job.status = Job.STATUS_FAILED
+        job.error = "Job interrupted"
+        _finish(job)
+        raise
+    else:
+        job.status = Job.STATUS_SUCCEEDED
+        job.result = result
+    _finish(job)
+
+
+def _finish(job: Job) -> None:
+    job.progress = 100
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'result', 'spec', 'progress', 'finished_at'])
+
+
+def drain_queue() -> int:
+    """Run queued jobs until the queue is empty. Returns the number of jobs run."""
+    count = 0
+    try:
+        while True:
+            close_old_connections()
+            job = claim_next_job()
+            if job is None:
+                return count
+            run_job(job)
+            count += 1
+    finally:
+        connections.close_all()
+
+
+def requeue_stale_jobs(max_age_seconds: int) -> int:
+    """Return jobs stuck in running (e.g. after a worker crash) to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=max_age_seconds)
+    return Job.objects.filter(status=Job.STATUS_RUNNING, started_at__lt=cutoff).update(
+        status=Job.STATUS_QUEUED,
+        progress=0,
+        started_at=None,
+    )
+
+
+class JobRunner:
+    """Bounded in-process worker pool that drains the job table."""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = None
+        self._active = 0
+        self._rerun = False
+        self._lock = threading.Lock()
+
+    def wake(self) -> None:
+        """Make sure a worker will see newly queued jobs."""
+        with self._lock:
+            if self._active >= self.max_workers:
+                # Every worker is busy; the next one to finish drains again
+                self._rerun = True
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='ai-job'
+                )
+            self._active += 1
+            self._executor.submit(self._work)
+
+    def _work(self) -> None:
+        while True:
+            try:
+                drain_queue()
+            except Exception:
+                logger.exception("AI job worker crashed")
+            with self._lock:
+                if not self._rerun:
+                    self._active -= 1
+                    return
+                self._rerun = False
+
+
+job_runner = JobRunner(getattr(settings, 'AI_JOB_WORKERS', 4))
+
+
+def wants_async(request) -> bool:
+    """Async mode is opt-in via ?async=true or a `Prefer: respond-async` header."""
+    if request.query_params.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+
+def enqueue_job(user, kind: str, payload: dict, spec: Optional[Spec] = None) -> Job:
+    """Create a queued job and wake the in-process pool if enabled."""
+    job = Job.objects.create(user=user, kind=kind, payload=payload, spec=spec)
+    if getattr(settings, 'AI_JOB_RUN_IN_PROCESS', True):
+        transaction.on_commit(job_runner.wake)
+    return job
+
+
+__all__ = [
+    'JOB_HANDLERS',
+    'claim_next_job',
+    'run_job',
+    'drain_queue',
+    'requeue_stale_jobs',
+    'JobRunner',
+    'job_runner',
+    'wants_async',
+    'enqueue_job',
+]
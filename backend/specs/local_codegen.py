@@ -0,0 +1,271 @@
+"""
+Deterministic, template-based Django/DRF code generator.
+
+Turns a blueprint module's entities[] and apis[] into models.py,
+serializers.py, views.py and urls.py without calling the model. It follows
+the same rules SYSTEM_CODE_PROMPT gives the LLM (field type mapping,
+DecimalField for numbers, max_length on CharFields, unique where indicated,
+created_at/updated_at timestamps, router.register per viewset).
+
+Constructs the templates cannot express are reported by unsupported_reasons()
+so callers can fall back to the LLM (engine=hybrid).
+"""
+import keyword
+import re
+from typing import Dict, List
+
+
+FIELD_TEMPLATES = {
+    'string': ('CharField', ['max_length=255']),
+    'text': ('TextField', []),
+    'integer': ('IntegerField', []),
+    'number': ('DecimalField', ['max_digits=10', 'decimal_places=2']),
+    'boolean': ('BooleanField', ['default=False']),
+    'date': ('DateField', []),
+    'datetime': ('DateTimeField', []),
+    'email': ('EmailField', ['max_length=254']),
+}
+
+# Optional text-like fields use blank=True only, per Django convention
+TEXT_TYPES = {'string', 'text', 'email'}
+
+RESERVED_FIELDS = {'id', 'created_at', 'updated_at'}
+
+CRUD_METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE'}
+
+# Collection or detail routes, e.g. /items, /api/inventory/items/, /items/{id}, /items/:id/
+PATH_PARAM = re.compile(r'^(?:\{\w+\}|:\w+|<[\w:]+>)$')
+CRUD_PATH = re.compile(r'^/?(?:[\w-]+/)*[\w-]+/?(?:(?:\{\w+\}|:\w+|<[\w:]+>)/?)?$')
+
+
+def _identifier(name: str) -> str:
+    """snake_case Python identifier for a field name."""
+    text = re.sub(r'([a-z0-9])([A-Z])', r'\1_\2', str(name).strip())
+    text = re.sub(r'\W+', '_', text).strip('_').lower() or 'field'
+    if text[0].isdigit():
+        text = f'f_{text}'
+    if keyword.iskeyword(text):
+        text = f'{text}_'
+    return text
+
+
+def _class_name(name: str) -> str:
+    """CamelCase class name for an entity name."""
+    parts = re.split(r'[\W_]+', str(name).strip())
+    text = ''.join(part[:1].upper() + part[1:] for part in parts if part) or 'Entity'
+    if text[0].isdigit():
+        text = f'E{text}'
+    return text
+
+
+def _route(entity: Dict, apis: List[Dict]) -> str:
+    """Router prefix: the literal part of the entity's API path, else a plural of its name."""
+    for api in apis:
+        if api.get('entity') == entity.get('name') and isinstance(api.get('path'), str):
+            segments = [seg for seg in api['path'].strip('/').split('/') if seg]
+            if segments and segments[0] == 'api':
+                segments = segments[1:]
+            if segments and PATH_PARAM.match(segments[-1]):
+                segments = segments[:-1]
+            if segments:
+                return '/'.join(segments)
+    return _identifier(entity.get('name', 'entity')).replace('_', '-') + 's'
+
+
+def unsupported_reasons(module: Dict) -> List[str]:
+    """Return why the templates cannot render module; an empty list means they can."""
+    reasons = []
+    entities = module.get('entities') or []
+    if not entities:
+        reasons.append("module has no entities")
+    if any(not isinstance(entity, dict) for entity in entities):
+        return reasons + ["entity that is not an object"]
+    entity_names = {entity.get('name') for entity in entities}
+
+    # Names that normalize to the same identifier would silently overwrite each other
+    classes = {'TimeStampedModel': 'the base model'}
+    for entity in entities:
+        if not entity.get('name'):
+            reasons.append("entity without a name")
+            continue
+        class_name = _class_name(entity['name'])
+        if class_name in classes:
+            reasons.append(f"{entity['name']}: class {class_name} clashes with {classes[class_name]}")
+        classes.setdefault(class_name, f"entity '{entity['name']}'")
+        attributes = {}
+        for field in entity.get('fields') or []:
+            if not isinstance(field, dict):
+                reasons.append(f"{entity['name']}: field that is not an object")
+                continue
+            if not field.get('name'):
+                reasons.append(f"{entity['name']}: field without a name")
+                continue
+            field_type = field.get('type')
+            if field_type not in FIELD_TEMPLATES:
+                reasons.append(f"{entity['name']}.{field['name']}: unsupported type '{field_type}'")
+            attribute = _identifier(field['name'])
+            if attribute in attributes and attribute not in RESERVED_FIELDS:
+                reasons.append(
+                    f"{entity['name']}.{field['name']}: attribute {attribute} clashes with field '{attributes[attribute]}'"
+                )
+            attributes.setdefault(attribute, field['name'])
+
+    for api in module.get('apis') or []:
+        if not isinstance(api, dict):
+            reasons.append("API that is not an object")
+            continue
+        method = api.get('method', '')
+        path = api.get('path', '')
+        if not isinstance(method, str) or not isinstance(path, str):
+            reasons.append(f"{method!r} {path!r}: method and path must be strings")
+            continue
+        method = method.upper()
+        if method not in CRUD_METHODS:
+            reasons.append(f"{method} {path}: unsupported method")
+        elif api.get('entity') and api['entity'] not in entity_names:
+            reasons.append(f"{method} {path}: unknown entity '{api['entity']}'")
+        elif not api.get('entity') or not CRUD_PATH.match(path):
+            reasons.append(f"{method} {path}: custom action")
+    return reasons
+
+
+def can_render(module: Dict) -> bool:
+    return not unsupported_reasons(module)
+
+
+def _field_line(field: Dict) -> str:
+    django_field, args = FIELD_TEMPLATES[field['type']]
+    args = list(args)
+    if field.get('unique'):
+        args.append('unique=True')
+    if not field.get('required', False) and field['type'] != 'boolean':
+        args.append('blank=True')
+        # Blank strings would collide on a unique index, so unique text fields are nullable
+        if field['type'] not in TEXT_TYPES or field.get('unique'):
+            args.append('null=True')
+    return f"    {_identifier(field['name'])} = models.{django_field}({', '.join(args)})"
+
+
+def render_models(module: Dict) -> str:
+    lines = [
+        "from django.db import models",
+        "",
+        "",
+        "class TimeStampedModel(models.Model):",
+        "    created_at = models.DateTimeField(auto_now_add=True)",
+        "    updated_at = models.DateTimeField(auto_now=True)",
+        "",
+        "    class Meta:",
+        "        abstract = True",
+    ]
+    for entity in module['entities']:
+        fields = [
+            field for field in entity.get('fields') or []
+            if _identifier(field.get('name', '')) not in RESERVED_FIELDS
+        ]
+        lines += ["", "", f"class {_class_name(entity['name'])}(TimeStampedModel):"]
+        lines += [_field_line(field) for field in fields]
+        if fields:
+            lines += [""]
+        lines += [
+            "    class Meta:",
+            "        ordering = ['-created_at']",
+            "",
+            "    def __str__(self):",
+        ]
+        display = next(
+            (_identifier(field['name']) for field in fields if field['type'] in ('string', 'email')),
+            None
+        )
+        lines.append(f"        return str(self.{display})" if display else "        return f\"{self.__class__.__name__} {self.pk}\"")
+    return "\n".join(lines) + "\n"
+
+
+def render_serializers(module: Dict) -> str:
+    names = [_class_name(entity['name']) for entity in module['entities']]
+    lines = [
+        "from rest_framework import serializers",
+        "",
+        f"from .models import {', '.join(names)}",
+    ]
+    for name in names:
+        lines += [
+            "",
+            "",
+            f"class {name}Serializer(serializers.ModelSerializer):",
+            "    class Meta:",
+            f"        model = {name}",
+            "        fields = '__all__'",
+            "        read_only_fields = ['id', 'created_at', 'updated_at']",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def render_views(module: Dict) -> str:
+    names = [_class_name(entity['name']) for entity in module['entities']]
+    apis = module.get('apis') or []
+    lines = [
+        "from rest_framework import viewsets",
+        "",
+        f"from .models import {', '.join(names)}",
+        f"from .serializers import {', '.join(f'{name}Serializer' for name in names)}",
+    ]
+    for entity, name in zip(module['entities'], names):
+        methods = sorted({
+            str(api.get('method', '')).lower()
+            for api in apis if api.get('entity') == entity['name']
+        })
+        lines += [
+            "",
+            "",
+            f"class {name}ViewSet(viewsets.ModelViewSet):",
+            f"    queryset = {name}.objects.all()",
+            f"    serializer_class = {name}Serializer",
+        ]
+        if methods:
+            allowed = methods + ['head', 'options']
+            lines.append(f"    http_method_names = {allowed!r}")
+    return "\n".join(lines) + "\n"
+
+
+def render_urls(module: Dict) -> str:
+    names = [_class_name(entity['name']) for entity in module['entities']]
+    apis = module.get('apis') or []
+    lines = [
+        "from django.urls import include, path",
+        "from rest_framework.routers import DefaultRouter",
+        "",
+        f"from .views import {', '.join(f'{name}ViewSet' for name in names)}",
+        "",
+        "router = DefaultRouter()",
+    ]
+    for entity, name in zip(module['entities'], names):
+        lines.append(f"router.register(r'{_route(entity, apis)}', {name}ViewSet)")
+    lines += [
+        "",
+        "urlpatterns = [",
+        "    path('', include(router.urls)),",
+        "]",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def render_module(module: Dict) -> Dict[str, str]:
+    """
+    Render the four code files for a module.
+
+    Raises:
+        ValueError: if the module uses constructs the templates cannot express
+    """
+    reasons = unsupported_reasons(module)
+    if reasons:
+        raise ValueError("Local generator cannot render module: " + "; ".join(reasons))
+    return {
+        'models_py': render_models(module),
+        'serializers_py': render_serializers(module),
+        'views_py': render_views(module),
+        'urls_py': render_urls(module),
+    }
+
+
+__all__ = ['FIELD_TEMPLATES', 'unsupported_reasons', 'can_render', 'render_module']
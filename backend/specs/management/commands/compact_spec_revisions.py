@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from specs.models import Spec, SpecRevision
+from specs.revisions import compact_revisions, snapshot_interval
+
+
+class Command(BaseCommand):
+    help = "Rebase blueprint revision chains: drop old revisions and re-space snapshots"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep',
+            type=int,
+            default=0,
+            help="Keep only the N most recent revisions of each blueprint (default: keep all)"
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help="Snapshot every N revisions (default: SPEC_REVISION_SNAPSHOT_INTERVAL)"
+        )
+        parser.add_argument(
+            '--spec',
+            action='append',
+            default=[],
+            metavar='SPEC_ID',
+            help="Only compact this blueprint (repeatable)"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Report what would change without writing"
+        )
+
+    def handle(self, *args, **options):
+        if options['keep'] < 0 or options['interval'] < 0:
+            raise CommandError("--keep and --interval must be positive")
+        interval = options['interval'] or snapshot_interval()
+
+        specs = Spec.objects.only('id').order_by('created_at')
+        if options['spec']:
+            specs = specs.filter(id__in=options['spec'])
+
+        totals = {'specs': 0, 'deleted': 0, 'rewritten': 0, 'bytes_before': 0, 'bytes_after': 0}
+        for spec in specs.iterator(chunk_size=200):
+            try:
+                stats = compact_revisions(spec, interval, options['keep'] or None, options['dry_run'])
+            except SpecRevision.DoesNotExist as e:
+                self.stderr.write(f"Skipped {spec.id}: {e}")
+                continue
+            totals['specs'] += 1
+            for key in ('deleted', 'rewritten', 'bytes_before', 'bytes_after'):
+                totals[key] += stats[key]
+
+        prefix = "Would compact" if options['dry_run'] else "Compacted"
+        self.stdout.write(
+            f"{prefix} {totals['specs']} blueprint(s): {totals['deleted']} revision(s) deleted, "
+            f"{totals['rewritten']} rewritten, {totals['bytes_before']} -> {totals['bytes_after']} bytes stored "
+            f"(snapshot every {interval})"
+        )
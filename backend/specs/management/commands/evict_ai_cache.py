@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from specs.ai_service import ai_service
+
+
+class Command(BaseCommand):
+    help = "Delete expired AI response cache rows and trim the table to AI_CACHE_MAX_ENTRIES"
+
+    def handle(self, *args, **options):
+        removed = ai_service.cache.evict()
+        self.stdout.write(f"Removed {removed} cached response(s)")
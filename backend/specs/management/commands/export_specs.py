@@ -0,0 +1,56 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from specs import portability
+
+
+class Command(BaseCommand):
+    help = "Write a user's blueprints as NDJSON (one per line), gzipped for .gz files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help="Username, email or id of the owner")
+        parser.add_argument(
+            '--output',
+            default='-',
+            help="File to write, or - for standard output (default)"
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help="Compress the output (implied by an --output ending in .gz)"
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=0,
+            help="Rows fetched per query (default: SPEC_EXPORT_CHUNK_SIZE)"
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 0:
+            raise CommandError("--chunk-size must be positive")
+        try:
+            user = portability.find_user(options['user'])
+        except get_user_model().DoesNotExist as e:
+            raise CommandError(str(e))
+
+        chunks = portability.export_lines(user, options['chunk_size'] or None)
+        if options['gzip'] or options['output'].endswith('.gz'):
+            chunks = portability.gzip_stream(chunks)
+        try:
+            target = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        except OSError as e:
+            raise CommandError(str(e))
+        written = 0
+        try:
+            for chunk in chunks:
+                target.write(chunk)
+                written += len(chunk)
+        finally:
+            if target is not sys.stdout.buffer:
+                target.close()
+
+        if options['output'] != '-':
+            self.stdout.write(f"Wrote {written} bytes of blueprints for {user.username} to {options['output']}")
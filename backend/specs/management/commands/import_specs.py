@@ -0,0 +1,67 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from specs import portability
+
+
+class Command(BaseCommand):
+    help = "Create blueprints for a user from an NDJSON export (gzipped if the file name ends in .gz)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help="Username, email or id of the new owner")
+        parser.add_argument('file', help="Path to the file, or - for standard input")
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help="The input is gzipped (implied by a file name ending in .gz)"
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=0,
+            help="Rows validated and inserted together (default: SPEC_IMPORT_BATCH_SIZE)"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Validate without creating anything"
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 0:
+            raise CommandError("--batch-size must be positive")
+        try:
+            user = portability.find_user(options['user'])
+        except get_user_model().DoesNotExist as e:
+            raise CommandError(str(e))
+        try:
+            source = sys.stdin.buffer if options['file'] == '-' else open(options['file'], 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        compressed = options['gzip'] or options['file'].endswith('.gz')
+        try:
+            result = portability.import_specs(
+                user,
+                portability.read_rows(source, compressed=compressed),
+                batch_size=options['batch_size'] or None,
+                dry_run=options['dry_run'],
+            )
+        except portability.READ_ERRORS as e:
+            raise CommandError(f"Could not read {options['file']}: {e}")
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+
+        for error in result['error_rows']:
+            self.stderr.write(f"Row {error['row']}: {'; '.join(error['errors'])}")
+        if result['errors'] > len(result['error_rows']):
+            self.stderr.write(f"... and {result['errors'] - len(result['error_rows'])} more invalid row(s)")
+
+        prefix = "Would create" if options['dry_run'] else "Created"
+        self.stdout.write(
+            f"{prefix} {result['created']} blueprint(s) for {user.username}; "
+            f"{result['skipped']} skipped as already imported, {result['errors']} invalid"
+        )
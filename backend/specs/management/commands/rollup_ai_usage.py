@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from specs.models import AIUsageRecord
+from specs.usage import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily AI usage rollup from the ledger, and optionally prune old ledger rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help="Rebuild the rollup for the last N days, today included (default: 7)"
+        )
+        parser.add_argument(
+            '--prune-ledger',
+            type=int,
+            default=0,
+            metavar='DAYS',
+            help="Delete ledger rows older than DAYS days; the rollup keeps their totals (default: keep all)"
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['prune_ledger'] < 0:
+            raise CommandError("--days and --prune-ledger must be positive")
+        if options['prune_ledger'] and options['prune_ledger'] < options['days']:
+            raise CommandError("--prune-ledger must not be shorter than --days, or the rebuild would lose usage")
+
+        now = timezone.now()
+        if options['days']:
+            rows = rebuild_rollup(now - timedelta(days=options['days'] - 1))
+            self.stdout.write(f"Rebuilt {rows} rollup row(s) for the last {options['days']} day(s)")
+
+        if options['prune_ledger']:
+            cutoff = now - timedelta(days=options['prune_ledger'])
+            deleted = 0
+            # In chunks, so pruning millions of rows does not hold one long write lock
+            while True:
+                ids = list(AIUsageRecord.objects.filter(created_at__lt=cutoff).order_by('id').values_list('id', flat=True)[:5000])
+                if not ids:
+                    break
+                deleted += AIUsageRecord.objects.filter(id__in=ids).delete()[0]
+            self.stdout.write(f"Deleted {deleted} ledger row(s) older than {options['prune_ledger']} day(s)")
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from specs.jobs import drain_queue, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued AI jobs (generate, refine, code stubs) from the database queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Drain the queue once and exit instead of polling"
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help="Seconds to sleep between polls when the queue is empty"
+        )
+        parser.add_argument(
+            '--requeue-stale',
+            type=int,
+            default=0,
+            metavar='SECONDS',
+            help="On startup, requeue jobs that have been running longer than this"
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue_stale']:
+            requeued = requeue_stale_jobs(options['requeue_stale'])
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+        while True:
+            processed = drain_queue()
+            if processed:
+                self.stdout.write(f"Processed {processed} job(s)")
+            if options['once']:
+                return
+            time.sleep(options['interval'])
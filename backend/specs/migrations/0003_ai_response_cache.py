@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('specs', '0002_spec_user_spec_specs_spec_user_id_2ed2e1_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIResponseCache',
+            fields=[
+                ('key', models.CharField(help_text='SHA-256 of model, temperature and prompts', max_length=64, primary_key=True, serialize=False)),
+                ('response', models.TextField(help_text='Raw JSON content returned by the model')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
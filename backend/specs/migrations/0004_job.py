@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:48
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('specs', '0003_ai_response_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('generate', 'Generate blueprint'), ('refine', 'Refine blueprint'), ('code_stubs', 'Generate code stubs')], max_length=20)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('progress', models.PositiveSmallIntegerField(default=0, help_text='Completion percentage (0-100)')),
+                ('payload', models.JSONField(default=dict, help_text='Validated request data for the operation')),
+                ('result', models.JSONField(blank=True, help_text='Response body of the finished operation', null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('spec', models.ForeignKey(blank=True, help_text='Blueprint created or used by this job', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='specs.spec')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spec_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='specs_job_status_72efef_idx')],
+            },
+        ),
+    ]
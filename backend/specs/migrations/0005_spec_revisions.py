@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def snapshot_existing_specs(apps, schema_editor):
+    """Give every existing blueprint a revision 1 snapshot of its current content."""
+    Spec = apps.get_model('specs', 'Spec')
+    SpecRevision = apps.get_model('specs', 'SpecRevision')
+    batch = []
+    for spec in Spec.objects.only('id', 'spec_json').iterator(chunk_size=500):
+        batch.append(SpecRevision(
+            spec_id=spec.id,
+            number=1,
+            kind='snapshot',
+            snapshot=spec.spec_json,
+            source='generate',
+        ))
+        if len(batch) >= 500:
+            SpecRevision.objects.bulk_create(batch)
+            batch = []
+    SpecRevision.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('specs', '0004_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='spec',
+            name='revision',
+            field=models.PositiveIntegerField(default=1, help_text='Number of the SpecRevision spec_json holds'),
+        ),
+        migrations.CreateModel(
+            name='SpecRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(help_text='1 for the generated blueprint, +1 per change')),
+                ('kind', models.CharField(choices=[('snapshot', 'Snapshot'), ('diff', 'Diff')], max_length=10)),
+                ('snapshot', models.JSONField(blank=True, help_text='Full blueprint (snapshot revisions)', null=True)),
+                ('patch', models.JSONField(blank=True, help_text='JSON Patch from the previous revision (diff revisions)', null=True)),
+                ('source', models.CharField(choices=[('generate', 'Generated'), ('refine', 'Refined'), ('rollback', 'Rolled back')], max_length=10)),
+                ('instruction', models.TextField(blank=True, default='', help_text='Refinement feedback that produced this revision')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('spec', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='specs.spec')),
+            ],
+            options={
+                'ordering': ['-number'],
+                'constraints': [models.UniqueConstraint(fields=('spec', 'number'), name='specs_revision_spec_number_uniq')],
+            },
+        ),
+        migrations.RunPython(snapshot_existing_specs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:08
+
+from django.db import migrations, models
+
+
+def fill_summaries(apps, schema_editor):
+    """Derive title and module_count for existing blueprints."""
+    Spec = apps.get_model('specs', 'Spec')
+    batch = []
+    for spec in Spec.objects.only('id', 'spec_json').iterator(chunk_size=500):
+        blueprint = spec.spec_json if isinstance(spec.spec_json, dict) else {}
+        modules = blueprint.get('modules')
+        spec.title = str(blueprint.get('title') or '')[:255]
+        spec.module_count = len(modules) if isinstance(modules, list) else 0
+        batch.append(spec)
+        if len(batch) >= 500:
+            Spec.objects.bulk_update(batch, ['title', 'module_count'])
+            batch = []
+    Spec.objects.bulk_update(batch, ['title', 'module_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('specs', '0005_spec_revisions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='spec',
+            name='module_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of modules in spec_json, kept for listings'),
+        ),
+        migrations.AddField(
+            model_name='spec',
+            name='title',
+            field=models.CharField(blank=True, default='', help_text='spec_json title, kept for listings', max_length=255),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:10
+
+from django.db import migrations, models
+
+
+def fill_search_text(apps, schema_editor):
+    """Derive search_text for existing blueprints (mirrors models.blueprint_search_text)."""
+    Spec = apps.get_model('specs', 'Spec')
+    batch = []
+    for spec in Spec.objects.only('id', 'spec_json').iterator(chunk_size=500):
+        blueprint = spec.spec_json if isinstance(spec.spec_json, dict) else {}
+        modules = blueprint.get('modules')
+        lines = []
+        for module in modules if isinstance(modules, list) else []:
+            if not isinstance(module, dict):
+                continue
+            words = [str(module.get('name') or '')]
+            for entity in module.get('entities') or []:
+                if isinstance(entity, dict):
+                    words.append(str(entity.get('name') or ''))
+                    words.extend(
+                        str(field.get('name') or '') for field in entity.get('fields') or [] if isinstance(field, dict)
+                    )
+            lines.append(' '.join(word for word in words if word))
+        spec.search_text = '\n'.join(lines)
+        batch.append(spec)
+        if len(batch) >= 500:
+            Spec.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    Spec.objects.bulk_update(batch, ['search_text'])
+
+
+def create_search_index(apps, schema_editor):
+    from specs.search import install_index
+    install_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from specs.search import drop_index
+    drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('specs', '0006_spec_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='spec',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Module, entity and field names from spec_json, indexed for search'),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
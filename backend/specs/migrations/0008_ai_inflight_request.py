@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('specs', '0007_spec_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIInFlightRequest',
+            fields=[
+                ('key', models.CharField(help_text='Same prompt hash as AIResponseCache', max_length=64, primary_key=True, serialize=False)),
+                ('owner', models.CharField(help_text='Process/thread holding the call', max_length=64)),
+                ('response', models.TextField(blank=True, help_text='Raw JSON content, published by the owner for waiting processes', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
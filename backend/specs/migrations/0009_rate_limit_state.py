@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('specs', '0008_ai_inflight_request'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitState',
+            fields=[
+                ('key', models.CharField(help_text='e.g. ai-rl:generate:<user id>', max_length=100, primary_key=True, serialize=False)),
+                ('tat', models.FloatField(default=0.0, help_text='GCRA theoretical arrival time (Unix seconds)')),
+                ('in_flight', models.PositiveIntegerField(default=0, help_text='Slots held (concurrency counters)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('specs', '0009_rate_limit_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('endpoint', models.CharField(max_length=100)),
+                ('model', models.CharField(max_length=50)),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+                ('prompt_tokens', models.BigIntegerField(default=0)),
+                ('completion_tokens', models.BigIntegerField(default=0)),
+                ('total_tokens', models.BigIntegerField(default=0)),
+                ('latency_ms', models.BigIntegerField(default=0, help_text='Sum of call latencies; divide by calls for the mean')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ai_usage_daily', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'AI usage daily',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['user', '-day'], name='specs_aiusa_user_id_e3b7d2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'user', 'endpoint', 'model'), name='specs_usage_daily_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AIUsageRecord',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('endpoint', models.CharField(help_text='URL pattern or job:<kind> that made the call', max_length=100)),
+                ('model', models.CharField(max_length=50)),
+                ('outcome', models.CharField(choices=[('ok', 'Succeeded'), ('error', 'Failed')], default='ok', max_length=10)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('total_tokens', models.PositiveIntegerField(default=0)),
+                ('prompt_chars', models.PositiveIntegerField(default=0, help_text='Prompt size, a proxy for the blueprint size')),
+                ('latency_ms', models.PositiveIntegerField(default=0, help_text='Upstream time including retries')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, help_text='User the call was made for (empty for anonymous or system work)', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ai_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='specs_aiusa_user_id_a61f56_idx'), models.Index(fields=['created_at'], name='specs_aiusa_created_3be949_idx')],
+            },
+        ),
+    ]
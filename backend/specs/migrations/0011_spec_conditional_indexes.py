@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 06:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('specs', '0010_ai_usage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='spec',
+            index=models.Index(fields=['id'], include=('user', 'updated_at'), name='specs_spec_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='spec',
+            index=models.Index(fields=['user', 'updated_at'], name='specs_spec_user_updated_idx'),
+        ),
+    ]
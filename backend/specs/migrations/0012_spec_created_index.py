@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 06:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('specs', '0011_spec_conditional_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='spec',
+            index=models.Index(fields=['created_at'], name='specs_spec_created_idx'),
+        ),
+    ]
@@ -1,8 +1,25 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
+def blueprint_search_text(blueprint: dict) -> str:
+    """One line per module: its name, then each entity name followed by its field names."""
+    lines = []
+    modules = blueprint.get('modules') if isinstance(blueprint, dict) else None
+    for module in modules if isinstance(modules, list) else []:
+        if not isinstance(module, dict):
+            continue
+        words = [str(module.get('name') or '')]
+        for entity in module.get('entities') or []:
+            if isinstance(entity, dict):
+                words.append(str(entity.get('name') or ''))
+                words.extend(str(field.get('name') or '') for field in entity.get('fields') or [] if isinstance(field, dict))
+        lines.append(' '.join(word for word in words if word))
+    return '\n'.join(lines)
+
+
 class Spec(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(
@@ -15,6 +32,15 @@ class Spec(models.Model):
     )
     idea = models.TextField(help_text="The initial idea or requirement")
     spec_json = models.JSONField(help_text="Generated specification in JSON format")
+    revision = models.PositiveIntegerField(default=1, help_text="Number of the SpecRevision spec_json holds")
+    title = models.CharField(max_length=255, blank=True, default='', help_text="spec_json title, kept for listings")
+    module_count = models.PositiveIntegerField(default=0, help_text="Number of modules in spec_json, kept for listings")
+    search_text = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        help_text="Module, entity and field names from spec_json, indexed for search"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -22,7 +48,255 @@ class Spec(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', '-created_at']),
+            # Covering indexes for conditional GETs (specs/conditional.py). INCLUDE
+            # is PostgreSQL-only; SQLite skips that index and uses the primary key
+            models.Index(fields=['id'], include=['user', 'updated_at'], name='specs_spec_version_idx'),
+            models.Index(fields=['user', 'updated_at'], name='specs_spec_user_updated_idx'),
+            # Picking up new blueprints for the similar-idea index (specs/similarity.py)
+            models.Index(fields=['created_at'], name='specs_spec_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Blueprint {self.id}: {self.idea[:50]}..."
+
+    def refresh_summary(self):
+        """Derive the listing and search fields from spec_json."""
+        blueprint = self.spec_json if isinstance(self.spec_json, dict) else {}
+        self.title = str(blueprint.get('title') or '')[:255]
+        modules = blueprint.get('modules')
+        self.module_count = len(modules) if isinstance(modules, list) else 0
+        self.search_text = blueprint_search_text(blueprint)
+
+    def save(self, *args, **kwargs):
+        # Keep the derived fields in step with spec_json on every write
+        self.refresh_summary()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'spec_json' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'title', 'module_count', 'search_text'}
+        super().save(*args, **kwargs)
+
+
+class SpecRevision(models.Model):
+    """
+    One version of a blueprint.
+
+    Stored as a JSON Patch against the previous revision, with a full snapshot
+    every SPEC_REVISION_SNAPSHOT_INTERVAL revisions so any version can be
+    rebuilt from the nearest snapshot. Spec.spec_json always holds the latest.
+    """
+    KIND_SNAPSHOT = 'snapshot'
+    KIND_DIFF = 'diff'
+    KIND_CHOICES = [
+        (KIND_SNAPSHOT, 'Snapshot'),
+        (KIND_DIFF, 'Diff'),
+    ]
+
+    SOURCE_GENERATE = 'generate'
+    SOURCE_REFINE = 'refine'
+    SOURCE_ROLLBACK = 'rollback'
+    SOURCE_CHOICES = [
+        (SOURCE_GENERATE, 'Generated'),
+        (SOURCE_REFINE, 'Refined'),
+        (SOURCE_ROLLBACK, 'Rolled back'),
+    ]
+
+    spec = models.ForeignKey(Spec, on_delete=models.CASCADE, related_name='revisions')
+    number = models.PositiveIntegerField(help_text="1 for the generated blueprint, +1 per change")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    snapshot = models.JSONField(null=True, blank=True, help_text="Full blueprint (snapshot revisions)")
+    patch = models.JSONField(null=True, blank=True, help_text="JSON Patch from the previous revision (diff revisions)")
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    instruction = models.TextField(blank=True, default='', help_text="Refinement feedback that produced this revision")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-number']
+        constraints = [
+            models.UniqueConstraint(fields=['spec', 'number'], name='specs_revision_spec_number_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Blueprint {self.spec_id} r{self.number} ({self.kind})"
+
+
+class AIResponseCache(models.Model):
+    """Persistent tier of the AI response cache, keyed by a prompt hash."""
+    key = models.CharField(
+        max_length=64,
+        primary_key=True,
+        help_text="SHA-256 of model, temperature and prompts"
+    )
+    response = models.TextField(help_text="Raw JSON content returned by the model")
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"AI cache {self.key[:12]}..."
+
+
+class AIInFlightRequest(models.Model):
+    """Cross-process single-flight lock: one row per AI prompt currently being answered."""
+    key = models.CharField(
+        max_length=64,
+        primary_key=True,
+        help_text="Same prompt hash as AIResponseCache"
+    )
+    owner = models.CharField(max_length=64, help_text="Process/thread holding the call")
+    response = models.TextField(
+        null=True,
+        blank=True,
+        help_text="Raw JSON content, published by the owner for waiting processes"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"AI in-flight {self.key[:12]}..."
+
+
+class RateLimitState(models.Model):
+    """Rate limiter state for the 'database' store: one row per bucket or slot counter."""
+    key = models.CharField(max_length=100, primary_key=True, help_text="e.g. ai-rl:generate:<user id>")
+    tat = models.FloatField(default=0.0, help_text="GCRA theoretical arrival time (Unix seconds)")
+    in_flight = models.PositiveIntegerField(default=0, help_text="Slots held (concurrency counters)")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.key
+
+
+class AIUsageRecord(models.Model):
+    """
+    Append-only ledger: one row per upstream AI call.
+
+    Written in batches by specs.usage; never updated. Reports read
+    AIUsageDaily instead of scanning this table.
+    """
+    OUTCOME_OK = 'ok'
+    OUTCOME_ERROR = 'error'
+    OUTCOME_CHOICES = [
+        (OUTCOME_OK, 'Succeeded'),
+        (OUTCOME_ERROR, 'Failed'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        User,
+        # No constraint or cascade: the ledger is never rewritten, even when a user is deleted
+        on_delete=models.DO_NOTHING,
+        related_name='ai_usage',
+        null=True,
+        blank=True,
+        db_constraint=False,
+        help_text="User the call was made for (empty for anonymous or system work)"
+    )
+    endpoint = models.CharField(max_length=100, help_text="URL pattern or job:<kind> that made the call")
+    model = models.CharField(max_length=50)
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES, default=OUTCOME_OK)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    total_tokens = models.PositiveIntegerField(default=0)
+    prompt_chars = models.PositiveIntegerField(default=0, help_text="Prompt size, a proxy for the blueprint size")
+    latency_ms = models.PositiveIntegerField(default=0, help_text="Upstream time including retries")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.endpoint}: {self.total_tokens} tokens"
+
+
+class AIUsageDaily(models.Model):
+    """Per-day totals of AIUsageRecord by user, endpoint and model, kept current as the ledger is written."""
+    day = models.DateField()
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='ai_usage_daily',
+        null=True,
+        blank=True
+    )
+    endpoint = models.CharField(max_length=100)
+    model = models.CharField(max_length=50)
+    calls = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    completion_tokens = models.BigIntegerField(default=0)
+    total_tokens = models.BigIntegerField(default=0)
+    latency_ms = models.BigIntegerField(default=0, help_text="Sum of call latencies; divide by calls for the mean")
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'user', 'endpoint', 'model'],
+                name='specs_usage_daily_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-day']),
+        ]
+        verbose_name_plural = 'AI usage daily'
+
+    def __str__(self):
+        return f"{self.day} {self.user_id or '-'} {self.endpoint}: {self.total_tokens} tokens"
+
+
+class Job(models.Model):
+    """A queued AI operation run by the background worker pool."""
+    KIND_GENERATE = 'generate'
+    KIND_REFINE = 'refine'
+    KIND_CODE_STUBS = 'code_stubs'
+    KIND_CHOICES = [
+        (KIND_GENERATE, 'Generate blueprint'),
+        (KIND_REFINE, 'Refine blueprint'),
+        (KIND_CODE_STUBS, 'Generate code stubs'),
+    ]
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='spec_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Completion percentage (0-100)")
+    payload = models.JSONField(default=dict, help_text="Validated request data for the operation")
+    spec = models.ForeignKey(
+        Spec,
+        on_delete=models.SET_NULL,
+        related_name='jobs',
+        null=True,
+        blank=True,
+        help_text="Blueprint created or used by this job"
+    )
+    result = models.JSONField(null=True, blank=True, help_text="Response body of the finished operation")
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
         ]
 
     def __str__(self):
-        return f"Blueprint {self.id}: {self.idea[:50]}..."
\ No newline at end of file
+        return f"Job {self.id}: {self.kind} ({self.status})"
@@ -0,0 +1,18 @@
+"""
+Cursor (keyset) pagination for blueprint listings.
+
+Pages are fetched with `created_at < <cursor position>` on the
+(user, -created_at) index instead of OFFSET, so the cost of a page does not
+grow with how many blueprints a user owns or how deep they have paged.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class SpecCursorPagination(CursorPagination):
+    ordering = '-created_at'
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+__all__ = ['SpecCursorPagination']
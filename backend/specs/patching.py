@@ -0,0 +1,269 @@
+"""
+Patch-based blueprint refinement.
+
+Instead of asking the model to re-emit the whole blueprint, refinement in
+patch mode asks for an RFC 6902 JSON Patch and applies it here. When the
+instruction names specific modules (or their entities), only those modules
+are sent, together with a one-line outline of the rest, so prompt size stays
+flat as blueprints grow.
+
+Patches are validated before and after they are applied: unknown ops, bad
+pointers, failed `test` ops or a result that no longer looks like a
+blueprint raise PatchError (a ValueError), and the caller can fall back to
+a full refine.
+"""
+import copy
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+
+REFINE_MODE_FULL = 'full'
+REFINE_MODE_PATCH = 'patch'
+REFINE_MODES = [REFINE_MODE_FULL, REFINE_MODE_PATCH]
+
+PATCH_OPS = {'add', 'remove', 'replace', 'move', 'copy', 'test'}
+
+
+class PatchError(ValueError):
+    """Raised when a JSON Patch is malformed, does not apply, or breaks the blueprint schema."""
+
+
+def _parse_pointer(pointer: str) -> List[str]:
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith('/')):
+        raise PatchError(f"Invalid JSON pointer: {pointer!r}")
+    if pointer == '':
+        return []
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def _array_index(container: List, token: str, allow_end: bool = False) -> int:
+    if allow_end and token == '-':
+        return len(container)
+    if not re.fullmatch(r'0|[1-9][0-9]*', token):
+        raise PatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    limit = len(container) + 1 if allow_end else len(container)
+    if index >= limit:
+        raise PatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _resolve(document: Any, tokens: List[str]) -> Any:
+    target = document
+    for token in tokens:
+        if isinstance(target, dict):
+            if token not in target:
+                raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+            target = target[token]
+        elif isinstance(target, list):
+            target = target[_array_index(target, token)]
+        else:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+    return target
+
+
+def _add(document: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent = _resolve(document, tokens[:-1])
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    elif isinstance(parent, list):
+        parent.insert(_array_index(parent, tokens[-1], allow_end=True), value)
+    else:
+        raise PatchError(f"Cannot add to a scalar at /{'/'.join(tokens[:-1])}")
+    return document
+
+
+def _remove(document: Any, tokens: List[str]) -> Any:
+    if not tokens:
+        raise PatchError("Cannot remove the whole document")
+    parent = _resolve(document, tokens[:-1])
+    if isinstance(parent, dict):
+        if tokens[-1] not in parent:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+        return parent.pop(tokens[-1])
+    if isinstance(parent, list):
+        return parent.pop(_array_index(parent, tokens[-1]))
+    raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+
+
+def apply_patch(document: Any, patch: List[Dict]) -> Any:
+    """
+    Apply an RFC 6902 JSON Patch and return the patched copy.
+
+    The input document is never modified; the patch is applied atomically
+    (any failing operation raises PatchError and nothing is returned).
+    """
+    if not isinstance(patch, list):
+        raise PatchError("Patch must be a list of operations")
+    result = copy.deepcopy(document)
+    for operation in patch:
+        if not isinstance(operation, dict) or operation.get('op') not in PATCH_OPS:
+            raise PatchError(f"Unsupported patch operation: {operation!r}")
+        op = operation['op']
+        tokens = _parse_pointer(operation.get('path'))
+        if op in ('add', 'replace', 'test') and 'value' not in operation:
+            raise PatchError(f"'{op}' operation requires a value")
+
+        if op == 'add':
+            result = _add(result, tokens, copy.deepcopy(operation['value']))
+        elif op == 'remove':
+            _remove(result, tokens)
+        elif op == 'replace':
+            _resolve(result, tokens)
+            if tokens:
+                _remove(result, tokens)
+            result = _add(result, tokens, copy.deepcopy(operation['value']))
+        elif op in ('move', 'copy'):
+            source = _parse_pointer(operation.get('from'))
+            if op == 'move' and tokens[:len(source)] == source and tokens != source:
+                raise PatchError("Cannot move a value into one of its children")
+            value = copy.deepcopy(_resolve(result, source))
+            if op == 'move':
+                _remove(result, source)
+            result = _add(result, tokens, value)
+        elif op == 'test':
+            if _resolve(result, tokens) != operation['value']:
+                raise PatchError(f"Test failed at {operation.get('path')}")
+    return result
+
+
+def _escape(token) -> str:
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def _diff(old: Any, new: Any, path: str, ops: List[Dict]) -> None:
+    if type(old) is type(new) and isinstance(old, dict):
+        # Sorted keys make the patch independent of key order, which JSON columns don't preserve
+        for key in sorted(old):
+            if key not in new:
+                ops.append({'op': 'remove', 'path': f"{path}/{_escape(key)}"})
+        for key in sorted(new):
+            if key not in old:
+                ops.append({'op': 'add', 'path': f"{path}/{_escape(key)}", 'value': new[key]})
+            else:
+                _diff(old[key], new[key], f"{path}/{_escape(key)}", ops)
+    elif type(old) is type(new) and isinstance(old, list):
+        shared = min(len(old), len(new))
+        for index in range(shared):
+            _diff(old[index], new[index], f"{path}/{index}", ops)
+        # Remove from the end so earlier indexes stay valid
+        for index in range(len(old) - 1, shared - 1, -1):
+            ops.append({'op': 'remove', 'path': f"{path}/{index}"})
+        for value in new[shared:]:
+            ops.append({'op': 'add', 'path': f"{path}/-", 'value': value})
+    elif type(old) is not type(new) or old != new:
+        ops.append({'op': 'replace', 'path': path, 'value': new})
+
+
+def make_patch(old: Any, new: Any) -> List[Dict]:
+    """
+    Build a JSON Patch that turns old into new.
+
+    Objects are diffed key by key and arrays index by index (with appends and
+    tail removals), which keeps the patch small for the in-place edits a
+    refinement usually makes.
+    """
+    ops = []
+    _diff(old, new, '', ops)
+    return ops
+
+
+def validate_blueprint(blueprint: Any) -> None:
+    """Check the top-level shape SYSTEM_SPEC_PROMPT asks for; raise PatchError if it is broken."""
+    if not isinstance(blueprint, dict):
+        raise PatchError("Blueprint must be a JSON object")
+    for key in ('title', 'description'):
+        if key in blueprint and not isinstance(blueprint[key], str):
+            raise PatchError(f"'{key}' must be a string")
+    for key in ('modules', 'kpis'):
+        if key in blueprint and not isinstance(blueprint[key], list):
+            raise PatchError(f"'{key}' must be a list")
+    for index, module in enumerate(blueprint.get('modules') or []):
+        if not isinstance(module, dict) or not isinstance(module.get('name'), str):
+            raise PatchError(f"/modules/{index} must be an object with a name")
+        for key in ('entities', 'apis', 'ui'):
+            if key in module and not isinstance(module[key], list):
+                raise PatchError(f"/modules/{index}/{key} must be a list")
+
+
+def _mentions(instruction: str, name: str) -> bool:
+    if not name:
+        return False
+    variants = {name, name.replace(' ', '_'), name.replace('_', ' ')}
+    return any(
+        re.search(rf'(?<!\w){re.escape(variant)}(?!\w)', instruction, re.IGNORECASE)
+        for variant in variants
+    )
+
+
+def relevant_modules(blueprint: Dict, instruction: str) -> Optional[List[int]]:
+    """
+    Indexes of the modules the instruction refers to by module or entity name.
+
+    Returns None when nothing specific is named (or every module is), meaning
+    the whole blueprint should be sent.
+    """
+    modules = blueprint.get('modules') or []
+    indexes = []
+    for index, module in enumerate(modules):
+        names = [module.get('name', '')] + [entity.get('name', '') for entity in module.get('entities') or []]
+        if any(_mentions(instruction, name) for name in names):
+            indexes.append(index)
+    if not indexes or len(indexes) == len(modules):
+        return None
+    return indexes
+
+
+def patch_context(blueprint: Dict, instruction: str) -> str:
+    """
+    The part of the blueprint the model needs to write a patch for instruction.
+
+    For a localized instruction this is the top-level fields, an outline of
+    every module (index and name) and the full JSON of the named modules only.
+    """
+    compact = dict(separators=(',', ':'))
+    indexes = relevant_modules(blueprint, instruction)
+    if indexes is None:
+        return f"Current Specification:\n{json.dumps(blueprint, **compact)}"
+
+    modules = blueprint.get('modules') or []
+    top_level = {key: value for key, value in blueprint.items() if key != 'modules'}
+    outline = "\n".join(f"/modules/{index}: {module.get('name', '')}" for index, module in enumerate(modules))
+    scoped = "\n".join(f"/modules/{index}:\n{json.dumps(modules[index], **compact)}" for index in indexes)
+    return (
+        f"Current Specification (top-level fields, modules omitted):\n{json.dumps(top_level, **compact)}\n\n"
+        f"Module outline ({len(modules)} modules):\n{outline}\n\n"
+        f"Relevant modules in full:\n{scoped}"
+    )
+
+
+def patch_operations(response: Dict) -> List[Dict]:
+    """Extract the operation list from the model's {"patch": [...]} response."""
+    patch = response.get('patch') if isinstance(response, dict) else None
+    if not isinstance(patch, list):
+        raise PatchError("AI response did not contain a 'patch' list")
+    return patch
+
+
+def apply_refinement(blueprint: Dict, response: Dict) -> Dict:
+    """Apply the model's patch response to blueprint and validate the result."""
+    refined = apply_patch(blueprint, patch_operations(response))
+    validate_blueprint(refined)
+    return refined
+
+
+__all__ = [
+    'REFINE_MODE_FULL',
+    'REFINE_MODE_PATCH',
+    'REFINE_MODES',
+    'PatchError',
+    'apply_patch',
+    'make_patch',
+    'validate_blueprint',
+    'relevant_modules',
+    'patch_context',
+    'apply_refinement',
+]
@@ -0,0 +1,252 @@
+"""
+Exporting and importing a user's blueprints as NDJSON.
+
+export_lines() streams one JSON object per blueprint (id, idea, spec_json,
+title, module_count, revision, created_at, updated_at), oldest first. It
+reads rows with .iterator(chunk_size=SPEC_EXPORT_CHUNK_SIZE), so memory stays
+flat however many blueprints the account holds; gzip_stream() compresses the
+lines as they go.
+
+import_specs() reads the same format back in batches of
+SPEC_IMPORT_BATCH_SIZE rows: each batch is validated, then inserted with one
+bulk_create for the blueprints and one for their initial revisions, plus one
+UPDATE restoring the exported created_at. updated_at is the time of the
+import, not the exported one: listing ETags (conditional.list_validators)
+rely on every write moving the newest updated_at forward. Only the current blueprint is
+carried over; each imported blueprint starts a new history at revision 1.
+An id the importing user already owns is skipped, so re-running an
+interrupted import is safe; an id taken by another user gets a new one.
+
+GET /api/specs/export/, POST /api/specs/import/ and the export_specs and
+import_specs management commands all go through here.
+"""
+import datetime
+import gzip
+import json
+import uuid
+import zlib
+from typing import Dict, Iterable, Iterator, List
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from rest_framework.renderers import BaseRenderer
+
+from .models import Spec
+from .patching import PatchError, validate_blueprint
+from .serializers import SpecImportSerializer
+from .similarity import similar_ideas
+from . import revisions
+
+
+EXPORT_FIELDS = ('id', 'idea', 'spec_json', 'title', 'module_count', 'revision', 'created_at', 'updated_at')
+
+# Lines are joined into chunks of about this many bytes before being yielded
+WRITE_BUFFER = 64 * 1024
+
+# What reading a truncated or corrupt gzip upload raises
+READ_ERRORS = (OSError, EOFError, zlib.error)
+
+# Rows of error detail kept in an import report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+class _ExportEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder without its rounding of datetimes to milliseconds, so created_at round-trips exactly."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export_chunk_size() -> int:
+    return max(1, getattr(settings, 'SPEC_EXPORT_CHUNK_SIZE', 500))
+
+
+def import_batch_size() -> int:
+    return max(1, getattr(settings, 'SPEC_IMPORT_BATCH_SIZE', 500))
+
+
+def find_user(identifier: str):
+    """The user with this username, email or id (for the management commands)."""
+    User = get_user_model()
+    lookup = models.Q(username=identifier) | models.Q(email__iexact=identifier)
+    if identifier.isdigit():
+        lookup |= models.Q(pk=int(identifier))
+    users = list(User._default_manager.filter(lookup)[:2])
+    if len(users) != 1:
+        raise User.DoesNotExist(f"{'No' if not users else 'More than one'} user matches {identifier!r}")
+    return users[0]
+
+
+def export_lines(user, chunk_size: int = None) -> Iterator[bytes]:
+    """NDJSON for every blueprint user owns, in chunks of about WRITE_BUFFER bytes."""
+    rows = (
+        Spec.objects
+        .filter(user=user)
+        .order_by('created_at', 'id')
+        .values(*EXPORT_FIELDS)
+        .iterator(chunk_size=chunk_size or export_chunk_size())
+    )
+    encoder = _ExportEncoder(separators=(',', ':'))
+    buffer, size = [], 0
+    for row in rows:
+        line = (encoder.encode(row) + '\n').encode()
+        buffer.append(line)
+        size += len(line)
+        if size >= WRITE_BUFFER:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream into gzip format incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def read_rows(stream, compressed: bool = False) -> Iterator[Dict]:
+    """
+    Rows from an NDJSON byte stream (a file, or the request itself), one line at a time.
+
+    A line that is not a JSON object yields {'_error': ...} in its place, so
+    row numbers still line up with the input.
+    """
+    lines = gzip.GzipFile(fileobj=stream, mode='rb') if compressed else stream
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield {'_error': f"Invalid JSON: {e}"}
+            continue
+        yield row if isinstance(row, dict) else {'_error': "Each line must be a JSON object"}
+
+
+def _clean(row: Dict) -> Dict:
+    """Validated fields of one row; raises ValidationError with the problems."""
+    if '_error' in row:
+        raise ValidationError(row['_error'])
+    serializer = SpecImportSerializer(data=row)
+    if not serializer.is_valid():
+        raise ValidationError([
+            f"{field}: {message}" for field, messages in serializer.errors.items() for message in messages
+        ])
+    data = serializer.validated_data
+    try:
+        validate_blueprint(data['spec_json'])
+    except PatchError as e:
+        raise ValidationError(f"spec_json: {e}")
+    return data
+
+
+def _restore_created_at(pairs: List) -> None:
+    """One UPDATE setting created_at from the export (bulk_create stamps it with now)."""
+    whens = [models.When(id=spec.id, then=models.Value(data['created_at'])) for spec, data in pairs if data.get('created_at')]
+    if whens:
+        Spec.objects.filter(id__in=[spec.id for spec, _ in pairs]).update(
+            created_at=models.Case(*whens, default=models.F('created_at'), output_field=models.DateTimeField())
+        )
+
+
+def _import_batch(user, rows: List[Dict], first_row: int, totals: Dict, dry_run: bool) -> None:
+    valid = []
+    for number, row in enumerate(rows, first_row):
+        try:
+            valid.append(_clean(row))
+        except ValidationError as e:
+            totals['errors'] += 1
+            if len(totals['error_rows']) < MAX_REPORTED_ERRORS:
+                totals['error_rows'].append({'row': number, 'errors': e.messages})
+
+    owners = dict(
+        Spec.objects
+        .filter(id__in=[data['id'] for data in valid if data.get('id')])
+        .values_list('id', 'user_id')
+    )
+    # Earlier batches are in the database by now, so only repeats within this one need tracking
+    pairs, seen = [], set()
+    for data in valid:
+        spec_id = data.get('id')
+        if (spec_id is not None and spec_id in seen) or (spec_id in owners and owners[spec_id] == user.pk):
+            totals['skipped'] += 1
+            continue
+        seen.add(spec_id)
+        if spec_id is None or spec_id in owners:
+            spec_id = uuid.uuid4()
+        spec = Spec(id=spec_id, user=user, idea=data['idea'], spec_json=data['spec_json'])
+        # bulk_create does not call save(), which fills these in
+        spec.refresh_summary()
+        pairs.append((spec, data))
+
+    if pairs and not dry_run:
+        specs = [spec for spec, _ in pairs]
+        with transaction.atomic():
+            Spec.objects.bulk_create(specs)
+            revisions.create_initial_revisions(specs)
+            _restore_created_at(pairs)
+        # bulk_create sends no post_save
+        similar_ideas.add_specs(specs)
+    totals['created'] += len(pairs)
+
+
+def import_specs(user, rows: Iterable[Dict], batch_size: int = None, dry_run: bool = False) -> Dict:
+    """
+    Create blueprints for user from exported rows, a batch at a time.
+
+    Returns {'created', 'skipped', 'errors', 'error_rows'}: counts, plus
+    {'row', 'errors'} for the first MAX_REPORTED_ERRORS invalid rows
+    (numbered from 1). Each batch commits on its own.
+    """
+    batch_size = batch_size or import_batch_size()
+    totals = {'created': 0, 'skipped': 0, 'errors': 0, 'error_rows': []}
+    batch, first_row = [], 1
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _import_batch(user, batch, first_row, totals, dry_run)
+            first_row += len(batch)
+            batch = []
+    if batch:
+        _import_batch(user, batch, first_row, totals, dry_run)
+    return totals
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Lets `Accept: application/x-ndjson` pass DRF content negotiation.
+
+    The export view streams its own response; this renderer only formats
+    early errors and import reports, as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data, cls=DjangoJSONEncoder) + '\n').encode(self.charset)
+
+
+__all__ = [
+    'EXPORT_FIELDS',
+    'READ_ERRORS',
+    'MAX_REPORTED_ERRORS',
+    'export_chunk_size',
+    'import_batch_size',
+    'find_user',
+    'export_lines',
+    'gzip_stream',
+    'read_rows',
+    'import_specs',
+    'NDJSONRenderer',
+]
@@ -0,0 +1,499 @@
+"""
+Per-user rate limits and concurrency quotas for the AI endpoints.
+
+Each plan in AI_RATE_LIMIT_PLANS gives a token bucket per endpoint scope
+(generate, refine, code_stubs) written as "N/period": bursts of up to N
+requests, refilled at N per period. It also sets a cap on the AI operations
+a user has in flight at once ('concurrency'). That counts requests still
+being answered (including streams) plus background jobs still queued or
+running. A scope or cap missing from a plan is unlimited.
+
+A user's plan is the first "plan:<name>" group they belong to, "staff" for
+staff users if that plan exists, and AI_RATE_LIMIT_DEFAULT_PLAN otherwise.
+
+Buckets use GCRA (the generic cell rate algorithm, equivalent to a token
+bucket), so a bucket is one timestamp. State lives in a pluggable store
+(AI_RATE_LIMIT_STORE):
+- 'database' (default): the RateLimitState table; exact, one row lock per check
+- 'cache': the Django cache, shared by every process using it. Concurrency
+  counters use atomic incr; bucket updates are last-writer-wins, so a
+  burst of simultaneous requests can slightly overshoot. Needs a shared
+  cache backend (e.g. Redis); the default local-memory cache is per process.
+- 'memory': per process, lock-protected dicts; no I/O on the hot path, but
+  each worker process enforces the limits on its own
+
+A request can cost more than one token (the batch endpoint takes one per
+idea); a cost above the bucket size can never be admitted and is refused.
+Tokens are taken when a request is admitted and given back if it turns out
+not to reach the model: a 4xx answer (invalid input, missing blueprint) or a
+blueprint reused from a similar idea.
+
+Limited requests get 429 with a Retry-After header.
+"""
+import functools
+import math
+import re
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import LRUCache
+
+
+STORE_MEMORY = 'memory'
+STORE_CACHE = 'cache'
+STORE_DATABASE = 'database'
+
+# Retry-After suggested when the concurrency cap, not a bucket, is the limit
+CONCURRENCY_RETRY_AFTER = 5
+
+# How long a user's plan is remembered before the groups are read again
+PLAN_CACHE_SECONDS = 60
+
+# How long the request path reuses a user's count of active background jobs
+ACTIVE_JOBS_CACHE_SECONDS = 2
+
+# Users whose plan and job count are remembered; the least recently used go first
+USER_CACHE_SIZE = 10000
+
+PERIODS = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60,
+           'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+RATE_PATTERN = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([a-z]+)\s*$')
+
+
+class RateLimited(Exception):
+    """Raised (or turned into a 429) when a user is over a limit."""
+
+    def __init__(self, message: str, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """Parse "N/period" ("10/min", "100/hour", "5/30s") into (N, seconds)."""
+    match = RATE_PATTERN.match(rate.lower())
+    if not match or match.group(3) not in PERIODS or int(match.group(1)) <= 0:
+        raise ValueError(f"Invalid rate {rate!r}; expected e.g. '10/min'")
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * PERIODS[unit]
+
+
+def _gcra(tat: float, now: float, count: int, period: float, cost: int = 1) -> Tuple[Optional[float], float]:
+    """
+    One GCRA step: (new theoretical arrival time or None if limited, retry_after).
+
+    Each request advances the TAT by cost * period/count; a request is allowed
+    while the TAT stays within one period of now, i.e. up to count in a burst.
+    """
+    new_tat = max(tat, now) + cost * period / count
+    allow_at = new_tat - period
+    if allow_at > now:
+        return None, allow_at - now
+    return new_tat, 0.0
+
+
+def _refunded(tat: float, now: float, count: int, period: float, cost: int = 1) -> Optional[float]:
+    """TAT with cost tokens given back, or None if the bucket is then full."""
+    tat -= cost * period / count
+    return tat if tat > now else None
+
+
+class MemoryStore:
+    """Per-process state; the fastest store, exact within one process."""
+
+    def __init__(self):
+        self._tats: Dict[str, float] = {}
+        self._slots: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, count: int, period: float, cost: int = 1) -> float:
+        now = time.time()
+        with self._lock:
+            new_tat, retry_after = _gcra(self._tats.get(key, 0.0), now, count, period, cost)
+            if new_tat is not None:
+                self._tats[key] = new_tat
+        return retry_after
+
+    def refund(self, key: str, count: int, period: float, cost: int = 1) -> None:
+        now = time.time()
+        with self._lock:
+            tat = _refunded(self._tats.get(key, 0.0), now, count, period, cost)
+            if tat is None:
+                self._tats.pop(key, None)
+            else:
+                self._tats[key] = tat
+
+    def acquire(self, key: str, limit: int) -> bool:
+        with self._lock:
+            if self._slots.get(key, 0) >= limit:
+                return False
+            self._slots[key] = self._slots.get(key, 0) + 1
+            return True
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            remaining = self._slots.get(key, 0) - 1
+            if remaining > 0:
+                self._slots[key] = remaining
+            else:
+                self._slots.pop(key, None)
+
+    def in_flight(self, key: str) -> int:
+        return self._slots.get(key, 0)
+
+
+class CacheStore:
+    """State in a Django cache (AI_RATE_LIMIT_CACHE), shared across processes."""
+
+    def __init__(self, alias: str, slot_ttl: int):
+        self.cache = caches[alias]
+        self.slot_ttl = slot_ttl
+
+    def take(self, key: str, count: int, period: float, cost: int = 1) -> float:
+        now = time.time()
+        new_tat, retry_after = _gcra(self.cache.get(key, 0.0), now, count, period, cost)
+        if new_tat is not None:
+            self.cache.set(key, new_tat, timeout=math.ceil(new_tat - now) + 1)
+        return retry_after
+
+    def refund(self, key: str, count: int, period: float, cost: int = 1) -> None:
+        now = time.time()
+        tat = _refunded(self.cache.get(key, 0.0), now, count, period, cost)
+        if tat is None:
+            self.cache.delete(key)
+        else:
+            self.cache.set(key, tat, timeout=math.ceil(tat - now) + 1)
+
+    def acquire(self, key: str, limit: int) -> bool:
+        # Counters expire so a crashed process cannot hold slots forever
+        self.cache.add(key, 0, timeout=self.slot_ttl)
+        try:
+            value = self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, timeout=self.slot_ttl)
+            value = 1
+        if value > limit:
+            self.release(key)
+            return False
+        return True
+
+    def release(self, key: str) -> None:
+        try:
+            if self.cache.decr(key) < 0:
+                self.cache.set(key, 0, timeout=self.slot_ttl)
+        except ValueError:
+            pass
+
+    def in_flight(self, key: str) -> int:
+        return max(0, self.cache.get(key, 0))
+
+
+class DatabaseStore:
+    """State in the RateLimitState table; exact across processes."""
+
+    def __init__(self, slot_ttl: int):
+        self.slot_ttl = slot_ttl
+
+    def take(self, key: str, count: int, period: float, cost: int = 1) -> float:
+        from .models import RateLimitState
+        now = time.time()
+        with transaction.atomic():
+            state, _ = RateLimitState.objects.select_for_update().get_or_create(key=key)
+            new_tat, retry_after = _gcra(state.tat, now, count, period, cost)
+            if new_tat is not None:
+                state.tat = new_tat
+                state.save(update_fields=['tat', 'updated_at'])
+        return retry_after
+
+    def refund(self, key: str, count: int, period: float, cost: int = 1) -> None:
+        from .models import RateLimitState
+        now = time.time()
+        with transaction.atomic():
+            state = RateLimitState.objects.select_for_update().filter(key=key).first()
+            if state is None:
+                return
+            state.tat = _refunded(state.tat, now, count, period, cost) or 0.0
+            state.save(update_fields=['tat', 'updated_at'])
+
+    def acquire(self, key: str, limit: int) -> bool:
+        from .models import RateLimitState
+        now = timezone.now()
+        slot = RateLimitState.objects.filter(key=key, in_flight__lt=limit)
+        if slot.update(in_flight=F('in_flight') + 1, updated_at=now):
+            return True
+        # Slots held by a process that died are forgotten after slot_ttl
+        if RateLimitState.objects.filter(
+            key=key, updated_at__lt=now - timedelta(seconds=self.slot_ttl)
+        ).update(in_flight=1, updated_at=now):
+            return True
+        try:
+            with transaction.atomic():
+                RateLimitState.objects.create(key=key, in_flight=1)
+            return True
+        except IntegrityError:
+            # Created by a concurrent request in the meantime
+            return bool(slot.update(in_flight=F('in_flight') + 1, updated_at=now))
+
+    def release(self, key: str) -> None:
+        from .models import RateLimitState
+        RateLimitState.objects.filter(key=key, in_flight__gt=0).update(in_flight=F('in_flight') - 1)
+
+    def in_flight(self, key: str) -> int:
+        from .models import RateLimitState
+        return RateLimitState.objects.filter(key=key).values_list('in_flight', flat=True).first() or 0
+
+
+class RateLimiter:
+    """Plan lookup plus bucket and slot checks against the configured store."""
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'AI_RATE_LIMIT_ENABLED', True)
+        self.plans = getattr(settings, 'AI_RATE_LIMIT_PLANS', {})
+        self.default_plan = getattr(settings, 'AI_RATE_LIMIT_DEFAULT_PLAN', 'default')
+        self.store_name = getattr(settings, 'AI_RATE_LIMIT_STORE', STORE_DATABASE)
+        slot_ttl = getattr(settings, 'AI_RATE_LIMIT_SLOT_TTL', 900)
+        if self.store_name == STORE_CACHE:
+            self.store = CacheStore(getattr(settings, 'AI_RATE_LIMIT_CACHE', 'default'), slot_ttl)
+        elif self.store_name == STORE_DATABASE:
+            self.store = DatabaseStore(slot_ttl)
+        else:
+            self.store = MemoryStore()
+        # Parse every rate up front so a typo fails at startup, not per request
+        self.rates = {
+            plan: {scope: parse_rate(rate) for scope, rate in limits.items() if scope != 'concurrency'}
+            for plan, limits in self.plans.items()
+        }
+        self._plan_cache = LRUCache(USER_CACHE_SIZE)
+        self._jobs_cache = LRUCache(USER_CACHE_SIZE)
+
+    def plan_for(self, user) -> str:
+        """Name of the user's plan (cached for PLAN_CACHE_SECONDS)."""
+        cached = self._plan_cache.get(user.pk)
+        if cached is not None:
+            return cached
+        plan = self.default_plan
+        group = user.groups.filter(name__startswith='plan:').order_by('name').values_list('name', flat=True).first()
+        if group and group[len('plan:'):] in self.plans:
+            plan = group[len('plan:'):]
+        elif user.is_staff and 'staff' in self.plans:
+            plan = 'staff'
+        self._plan_cache.set(user.pk, plan, PLAN_CACHE_SECONDS)
+        return plan
+
+    def concurrency_for(self, user) -> Optional[int]:
+        return self.plans.get(self.plan_for(user), {}).get('concurrency')
+
+    def check(self, user, scope: str, cost: int = 1) -> None:
+        """Take cost tokens from the user's scope bucket; raise RateLimited if it has fewer."""
+        if not self.enabled:
+            return
+        rate = self.rates.get(self.plan_for(user), {}).get(scope)
+        if rate is None:
+            return
+        count, period = rate
+        if cost > count:
+            # More than the bucket ever holds: no amount of waiting would admit it
+            raise RateLimited(
+                f"Rate limit exceeded: at most {count} {scope.replace('_', ' ')} request(s) per {_period_label(period)}",
+                period,
+            )
+        retry_after = self.store.take(f"ai-rl:{scope}:{user.pk}", count, period, cost)
+        if retry_after > 0:
+            raise RateLimited(
+                f"Rate limit exceeded: {count} {scope.replace('_', ' ')} request(s) per {_period_label(period)}",
+                retry_after,
+            )
+
+    def refund(self, user, scope: str, cost: int = 1) -> None:
+        """Give back cost tokens taken by check() for work that never reached the model."""
+        if not self.enabled:
+            return
+        rate = self.rates.get(self.plan_for(user), {}).get(scope)
+        if rate is not None:
+            self.store.refund(f"ai-rl:{scope}:{user.pk}", *rate, cost)
+
+    def acquire_slot(self, user) -> bool:
+        """Reserve an in-flight slot; False if the user is at their concurrency cap."""
+        limit = self.concurrency_for(user) if self.enabled else None
+        if limit is None:
+            return True
+        available = limit - self.active_jobs(user, cached=True)
+        return available > 0 and self.store.acquire(f"ai-slots:{user.pk}", available)
+
+    def release_slot(self, user) -> None:
+        if self.enabled and self.concurrency_for(user) is not None:
+            self.store.release(f"ai-slots:{user.pk}")
+
+    def check_job_quota(self, user) -> None:
+        """Raise RateLimited if queuing another background job would exceed the cap."""
+        limit = self.concurrency_for(user) if self.enabled else None
+        if limit is None:
+            return
+        active = self.active_jobs(user)
+        if active + self.store.in_flight(f"ai-slots:{user.pk}") >= limit:
+            raise concurrency_error(limit)
+        # Count the job about to be queued before the request path sees it
+        self._jobs_cache.set(user.pk, active + 1, ACTIVE_JOBS_CACHE_SECONDS)
+
+    def active_jobs(self, user, cached: bool = False) -> int:
+        """
+        Queued or running background jobs of user.
+
+        With cached=True a count up to ACTIVE_JOBS_CACHE_SECONDS old may be
+        returned, which keeps the query off the per-request path.
+        """
+        from .models import Job
+        count = self._jobs_cache.get(user.pk) if cached else None
+        if count is not None:
+            return count
+        count = Job.objects.filter(user=user, status__in=[Job.STATUS_QUEUED, Job.STATUS_RUNNING]).count()
+        self._jobs_cache.set(user.pk, count, ACTIVE_JOBS_CACHE_SECONDS)
+        return count
+
+    def enter(self, user, scope: str, background: bool = False, cost: int = 1) -> None:
+        """
+        Admit one AI request: take cost tokens for scope (one per AI operation it
+        asks for) and, unless it only queues a background job, an in-flight slot
+        (give it back with release_slot()).
+
+        Raises:
+            RateLimited: if the bucket is empty or the concurrency cap is reached
+        """
+        self.check(user, scope, cost)
+        if background:
+            self.check_job_quota(user)
+        elif not self.acquire_slot(user):
+            raise concurrency_error(self.concurrency_for(user))
+
+    async def aenter(self, user, scope: str, cost: int = 1) -> None:
+        await sync_to_async(self.enter)(user, scope, cost=cost)
+
+    async def arelease_slot(self, user) -> None:
+        await sync_to_async(self.release_slot)(user)
+
+    async def arefund(self, user, scope: str, cost: int = 1) -> None:
+        await sync_to_async(self.refund)(user, scope, cost)
+
+
+def _period_label(seconds: float) -> str:
+    for name, length in (('day', 86400), ('hour', 3600), ('minute', 60)):
+        if seconds == length:
+            return name
+    return f"{seconds:g}s"
+
+
+def concurrency_error(limit: int) -> RateLimited:
+    return RateLimited(
+        f"Too many AI requests in progress (limit {limit}); wait for one to finish",
+        CONCURRENCY_RETRY_AFTER,
+    )
+
+
+limiter = RateLimiter()
+
+
+def too_many_requests(error: RateLimited) -> Response:
+    """429 response for a RateLimited error, with Retry-After in whole seconds."""
+    return Response(
+        {"error": str(error)},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={'Retry-After': str(max(1, math.ceil(error.retry_after)))}
+    )
+
+
+def charged(response) -> bool:
+    """
+    Whether response did AI work that should stay charged to the user's bucket.
+
+    4xx answers (bad input, missing blueprint, over a limit) and blueprints
+    reused from a similar idea never reached the model.
+    """
+    return not (400 <= response.status_code < 500 or response.has_header('X-Spec-Reused-From'))
+
+
+def _release_when_done(response, release):
+    """Hold the slot until a streamed body has been sent (or abandoned)."""
+    content = response.streaming_content
+    if response.is_async:
+        async def wrapped():
+            try:
+                async for chunk in content:
+                    yield chunk
+            finally:
+                await sync_to_async(release)()
+    else:
+        def wrapped():
+            try:
+                yield from content
+            finally:
+                release()
+    response.streaming_content = wrapped()
+    return response
+
+
+def ai_rate_limit(scope: str, cost: Optional[Callable] = None):
+    """
+    Apply the user's rate limit for scope and concurrency cap to a DRF view.
+
+    Place it directly above the view function, under @permission_classes, so
+    request.user is already authenticated. Requests that queue a background
+    job are checked against the cap instead of holding a slot. cost(request)
+    gives the tokens a request takes, for views doing several AI operations
+    (default 1); they are refunded if the response is not charged().
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            from .jobs import wants_async
+            user = request.user
+            background = wants_async(request)
+            tokens = cost(request) if cost else 1
+            try:
+                limiter.enter(user, scope, background, tokens)
+            except RateLimited as e:
+                return too_many_requests(e)
+            if background:
+                response = view(request, *args, **kwargs)
+                if not charged(response):
+                    limiter.refund(user, scope, tokens)
+                return response
+
+            release = functools.partial(limiter.release_slot, user)
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                release()
+                raise
+            if not charged(response):
+                limiter.refund(user, scope, tokens)
+            if getattr(response, 'streaming', False):
+                return _release_when_done(response, release)
+            release()
+            return response
+        return wrapper
+    return decorator
+
+
+__all__ = [
+    'RateLimited',
+    'parse_rate',
+    'MemoryStore',
+    'CacheStore',
+    'DatabaseStore',
+    'RateLimiter',
+    'limiter',
+    'too_many_requests',
+    'charged',
+    'ai_rate_limit',
+]
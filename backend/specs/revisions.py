@@ -0,0 +1,199 @@
+"""
+Blueprint version history.
+
+Every change to Spec.spec_json goes through commit_revision(), which stores a
+SpecRevision holding either a JSON Patch from the previous revision or, every
+SPEC_REVISION_SNAPSHOT_INTERVAL revisions, a full snapshot. Rebuilding any
+revision therefore reads one snapshot plus at most interval - 1 patches,
+while reading the current blueprint stays a single Spec row.
+
+compact_revisions() rewrites a spec's chain: it can drop revisions older than
+the most recent N and re-spaces snapshots to the current interval.
+"""
+import json
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Spec, SpecRevision
+from . import patching
+
+
+def snapshot_interval() -> int:
+    return max(1, getattr(settings, 'SPEC_REVISION_SNAPSHOT_INTERVAL', 10))
+
+
+def _initial_revision(spec: Spec) -> SpecRevision:
+    return SpecRevision(
+        spec=spec,
+        number=spec.revision,
+        kind=SpecRevision.KIND_SNAPSHOT,
+        snapshot=spec.spec_json,
+        source=SpecRevision.SOURCE_GENERATE,
+    )
+
+
+def create_initial_revision(spec: Spec) -> SpecRevision:
+    """Record a freshly generated blueprint as revision 1."""
+    revision = _initial_revision(spec)
+    revision.save()
+    return revision
+
+
+def create_initial_revisions(specs: List[Spec]) -> List[SpecRevision]:
+    """create_initial_revision() for several blueprints, in one insert."""
+    return SpecRevision.objects.bulk_create([_initial_revision(spec) for spec in specs])
+
+
+def commit_revision(spec: Spec, blueprint: Dict, source: str, instruction: str = '') -> SpecRevision:
+    """
+    Make blueprint the current content of spec and record it as a new revision.
+
+    The spec row is locked while the next number is assigned, so concurrent
+    refinements of the same blueprint get consecutive revisions.
+    """
+    with transaction.atomic():
+        current = Spec.objects.select_for_update().only('spec_json', 'revision').get(pk=spec.pk)
+        number = current.revision + 1
+        last_snapshot = (
+            SpecRevision.objects
+            .filter(spec_id=spec.pk, kind=SpecRevision.KIND_SNAPSHOT)
+            .order_by('-number')
+            .values_list('number', flat=True)
+            .first()
+        )
+        revision = SpecRevision(spec=spec, number=number, source=source, instruction=instruction)
+        if last_snapshot is None or number - last_snapshot >= snapshot_interval():
+            revision.kind = SpecRevision.KIND_SNAPSHOT
+            revision.snapshot = blueprint
+        else:
+            revision.kind = SpecRevision.KIND_DIFF
+            revision.patch = patching.make_patch(current.spec_json, blueprint)
+        revision.save()
+
+        spec.spec_json = blueprint
+        spec.revision = number
+        spec.save(update_fields=['spec_json', 'revision', 'updated_at'])
+    return revision
+
+
+def _replay(rows: List[SpecRevision]) -> Dict:
+    """Rebuild the blueprint of rows[-1] from a snapshot followed by consecutive diffs."""
+    if not rows or rows[0].kind != SpecRevision.KIND_SNAPSHOT:
+        raise SpecRevision.DoesNotExist("No snapshot to rebuild this revision from")
+    blueprint = rows[0].snapshot
+    for previous, row in zip(rows, rows[1:]):
+        if row.number != previous.number + 1:
+            raise SpecRevision.DoesNotExist(f"Revision {previous.number + 1} is missing from the chain")
+        if row.kind == SpecRevision.KIND_SNAPSHOT:
+            blueprint = row.snapshot
+        else:
+            blueprint = patching.apply_patch(blueprint, row.patch)
+    return blueprint
+
+
+def reconstruct(spec: Spec, number: int) -> Dict:
+    """
+    Return the blueprint as it was at revision number.
+
+    Raises:
+        SpecRevision.DoesNotExist: if the revision does not exist or was compacted away
+    """
+    if number == spec.revision:
+        return spec.spec_json
+    base = (
+        SpecRevision.objects
+        .filter(spec_id=spec.pk, number__lte=number, kind=SpecRevision.KIND_SNAPSHOT)
+        .order_by('-number')
+        .values_list('number', flat=True)
+        .first()
+    )
+    if base is None:
+        raise SpecRevision.DoesNotExist(f"Revision {number} not found")
+    rows = list(
+        SpecRevision.objects
+        .filter(spec_id=spec.pk, number__gte=base, number__lte=number)
+        .order_by('number')
+    )
+    if rows[-1].number != number:
+        raise SpecRevision.DoesNotExist(f"Revision {number} not found")
+    return _replay(rows)
+
+
+def rollback(spec: Spec, number: int) -> SpecRevision:
+    """Restore revision number as a new revision, keeping the history in between."""
+    blueprint = reconstruct(spec, number)
+    return commit_revision(spec, blueprint, SpecRevision.SOURCE_ROLLBACK, f"Rollback to revision {number}")
+
+
+def _stored_size(row: SpecRevision) -> int:
+    return len(json.dumps(row.snapshot if row.kind == SpecRevision.KIND_SNAPSHOT else row.patch))
+
+
+def compact_revisions(
+    spec: Spec, interval: Optional[int] = None, keep: Optional[int] = None, dry_run: bool = False
+) -> Dict:
+    """
+    Rebase spec's revision chain.
+
+    Revisions older than the `keep` most recent are deleted and the oldest
+    survivor becomes a snapshot. The remaining chain is then re-spaced so a
+    snapshot occurs every `interval` revisions (default
+    SPEC_REVISION_SNAPSHOT_INTERVAL) and every other row is a diff from its
+    predecessor. Only rows whose storage changes are written.
+
+    Returns:
+        Dict: Counts of deleted and rewritten rows and stored bytes before/after
+    """
+    interval = max(1, interval or snapshot_interval())
+    with transaction.atomic():
+        Spec.objects.select_for_update().only('id').get(pk=spec.pk)
+        rows = list(SpecRevision.objects.filter(spec_id=spec.pk).order_by('number'))
+        stats = {'revisions': len(rows), 'deleted': 0, 'rewritten': 0, 'bytes_before': 0, 'bytes_after': 0}
+        if not rows:
+            return stats
+        stats['bytes_before'] = sum(_stored_size(row) for row in rows)
+
+        # Rebuild every state first; a broken chain is left untouched
+        states = []
+        for index, row in enumerate(rows):
+            if row.kind == SpecRevision.KIND_SNAPSHOT:
+                states.append(row.snapshot)
+            elif index and row.number == rows[index - 1].number + 1:
+                states.append(patching.apply_patch(states[-1], row.patch))
+            else:
+                raise SpecRevision.DoesNotExist(f"Revision chain of blueprint {spec.pk} is broken at {row.number}")
+
+        if keep and len(rows) > keep:
+            dropped = rows[:-keep]
+            rows, states = rows[-keep:], states[-keep:]
+            stats['deleted'] = len(dropped)
+            if not dry_run:
+                SpecRevision.objects.filter(pk__in=[row.pk for row in dropped]).delete()
+
+        changed = []
+        for index, (row, state) in enumerate(zip(rows, states)):
+            if index % interval == 0:
+                kind, snapshot, patch = SpecRevision.KIND_SNAPSHOT, state, None
+            else:
+                kind, snapshot, patch = SpecRevision.KIND_DIFF, None, patching.make_patch(states[index - 1], state)
+            if (row.kind, row.snapshot, row.patch) != (kind, snapshot, patch):
+                row.kind, row.snapshot, row.patch = kind, snapshot, patch
+                changed.append(row)
+        stats['rewritten'] = len(changed)
+        stats['bytes_after'] = sum(_stored_size(row) for row in rows)
+        if changed and not dry_run:
+            SpecRevision.objects.bulk_update(changed, ['kind', 'snapshot', 'patch'], batch_size=200)
+    return stats
+
+
+__all__ = [
+    'snapshot_interval',
+    'create_initial_revision',
+    'create_initial_revisions',
+    'commit_revision',
+    'reconstruct',
+    'rollback',
+    'compact_revisions',
+]
@@ -0,0 +1,235 @@
+"""
+Indexed full-text search over blueprints.
+
+The index covers each spec's title, idea and search_text (module, entity and
+field names) and lives in the database:
+- SQLite: an FTS5 table kept in sync by triggers on specs_spec, ranked with
+  bm25() and highlighted with snippet()
+- PostgreSQL: a generated, weighted tsvector column with a GIN index, ranked
+  with ts_rank_cd() and highlighted with ts_headline()
+- anything else: icontains over the same columns, unranked
+
+Both indexes are maintained by the database itself on every insert/update,
+so create, refine, rollback and bulk writes need no extra code.
+"""
+import re
+from typing import Dict, List, Optional
+
+from django.db import connection
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import Q
+
+from .models import Spec
+
+
+SEARCH_MIGRATION = ('specs', '0007_spec_search')
+
+MAX_TERMS = 8
+
+SUMMARY_FIELDS = ['id', 'idea', 'title', 'module_count', 'revision', 'created_at', 'updated_at']
+
+SQLITE_INDEX_SQL = [
+    # owner holds 'u<user_id>' so a user's matches come from intersecting posting
+    # lists instead of filtering every match by user afterwards
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS specs_spec_fts USING fts5(
+        owner, title, structure, idea, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS specs_spec_fts_insert AFTER INSERT ON specs_spec BEGIN
+        INSERT INTO specs_spec_fts (rowid, owner, title, structure, idea)
+        VALUES (new.rowid, 'u' || new.user_id, new.title, new.search_text, new.idea);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS specs_spec_fts_delete AFTER DELETE ON specs_spec BEGIN
+        DELETE FROM specs_spec_fts WHERE rowid = old.rowid;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS specs_spec_fts_update AFTER UPDATE OF user_id, title, search_text, idea ON specs_spec BEGIN
+        DELETE FROM specs_spec_fts WHERE rowid = old.rowid;
+        INSERT INTO specs_spec_fts (rowid, owner, title, structure, idea)
+        VALUES (new.rowid, 'u' || new.user_id, new.title, new.search_text, new.idea);
+    END
+    """,
+    "DELETE FROM specs_spec_fts",
+    """
+    INSERT INTO specs_spec_fts (rowid, owner, title, structure, idea)
+    SELECT rowid, 'u' || user_id, title, search_text, idea FROM specs_spec
+    """,
+]
+
+SQLITE_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS specs_spec_fts_update",
+    "DROP TRIGGER IF EXISTS specs_spec_fts_delete",
+    "DROP TRIGGER IF EXISTS specs_spec_fts_insert",
+    "DROP TABLE IF EXISTS specs_spec_fts",
+]
+
+POSTGRES_INDEX_SQL = [
+    # A generated column is recomputed by Postgres on every insert/update
+    """
+    ALTER TABLE specs_spec ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(search_text, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(idea, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS specs_spec_search_vector_gin ON specs_spec USING GIN (search_vector)",
+]
+
+POSTGRES_DROP_SQL = [
+    "DROP INDEX IF EXISTS specs_spec_search_vector_gin",
+    "ALTER TABLE specs_spec DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _execute(db, statements: List[str]) -> None:
+    with db.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def install_index(db=connection) -> None:
+    """Create (or rebuild) the search index for db's backend."""
+    if db.vendor == 'sqlite':
+        _execute(db, SQLITE_INDEX_SQL)
+    elif db.vendor == 'postgresql':
+        _execute(db, POSTGRES_INDEX_SQL)
+
+
+def drop_index(db=connection) -> None:
+    if db.vendor == 'sqlite':
+        _execute(db, SQLITE_DROP_SQL)
+    elif db.vendor == 'postgresql':
+        _execute(db, POSTGRES_DROP_SQL)
+
+
+def ensure_index(sender=None, using='default', **kwargs) -> None:
+    """
+    post_migrate hook: reinstall the SQLite index if a table rebuild dropped it.
+
+    Django's SQLite schema editor alters tables by copying them, which drops
+    their triggers and can renumber rowids, so the FTS table is rebuilt too.
+    """
+    from django.db import connections
+    db = connections[using]
+    if db.vendor != 'sqlite' or SEARCH_MIGRATION not in MigrationRecorder(db).applied_migrations():
+        return
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'specs_spec_fts_%'"
+        )
+        if cursor.fetchone()[0] == 3:
+            return
+    install_index(db)
+
+
+def query_terms(query: str) -> List[str]:
+    """Words of the user's query, lowercased; operators and punctuation are dropped."""
+    return [term.lower() for term in re.findall(r'\w+', query or '')][:MAX_TERMS]
+
+
+def _search_sqlite(terms: List[str], user, limit: int) -> List[tuple]:
+    # Every term must match (as a prefix) in the searchable columns
+    match = '{title structure idea} : (' + ' AND '.join(f'"{term}"*' for term in terms) + ')'
+    # The join is on rowid, which VACUUM may renumber for a table with a UUID key;
+    # checking the owner against the joined row keeps a stale index from
+    # showing one user's text to another
+    user_clause = "AND s.user_id = %s" if user is not None else ""
+    if user is not None:
+        match = f'owner : "u{user.pk}" AND {match}'
+    sql = f"""
+        SELECT s.id,
+               -bm25(specs_spec_fts, 0.0, 3.0, 2.0, 1.0) AS rank,
+               highlight(specs_spec_fts, 1, '<mark>', '</mark>'),
+               snippet(specs_spec_fts, 2, '<mark>', '</mark>', '...', 12),
+               snippet(specs_spec_fts, 3, '<mark>', '</mark>', '...', 16)
+        FROM specs_spec_fts
+        JOIN specs_spec s ON s.rowid = specs_spec_fts.rowid AND specs_spec_fts.owner = 'u' || s.user_id
+        WHERE specs_spec_fts MATCH %s {user_clause}
+        ORDER BY bm25(specs_spec_fts, 0.0, 3.0, 2.0, 1.0)
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match] + ([user.pk] if user is not None else []) + [limit])
+        return cursor.fetchall()
+
+
+def _search_postgres(terms: List[str], user, limit: int) -> List[tuple]:
+    tsquery = ' & '.join(f"{term}:*" for term in terms)
+    user_clause = "AND s.user_id = %s" if user is not None else ""
+    sql = f"""
+        SELECT s.id,
+               ts_rank_cd(s.search_vector, q) AS rank,
+               ts_headline('english', s.title, q, 'StartSel=<mark>, StopSel=</mark>, HighlightAll=true'),
+               ts_headline('english', s.search_text, q, 'StartSel=<mark>, StopSel=</mark>, MaxWords=20, MinWords=5'),
+               ts_headline('english', s.idea, q, 'StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10')
+        FROM specs_spec s, to_tsquery('english', %s) q
+        WHERE s.search_vector @@ q {user_clause}
+        ORDER BY rank DESC
+        LIMIT %s
+    """
+    params = [tsquery] + ([user.pk] if user is not None else []) + [limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _search_fallback(terms: List[str], user, limit: int) -> List[tuple]:
+    specs = Spec.objects.all() if user is None else Spec.objects.filter(user=user)
+    for term in terms:
+        specs = specs.filter(Q(title__icontains=term) | Q(search_text__icontains=term) | Q(idea__icontains=term))
+    return [(spec_id, None, '', '', '') for spec_id in specs.values_list('id', flat=True)[:limit]]
+
+
+def search_specs(query: str, user=None, limit: int = 20, fields: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Search blueprints by title, idea and module/entity/field names.
+
+    Every word of query must match (prefix matching, so 'inv' finds
+    'Inventory'). Results are best first.
+
+    Args:
+        query: Free text typed by the user
+        user: Only search this user's blueprints; None searches all (admin)
+        limit: Maximum number of results
+        fields: Spec fields to load for each hit (default: all but spec_json)
+
+    Returns:
+        List[Dict]: {'spec': Spec, 'rank': float or None, 'highlights': {column: snippet with <mark>}}
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    if connection.vendor == 'sqlite':
+        rows = _search_sqlite(terms, user, limit)
+    elif connection.vendor == 'postgresql':
+        rows = _search_postgres(terms, user, limit)
+    else:
+        rows = _search_fallback(terms, user, limit)
+
+    to_python = Spec._meta.pk.to_python
+    ids = [to_python(row[0]) for row in rows]
+    queryset = Spec.objects.all() if user is None else Spec.objects.filter(user=user)
+    specs = queryset.only(*(fields or SUMMARY_FIELDS)).in_bulk(ids)
+    results = []
+    for spec_id, row in zip(ids, rows):
+        if spec_id in specs:
+            highlights = {'title': row[2], 'structure': row[3], 'idea': row[4]}
+            results.append({
+                'spec': specs[spec_id],
+                'rank': float(row[1]) if row[1] is not None else None,
+                'highlights': {key: value for key, value in highlights.items() if value},
+            })
+    return results
+
+
+def matching_ids(query: str, user=None, limit: int = 1000) -> List:
+    """Ids of the best matches, for filtering a queryset (used by the admin)."""
+    return [result['spec'].pk for result in search_specs(query, user, limit, fields=['id'])]
+
+
+__all__ = ['install_index', 'drop_index', 'ensure_index', 'query_terms', 'search_specs', 'matching_ids']
@@ -1,12 +1,29 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Spec
+from .models import Spec, SpecRevision, Job
 
 
 class SpecSerializer(serializers.ModelSerializer):
     class Meta:
         model = Spec
-        fields = ['id', 'idea', 'spec_json', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'idea', 'spec_json', 'title', 'module_count', 'revision', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'title', 'module_count', 'revision', 'created_at', 'updated_at']
+
+
+class SpecSummarySerializer(serializers.ModelSerializer):
+    """Listing representation: everything but spec_json."""
+
+    class Meta:
+        model = Spec
+        fields = ['id', 'idea', 'title', 'module_count', 'revision', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class SpecRevisionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SpecRevision
+        fields = ['number', 'kind', 'source', 'instruction', 'created_at']
+        read_only_fields = fields
 
 
 class SpecGenerateSerializer(serializers.Serializer):
@@ -14,6 +31,49 @@ class SpecGenerateSerializer(serializers.Serializer):
         max_length=10000,
         help_text="Business concept or requirement description"
     )
+    reuse = serializers.ChoiceField(
+        choices=['off', 'return', 'clone'],
+        required=False,
+        help_text="Answer with a similar existing blueprint instead of generating (default SPEC_REUSE_MODE)"
+    )
+
+
+class SpecBatchGenerateSerializer(serializers.Serializer):
+    ideas = serializers.ListField(
+        child=serializers.CharField(max_length=10000),
+        allow_empty=False,
+        help_text="Business concepts, one blueprint each (at most AI_BATCH_MAX_IDEAS)"
+    )
+
+    def validate_ideas(self, value):
+        limit = getattr(settings, 'AI_BATCH_MAX_IDEAS', 50)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} ideas per batch.")
+        return value
+
+
+class SpecBatchResultSerializer(serializers.Serializer):
+    """One idea of a batch generation: the blueprint created for it, or why it failed."""
+    index = serializers.IntegerField()
+    idea = serializers.CharField()
+    status = serializers.CharField()
+    cached = serializers.BooleanField()
+    spec = SpecSerializer(allow_null=True)
+    error = serializers.CharField(allow_null=True)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.pop('error' if instance['spec'] is not None else 'spec')
+        return data
+
+
+class SpecImportSerializer(serializers.Serializer):
+    """One line of an NDJSON export; derived fields (title, module_count, revision) are recomputed and updated_at is ignored."""
+    id = serializers.UUIDField(required=False, allow_null=True)
+    idea = serializers.CharField(max_length=10000)
+    spec_json = serializers.JSONField()
+    created_at = serializers.DateTimeField(required=False, allow_null=True)
+    updated_at = serializers.DateTimeField(required=False, allow_null=True)
 
 
 class SpecRefineSerializer(serializers.Serializer):
@@ -21,6 +81,11 @@ class SpecRefineSerializer(serializers.Serializer):
         max_length=10000,
         help_text="Feedback or modification instructions for the blueprint"
     )
+    mode = serializers.ChoiceField(
+        choices=['full', 'patch'],
+        required=False,
+        help_text="patch (model returns a JSON Patch for the affected modules) or full (regenerate the whole blueprint); default AI_REFINE_MODE"
+    )
 
 
 class CodeStubSerializer(serializers.Serializer):
@@ -35,3 +100,31 @@ class CodeStubSerializer(serializers.Serializer):
         required=False,
         help_text="Framework preference (e.g., 'django', 'fastapi')"
     )
+    modules = serializers.ListField(
+        child=serializers.CharField(max_length=200),
+        required=False,
+        allow_empty=False,
+        help_text="Module names to generate (default: every module in the blueprint)"
+    )
+    engine = serializers.ChoiceField(
+        choices=['llm', 'local', 'hybrid'],
+        required=False,
+        help_text="llm, local (templates only) or hybrid (templates, falling back to the LLM); default AI_CODEGEN_ENGINE"
+    )
+    bundle = serializers.ChoiceField(
+        choices=['json', 'zip'],
+        default='json',
+        help_text="Return the modules as JSON or as a zip with one Django app per module"
+    )
+
+
+class JobSerializer(serializers.ModelSerializer):
+    spec_id = serializers.UUIDField(read_only=True)
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'status', 'progress', 'spec_id', 'result', 'error',
+            'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
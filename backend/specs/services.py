@@ -0,0 +1,297 @@
+"""
+Spec operations shared by the HTTP views and the background job runner.
+
+Each function performs the AI call plus the matching database writes and
+returns plain data, so callers decide how to present the result.
+"""
+import asyncio
+import contextvars
+import logging
+import math
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import Spec, SpecRevision
+from .ai_service import ai_service
+from .transport import CircuitOpenError
+from . import codegen, patching, revisions, similarity
+
+
+logger = logging.getLogger(__name__)
+
+
+def save_spec(user, concept: str, blueprint: Dict) -> Spec:
+    """Persist a generated blueprint for user as revision 1."""
+    with transaction.atomic():
+        spec = Spec.objects.create(
+            user=user,
+            idea=concept,
+            spec_json=blueprint
+        )
+        revisions.create_initial_revision(spec)
+    return spec
+
+
+def create_spec(user, concept: str) -> Spec:
+    """Generate a blueprint for concept and save it for user."""
+    blueprint = ai_service.generate_blueprint(concept)
+    return save_spec(user, concept, blueprint)
+
+
+def reuse_spec(user, concept: str, mode: str) -> Optional[Tuple[Spec, Spec, float]]:
+    """
+    A blueprint for concept taken from the most similar one user owns, without an AI call.
+
+    Returns (blueprint to answer with, the similar blueprint, similarity), or
+    None when mode is off or nothing is similar enough. mode=return answers
+    with the similar blueprint itself; mode=clone saves a copy of it for user
+    under concept.
+    """
+    if mode == similarity.REUSE_OFF:
+        return None
+    found = similarity.similar_ideas.find(user, concept)
+    if found is None:
+        return None
+    source, score = found
+    if mode == similarity.REUSE_RETURN:
+        return source, source, score
+    return save_spec(user, concept, source.spec_json), source, score
+
+
+def save_specs(user, items: List[Dict]) -> List[Spec]:
+    """Persist several generated blueprints ({'idea', 'blueprint'}) for user as revision 1, in two inserts."""
+    specs = [Spec(user=user, idea=item['idea'], spec_json=item['blueprint']) for item in items]
+    for spec in specs:
+        # bulk_create does not call save(), which fills these in
+        spec.refresh_summary()
+    with transaction.atomic():
+        Spec.objects.bulk_create(specs)
+        revisions.create_initial_revisions(specs)
+    # bulk_create sends no post_save
+    similarity.similar_ideas.add_specs(specs)
+    return specs
+
+
+BATCH_OK = 'ok'
+BATCH_FAILED = 'failed'
+
+
+def batch_limits(concurrency: Optional[int] = None):
+    """(concurrency, max ideas) for batch generation."""
+    if concurrency is None:
+        concurrency = getattr(settings, 'AI_BATCH_CONCURRENCY', 8)
+    return max(1, concurrency), getattr(settings, 'AI_BATCH_MAX_IDEAS', 50)
+
+
+def batch_cost(data) -> int:
+    """Rate limit tokens for a batch request body: one per idea."""
+    ideas = data.get('ideas') if isinstance(data, dict) else None
+    return max(1, min(len(ideas), batch_limits()[1])) if isinstance(ideas, list) else 1
+
+
+def _batch_result(index: int, concept: str) -> Dict:
+    return {'index': index, 'idea': concept, 'status': BATCH_FAILED, 'cached': False,
+            'blueprint': None, 'spec': None, 'error': None}
+
+
+def _batch_failure(result: Dict, error: Exception) -> Dict:
+    if isinstance(error, CircuitOpenError):
+        result['retry_after'] = error.retry_after
+        result['error'] = str(error)
+    elif isinstance(error, ValueError):
+        result['error'] = f"Invalid response from AI service: {str(error)}"
+    else:
+        result['error'] = str(error)
+    return result
+
+
+def _generate_batch_item(index: int, concept: str) -> Dict:
+    result = _batch_result(index, concept)
+    try:
+        result['blueprint'] = ai_service.generate_blueprint(concept)
+        result['status'] = BATCH_OK
+        result['cached'] = ai_service.last_cache_hit()
+    except Exception as e:
+        _batch_failure(result, e)
+    finally:
+        # Runs in a pool thread; don't leak its database connection
+        connections.close_all()
+    return result
+
+
+def _save_batch(user, results: List[Dict]) -> None:
+    ok = [result for result in results if result['status'] == BATCH_OK]
+    if ok:
+        for result, spec in zip(ok, save_specs(user, ok)):
+            result['spec'] = spec
+
+
+def iter_batch(user, concepts: List[str], concurrency: Optional[int] = None) -> Iterator[List[Dict]]:
+    """
+    Generate blueprints for concepts concurrently, yielding results as they finish.
+
+    Results that finish together are saved with one bulk insert and yielded
+    as one list, each {'index', 'idea', 'status', 'cached', 'spec', 'error'}.
+    """
+    concurrency, _ = batch_limits(concurrency)
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(concepts)), thread_name_prefix='batch') as pool:
+        # Each idea runs in a copy of this context so its AI calls count toward the request
+        pending = {
+            pool.submit(contextvars.copy_context().run, _generate_batch_item, index, concept): index
+            for index, concept in enumerate(concepts)
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            results = sorted((future.result() for future in done), key=lambda result: result['index'])
+            for future in done:
+                del pending[future]
+            _save_batch(user, results)
+            yield results
+
+
+def generate_batch(user, concepts: List[str], concurrency: Optional[int] = None) -> List[Dict]:
+    """
+    Generate blueprints for concepts, up to concurrency at a time, and save
+    the successful ones with one bulk insert. Results are in input order
+    (see iter_batch()); a failed idea does not stop the others.
+    """
+    concurrency, _ = batch_limits(concurrency)
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(concepts)), thread_name_prefix='batch') as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _generate_batch_item, index, concept)
+            for index, concept in enumerate(concepts)
+        ]
+        results = [future.result() for future in futures]
+    _save_batch(user, results)
+    return results
+
+
+def batch_counts(results: List[Dict]) -> Dict:
+    created = sum(result['status'] == BATCH_OK for result in results)
+    return {'created': created, 'failed': len(results) - created}
+
+
+def batch_retry_after(results: List[Dict]) -> Optional[int]:
+    """Seconds to wait when every idea failed because the upstream circuit is open, else None."""
+    delays = [result.get('retry_after') for result in results]
+    if delays and all(delay is not None for delay in delays):
+        return math.ceil(max(delays))
+    return None
+
+
+def default_refine_mode() -> str:
+    return getattr(settings, 'AI_REFINE_MODE', patching.REFINE_MODE_PATCH)
+
+
+def _patch_fallback(spec: Spec, error: patching.PatchError) -> bool:
+    """Log a rejected patch and say whether to retry as a full refine."""
+    logger.warning("Patch refine of spec %s rejected: %s", spec.id, error)
+    return getattr(settings, 'AI_REFINE_PATCH_FALLBACK', True)
+
+
+def refine_spec(spec: Spec, instruction: str, mode: Optional[str] = None) -> Spec:
+    """
+    Apply a refinement instruction to spec and save it.
+
+    mode 'patch' asks the model for a JSON Patch against the relevant part of
+    the blueprint; a patch that does not apply falls back to 'full', which
+    regenerates the whole document.
+    """
+    blueprint = None
+    if (mode or default_refine_mode()) == patching.REFINE_MODE_PATCH:
+        try:
+            blueprint = ai_service.patch_blueprint(spec.spec_json, instruction)
+        except patching.PatchError as e:
+            if not _patch_fallback(spec, e):
+                raise
+    if blueprint is None:
+        blueprint = ai_service.refine_blueprint(spec.spec_json, instruction)
+    revisions.commit_revision(spec, blueprint, SpecRevision.SOURCE_REFINE, instruction)
+    return spec
+
+
+def _checked_bundle(spec: Spec, language: str, framework: str, results: List[Dict]) -> Dict:
+    payload = codegen.bundle_payload(spec.id, language, framework, results)
+    if payload['implementation'] is None:
+        # Nothing usable came back; surface the first module's error
+        raise Exception(results[0]['error'])
+    return payload
+
+
+def generate_code_stubs(
+    spec: Spec,
+    language: str,
+    framework: str,
+    modules: Optional[List[str]] = None,
+    engine: Optional[str] = None,
+) -> Dict:
+    """Generate implementation code for the selected modules (default: all) and return the code-stubs payload."""
+    selected, _ = codegen.select_modules(spec.spec_json, modules)
+    results = codegen.generate_modules(spec.spec_json, selected, engine=engine)
+    return _checked_bundle(spec, language, framework, results)
+
+
+async def acreate_spec(user, concept: str) -> Spec:
+    """Async version of create_spec."""
+    blueprint = await ai_service.agenerate_blueprint(concept)
+    return await sync_to_async(save_spec)(user, concept, blueprint)
+
+
+async def areuse_spec(user, concept: str, mode: str) -> Optional[Tuple[Spec, Spec, float]]:
+    """Async version of reuse_spec."""
+    if mode == similarity.REUSE_OFF:
+        return None
+    return await sync_to_async(reuse_spec)(user, concept, mode)
+
+
+async def agenerate_batch(user, concepts: List[str], concurrency: Optional[int] = None) -> List[Dict]:
+    """Async version of generate_batch."""
+    concurrency, _ = batch_limits(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def generate(index, concept):
+        result = _batch_result(index, concept)
+        async with semaphore:
+            try:
+                result['blueprint'] = await ai_service.agenerate_blueprint(concept)
+                result['status'] = BATCH_OK
+                result['cached'] = ai_service.last_cache_hit()
+            except Exception as e:
+                _batch_failure(result, e)
+        return result
+
+    results = await asyncio.gather(*(generate(index, concept) for index, concept in enumerate(concepts)))
+    await sync_to_async(_save_batch)(user, results)
+    return results
+
+
+async def arefine_spec(spec: Spec, instruction: str, mode: Optional[str] = None) -> Spec:
+    """Async version of refine_spec."""
+    blueprint = None
+    if (mode or default_refine_mode()) == patching.REFINE_MODE_PATCH:
+        try:
+            blueprint = await ai_service.apatch_blueprint(spec.spec_json, instruction)
+        except patching.PatchError as e:
+            if not _patch_fallback(spec, e):
+                raise
+    if blueprint is None:
+        blueprint = await ai_service.arefine_blueprint(spec.spec_json, instruction)
+    await sync_to_async(revisions.commit_revision)(spec, blueprint, SpecRevision.SOURCE_REFINE, instruction)
+    return spec
+
+
+async def agenerate_code_stubs(
+    spec: Spec,
+    language: str,
+    framework: str,
+    modules: Optional[List[str]] = None,
+    engine: Optional[str] = None,
+) -> Dict:
+    """Async version of generate_code_stubs."""
+    selected, _ = codegen.select_modules(spec.spec_json, modules)
+    results = await codegen.agenerate_modules(spec.spec_json, selected, engine=engine)
+    return _checked_bundle(spec, language, framework, results)
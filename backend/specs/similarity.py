@@ -0,0 +1,400 @@
+"""
+Finding an existing blueprint for an idea before generating a new one.
+
+Ideas are compared as sets of terms: lowercased words with plurals folded
+and stopwords removed, including words nearly every idea has ("app",
+"system", "management"), so "inventory app for a bakery" and "bakery
+inventory system" are both {bakery, inventory}. Similarity is the Jaccard
+index of two term sets.
+
+IdeaIndex answers "which ideas have similarity >= threshold with this one"
+without comparing against every blueprint. It keeps, for each term and
+idea size, the ideas holding that term (an inverted index), and uses two
+filters from set-similarity search:
+- size: an idea of n terms can only reach threshold t with ideas of
+  ceil(t*n) to floor(n/t) terms, so only those sizes are read
+- prefix: such an idea shares at least ceil(t*n) of the query's terms, so
+  it holds one of any n - ceil(t*n) + 1 of them; only the postings of that
+  many of the query's rarest terms are read
+The candidates found are then scored exactly. A lookup's cost depends on
+how common the query's rarest terms are, not on how many ideas are
+indexed. It stops early once it has found MATCH_LIMIT identical ideas,
+and SPEC_SIMILARITY_MAX_CANDIDATES caps it (newest first) for ideas made
+only of very common words. Rows are stored in flat arrays, under 100
+bytes per blueprint.
+
+SimilarIdeas keeps an IdeaIndex per process, like the token blacklist
+filter (accounts.tokens): it is loaded on first use, picks up blueprints
+created by other processes every SPEC_SIMILARITY_REFRESH_INTERVAL seconds
+(by created_at, through specs_spec_created_idx) and is rebuilt every
+SPEC_SIMILARITY_REBUILD_INTERVAL seconds, which drops deleted blueprints
+and re-reads edited ideas. Blueprints this process creates are added at
+once (post_save, and explicitly after bulk inserts). Matches are always
+re-read from the database and re-scored, so a stale entry can only cost a
+missed match, never a wrong one.
+
+generate_spec uses find() when the request (or SPEC_REUSE_MODE) asks to
+reuse a similar blueprint instead of calling the model.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+import uuid
+from array import array
+from datetime import timedelta
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from . import telemetry
+from .models import Spec
+
+
+REUSE_OFF = 'off'
+REUSE_RETURN = 'return'
+REUSE_CLONE = 'clone'
+REUSE_MODES = (REUSE_OFF, REUSE_RETURN, REUSE_CLONE)
+
+# Matches taken from the index and checked against the database per lookup
+MATCH_LIMIT = 5
+
+# Rows re-read before the newest created_at seen on each refresh. created_at
+# is set when the row is saved, not committed, so a slow transaction can
+# commit a row older than the last one read.
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+LOAD_CHUNK = 10000
+
+# Postings are keyed by term id and idea size in one int
+_SIZE_BITS = 16
+_MAX_SIZE = (1 << _SIZE_BITS) - 1
+
+WORD = re.compile(r'[^\W_]+')
+
+STOPWORDS = frozenset('''
+    a about all also an and any are as at be but by can could do does each for from get has have how i if in into is
+    it its just like make me more my need new of on or our out over should so some such than that the their them
+    then there these they this to too up us use used using via want was we what when where which while who will
+    with would you your
+    app application apps basic build builder create custom digital easy full help manage management manager
+    managing online platform portal program project service simple site small software solution system tool
+    track tracker tracking web webapp website
+'''.split())
+
+
+def _stem(word: str) -> str:
+    """Fold the common English plurals, so "bakeries" and "bakery" are one term."""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 4 and word.endswith(('sses', 'shes', 'ches', 'xes')):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def terms(idea: str) -> FrozenSet[str]:
+    """The terms an idea is compared by."""
+    return frozenset(
+        _stem(word) for word in WORD.findall(idea.lower())
+        if word not in STOPWORDS and not word.isdigit()
+    ) - STOPWORDS
+
+
+def similarity(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    """Jaccard index of two term sets (0 when either is empty)."""
+    if not first or not second:
+        return 0.0
+    overlap = len(first & second)
+    return overlap / (len(first) + len(second) - overlap)
+
+
+class IdeaIndex:
+    """Inverted index over idea term sets, searched with size and prefix filtering."""
+
+    def __init__(self):
+        self._term_ids: Dict[str, int] = {}
+        self._frequency = array('I')  # rows holding each term
+        self._postings: Dict[int, array] = {}  # term id << _SIZE_BITS | size -> rows, oldest first
+        self._row_terms = array('I')  # every row's term ids, back to back
+        self._offsets = array('Q', [0])  # row r's terms are _row_terms[_offsets[r]:_offsets[r + 1]]
+        self._spec_ids = bytearray()  # 16 bytes per row
+        self._users = array('q')  # owner id per row, 0 for none
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def add(self, spec_id: uuid.UUID, user_id: Optional[int], idea: str) -> None:
+        idea_terms = terms(idea)
+        if not idea_terms:
+            return
+        size = min(len(idea_terms), _MAX_SIZE)
+        with self._lock:
+            term_ids = []
+            for term in idea_terms:
+                term_id = self._term_ids.get(term)
+                if term_id is None:
+                    term_id = self._term_ids[term] = len(self._frequency)
+                    self._frequency.append(0)
+                self._frequency[term_id] += 1
+                term_ids.append(term_id)
+            row = len(self._users)
+            self._row_terms.extend(term_ids)
+            self._offsets.append(len(self._row_terms))
+            self._spec_ids += spec_id.bytes
+            self._users.append(user_id or 0)
+            # Postings last: readers find a row only once the rest of it is in place
+            for term_id in term_ids:
+                key = term_id << _SIZE_BITS | size
+                posting = self._postings.get(key)
+                if posting is None:
+                    self._postings[key] = array('I', [row])
+                else:
+                    posting.append(row)
+
+    def search(self, idea: str, threshold: float, user_id: Optional[int] = None,
+               limit: int = MATCH_LIMIT, max_candidates: int = 2000) -> List[Tuple[float, uuid.UUID]]:
+        """
+        Up to limit (similarity, spec id) pairs at or above threshold, best first.
+
+        Ties go to the newer blueprint. With user_id, only that user's
+        blueprints are considered.
+        """
+        query = terms(idea)
+        size = len(query)
+        if not size or threshold <= 0:
+            return []
+        # Slightly loose bounds, so float rounding never drops an exact match
+        overlap = max(1, math.ceil(threshold * size - 1e-9))
+        sizes = range(overlap, min(math.floor(size / threshold + 1e-9), _MAX_SIZE) + 1)
+
+        known = [self._term_ids[term] for term in query if term in self._term_ids]
+        # A match holds `overlap` of the query's terms, so one of any size - overlap + 1
+        # of them. Terms never indexed count towards those with no rows to read.
+        probes = size - overlap + 1 - (size - len(known))
+        if probes <= 0:
+            return []
+        frequency = self._frequency
+        prefix = sorted(known, key=lambda term_id: frequency[term_id])[:probes]
+
+        query_ids = set(known)
+        row_terms, offsets = self._row_terms, self._offsets
+        scored, exact = [], 0
+        for row in self._candidates(prefix, sizes, size, user_id, max_candidates):
+            start, end = offsets[row], offsets[row + 1]
+            shared = len(query_ids.intersection(row_terms[start:end]))
+            score = shared / (size + (end - start) - shared)
+            if score >= threshold - 1e-9:
+                scored.append((score, row))
+                # Nothing can beat `limit` identical ideas
+                exact += shared == size == end - start
+                if exact >= limit:
+                    break
+        spec_ids = self._spec_ids
+        return [
+            (score, uuid.UUID(bytes=bytes(spec_ids[row * 16:row * 16 + 16])))
+            for score, row in heapq.nlargest(limit, scored)
+        ]
+
+    def _candidates(self, prefix: List[int], sizes: range, size: int, user_id: Optional[int],
+                    max_candidates: int) -> Iterator[int]:
+        """Distinct rows holding a prefix term, idea size nearest the query's first, newest first."""
+        postings, users = self._postings, self._users
+        seen = set()
+        for term_id in prefix:
+            for candidate_size in sorted(sizes, key=lambda candidate: abs(candidate - size)):
+                posting = postings.get(term_id << _SIZE_BITS | candidate_size)
+                if not posting:
+                    continue
+                for row in reversed(posting):
+                    if row in seen or (user_id is not None and users[row] != user_id):
+                        continue
+                    if len(seen) >= max_candidates:
+                        return
+                    seen.add(row)
+                    yield row
+
+    def stats(self) -> Dict:
+        return {
+            'rows': len(self._users),
+            'terms': len(self._term_ids),
+            'postings': len(self._postings),
+            'bytes': (
+                self._row_terms.itemsize * len(self._row_terms)
+                + self._offsets.itemsize * len(self._offsets)
+                + len(self._spec_ids)
+                + self._users.itemsize * len(self._users)
+                # Each row is in one posting per term
+                + self._row_terms.itemsize * len(self._row_terms)
+            ),
+        }
+
+
+def reuse_mode() -> str:
+    mode = getattr(settings, 'SPEC_REUSE_MODE', REUSE_OFF)
+    return mode if mode in REUSE_MODES else REUSE_OFF
+
+
+class SimilarIdeas:
+    """Per-process IdeaIndex over every blueprint's idea, kept current from the database."""
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'SPEC_SIMILARITY_INDEX', True)
+        self.interval = getattr(settings, 'SPEC_SIMILARITY_REFRESH_INTERVAL', 5)
+        self.rebuild_interval = getattr(settings, 'SPEC_SIMILARITY_REBUILD_INTERVAL', 3600)
+        self.max_candidates = getattr(settings, 'SPEC_SIMILARITY_MAX_CANDIDATES', 2000)
+        self.threshold = getattr(settings, 'SPEC_REUSE_MIN_SIMILARITY', 0.8)
+        self._index: Optional[IdeaIndex] = None
+        self._watermark = None  # newest created_at read from the database
+        self._recent: Dict[uuid.UUID, object] = {}  # ids added with their created_at, within the overlap
+        self._refreshed_at = float('-inf')
+        self._built_at = float('-inf')
+        self._lock = threading.Lock()
+        self._stats = {'lookups': 0, 'matches': 0, 'refreshes': 0, 'rebuilds': 0, 'errors': 0}
+        self._timings = {'lookup_ms': 0.0, 'refresh_ms': 0.0, 'rebuild_ms': 0.0}
+
+    def find(self, user, idea: str) -> Optional[Tuple[Spec, float]]:
+        """
+        (blueprint, similarity) of user's most similar blueprint at or above
+        SPEC_REUSE_MIN_SIMILARITY, or None.
+
+        Only user's own blueprints are considered: blueprints are private, and
+        a similar-sounding idea must not reveal another account's.
+        """
+        if not self.enabled:
+            return None
+        with telemetry.phase('similar'):
+            now = time.monotonic()
+            if now - self._refreshed_at >= self.interval:
+                self._refresh(now)
+            index = self._index
+            if index is None:
+                return None
+            self._stats['lookups'] += 1
+            started = time.perf_counter()
+            matches = index.search(idea, self.threshold, user_id=user.pk, max_candidates=self.max_candidates)
+            self._timings['lookup_ms'] = (time.perf_counter() - started) * 1000
+            if not matches:
+                return None
+
+            found = Spec.objects.filter(id__in=[spec_id for _, spec_id in matches], user=user)
+            specs = {spec.id: spec for spec in found}
+            query = terms(idea)
+            for _, spec_id in matches:
+                spec = specs.get(spec_id)
+                # The index may predate an edit to the idea
+                score = similarity(query, terms(spec.idea)) if spec is not None else 0.0
+                if score >= self.threshold:
+                    self._stats['matches'] += 1
+                    return spec, score
+        return None
+
+    def add(self, spec: Spec) -> None:
+        """Index a blueprint this process has just created."""
+        index = self._index
+        if index is not None and spec.id not in self._recent:
+            index.add(spec.id, spec.user_id, spec.idea)
+            self._recent[spec.id] = spec.created_at
+
+    def add_specs(self, specs: Iterable[Spec]) -> None:
+        for spec in specs:
+            self.add(spec)
+
+    def _refresh(self, now: float) -> None:
+        # One thread refreshes; the others keep answering from the current index
+        # (unless there is none yet, or every lookup must see the latest rows)
+        if not self._lock.acquire(blocking=self._index is None or not self.interval):
+            return
+        if now - self._refreshed_at < self.interval:
+            # Another thread refreshed while this one waited
+            self._lock.release()
+            return
+        try:
+            if self._index is None or now - self._built_at >= self.rebuild_interval:
+                self.rebuild()
+            else:
+                started = time.perf_counter()
+                queryset = Spec.objects.all()
+                if self._watermark is not None:
+                    queryset = queryset.filter(created_at__gte=self._watermark - REFRESH_OVERLAP)
+                self._watermark = self._load(self._index, queryset, self._recent, self._watermark)
+                self._stats['refreshes'] += 1
+                self._timings['refresh_ms'] = (time.perf_counter() - started) * 1000
+        except Exception:
+            # Until the next attempt, lookups use the current index (or find nothing)
+            self._stats['errors'] += 1
+        finally:
+            self._refreshed_at = now
+            self._lock.release()
+
+    def _load(self, index: IdeaIndex, queryset, recent: Dict, watermark):
+        """Add queryset's rows not in recent to index; returns the new watermark."""
+        rows = queryset.order_by('created_at').values_list('id', 'user_id', 'idea', 'created_at')
+        for spec_id, user_id, idea, created_at in rows.iterator(chunk_size=LOAD_CHUNK):
+            if spec_id in recent:
+                continue
+            index.add(spec_id, user_id, idea)
+            recent[spec_id] = created_at
+            if watermark is None or created_at > watermark:
+                watermark = created_at
+        if watermark is not None:
+            # Only ids a refresh can read again need remembering
+            cutoff = watermark - REFRESH_OVERLAP
+            for spec_id, created_at in list(recent.items()):
+                if created_at is None or created_at < cutoff:
+                    recent.pop(spec_id, None)
+        return watermark
+
+    def rebuild(self) -> None:
+        """Load every blueprint's idea into a new index and swap it in."""
+        started = time.perf_counter()
+        index, recent = IdeaIndex(), {}
+        watermark = self._load(index, Spec.objects.all(), recent, None)
+        # Blueprints this process creates meanwhile go to the old index; the
+        # next refresh reads them again, as they are newer than the watermark
+        self._index, self._recent, self._watermark = index, recent, watermark
+        self._built_at = self._refreshed_at = time.monotonic()
+        self._stats['rebuilds'] += 1
+        self._timings['rebuild_ms'] = (time.perf_counter() - started) * 1000
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index = None
+            self._recent = {}
+            self._watermark = None
+            self._refreshed_at = self._built_at = float('-inf')
+
+    def stats(self) -> Dict:
+        index = self._index
+        return {
+            **self._stats,
+            **{name: round(ms, 3) for name, ms in self._timings.items()},
+            **(index.stats() if index is not None else {'rows': 0, 'terms': 0, 'postings': 0, 'bytes': 0}),
+        }
+
+
+similar_ideas = SimilarIdeas()
+
+
+def index_created_spec(sender, instance, created, raw=False, **kwargs):
+    """post_save receiver: index a blueprint as soon as it is created."""
+    if created and not raw:
+        similar_ideas.add(instance)
+
+
+__all__ = [
+    'REUSE_OFF',
+    'REUSE_RETURN',
+    'REUSE_CLONE',
+    'REUSE_MODES',
+    'terms',
+    'similarity',
+    'IdeaIndex',
+    'reuse_mode',
+    'SimilarIdeas',
+    'similar_ideas',
+    'index_created_spec',
+]
@@ -0,0 +1,276 @@
+"""
+Request coalescing (single-flight) for AI completions.
+
+When several callers ask for the same prompt at once (a classroom submitting
+the same idea, a double-clicked button), only the first one, the leader,
+calls the model; the others wait for its answer. Calls are identified by the
+response cache key, and only the raw JSON text is shared, so every caller
+parses its own copy and goes on to save its own Spec row.
+
+Two scopes, selected with AI_SINGLEFLIGHT_BACKEND:
+- 'local': threads (sync views, job workers) and asyncio tasks of one process
+- 'database': additionally across processes, through an AIInFlightRequest row
+  per prompt. The leader publishes the response on its row; waiting
+  processes poll it every AI_SINGLEFLIGHT_POLL_INTERVAL seconds.
+
+A waiter gives up after AI_SINGLEFLIGHT_TIMEOUT seconds and calls the model
+itself, and a failed leader makes its local waiters fail the same way (remote
+waiters retry), so coalescing never changes what a caller can get back.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+import weakref
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+BACKEND_LOCAL = 'local'
+BACKEND_DATABASE = 'database'
+
+# How long a published response stays readable for processes still polling
+RESULT_GRACE = 5.0
+
+# DatabaseFlightLock.poll() states
+RUNNING = 'running'
+DONE = 'done'
+GONE = 'gone'
+
+
+class _Call:
+    """One in-progress upstream call and the threads waiting on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.content: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class DatabaseFlightLock:
+    """Cross-process leader election over the AIInFlightRequest table."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+
+    def acquire(self, key: str) -> bool:
+        """Try to become the leader for key; False if another process is answering it."""
+        from .models import AIInFlightRequest
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                AIInFlightRequest.objects.create(
+                    key=key, owner=self.owner, expires_at=now + timedelta(seconds=self.timeout)
+                )
+            return True
+        except IntegrityError:
+            # A crashed leader or an old published response must not block forever
+            AIInFlightRequest.objects.filter(key=key, expires_at__lte=now).delete()
+            return False
+
+    def poll(self, key: str) -> Tuple[str, Optional[str]]:
+        """Return (RUNNING|DONE|GONE, response) for another process's call."""
+        from .models import AIInFlightRequest
+        row = AIInFlightRequest.objects.filter(key=key).values('response', 'expires_at').first()
+        if row is None or row['expires_at'] <= timezone.now():
+            return GONE, None
+        if row['response'] is not None:
+            return DONE, row['response']
+        return RUNNING, None
+
+    def publish(self, key: str, content: str) -> None:
+        """Hand the response to waiting processes; the row expires shortly after."""
+        from .models import AIInFlightRequest
+        try:
+            AIInFlightRequest.objects.filter(key=key, owner=self.owner).update(
+                response=content, expires_at=timezone.now() + timedelta(seconds=RESULT_GRACE)
+            )
+        except DatabaseError:
+            logger.warning("Single-flight publish failed; waiters will retry", exc_info=True)
+
+    def release(self, key: str) -> None:
+        """Drop the lock without a response so a waiting process takes over."""
+        from .models import AIInFlightRequest
+        try:
+            AIInFlightRequest.objects.filter(key=key, owner=self.owner).delete()
+        except DatabaseError:
+            logger.warning("Single-flight release failed; the lock will expire", exc_info=True)
+
+
+class SingleFlight:
+    """Coalesce identical concurrent calls, keyed by prompt hash."""
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'AI_SINGLEFLIGHT_ENABLED', True)
+        self.backend = getattr(settings, 'AI_SINGLEFLIGHT_BACKEND', BACKEND_LOCAL)
+        self.timeout = getattr(settings, 'AI_SINGLEFLIGHT_TIMEOUT', 120.0)
+        self.poll_interval = getattr(settings, 'AI_SINGLEFLIGHT_POLL_INTERVAL', 0.2)
+        self.db_lock = DatabaseFlightLock(self.timeout) if self.backend == BACKEND_DATABASE else None
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._async_calls = weakref.WeakKeyDictionary()
+        self._stats = {'leaders': 0, 'followers': 0, 'remote_followers': 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Calls made upstream (leaders) and calls served by another caller's answer."""
+        with self._lock:
+            return dict(self._stats)
+
+    # Sync callers (threads)
+
+    def do(self, key: str, fn: Callable[[], str]) -> str:
+        """
+        Return fn()'s result, sharing one call among concurrent callers of key.
+
+        Args:
+            key: Identity of the call (the response cache key)
+            fn: Performs the upstream call and returns the raw JSON text
+
+        Returns:
+            str: The JSON text, from this caller's call or the leader's
+        """
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+            else:
+                self._stats['followers'] += 1
+
+        if not leader:
+            if call.done.wait(self.timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.content
+            logger.warning("Single-flight wait for %s timed out; calling upstream", key[:12])
+            return fn()
+
+        try:
+            call.content = self._lead(key, fn)
+            return call.content
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _lead(self, key: str, fn: Callable[[], str]) -> str:
+        if self.db_lock is None:
+            return fn()
+
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            try:
+                if self.db_lock.acquire(key):
+                    break
+                state, content = self.db_lock.poll(key)
+            except DatabaseError:
+                logger.warning("Single-flight lock table unavailable; calling upstream", exc_info=True)
+                return fn()
+            if state == DONE:
+                self._count('remote_followers')
+                return content
+            if state == RUNNING:
+                time.sleep(self.poll_interval)
+        else:
+            return fn()
+
+        try:
+            content = fn()
+        except BaseException:
+            self.db_lock.release(key)
+            raise
+        self.db_lock.publish(key, content)
+        return content
+
+    # Async callers (asyncio tasks of the current event loop)
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        """Async version of do(); coalesces tasks running on the same event loop."""
+        if not self.enabled:
+            return await fn()
+
+        loop = asyncio.get_running_loop()
+        calls = self._async_calls.setdefault(loop, {})
+        future = calls.get(key)
+        if future is not None:
+            self._count('followers')
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Single-flight wait for %s timed out; calling upstream", key[:12])
+                return await fn()
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled (client went away), not this caller
+                return await fn()
+
+        future = calls[key] = loop.create_future()
+        self._count('leaders')
+        try:
+            content = await self._alead(key, fn)
+            future.set_result(content)
+            return content
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited future does not log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            calls.pop(key, None)
+
+    async def _alead(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        if self.db_lock is None:
+            return await fn()
+
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            try:
+                if await sync_to_async(self.db_lock.acquire)(key):
+                    break
+                state, content = await sync_to_async(self.db_lock.poll)(key)
+            except DatabaseError:
+                logger.warning("Single-flight lock table unavailable; calling upstream", exc_info=True)
+                return await fn()
+            if state == DONE:
+                self._count('remote_followers')
+                return content
+            if state == RUNNING:
+                await asyncio.sleep(self.poll_interval)
+        else:
+            return await fn()
+
+        try:
+            content = await fn()
+        except BaseException:
+            await sync_to_async(self.db_lock.release)(key)
+            raise
+        await sync_to_async(self.db_lock.publish)(key, content)
+        return content
+
+
+__all__ = ['BACKEND_LOCAL', 'BACKEND_DATABASE', 'DatabaseFlightLock', 'SingleFlight']
@@ -0,0 +1,117 @@
+"""
+Helpers for streaming blueprint generation over Server-Sent Events.
+
+ModuleStreamParser consumes the model's JSON output chunk by chunk and emits
+each entry of the top-level "modules" array as soon as its closing brace
+arrives, so clients can render modules long before the completion finishes.
+"""
+import json
+from typing import AsyncIterator, Dict, Iterable, List
+
+from asgiref.sync import sync_to_async
+from rest_framework.renderers import BaseRenderer
+
+
+class ModuleStreamParser:
+    """Incremental scanner that extracts completed modules from partial spec JSON."""
+
+    def __init__(self):
+        self._text = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        self._in_modules = False
+        self._module_start = None
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Add a chunk of model output and return any modules it completed."""
+        self._text += chunk
+        modules = []
+
+        text = self._text
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = text[self._string_start + 1:pos]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char == ':' and self._depth == 1:
+                self._key = self._last_string
+            elif char in '{[':
+                self._depth += 1
+                if char == '[' and self._depth == 2 and self._key == 'modules':
+                    self._in_modules = True
+                elif char == '{' and self._depth == 3 and self._in_modules:
+                    self._module_start = pos
+            elif char in '}]':
+                if char == '}' and self._depth == 3 and self._module_start is not None:
+                    try:
+                        modules.append(json.loads(text[self._module_start:pos + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._module_start = None
+                elif char == ']' and self._depth == 2:
+                    self._in_modules = False
+                self._depth -= 1
+
+        self._pos = len(text)
+        return modules
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return self._text
+
+
+def sse_event(event: str, data) -> str:
+    """Format a single Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets `Accept: text/event-stream` pass DRF content negotiation.
+
+    Streaming views return their own StreamingHttpResponse; this renderer only
+    formats early errors (validation, configuration) as a single error event.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event('error', data).encode(self.charset)
+
+
+async def iterate_in_thread(iterable: Iterable) -> AsyncIterator:
+    """
+    Drive a blocking iterator from async code one item at a time.
+
+    Django buffers synchronous streaming iterators completely when serving
+    them under ASGI, which would defeat streaming.
+    """
+    iterator = iter(iterable)
+    sentinel = object()
+    while True:
+        item = await sync_to_async(next)(iterator, sentinel)
+        if item is sentinel:
+            return
+        yield item
+
+
+__all__ = ['ModuleStreamParser', 'sse_event', 'EventStreamRenderer', 'iterate_in_thread']
@@ -0,0 +1,467 @@
+"""
+Per-request timing breakdown and Prometheus metrics.
+
+ServerTimingMiddleware gives every request a RequestTimings, and hooks add
+time to named phases as the request runs:
+- auth: resolving the user from the JWT (specs.authentication, async views)
+- db: SQL queries on any connection (a database execute wrapper)
+- cache: AI response cache lookups
+- similar: looking for a similar existing blueprint (specs.similarity)
+- llm: upstream AI calls, including waiting on a coalesced call
+- parse: decoding the model's JSON
+- render: rendering the response body
+- compress: compressing it (specs.compression)
+
+Phases are inclusive and may overlap: a query made while authenticating
+counts in auth and db, and code-stub modules generated in parallel each add
+their llm time. The breakdown is sent in a Server-Timing header (browser dev
+tools show it) and observed into histograms; AI calls also go into a
+histogram labelled by endpoint, model and outcome. Background jobs are
+recorded the same way under the endpoint "job:<kind>".
+
+GET /metrics serves the histograms, plus the upstream transport,
+single-flight and connection pool counters, in the Prometheus text format.
+Histograms are per process: with several workers, scrape each one or run one
+worker per container.
+
+A request costs a handful of perf_counter() calls and dict updates, so it is
+on by default (TELEMETRY_ENABLED). Set METRICS_TOKEN to require
+"Authorization: Bearer <token>" on /metrics, and TELEMETRY_SERVER_TIMING to
+False to keep the breakdown out of responses.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotFound
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Order of phases in the Server-Timing header
+PHASES = ('auth', 'db', 'cache', 'similar', 'llm', 'parse', 'render', 'compress')
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (last one is +Inf), then sum and count
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            base = _labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                yield f'{self.name}_bucket{{{base}{"," if base else ""}le="{le}"}} {cumulative}'
+            yield f'{self.name}_sum{{{base}}} {series[-2]:.6f}'
+            yield f'{self.name}_count{{{base}}} {series[-1]}'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+REQUEST_DURATION = Histogram(
+    'erp_http_request_duration_seconds', "Time to serve a request, by route, method and status.",
+    ('endpoint', 'method', 'status'),
+)
+PHASE_DURATION = Histogram(
+    'erp_request_phase_seconds', "Time spent in each phase of a request (auth, db, cache, llm, parse, render).",
+    ('endpoint', 'phase'),
+)
+AI_CALL_DURATION = Histogram(
+    'erp_ai_call_duration_seconds', "AI completions by endpoint, model and outcome (cache_hit, ok, error, ...).",
+    ('endpoint', 'model', 'outcome'),
+)
+
+
+class RequestTimings:
+    """Accumulated phase durations (seconds) and counts for one request or job."""
+
+    def __init__(self, endpoint: Optional[str] = None, request=None, user_id: Optional[int] = None):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._endpoint = endpoint
+        self._request = request
+        self._user_id = user_id
+        self._lock = threading.Lock()
+
+    @property
+    def endpoint(self) -> str:
+        """The route pattern (e.g. api/specs/<uuid:spec_id>/), known once the URL resolved."""
+        if self._endpoint is None:
+            match = getattr(self._request, 'resolver_match', None)
+            if match is None:
+                return 'unmatched'
+            self._endpoint = match.route or match.view_name or 'unmatched'
+        return self._endpoint
+
+    @property
+    def user_id(self) -> Optional[int]:
+        """The user the work is done for: explicit, or the request's authenticated user."""
+        if self._user_id is None and self._request is not None:
+            user = getattr(self._request, 'user', None)
+            if user is not None and user.is_authenticated:
+                return user.pk
+        return self._user_id
+
+    def add(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in milliseconds."""
+        with self._lock:
+            durations, counts = dict(self.durations), dict(self.counts)
+        parts = []
+        for phase in PHASES + tuple(sorted(set(durations) - set(PHASES))):
+            if phase in durations:
+                part = f'{phase};dur={durations[phase] * 1000:.1f}'
+                if counts[phase] > 1:
+                    part += f';desc="{counts[phase]}x"'
+                parts.append(part)
+        parts.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(parts)
+
+    def observe(self, method: str, status: int) -> None:
+        """Record this request's duration and phases in the histograms."""
+        endpoint = self.endpoint
+        REQUEST_DURATION.observe(self.elapsed(), endpoint, method, str(status))
+        with self._lock:
+            durations = dict(self.durations)
+        for phase, seconds in durations.items():
+            PHASE_DURATION.observe(seconds, endpoint, phase)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+
+
+def enabled() -> bool:
+    return getattr(settings, 'TELEMETRY_ENABLED', True)
+
+
+def current() -> Optional[RequestTimings]:
+    """Timings of the request (or job) being handled in this context, if any."""
+    return _current.get()
+
+
+@contextmanager
+def phase(name: str):
+    """Add the time spent in the block to phase name of the current request."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def observe_ai_call(model: str, outcome: str, seconds: float) -> None:
+    timings = _current.get()
+    AI_CALL_DURATION.observe(seconds, timings.endpoint if timings else 'unknown', model, outcome)
+
+
+def _outcome(error: BaseException) -> str:
+    from .transport import CircuitOpenError
+    if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+        return 'cancelled'
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    if isinstance(error, TimeoutError):
+        return 'timeout'
+    if isinstance(error, ValueError):
+        return 'invalid_response'
+    return 'error'
+
+
+@contextmanager
+def ai_call(model: str):
+    """Time an upstream AI call as the llm phase and in the AI call histogram."""
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except BaseException as e:
+        outcome = _outcome(e)
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        timings = _current.get()
+        if timings is not None:
+            timings.add('llm', seconds)
+        observe_ai_call(model, outcome, seconds)
+
+
+@contextmanager
+def track(endpoint: str, user_id: Optional[int] = None):
+    """Record work done outside a request (background jobs) under endpoint, on behalf of user_id."""
+    if not enabled():
+        yield None
+        return
+    timings = RequestTimings(endpoint=endpoint, user_id=user_id)
+    token = _current.set(timings)
+    status = 200
+    try:
+        yield timings
+    except BaseException:
+        status = 500
+        raise
+    finally:
+        _current.reset(token)
+        timings.observe('JOB', status)
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper adding query time to the db phase."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', time.perf_counter() - started)
+
+
+def install_query_timer(sender=None, connection=None, **kwargs) -> None:
+    """connection_created receiver: time every query on the new connection."""
+    if connection is not None and time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class ServerTimingMiddleware:
+    """
+    Time each request, add a Server-Timing header and feed the histograms.
+
+    Put it first in MIDDLEWARE so the total covers the rest of the stack.
+    A streamed response gets the breakdown up to its headers; its histograms
+    are recorded once the body has been sent.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = enabled()
+        self.send_header = getattr(settings, 'TELEMETRY_SERVER_TIMING', True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        timings = RequestTimings(request=request)
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        timings = RequestTimings(request=request)
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    def process_template_response(self, request, response):
+        timings = _current.get()
+        if timings is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda _: timings.add('render', time.perf_counter() - started))
+        return response
+
+    def _finish(self, request, response, timings: RequestTimings):
+        if self.send_header:
+            response['Server-Timing'] = timings.server_timing()
+        if getattr(response, 'streaming', False):
+            return _observe_when_done(request, response, timings)
+        timings.observe(request.method, response.status_code)
+        return response
+
+
+def _observe_when_done(request, response, timings: RequestTimings):
+    """Attribute work done while streaming to the request, then record it."""
+    content = response.streaming_content
+    if response.is_async:
+        async def wrapped():
+            token = _current.set(timings)
+            try:
+                async for chunk in content:
+                    yield chunk
+            finally:
+                _reset(token)
+                timings.observe(request.method, response.status_code)
+    else:
+        def wrapped():
+            token = _current.set(timings)
+            try:
+                yield from content
+            finally:
+                _reset(token)
+                timings.observe(request.method, response.status_code)
+    response.streaming_content = wrapped()
+    return response
+
+
+def _reset(token) -> None:
+    # The body may be finished from another context than the one it began in
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(None)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    from .ai_service import ai_service
+    lines = []
+    for histogram in (REQUEST_DURATION, PHASE_DURATION, AI_CALL_DURATION):
+        lines.extend(histogram.collect())
+
+    transport = ai_service.transport.stats()
+    for name in ('requests', 'attempts', 'retries', 'successes', 'failures', 'breaker_rejections', 'budget_exhausted',
+                 'deadline_exceeded'):
+        metric = f'erp_ai_upstream_{name}_total'
+        lines += [f'# HELP {metric} Upstream transport {name.replace("_", " ")}.', f'# TYPE {metric} counter',
+                  f'{metric} {transport[name]}']
+    lines += ['# HELP erp_ai_breaker_state Circuit breaker state (1 for the current state).',
+              '# TYPE erp_ai_breaker_state gauge']
+    lines += [f'erp_ai_breaker_state{{state="{state}"}} {int(transport["breaker_state"] == state)}'
+              for state in ('closed', 'open', 'half_open')]
+    lines += ['# HELP erp_ai_retry_budget_tokens Retries currently allowed by the retry budget.',
+              '# TYPE erp_ai_retry_budget_tokens gauge', f'erp_ai_retry_budget_tokens {transport["retry_budget"]}']
+    lines += ['# HELP erp_ai_pool_connections Upstream HTTP pool connections by client and state.',
+              '# TYPE erp_ai_pool_connections gauge']
+    for client, pool in (('sync', transport['pool']), ('async', transport['async_pool'])):
+        lines += [f'erp_ai_pool_connections{{client="{client}",state="{state}"}} {pool[state]}'
+                  for state in ('active', 'idle', 'waiting')]
+
+    lines += ['# HELP erp_ai_singleflight_calls_total AI calls by single-flight role.',
+              '# TYPE erp_ai_singleflight_calls_total counter']
+    lines += [f'erp_ai_singleflight_calls_total{{role="{role}"}} {count}'
+              for role, count in sorted(ai_service.singleflight.stats().items())]
+
+    from .usage import ledger
+    usage = ledger.stats()
+    lines += ['# HELP erp_ai_usage_records_total Usage ledger records by state.',
+              '# TYPE erp_ai_usage_records_total counter']
+    lines += [f'erp_ai_usage_records_total{{state="{state}"}} {usage[state]}'
+              for state in ('recorded', 'written', 'dropped')]
+    lines += ['# HELP erp_ai_usage_pending Usage records buffered, not yet written.',
+              '# TYPE erp_ai_usage_pending gauge', f'erp_ai_usage_pending {usage["pending"]}']
+
+    from accounts.tokens import blacklist_filter
+    tokens = blacklist_filter.stats()
+    lines += ['# HELP erp_token_blacklist_checks_total Refresh token blacklist checks, and those the filter answered alone.',
+              '# TYPE erp_token_blacklist_checks_total counter']
+    lines += [f'erp_token_blacklist_checks_total{{result="{result}"}} {tokens[key]}'
+              for result, key in (('all', 'checks'), ('filter', 'passed'))]
+    lines += ['# HELP erp_token_blacklist_filter_loads_total Blacklist filter loads by kind.',
+              '# TYPE erp_token_blacklist_filter_loads_total counter']
+    lines += [f'erp_token_blacklist_filter_loads_total{{kind="{kind}"}} {tokens[kind]}'
+              for kind in ('refreshes', 'rebuilds', 'errors')]
+    lines += ['# HELP erp_token_blacklist_filter_entries Tokens in this process\'s blacklist filter.',
+              '# TYPE erp_token_blacklist_filter_entries gauge', f'erp_token_blacklist_filter_entries {tokens["entries"]}']
+    lines += ['# HELP erp_token_blacklist_filter_load_seconds Duration of the latest filter load by kind.',
+              '# TYPE erp_token_blacklist_filter_load_seconds gauge']
+    lines += [f'erp_token_blacklist_filter_load_seconds{{kind="{kind}"}} {tokens[f"{kind}_ms"] / 1000}'
+              for kind in ('refresh', 'rebuild')]
+
+    from .similarity import similar_ideas
+    ideas = similar_ideas.stats()
+    lines += ['# HELP erp_spec_similar_lookups_total Similar-idea lookups, and those that found a blueprint to reuse.',
+              '# TYPE erp_spec_similar_lookups_total counter']
+    lines += [f'erp_spec_similar_lookups_total{{result="{result}"}} {ideas[key]}'
+              for result, key in (('all', 'lookups'), ('match', 'matches'))]
+    lines += ['# HELP erp_spec_similar_index_loads_total Idea index loads by kind.',
+              '# TYPE erp_spec_similar_index_loads_total counter']
+    lines += [f'erp_spec_similar_index_loads_total{{kind="{kind}"}} {ideas[kind]}'
+              for kind in ('refreshes', 'rebuilds', 'errors')]
+    lines += ['# HELP erp_spec_similar_index_entries Blueprints in this process\'s idea index.',
+              '# TYPE erp_spec_similar_index_entries gauge', f'erp_spec_similar_index_entries {ideas["rows"]}']
+    lines += ['# HELP erp_spec_similar_index_bytes Approximate size of this process\'s idea index arrays.',
+              '# TYPE erp_spec_similar_index_bytes gauge', f'erp_spec_similar_index_bytes {ideas["bytes"]}']
+    lines += ['# HELP erp_spec_similar_seconds Duration of the latest lookup and index load by kind.',
+              '# TYPE erp_spec_similar_seconds gauge']
+    lines += [f'erp_spec_similar_seconds{{kind="{kind}"}} {ideas[f"{kind}_ms"] / 1000}'
+              for kind in ('lookup', 'refresh', 'rebuild')]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """GET /metrics: Prometheus scrape endpoint."""
+    if not enabled():
+        return HttpResponseNotFound()
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+__all__ = [
+    'PHASES',
+    'Histogram',
+    'RequestTimings',
+    'current',
+    'phase',
+    'ai_call',
+    'observe_ai_call',
+    'track',
+    'time_query',
+    'install_query_timer',
+    'ServerTimingMiddleware',
+    'render_metrics',
+    'metrics_view',
+]
@@ -1,3 +1,821 @@
-from django.test import TestCase
+import asyncio
+import copy
+import gzip
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import zipfile
+from datetime import timedelta
+from uuid import UUID
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import openai
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import codegen, jobs, local_codegen, patching, ratelimit, revisions, search, services, similarity
+from .ai_service import SYSTEM_PATCH_PROMPT, AIService, ai_service
+from .cache import AIResponseCacheStore, LRUCache
+from .models import AIResponseCache, Job, Spec, SpecRevision
+from .transport import BREAKER_HALF_OPEN, CircuitOpenError
+
+
+FAKE_LLM = os.path.join(settings.BASE_DIR, 'benchmarks', 'fake_llm.py')
+
+
+class FakeLLMTestCase(SimpleTestCase):
+    """Runs benchmarks/fake_llm.py with fake_llm_args for each test."""
+
+    fake_llm_args = ()
+
+    def setUp(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        self.server = subprocess.Popen(
+            [sys.executable, FAKE_LLM, '--port', str(port), *self.fake_llm_args],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self.addCleanup(self.server.wait)
+        self.addCleanup(self.server.terminate)
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port), 0.1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        self.base_url = f'http://127.0.0.1:{port}/v1'
+
+    def service(self) -> AIService:
+        service = AIService()
+        service.api_key = 'sk-test'
+        service.client = openai.OpenAI(
+            api_key=service.api_key, base_url=self.base_url, **service.transport.client_options()
+        )
+        service.async_client = openai.AsyncOpenAI(
+            api_key=service.api_key, base_url=self.base_url, **service.transport.async_client_options()
+        )
+        service.cache.enabled = False
+        return service
+
+
+@override_settings(AI_USAGE_ENABLED=False, AI_MAX_RETRIES=3, AI_RETRY_BACKOFF_BASE=0.05,
+                   AI_RETRY_BUDGET_CAPACITY=100, AI_BREAKER_FAILURE_THRESHOLD=0)
+class SlowUpstreamTimeoutTests(FakeLLMTestCase):
+    """A module's timeout bounds the whole upstream call, retries included."""
+
+    fake_llm_args = ('--latency-dist', 'fixed', '--latency-ms', '1000')
+
+    def test_timeout_is_not_multiplied_by_retries(self):
+        service = self.service()
+        started = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            service.generate_implementation({'title': 'Shop', 'modules': []}, 'orders', timeout=0.3)
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(service.transport.stats()['attempts'], 1)
+
+    def test_code_stubs_module_times_out_within_limit(self):
+        module = {'name': 'Orders', 'entities': []}
+        with mock.patch.object(codegen, 'ai_service', self.service()):
+            started = time.monotonic()
+            [result] = codegen.generate_modules({'modules': [module]}, [module], timeout=0.3, engine='llm')
+        self.assertEqual(result['status'], codegen.STATUS_TIMEOUT)
+        self.assertLess(time.monotonic() - started, 0.6)
+
+
+@override_settings(AI_USAGE_ENABLED=False, AI_MAX_RETRIES=3, AI_RETRY_BACKOFF_BASE=0.05,
+                   AI_RETRY_BUDGET_CAPACITY=100, AI_BREAKER_FAILURE_THRESHOLD=0)
+class FailingUpstreamTimeoutTests(FakeLLMTestCase):
+    """Retries of failed attempts stop at the deadline too."""
+
+    fake_llm_args = ('--latency-dist', 'fixed', '--latency-ms', '250', '--error-rate', '1', '--error-status', '503')
+
+    def test_retries_stop_at_deadline(self):
+        service = self.service()
+        started = time.monotonic()
+        with self.assertRaises(Exception):
+            service.generate_implementation({'title': 'Shop', 'modules': []}, 'orders', timeout=0.6)
+        self.assertLess(time.monotonic() - started, 0.9)
+        stats = service.transport.stats()
+        self.assertLess(stats['attempts'], 4)
+        self.assertGreaterEqual(stats['retries'], 1)
+
+
+@override_settings(AI_USAGE_ENABLED=False, AI_BREAKER_FAILURE_THRESHOLD=1, AI_BREAKER_RESET_TIMEOUT=0.1)
+class CancelledProbeTests(FakeLLMTestCase):
+    """A half-open probe that is cancelled lets the next call probe instead of keeping the breaker shut."""
+
+    fake_llm_args = ('--latency-dist', 'fixed', '--latency-ms', '1000')
+
+    def test_cancelled_probe_is_released(self):
+        service = self.service()
+        breaker = service.transport.breaker
+        breaker.record_failure()
+        time.sleep(0.15)
+
+        async def probe():
+            await asyncio.wait_for(
+                service.agenerate_implementation({'title': 'Shop', 'modules': []}, 'orders'), 0.2
+            )
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(probe())
+        self.assertEqual(breaker.state, BREAKER_HALF_OPEN)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            self.fail("breaker still held by the cancelled probe")
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+
+@override_settings(AI_CACHE_MAX_ENTRIES=2, AI_CACHE_EVICT_INTERVAL=3600)
+class CacheEvictionTests(TestCase):
+    def test_writes_evict_at_most_once_per_interval(self):
+        cache = AIResponseCacheStore()
+        for i in range(4):
+            cache.set(f'key{i}', '{}')
+        # Only the first write evicted, when the table held one row
+        self.assertEqual(AIResponseCache.objects.count(), 4)
+        self.assertEqual(cache.evict(), 2)
+        self.assertEqual(set(AIResponseCache.objects.values_list('key', flat=True)), {'key2', 'key3'})
+
+    @override_settings(AI_CACHE_EVICT_INTERVAL=0)
+    def test_no_eviction_on_writes_when_disabled(self):
+        cache = AIResponseCacheStore()
+        for i in range(3):
+            cache.set(f'key{i}', '{}')
+        self.assertEqual(AIResponseCache.objects.count(), 3)
+
+
+class CodegenTests(SimpleTestCase):
+    CODE = {'models_py': 'm', 'serializers_py': 's', 'views_py': 'v', 'urls_py': 'u'}
+
+    def implementation(self, blueprint, module_name, timeout=None):
+        if module_name == 'broken':
+            return {**self.CODE, 'views_py': ['not', 'code']}
+        return self.CODE
+
+    def test_non_string_code_fails_only_its_module(self):
+        modules = [{'name': 'Orders', 'entities': []}, {'name': 'Broken', 'entities': []}]
+        with mock.patch.object(codegen.ai_service, 'generate_implementation', side_effect=self.implementation):
+            archive = b''.join(codegen.stream_bundle_zip(
+                codegen.iter_module_implementations({'modules': modules}, modules, engine='llm'), {}
+            ))
+        with zipfile.ZipFile(io.BytesIO(archive)) as bundle:
+            self.assertEqual(bundle.read('orders/views.py'), b'v')
+            self.assertNotIn('broken/views.py', bundle.namelist())
+            statuses = {module['module_name']: module['status'] for module in json.loads(bundle.read('manifest.json'))['modules']}
+        self.assertEqual(statuses, {'orders': codegen.STATUS_OK, 'broken': codegen.STATUS_FAILED})
+
+
+    def test_closing_the_stream_cancels_pending_modules(self):
+        modules = [{'name': f'Module {i}', 'entities': []} for i in range(6)]
+        calls = []
+
+        def slow(blueprint, module_name, timeout=None):
+            calls.append(module_name)
+            time.sleep(0.2)
+            return self.CODE
+
+        with mock.patch.object(codegen.ai_service, 'generate_implementation', side_effect=slow):
+            results = codegen.iter_module_implementations({'modules': modules}, modules, concurrency=1, engine='llm')
+            next(results)
+            started = time.monotonic()
+            results.close()
+            self.assertLess(time.monotonic() - started, 0.15)
+            time.sleep(0.3)
+        self.assertLess(len(calls), len(modules))
+
+
+
+class LocalCodegenTests(SimpleTestCase):
+    def module(self, **api):
+        entity = {'name': 'Item', 'fields': [{'name': 'name', 'type': 'string'}]}
+        return {'name': 'Inventory', 'entities': [entity], 'apis': [{'entity': 'Item', **api}]}
+
+    def test_crud_api_renders(self):
+        module = self.module(method='GET', path='/api/items/')
+        self.assertEqual(local_codegen.unsupported_reasons(module), [])
+        self.assertIn("'items'", local_codegen.render_module(module)['urls_py'])
+
+    def test_non_string_method_or_path_is_unsupported(self):
+        for api in ({'method': 'GET', 'path': None}, {'method': 'GET', 'path': ['items']},
+                    {'method': ['GET'], 'path': '/items'}, {'method': None, 'path': '/items'}):
+            with self.subTest(api=api):
+                module = self.module(**api)
+                self.assertEqual(len(local_codegen.unsupported_reasons(module)), 1)
+                self.assertFalse(codegen.uses_local(module, codegen.ENGINE_HYBRID))
+                with self.assertRaises(ValueError):
+                    local_codegen.render_module(module)
+
+
+class CacheMemoryTierTests(TestCase):
+    def test_entries_expire(self):
+        memory = LRUCache(10)
+        memory.set('key', 'value', 0.05)
+        self.assertEqual(memory.get('key'), 'value')
+        time.sleep(0.06)
+        self.assertIsNone(memory.get('key'))
+        self.assertEqual(len(memory), 0)
+
+    @override_settings(AI_CACHE_TTL=60, AI_CACHE_LRU_TTL=0.05)
+    def test_clear_elsewhere_is_seen_within_the_memory_ttl(self):
+        cache, other = AIResponseCacheStore(), AIResponseCacheStore()
+        cache.set('key', '{}')
+        self.assertEqual(cache.get('key'), '{}')
+        other.clear()
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('key'))
+
+    @override_settings(AI_CACHE_TTL=60)
+    def test_row_expiry_bounds_the_memory_entry(self):
+        cache = AIResponseCacheStore()
+        cache.set('key', '{}')
+        cache.memory.clear()
+        AIResponseCache.objects.filter(key='key').update(expires_at=timezone.now() + timedelta(seconds=0.05))
+        self.assertEqual(cache.get('key'), '{}')
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('key'))
+
+
+@override_settings(AI_RATE_LIMIT_ENABLED=True, AI_RATE_LIMIT_STORE='memory',
+                   AI_RATE_LIMIT_PLANS={'default': {'generate': '2/hour'}}, AI_RATE_LIMIT_DEFAULT_PLAN='default')
+class RateLimitTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ann', 'ann@example.com', 'S3cure-pass-xy')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        patcher = mock.patch.object(ratelimit, 'limiter', ratelimit.RateLimiter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def generate(self, idea='A bakery shop'):
+        return self.client.post('/api/specs/generate/', {'idea': idea}, format='json')
+
+    def created(self):
+        return mock.patch.object(
+            services, 'create_spec',
+            side_effect=lambda user, idea: Spec.objects.create(user=user, idea=idea, spec_json={'modules': []}),
+        )
+
+    def test_over_the_limit_gets_429_with_retry_after(self):
+        with self.created(), mock.patch.object(ai_service, 'validate_api_key', return_value=True):
+            self.assertEqual(self.generate().status_code, 201)
+            self.assertEqual(self.generate().status_code, 201)
+            response = self.generate()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+    def test_invalid_requests_are_refunded(self):
+        for _ in range(3):
+            self.assertEqual(self.generate('').status_code, 400)
+        with self.created(), mock.patch.object(ai_service, 'validate_api_key', return_value=True):
+            self.assertEqual(self.generate().status_code, 201)
+
+    def test_reused_blueprints_are_refunded(self):
+        spec = Spec.objects.create(user=self.user, idea='A bakery', spec_json={'modules': []})
+        with mock.patch.object(services, 'reuse_spec', return_value=(spec, spec, 0.95)):
+            for _ in range(3):
+                response = self.generate()
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['X-Spec-Reused-From'], str(spec.pk))
+
+    def test_per_user_caches_are_bounded(self):
+        users = [self.user] + [User.objects.create_user(f'user{i}') for i in range(3)]
+        with mock.patch.object(ratelimit, 'USER_CACHE_SIZE', 2):
+            limiter = ratelimit.RateLimiter()
+        for user in users:
+            self.assertEqual(limiter.plan_for(user), 'default')
+            self.assertEqual(limiter.active_jobs(user), 0)
+        self.assertEqual(len(limiter._plan_cache), 2)
+        self.assertEqual(len(limiter._jobs_cache), 2)
+
+    def test_default_store_is_shared_between_processes(self):
+        with self.settings():
+            del settings.AI_RATE_LIMIT_STORE
+            first, second = ratelimit.RateLimiter(), ratelimit.RateLimiter()
+        self.assertIsInstance(first.store, ratelimit.DatabaseStore)
+        first.check(self.user, 'generate', 2)
+        with self.assertRaises(ratelimit.RateLimited):
+            second.check(self.user, 'generate')
+
+    def test_refund_never_overfills_the_bucket(self):
+        store = ratelimit.MemoryStore()
+        store.refund('key', 2, 3600)
+        self.assertEqual(store.take('key', 2, 3600, 2), 0.0)
+        self.assertGreater(store.take('key', 2, 3600), 0.0)
+
+
+@override_settings(AI_JOB_RUN_IN_PROCESS=False)
+class JobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ann', 'ann@example.com', 'S3cure-pass-xy')
+
+    def test_interrupted_job_is_marked_failed(self):
+        jobs.enqueue_job(self.user, Job.KIND_GENERATE, {'idea': 'A bakery'})
+        job = jobs.claim_next_job()
+        with mock.patch.object(services, 'create_spec', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                jobs.run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertEqual(job.error, "Job interrupted")
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(jobs.claim_next_job())
+
+
+class CorsTests(TestCase):
+    def test_frontend_can_read_conditional_and_rate_limit_headers(self):
+        user = User.objects.create_user('ann', 'ann@example.com', 'S3cure-pass-xy')
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/specs/', HTTP_ORIGIN='http://localhost:3000')
+        exposed = {header.strip().lower() for header in response['Access-Control-Expose-Headers'].split(',')}
+        for header in ('ETag', 'Retry-After', 'Location', 'Server-Timing', 'X-Spec-Reused-From', 'X-Spec-Similarity'):
+            self.assertIn(header.lower(), exposed)
+
+
+@override_settings(AI_USAGE_ENABLED=False, AI_RATE_LIMIT_STORE='memory',
+                   AI_RATE_LIMIT_PLANS={'default': {'concurrency': 1}}, AI_RATE_LIMIT_DEFAULT_PLAN='default')
+class AsyncCodeStubsTests(TransactionTestCase):
+    async def test_zip_is_streamed_and_holds_the_slot_until_sent(self):
+        from accounts.tokens import RefreshToken
+        user = await User.objects.acreate(username='ann', email='ann@example.com')
+        modules = [{'name': 'Orders', 'entities': []}, {'name': 'Invoices', 'entities': []}]
+        spec = await Spec.objects.acreate(user=user, idea='A shop', spec_json={'title': 'Shop', 'modules': modules})
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(user).access_token))()
+        client = AsyncClient()
+        limiter = await sync_to_async(ratelimit.RateLimiter)()
+        code = {'models_py': 'm', 'serializers_py': 's', 'views_py': 'v', 'urls_py': 'u'}
+
+        with mock.patch('specs.async_views.limiter', limiter), \
+                mock.patch.object(ai_service, 'validate_api_key', return_value=True), \
+                mock.patch.object(ai_service, 'agenerate_implementation', new=mock.AsyncMock(return_value=code)):
+            response = await client.post('/api/async/code-stubs/', {'spec_id': str(spec.id), 'bundle': 'zip'},
+                                         content_type='application/json', headers={'Authorization': f'Bearer {token}'})
+            self.assertTrue(response.streaming)
+            self.assertEqual(await sync_to_async(limiter.store.in_flight)(f'ai-slots:{user.pk}'), 1)
+            archive = b''.join([chunk async for chunk in response.streaming_content])
+            self.assertEqual(await sync_to_async(limiter.store.in_flight)(f'ai-slots:{user.pk}'), 0)
+
+        with zipfile.ZipFile(io.BytesIO(archive)) as bundle:
+            self.assertEqual(bundle.read('orders/models.py'), b'm')
+            self.assertEqual(bundle.read('invoices/urls.py'), b'u')
+            self.assertEqual(len(json.loads(bundle.read('manifest.json'))['modules']), 2)
+
+
+@override_settings(SPEC_REVISION_SNAPSHOT_INTERVAL=3)
+class RevisionTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('ann', 'ann@example.com', 'S3cure-pass-xy')
+        self.states = [None, self.blueprint(0)]
+        self.spec = services.save_spec(user, 'A shop', self.states[1])
+        for number in range(2, 9):
+            self.states.append(self.blueprint(number - 1))
+            revisions.commit_revision(self.spec, self.states[number], SpecRevision.SOURCE_REFINE, f'step {number}')
+
+    def blueprint(self, step):
+        """Each step renames, adds, drops and reorders something, including array items."""
+        modules = [{'name': f'Module {i}', 'entities': [{'name': f'E{i}', 'fields': [{'name': 'a'}] * (i % 3)}]}
+                   for i in range(step % 4 + 1)]
+        if step % 2:
+            modules.reverse()
+        return {'title': f'Shop v{step}', 'modules': modules, 'kpis': ['revenue'] * (step % 3)}
+
+    def kinds(self):
+        return list(self.spec.revisions.order_by('number').values_list('kind', flat=True))
+
+    def assert_round_trips(self, numbers=range(1, 9)):
+        spec = Spec.objects.get(pk=self.spec.pk)
+        for number in numbers:
+            with self.subTest(revision=number):
+                self.assertEqual(revisions.reconstruct(spec, number), self.states[number])
+
+    def test_snapshots_every_interval_and_every_revision_rebuilds(self):
+        snapshot, diff = SpecRevision.KIND_SNAPSHOT, SpecRevision.KIND_DIFF
+        self.assertEqual(self.kinds(), [snapshot, diff, diff, snapshot, diff, diff, snapshot, diff])
+        self.assert_round_trips()
+
+    def test_rollback_across_a_snapshot_boundary(self):
+        revision = revisions.rollback(self.spec, 3)
+        self.assertEqual(revision.number, 9)
+        self.assertEqual(self.spec.spec_json, self.states[3])
+        self.states.append(self.states[3])
+        self.assert_round_trips(range(1, 10))
+        self.assertEqual(revisions.reconstruct(Spec.objects.get(pk=self.spec.pk), 9), self.states[3])
+
+    def test_compaction_respaces_snapshots(self):
+        stats = revisions.compact_revisions(self.spec, interval=5)
+        self.assertEqual(stats['deleted'], 0)
+        self.assertEqual(self.kinds(), [SpecRevision.KIND_SNAPSHOT] + [SpecRevision.KIND_DIFF] * 4
+                         + [SpecRevision.KIND_SNAPSHOT] + [SpecRevision.KIND_DIFF] * 2)
+        self.assert_round_trips()
+
+    def test_compaction_keeps_the_latest_revisions(self):
+        before = self.kinds()
+        self.assertEqual(revisions.compact_revisions(self.spec, keep=4, dry_run=True)['deleted'], 4)
+        self.assertEqual(self.kinds(), before)
+
+        revisions.compact_revisions(self.spec, keep=4)
+        self.assertEqual(list(self.spec.revisions.order_by('number').values_list('number', flat=True)), [5, 6, 7, 8])
+        self.assertEqual(self.kinds()[0], SpecRevision.KIND_SNAPSHOT)
+        self.assert_round_trips(range(5, 9))
+        with self.assertRaises(SpecRevision.DoesNotExist):
+            revisions.reconstruct(Spec.objects.get(pk=self.spec.pk), 4)
+
+
+class PatchingTests(SimpleTestCase):
+    DOCUMENT = {'title': 'Shop', 'modules': [{'name': 'Orders', 'entities': []}, {'name': 'Invoices'}], 'kpis': ['a', 'b']}
+
+    def apply(self, *operations):
+        return patching.apply_patch(self.DOCUMENT, list(operations))
+
+    def test_add(self):
+        self.assertEqual(self.apply({'op': 'add', 'path': '/kpis/-', 'value': 'c'})['kpis'], ['a', 'b', 'c'])
+        self.assertEqual(self.apply({'op': 'add', 'path': '/kpis/0', 'value': 'c'})['kpis'], ['c', 'a', 'b'])
+        self.assertEqual(self.apply({'op': 'add', 'path': '/kpis/2', 'value': 'c'})['kpis'], ['a', 'b', 'c'])
+        self.assertEqual(self.apply({'op': 'add', 'path': '/modules/1/purpose', 'value': 'p'})['modules'][1],
+                         {'name': 'Invoices', 'purpose': 'p'})
+
+    def test_remove_and_replace(self):
+        self.assertEqual(self.apply({'op': 'remove', 'path': '/modules/0'})['modules'], [{'name': 'Invoices'}])
+        self.assertNotIn('kpis', self.apply({'op': 'remove', 'path': '/kpis'}))
+        self.assertEqual(self.apply({'op': 'replace', 'path': '/kpis/1', 'value': 'z'})['kpis'], ['a', 'z'])
+        self.assertEqual(self.apply({'op': 'replace', 'path': '', 'value': {}}), {})
+
+    def test_move_and_copy(self):
+        moved = self.apply({'op': 'move', 'from': '/modules/0', 'path': '/modules/-'})
+        self.assertEqual([module['name'] for module in moved['modules']], ['Invoices', 'Orders'])
+        copied = self.apply({'op': 'copy', 'from': '/kpis/0', 'path': '/title'})
+        self.assertEqual((copied['title'], copied['kpis']), ('a', ['a', 'b']))
+
+    def test_test_operation(self):
+        self.assertEqual(self.apply({'op': 'test', 'path': '/modules/1/name', 'value': 'Invoices'}), self.DOCUMENT)
+        with self.assertRaises(patching.PatchError):
+            self.apply({'op': 'test', 'path': '/modules/1/name', 'value': 'Orders'})
+
+    def test_escaped_pointer_tokens(self):
+        document = patching.apply_patch({'a/b': {'c~d': 1}}, [{'op': 'replace', 'path': '/a~1b/c~0d', 'value': 2}])
+        self.assertEqual(document, {'a/b': {'c~d': 2}})
+
+    def test_invalid_operations(self):
+        for operation in ({'op': 'add', 'path': '/kpis/3', 'value': 'c'}, {'op': 'add', 'path': '/kpis/01', 'value': 'c'},
+                          {'op': 'remove', 'path': '/kpis/-'}, {'op': 'remove', 'path': '/missing'},
+                          {'op': 'replace', 'path': '/missing', 'value': 1}, {'op': 'add', 'path': '/title/x', 'value': 1},
+                          {'op': 'move', 'from': '/modules', 'path': '/modules/0'}, {'op': 'add', 'path': 'kpis', 'value': 1},
+                          {'op': 'add', 'path': '/kpis'}, {'op': 'merge', 'path': '/kpis'}):
+            with self.subTest(operation=operation), self.assertRaises(patching.PatchError):
+                self.apply(operation)
+
+    def test_failing_operation_rolls_back_the_whole_patch(self):
+        document = copy.deepcopy(self.DOCUMENT)
+        with self.assertRaises(patching.PatchError):
+            patching.apply_patch(document, [
+                {'op': 'replace', 'path': '/title', 'value': 'Changed'},
+                {'op': 'remove', 'path': '/modules/0'},
+                {'op': 'remove', 'path': '/modules/5'},
+            ])
+        self.assertEqual(document, self.DOCUMENT)
+
+    def test_make_patch_round_trips(self):
+        new = {'title': 'Shop 2', 'modules': [{'name': 'Orders', 'entities': [{'name': 'Order'}]}], 'kpis': ['a', 'b', 'c'],
+               'a/b~': 1}
+        self.assertEqual(patching.apply_patch(self.DOCUMENT, patching.make_patch(self.DOCUMENT, new)), new)
+
+    def test_refinement_must_keep_the_blueprint_shape(self):
+        for operation in ({'op': 'replace', 'path': '/modules', 'value': {}}, {'op': 'replace', 'path': '/title', 'value': 3},
+                          {'op': 'remove', 'path': '/modules/0/name'},
+                          {'op': 'replace', 'path': '/modules/0/entities', 'value': 'none'}):
+            with self.subTest(operation=operation), self.assertRaises(patching.PatchError):
+                patching.apply_refinement(self.DOCUMENT, {'patch': [operation]})
+        with self.assertRaises(patching.PatchError):
+            patching.apply_refinement(self.DOCUMENT, {'operations': []})
+        refined = patching.apply_refinement(self.DOCUMENT, {'patch': [{'op': 'add', 'path': '/modules/-', 'value': {'name': 'CRM'}}]})
+        self.assertEqual(refined['modules'][-1], {'name': 'CRM'})
+
+
+class RefineFallbackTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('ann', 'ann@example.com', 'S3cure-pass-xy')
+        self.spec = services.save_spec(user, 'A shop', {'title': 'Shop', 'modules': [{'name': 'Orders'}]})
+        self.full = {'title': 'Shop', 'modules': [{'name': 'Orders'}, {'name': 'CRM'}]}
+
+    def refine(self, patch_response):
+        def complete(system_prompt, user_prompt, timeout=None):
+            return patch_response if system_prompt == SYSTEM_PATCH_PROMPT else self.full
+
+        with mock.patch.object(ai_service, '_complete_json', side_effect=complete) as completions:
+            services.refine_spec(self.spec, 'Add a CRM module', patching.REFINE_MODE_PATCH)
+        return completions.call_count
+
+    def test_applied_patch_needs_one_call(self):
+        self.assertEqual(self.refine({'patch': [{'op': 'add', 'path': '/modules/-', 'value': {'name': 'CRM'}}]}), 1)
+        self.assertEqual(self.spec.spec_json, self.full)
+        self.assertEqual(self.spec.revision, 2)
+
+    def test_rejected_patch_falls_back_to_full_refine(self):
+        with self.assertLogs('specs.services', 'WARNING'):
+            self.assertEqual(self.refine({'patch': [{'op': 'remove', 'path': '/modules/0/name'}]}), 2)
+        self.assertEqual(self.spec.spec_json, self.full)
+        self.assertEqual(revisions.reconstruct(self.spec, 1), {'title': 'Shop', 'modules': [{'name': 'Orders'}]})
+
+    @override_settings(AI_REFINE_PATCH_FALLBACK=False)
+    def test_rejected_patch_is_an_error_without_fallback(self):
+        with self.assertRaises(patching.PatchError), self.assertLogs('specs.services', 'WARNING'):
+            self.refine({'patch': [{'op': 'test', 'path': '/title', 'value': 'Other'}]})
+        self.spec.refresh_from_db()
+        self.assertEqual(self.spec.revision, 1)
+
+
+class SearchTestMixin:
+    def create(self, user, title, idea='An idea', modules=()):
+        return Spec.objects.create(user=user, idea=idea, spec_json={
+            'title': title, 'modules': [{'name': name, 'entities': []} for name in modules]
+        })
+
+    def found(self, query, user=None):
+        return [result['spec'].pk for result in search.search_specs(query, user)]
+
+
+class SearchTests(SearchTestMixin, TestCase):
+    def setUp(self):
+        self.ann = User.objects.create_user('ann', 'ann@example.com', 'S3cure-pass-xy')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'S3cure-pass-xy')
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        spec = self.create(self.ann, 'Bakery orders')
+        self.assertEqual(self.found('bakery', self.ann), [spec.pk])
+        spec.spec_json = {'title': 'Florist orders', 'modules': []}
+        spec.save()
+        self.assertEqual(self.found('bakery', self.ann), [])
+        self.assertEqual(self.found('florist', self.ann), [spec.pk])
+        spec.delete()
+        self.assertEqual(self.found('florist', self.ann), [])
+
+    def test_results_are_scoped_to_the_owner(self):
+        mine = self.create(self.ann, 'Bakery orders')
+        theirs = self.create(self.bob, 'Bakery stock')
+        self.assertEqual(self.found('bakery', self.ann), [mine.pk])
+        self.assertEqual(self.found('bakery', self.bob), [theirs.pk])
+        self.assertEqual(set(self.found('bakery')), {mine.pk, theirs.pk})
+        Spec.objects.filter(pk=theirs.pk).update(user=self.ann)
+        self.assertEqual(set(self.found('bakery', self.ann)), {mine.pk, theirs.pk})
+
+    def test_every_term_matches_as_a_prefix(self):
+        spec = self.create(self.ann, 'Shop', idea='Selling bread', modules=['Inventory Management'])
+        self.assertEqual(self.found('inv', self.ann), [spec.pk])
+        self.assertEqual(self.found('inv bre', self.ann), [spec.pk])
+        self.assertEqual(self.found('inv cake', self.ann), [])
+        # FTS syntax in the query is stripped, not interpreted
+        self.assertEqual(self.found('inv* "bre" (', self.ann), [spec.pk])
+        [result] = search.search_specs('inventory', self.ann)
+        self.assertIn('<mark>Inventory</mark>', result['highlights']['structure'])
+
+
+@skipUnless(connection.vendor == 'sqlite', "the FTS5 index is SQLite-only")
+class SearchRebuildTests(SearchTestMixin, TransactionTestCase):
+    def test_index_is_rebuilt_after_a_table_copy(self):
+        ann = User.objects.create_user('ann', 'ann@example.com', 'S3cure-pass-xy')
+        first = self.create(ann, 'Bakery orders')
+        second = self.create(ann, 'Florist orders')
+        first.delete()
+        # What Django's SQLite schema editor does for most ALTERs: copy the
+        # table, which drops its triggers and renumbers rowids
+        with connection.schema_editor() as editor:
+            editor._remake_table(Spec)
+        search.ensure_index()
+        self.assertEqual(self.found('florist', ann), [second.pk])
+        self.assertEqual(self.found('bakery', ann), [])
+        third = self.create(ann, 'Bakery stock')
+        self.assertEqual(self.found('bakery', ann), [third.pk])
+
+
+class ListPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ann', 'ann@example.com', 'S3cure-pass-xy')
+        other = User.objects.create_user('bob', 'bob@example.com', 'S3cure-pass-xy')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        start = timezone.now() - timedelta(days=1)
+        self.specs = []
+        for i in range(25):
+            spec = Spec.objects.create(user=self.user, idea=f'Idea {i}', spec_json={'title': f'Shop {i}', 'modules': []})
+            # Pairs share a timestamp, so the cursor has to break ties
+            Spec.objects.filter(pk=spec.pk).update(created_at=start + timedelta(minutes=i // 2))
+            self.specs.append(spec.pk)
+        Spec.objects.create(user=other, idea='Not mine', spec_json={'title': 'Other', 'modules': []})
+
+    def pages(self, url):
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            yield response.data
+            url = response.data['next']
+
+    def test_pages_cover_every_spec_once_newest_first(self):
+        pages = list(self.pages('/api/specs/?page_size=10'))
+        self.assertEqual([len(page['results']) for page in pages], [10, 10, 5])
+        ids = [UUID(item['id']) for page in pages for item in page['results']]
+        self.assertEqual(sorted(ids), sorted(self.specs))
+        self.assertEqual(len(set(ids)), 25)
+        created = [Spec.objects.get(pk=pk).created_at for pk in ids]
+        self.assertEqual(created, sorted(created, reverse=True))
+
+    def test_new_specs_do_not_shift_later_pages(self):
+        first = self.client.get('/api/specs/?page_size=10').data
+        Spec.objects.create(user=self.user, idea='New', spec_json={'title': 'New', 'modules': []})
+        second = self.client.get(first['next']).data
+        previous = self.client.get(second['previous']).data
+        self.assertEqual([item['id'] for item in previous['results']], [item['id'] for item in first['results']])
+        self.assertTrue(set(item['id'] for item in first['results']).isdisjoint(item['id'] for item in second['results']))
+
+    def test_page_size_is_capped(self):
+        Spec.objects.bulk_create(
+            Spec(user=self.user, idea=f'Bulk {i}', spec_json={'modules': []}) for i in range(100)
+        )
+        self.assertEqual(len(self.client.get('/api/specs/?page_size=500').data['results']), 100)
+        self.assertEqual(len(self.client.get('/api/specs/').data['results']), 10)
+
+
+class ConditionalReadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ann', 'ann@example.com', 'S3cure-pass-xy')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.spec = services.save_spec(self.user, 'A shop', {'title': 'Shop', 'modules': []})
+        self.url = f'/api/specs/{self.spec.pk}/'
+
+    def test_unchanged_blueprint_is_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_changed_blueprint_gets_a_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        revisions.commit_revision(self.spec, {'title': 'Shop 2', 'modules': []}, SpecRevision.SOURCE_REFINE)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['spec_json']['title'], 'Shop 2')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_other_users_blueprint_is_404_not_304(self):
+        etag = self.client.get(self.url)['ETag']
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('bob', 'bob@example.com', 'S3cure-pass-xy'))
+        self.assertEqual(other.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_listing_etag_follows_any_change_and_the_page(self):
+        etag = self.client.get('/api/specs/')['ETag']
+        self.assertEqual(self.client.get('/api/specs/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get('/api/specs/?page_size=5')['ETag'], etag)
+
+        revisions.commit_revision(self.spec, {'title': 'Shop 2', 'modules': []}, SpecRevision.SOURCE_REFINE)
+        response = self.client.get('/api/specs/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        services.save_spec(self.user, 'Another', {'title': 'Florist', 'modules': []})
+        response = self.client.get('/api/specs/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        # Deleting an older blueprint leaves the newest updated_at alone; the count still changes
+        etag = response['ETag']
+        self.spec.delete()
+        self.assertEqual(self.client.get('/api/specs/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(SPEC_IMPORT_BATCH_SIZE=2, SPEC_EXPORT_CHUNK_SIZE=2)
+class PortabilityTests(TestCase):
+    def setUp(self):
+        self.ann = User.objects.create_user('ann', 'ann@example.com', 'S3cure-pass-xy')
+        self.specs = [
+            services.save_spec(self.ann, f'Idea {i}', {'title': f'Shop {i}', 'modules': [{'name': f'Module {i}'}]})
+            for i in range(3)
+        ]
+        for i, spec in enumerate(self.specs):
+            Spec.objects.filter(pk=spec.pk).update(created_at=timezone.now() - timedelta(days=10 - i))
+        revisions.commit_revision(self.specs[0], {'title': 'Shop 0 v2', 'modules': []}, SpecRevision.SOURCE_REFINE)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def export(self, client, query=''):
+        response = client.get(f'/api/specs/export/{query}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def contents(self, user):
+        return [(spec.idea, spec.spec_json, spec.created_at)
+                for spec in Spec.objects.filter(user=user).order_by('created_at')]
+
+    def test_round_trip_into_another_account(self):
+        body = self.export(self.client_for(self.ann))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['idea'] for row in rows], ['Idea 0', 'Idea 1', 'Idea 2'])
+
+        bob = User.objects.create_user('bob', 'bob@example.com', 'S3cure-pass-xy')
+        response = self.client_for(bob).post('/api/specs/import/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['skipped'], response.data['errors']), (3, 0, 0))
+        self.assertEqual(self.contents(bob), self.contents(self.ann))
+        # Ids owned by someone else are replaced, and history restarts at revision 1
+        imported = Spec.objects.filter(user=bob)
+        self.assertTrue({spec.pk for spec in imported}.isdisjoint(spec.pk for spec in self.specs))
+        self.assertEqual({spec.revision for spec in imported}, {1})
+        self.assertEqual(revisions.reconstruct(imported.get(idea='Idea 0'), 1), {'title': 'Shop 0 v2', 'modules': []})
+
+    def test_gzip_round_trip_keeps_ids_and_reimport_skips(self):
+        ann = self.client_for(self.ann)
+        body = self.export(ann, '?compress=gzip')
+        Spec.objects.filter(user=self.ann).delete()
+        response = ann.post('/api/specs/import/', body, content_type='application/gzip')
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(set(Spec.objects.filter(user=self.ann).values_list('pk', flat=True)), {spec.pk for spec in self.specs})
+
+        response = ann.post('/api/specs/import/', gzip.decompress(body), content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['skipped']), (0, 3))
+
+    def test_invalid_rows_are_reported_and_dry_run_saves_nothing(self):
+        body = b'\n'.join([
+            json.dumps({'idea': 'Good', 'spec_json': {'title': 'Ok', 'modules': []}}).encode(),
+            b'{not json',
+            json.dumps({'idea': 'Bad', 'spec_json': {'modules': 'none'}}).encode(),
+        ])
+        bob = User.objects.create_user('bob', 'bob@example.com', 'S3cure-pass-xy')
+        response = self.client_for(bob).post('/api/specs/import/?dry_run=true', body, content_type='application/x-ndjson')
+        self.assertEqual((response.data['created'], response.data['errors']), (1, 2))
+        self.assertEqual([row['row'] for row in response.data['error_rows']], [2, 3])
+        self.assertFalse(Spec.objects.filter(user=bob).exists())
+
+
+class ReuseTests(TestCase):
+    IDEA = 'An online bakery selling bread, cakes and pastries with delivery'
+
+    def setUp(self):
+        self.ann = User.objects.create_user('ann', 'ann@example.com', 'S3cure-pass-xy')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'S3cure-pass-xy')
+        self.client = APIClient()
+        self.client.force_authenticate(self.ann)
+        similarity.similar_ideas.clear()
+        self.addCleanup(similarity.similar_ideas.clear)
+
+    def generate(self, reuse):
+        generated = mock.patch.object(
+            services, 'create_spec',
+            side_effect=lambda user, idea: Spec.objects.create(user=user, idea=idea, spec_json={'title': 'New', 'modules': []}),
+        )
+        with generated as create_spec, mock.patch.object(ai_service, 'validate_api_key', return_value=True):
+            response = self.client.post('/api/specs/generate/', {'idea': self.IDEA, 'reuse': reuse}, format='json')
+        return response, create_spec.call_count
+
+    def test_another_users_blueprint_is_never_reused(self):
+        services.save_spec(self.bob, self.IDEA, {'title': "Bob's bakery", 'modules': []})
+        for mode in ('return', 'clone'):
+            with self.subTest(mode=mode):
+                response, generated = self.generate(mode)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(generated, 1)
+                self.assertNotIn('X-Spec-Reused-From', response)
+                self.assertEqual(response.data['spec_json']['title'], 'New')
+                Spec.objects.filter(user=self.ann).delete()
+
+    def test_own_blueprint_is_returned_or_cloned(self):
+        own = services.save_spec(self.ann, self.IDEA, {'title': "Ann's bakery", 'modules': []})
+        response, generated = self.generate('return')
+        self.assertEqual((response.status_code, generated), (200, 0))
+        self.assertEqual(response['X-Spec-Reused-From'], str(own.pk))
+
+        response, generated = self.generate('clone')
+        self.assertEqual((response.status_code, generated), (201, 0))
+        self.assertEqual(response['X-Spec-Reused-From'], str(own.pk))
+        self.assertEqual(Spec.objects.get(pk=response.data['id']).user, self.ann)
+
+    def test_blueprint_given_away_after_indexing_is_not_reused(self):
+        own = services.save_spec(self.ann, self.IDEA, {'title': "Ann's bakery", 'modules': []})
+        self.assertEqual(self.generate('return')[0].status_code, 200)
+        # The per-process index still lists the old owner until its next refresh
+        Spec.objects.filter(pk=own.pk).update(user=self.bob)
+        response, generated = self.generate('return')
+        self.assertEqual((response.status_code, generated), (201, 1))
+
+    def test_reuse_off_always_generates(self):
+        services.save_spec(self.ann, self.IDEA, {'title': "Ann's bakery", 'modules': []})
+        self.assertEqual(self.generate('off')[1], 1)
@@ -0,0 +1,387 @@
+"""
+Resilient transport for the upstream OpenAI API.
+
+AIService talks to OpenAI through one UpstreamTransport, which provides:
+- a shared keep-alive connection pool (AI_HTTP_MAX_CONNECTIONS,
+  AI_HTTP_MAX_KEEPALIVE, AI_HTTP_KEEPALIVE_EXPIRY) with separate connect,
+  read, write and pool-wait timeouts
+- up to AI_MAX_RETRIES retries of 408/409/429/5xx responses and connection
+  errors, with exponential backoff and full jitter. A server's Retry-After is
+  honoured, and a request is not retried if it asks for longer than
+  AI_RETRY_MAX_DELAY.
+- an optional deadline per call covering every attempt and backoff, so a
+  caller's timeout (e.g. AI_CODEGEN_MODULE_TIMEOUT) bounds the whole call:
+  a retry is only made if it can start before the deadline, and each
+  attempt gets the time left as its request timeout (remaining())
+- a retry budget: retries may add at most AI_RETRY_BUDGET_RATIO extra
+  requests per original request, so a degraded provider is not hit with a
+  multiple of normal traffic
+- a circuit breaker: once at least AI_BREAKER_FAILURE_THRESHOLD of the last
+  AI_BREAKER_WINDOW attempts failed, and they make up AI_BREAKER_FAILURE_RATE
+  of them, calls fail fast with CircuitOpenError for AI_BREAKER_RESET_TIMEOUT
+  seconds, then a single probe decides whether to close it again
+- counters and pool usage for monitoring (stats())
+
+The SDK's own retries are disabled so every attempt goes through this layer.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+import openai
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying (the same set the OpenAI SDK retries)
+RETRYABLE_STATUS = {408, 409, 429}
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"AI service temporarily unavailable, retry in {retry_after:.0f}s")
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether error is a transient upstream failure (rate limit, 5xx, network)."""
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return isinstance(error, openai.APIConnectionError)
+
+
+def deadline_after(timeout: Optional[float]) -> Optional[float]:
+    """time.monotonic() deadline timeout seconds from now, or None for no deadline."""
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left before deadline (a small positive minimum), or None for no deadline."""
+    if deadline is None:
+        return None
+    return max(0.001, deadline - time.monotonic())
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Delay requested by the server through retry-after-ms or Retry-After, if any."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if 'retry-after-ms' in headers:
+            return max(0.0, float(headers['retry-after-ms']) / 1000.0)
+        value = headers.get('retry-after')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """
+    Token bucket that caps retries to a fraction of original requests.
+
+    Every original request deposits `ratio` tokens (up to `capacity`) and every
+    retry withdraws one, so sustained failures cannot multiply upstream load.
+    """
+
+    def __init__(self, ratio: float, capacity: float):
+        self.ratio = ratio
+        self.capacity = capacity
+        self._tokens = capacity
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker over the last `window` attempts.
+
+    It opens when the window holds at least `failure_threshold` failures that
+    are at least `failure_rate` of the outcomes, so scattered errors under
+    heavy concurrency do not trip it but a provider that is mostly failing
+    does. After `reset_timeout` seconds a single half-open probe decides
+    whether to close it or keep it open.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, failure_rate: float = 0.5, window: int = 20):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_rate = failure_rate
+        self.outcomes = deque(maxlen=max(window, failure_threshold, 1))
+        self.state = BREAKER_CLOSED
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go upstream now."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == BREAKER_OPEN and remaining <= 0:
+                self.state = BREAKER_HALF_OPEN
+            if self.state == BREAKER_HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(max(remaining, 1.0))
+
+    def release(self) -> None:
+        """
+        End a call that was abandoned (cancelled, interrupted) without an outcome.
+
+        A half-open probe that never finished would otherwise keep every
+        later call out; the next call becomes the probe instead.
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.outcomes.append(False)
+            if self.state != BREAKER_CLOSED:
+                logger.info("AI circuit breaker closed")
+                self.outcomes.clear()
+            self.state = BREAKER_CLOSED
+            self._probing = False
+
+    def record_failure(self) -> None:
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self.outcomes.append(True)
+            self._probing = False
+            failures = sum(self.outcomes)
+            tripped = failures >= self.failure_threshold and failures >= self.failure_rate * len(self.outcomes)
+            if self.state == BREAKER_HALF_OPEN or (self.state == BREAKER_CLOSED and tripped):
+                if self.state == BREAKER_CLOSED:
+                    logger.warning("AI circuit breaker opened: %d of the last %d attempts failed", failures, len(self.outcomes))
+                self.state = BREAKER_OPEN
+                self.opened_at = time.monotonic()
+
+
+def _pool_stats(client) -> Dict[str, int]:
+    """Connection counts of an httpx client's pool (0s if httpx internals change)."""
+    pool = getattr(getattr(client, '_transport', None), '_pool', None)
+    connections = list(getattr(pool, 'connections', None) or [])
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {
+        'connections': len(connections),
+        'active': len(connections) - idle,
+        'idle': idle,
+        'waiting': max(0, len(getattr(pool, '_requests', None) or []) - (len(connections) - idle)),
+    }
+
+
+class UpstreamTransport:
+    """Pooled HTTP clients plus retry, budget and circuit-breaker policy for OpenAI calls."""
+
+    def __init__(self):
+        self.max_retries = getattr(settings, 'AI_MAX_RETRIES', 3)
+        self.backoff_base = getattr(settings, 'AI_RETRY_BACKOFF_BASE', 0.5)
+        self.max_delay = getattr(settings, 'AI_RETRY_MAX_DELAY', 20.0)
+        self.budget = RetryBudget(
+            getattr(settings, 'AI_RETRY_BUDGET_RATIO', 0.2),
+            getattr(settings, 'AI_RETRY_BUDGET_CAPACITY', 10.0),
+        )
+        self.breaker = CircuitBreaker(
+            getattr(settings, 'AI_BREAKER_FAILURE_THRESHOLD', 5),
+            getattr(settings, 'AI_BREAKER_RESET_TIMEOUT', 30.0),
+            getattr(settings, 'AI_BREAKER_FAILURE_RATE', 0.5),
+            getattr(settings, 'AI_BREAKER_WINDOW', 20),
+        )
+        self.limits = httpx.Limits(
+            max_connections=getattr(settings, 'AI_HTTP_MAX_CONNECTIONS', 20),
+            max_keepalive_connections=getattr(settings, 'AI_HTTP_MAX_KEEPALIVE', 10),
+            keepalive_expiry=getattr(settings, 'AI_HTTP_KEEPALIVE_EXPIRY', 30.0),
+        )
+        self.timeout = httpx.Timeout(
+            connect=getattr(settings, 'AI_HTTP_CONNECT_TIMEOUT', 5.0),
+            read=getattr(settings, 'AI_HTTP_READ_TIMEOUT', 120.0),
+            write=getattr(settings, 'AI_HTTP_WRITE_TIMEOUT', 30.0),
+            pool=getattr(settings, 'AI_HTTP_POOL_TIMEOUT', 10.0),
+        )
+        self.http_client = None
+        self.async_http_client = None
+        self._counters = {
+            'requests': 0,
+            'attempts': 0,
+            'retries': 0,
+            'successes': 0,
+            'failures': 0,
+            'breaker_rejections': 0,
+            'budget_exhausted': 0,
+            'deadline_exceeded': 0,
+        }
+        self._lock = threading.Lock()
+
+    def client_options(self) -> Dict[str, Any]:
+        """Keyword arguments for openai.OpenAI(): shared pool, timeouts, no SDK retries."""
+        if self.http_client is None:
+            self.http_client = openai.DefaultHttpxClient(limits=self.limits, timeout=self.timeout)
+        return {'http_client': self.http_client, 'timeout': self.timeout, 'max_retries': 0}
+
+    def async_client_options(self) -> Dict[str, Any]:
+        """Keyword arguments for openai.AsyncOpenAI()."""
+        if self.async_http_client is None:
+            self.async_http_client = openai.DefaultAsyncHttpxClient(limits=self.limits, timeout=self.timeout)
+        return {'http_client': self.async_http_client, 'timeout': self.timeout, 'max_retries': 0}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def _retry_delay(self, attempt: int, error: BaseException, deadline: Optional[float] = None) -> Optional[float]:
+        """Seconds to wait before retry number attempt + 1, or None to give up."""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.backoff_base * (2 ** attempt)))
+        requested = retry_after_seconds(error)
+        if requested is not None:
+            if requested > self.max_delay:
+                return None
+            delay = max(delay, requested)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            self._count('deadline_exceeded')
+            return None
+        if not self.budget.withdraw():
+            self._count('budget_exhausted')
+            return None
+        return delay
+
+    def _record(self, error: BaseException) -> None:
+        # Only transient failures count against the provider; a 400 means it is up
+        if is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def call(self, fn: Callable[[], Any], deadline: Optional[float] = None) -> Any:
+        """
+        Run fn (one upstream request) with retries, budget and circuit breaker.
+
+        With a deadline (see deadline_after()), no retry starts after it; fn
+        should pass remaining(deadline) as its request timeout.
+        """
+        self._count('requests')
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._count('breaker_rejections')
+                raise
+            self._count('attempts')
+            try:
+                result = fn()
+            except Exception as e:
+                self._record(e)
+                delay = self._retry_delay(attempt, e, deadline)
+                if delay is None:
+                    self._count('failures')
+                    raise
+                logger.info("Retrying AI request in %.2fs after %s", delay, type(e).__name__)
+                self._count('retries')
+                attempt += 1
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # GeneratorExit, KeyboardInterrupt...: no outcome, but free the probe slot
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            self._count('successes')
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], deadline: Optional[float] = None) -> Any:
+        """Async version of call()."""
+        self._count('requests')
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._count('breaker_rejections')
+                raise
+            self._count('attempts')
+            try:
+                result = await fn()
+            except Exception as e:
+                self._record(e)
+                delay = self._retry_delay(attempt, e, deadline)
+                if delay is None:
+                    self._count('failures')
+                    raise
+                logger.info("Retrying AI request in %.2fs after %s", delay, type(e).__name__)
+                self._count('retries')
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (asyncio.wait_for timeout, client gone): free the probe slot
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            self._count('successes')
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters, breaker state, retry budget and connection pool usage."""
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            'breaker_state': self.breaker.state,
+            'retry_budget': round(self.budget.tokens, 2),
+            'pool': _pool_stats(self.http_client),
+            'async_pool': _pool_stats(self.async_http_client),
+        }
+
+
+__all__ = [
+    'CircuitOpenError',
+    'is_retryable',
+    'deadline_after',
+    'remaining',
+    'retry_after_seconds',
+    'RetryBudget',
+    'CircuitBreaker',
+    'UpstreamTransport',
+]
@@ -3,8 +3,19 @@ from . import views
 
 urlpatterns = [
     path('specs/generate/', views.generate_spec, name='generate_spec'),
+    path('specs/generate/stream/', views.generate_spec_stream, name='generate_spec_stream'),
+    path('specs/generate/batch/', views.generate_spec_batch, name='generate_spec_batch'),
+    path('specs/search/', views.search_specs, name='search_specs'),
+    path('specs/export/', views.export_specs, name='export_specs'),
+    path('specs/import/', views.import_specs, name='import_specs'),
     path('specs/<uuid:spec_id>/', views.get_spec, name='get_spec'),
     path('specs/', views.list_specs, name='list_specs'),
     path('specs/refine/<uuid:spec_id>/', views.refine_spec, name='refine_spec'),
+    path('specs/<uuid:spec_id>/revisions/', views.list_spec_revisions, name='list_spec_revisions'),
+    path('specs/<uuid:spec_id>/revisions/<int:number>/', views.get_spec_revision, name='get_spec_revision'),
+    path('specs/<uuid:spec_id>/revisions/<int:number>/rollback/', views.rollback_spec, name='rollback_spec'),
     path('code-stubs/', views.generate_code_stubs, name='generate_code_stubs'),
+    path('jobs/<uuid:job_id>/', views.get_job, name='get_job'),
+    path('usage/', views.my_usage, name='my_usage'),
+    path('usage/summary/', views.usage_summary, name='usage_summary'),
 ]
@@ -0,0 +1,268 @@
+"""
+Token usage accounting for upstream AI calls.
+
+AIService reports every call it makes upstream (not cache hits or coalesced
+waiters) to the process-wide UsageLedger: tokens from response.usage,
+latency, model, prompt size and outcome, attributed to the user and endpoint
+of the current request or job (see telemetry).
+
+record() only appends to an in-memory buffer, so the request path makes no
+database round-trip. A background thread flushes the buffer every
+AI_USAGE_FLUSH_INTERVAL seconds, or sooner once AI_USAGE_BATCH_SIZE calls
+are waiting. A flush is one bulk INSERT into the AIUsageRecord ledger plus
+one increment per (day, user, endpoint, model) of the AIUsageDaily rollup,
+in one transaction. Reports read the rollup, so their cost does not grow
+with the ledger.
+
+If the database is unavailable, records stay buffered (up to
+AI_USAGE_MAX_BUFFER; the oldest are dropped beyond that) and the next flush
+retries them. The buffer is also flushed at interpreter exit.
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import telemetry
+
+
+logger = logging.getLogger(__name__)
+
+
+def _usage_numbers(usage) -> Dict[str, int]:
+    """Token counts from an OpenAI usage object (or None)."""
+    prompt = getattr(usage, 'prompt_tokens', None) or 0
+    completion = getattr(usage, 'completion_tokens', None) or 0
+    total = getattr(usage, 'total_tokens', None) or prompt + completion
+    return {'prompt_tokens': prompt, 'completion_tokens': completion, 'total_tokens': total}
+
+
+class UsageLedger:
+    """Buffers usage records in memory and writes them in batches."""
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'AI_USAGE_ENABLED', True)
+        self.flush_interval = getattr(settings, 'AI_USAGE_FLUSH_INTERVAL', 5.0)
+        self.batch_size = getattr(settings, 'AI_USAGE_BATCH_SIZE', 200)
+        self.max_buffer = getattr(settings, 'AI_USAGE_MAX_BUFFER', 10000)
+        self._buffer: List = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'flushes': 0, 'flush_errors': 0}
+
+    def record(self, model: str, usage, latency: float, prompt_chars: int = 0, outcome: str = 'ok') -> None:
+        """
+        Buffer one upstream call.
+
+        Args:
+            model: Model the call went to
+            usage: response.usage from the OpenAI SDK (None if unknown)
+            latency: Seconds spent upstream, including retries
+            prompt_chars: Length of the system and user prompts
+            outcome: 'ok' or 'error'
+        """
+        if not self.enabled:
+            return
+        from .models import AIUsageRecord
+        timings = telemetry.current()
+        entry = AIUsageRecord(
+            user_id=timings.user_id if timings else None,
+            endpoint=(timings.endpoint if timings else 'unknown')[:100],
+            model=model[:50],
+            outcome=outcome,
+            prompt_chars=prompt_chars,
+            latency_ms=int(latency * 1000),
+            created_at=timezone.now(),
+            **_usage_numbers(usage),
+        )
+        with self._lock:
+            self._buffer.append(entry)
+            self._stats['recorded'] += 1
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self._stats['dropped'] += overflow
+            full = len(self._buffer) >= self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='ai-usage-flush', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("AI usage flush failed")
+
+    def flush(self) -> int:
+        """Write buffered records and update the daily rollup. Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                write_batch(batch)
+            except DatabaseError:
+                logger.warning("Could not write %d AI usage records; will retry", len(batch), exc_info=True)
+                with self._lock:
+                    self._buffer[:0] = batch
+                    overflow = len(self._buffer) - self.max_buffer
+                    if overflow > 0:
+                        del self._buffer[:overflow]
+                        self._stats['dropped'] += overflow
+                    self._stats['flush_errors'] += 1
+                return 0
+            with self._lock:
+                self._stats['written'] += len(batch)
+                self._stats['flushes'] += 1
+            return len(batch)
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, 'pending': len(self._buffer)}
+
+
+def write_batch(records: List) -> None:
+    """Insert ledger rows and add them to AIUsageDaily, atomically."""
+    from django.contrib.auth.models import User
+    from .models import AIUsageDaily, AIUsageRecord
+    # A user deleted since the call keeps their ledger rows; their rollup goes to no user
+    user_ids = {record.user_id for record in records if record.user_id is not None}
+    existing = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True)) if user_ids else set()
+    totals = defaultdict(lambda: defaultdict(int))
+    for record in records:
+        user_id = record.user_id if record.user_id in existing else None
+        key = (timezone.localdate(record.created_at), user_id, record.endpoint, record.model)
+        row = totals[key]
+        row['calls'] += 1
+        row['errors'] += record.outcome != AIUsageRecord.OUTCOME_OK
+        for field in ('prompt_tokens', 'completion_tokens', 'total_tokens', 'latency_ms'):
+            row[field] += getattr(record, field)
+
+    with transaction.atomic():
+        AIUsageRecord.objects.bulk_create(records, batch_size=500)
+        for (day, user_id, endpoint, model), row in totals.items():
+            _add_to_rollup(AIUsageDaily, day, user_id, endpoint, model, row)
+
+
+def _add_to_rollup(AIUsageDaily, day, user_id, endpoint: str, model: str, row: Dict[str, int]) -> None:
+    lookup = dict(day=day, user_id=user_id, endpoint=endpoint, model=model)
+    increments = {field: F(field) + value for field, value in row.items()}
+    if AIUsageDaily.objects.filter(**lookup).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            AIUsageDaily.objects.create(**lookup, **row)
+    except IntegrityError:
+        # Another process created the row in the meantime
+        AIUsageDaily.objects.filter(**lookup).update(**increments)
+
+
+def rebuild_rollup(since: datetime, until: Optional[datetime] = None) -> int:
+    """
+    Recompute AIUsageDaily for the days from since to until from the ledger.
+
+    Returns the number of rollup rows written.
+    """
+    from django.contrib.auth.models import User
+    from .models import AIUsageDaily, AIUsageRecord
+    from django.db.models import Count, Q
+    from django.db.models.functions import TruncDate
+
+    first_day = timezone.localdate(since)
+    start = timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+    records = AIUsageRecord.objects.filter(created_at__gte=start)
+    days = AIUsageDaily.objects.filter(day__gte=first_day)
+    if until is not None:
+        last_day = timezone.localdate(until)
+        end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), datetime.min.time()))
+        records = records.filter(created_at__lt=end)
+        days = days.filter(day__lte=last_day)
+
+    rows = (
+        records
+        .annotate(day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'user_id', 'endpoint', 'model')
+        .annotate(
+            calls=Count('id'),
+            errors=Count('id', filter=~Q(outcome=AIUsageRecord.OUTCOME_OK)),
+            prompt_tokens_sum=Sum('prompt_tokens'),
+            completion_tokens_sum=Sum('completion_tokens'),
+            total_tokens_sum=Sum('total_tokens'),
+            latency_ms_sum=Sum('latency_ms'),
+        )
+        .order_by()
+    )
+    rows = list(rows.iterator())
+    # Ledger rows of deleted users are rolled up under no user, as write_batch does
+    user_ids = {row['user_id'] for row in rows if row['user_id'] is not None}
+    existing = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True)) if user_ids else set()
+    totals = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        user_id = row['user_id'] if row['user_id'] in existing else None
+        total = totals[(row['day'], user_id, row['endpoint'], row['model'])]
+        total['calls'] += row['calls']
+        total['errors'] += row['errors']
+        for field in ('prompt_tokens', 'completion_tokens', 'total_tokens', 'latency_ms'):
+            total[field] += row[f'{field}_sum'] or 0
+    rollups = [
+        AIUsageDaily(day=day, user_id=user_id, endpoint=endpoint, model=model, **total)
+        for (day, user_id, endpoint, model), total in totals.items()
+    ]
+    with transaction.atomic():
+        days.delete()
+        AIUsageDaily.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+TOTAL_FIELDS = ('calls', 'errors', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'latency_ms')
+
+
+def summarize(queryset, group_by: Sequence[str] = (), limit: Optional[int] = None) -> List[Dict]:
+    """
+    Sum AIUsageDaily rows, optionally grouped by columns, largest token use first.
+
+    Each row has the group columns, the totals and mean_latency_ms.
+    """
+    totals = {field: Sum(field) for field in TOTAL_FIELDS}
+    if not group_by:
+        rows = [queryset.aggregate(**totals)]
+    else:
+        grouped = queryset.values(*group_by).annotate(**totals).order_by('-total_tokens', *group_by)
+        rows = list(grouped[:limit] if limit else grouped)
+    for row in rows:
+        for field in TOTAL_FIELDS:
+            row[field] = row[field] or 0
+        row['mean_latency_ms'] = round(row['latency_ms'] / row['calls'], 1) if row['calls'] else 0.0
+    return rows
+
+
+ledger = UsageLedger()
+atexit.register(ledger.flush)
+
+
+__all__ = ['UsageLedger', 'ledger', 'write_batch', 'rebuild_rollup', 'summarize', 'TOTAL_FIELDS']
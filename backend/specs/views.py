@@ -1,19 +1,80 @@
+import json
+import math
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, renderer_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from .models import Spec
+from datetime import timedelta
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from .models import Spec, SpecRevision, Job, AIUsageDaily
 from .serializers import (
     SpecSerializer,
+    SpecSummarySerializer,
+    SpecRevisionSerializer,
     SpecGenerateSerializer,
+    SpecBatchGenerateSerializer,
+    SpecBatchResultSerializer,
     SpecRefineSerializer,
     CodeStubSerializer,
+    JobSerializer,
 )
 from .ai_service import ai_service
+from .authentication import READ_ONLY_AUTHENTICATION_CLASSES
+from .conditional import conditional_read, list_validators, spec_validators
+from .fastjson import FastJSONRenderer
+from .jobs import enqueue_job, wants_async
+from .pagination import SpecCursorPagination
+from .ratelimit import ai_rate_limit
+from .transport import CircuitOpenError
+from .streaming import ModuleStreamParser, EventStreamRenderer, sse_event, iterate_in_thread
+from .portability import NDJSONRenderer
+from . import codegen, portability, revisions, search, services, similarity, usage
+
+
+def _with_cache_status(response, hit=None):
+    """Report whether the AI call(s) behind this response were served from cache."""
+    if hit is None:
+        hit = ai_service.last_cache_hit()
+    response['X-AI-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def _reused(spec, source, score):
+    """A blueprint answered from a similar one: 200 for the same blueprint, 201 for a copy."""
+    response = Response(
+        SpecSerializer(spec).data,
+        status=status.HTTP_200_OK if spec.pk == source.pk else status.HTTP_201_CREATED
+    )
+    response['X-Spec-Reused-From'] = str(source.pk)
+    response['X-Spec-Similarity'] = f'{score:.3f}'
+    return response
+
+
+def _upstream_unavailable(error):
+    """503 with Retry-After while the circuit breaker is failing AI calls fast."""
+    return Response(
+        {"error": str(error)},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(math.ceil(error.retry_after))}
+    )
+
+
+def _job_accepted(request, job):
+    """202 response pointing the client at the job status endpoint."""
+    location = request.build_absolute_uri(reverse('get_job', args=[job.id]))
+    return Response(
+        JobSerializer(job).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': location}
+    )
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@ai_rate_limit('generate')
 def generate_spec(request):
     """Generate a technical blueprint from a business concept using AI"""
     serializer = SpecGenerateSerializer(data=request.data)
@@ -23,24 +84,32 @@ def generate_spec(request):
     concept = serializer.validated_data['idea']
     
     try:
+        # A similar enough blueprint answers without an AI call (or an API key)
+        reused = services.reuse_spec(
+            request.user, concept, serializer.validated_data.get('reuse') or similarity.reuse_mode()
+        )
+        if reused is not None:
+            return _reused(*reused)
+        
         if not ai_service.validate_api_key():
             return Response(
                 {"error": "OpenAI API key not configured"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
-        # Generate technical blueprint using AI service
-        blueprint = ai_service.generate_blueprint(concept)
+        if wants_async(request):
+            job = enqueue_job(request.user, Job.KIND_GENERATE, {'idea': concept})
+            return _job_accepted(request, job)
         
-        # Create and save the blueprint for the authenticated user
-        spec = Spec.objects.create(
-            user=request.user,
-            idea=concept,
-            spec_json=blueprint
-        )
+        # Generate and save the technical blueprint for the authenticated user
+        spec = services.create_spec(request.user, concept)
         
-        return Response(SpecSerializer(spec).data, status=status.HTTP_201_CREATED)
+        return _with_cache_status(
+            Response(SpecSerializer(spec).data, status=status.HTTP_201_CREATED)
+        )
         
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
     except ValueError as e:
         return Response(
             {"error": f"Invalid response from AI service: {str(e)}"},
@@ -53,8 +122,128 @@ def generate_spec(request):
         )
 
 
+def _blueprint_events(user, concept):
+    """Yield SSE messages for a streamed generation, then persist the finished spec."""
+    parser = ModuleStreamParser()
+    try:
+        for text in ai_service.stream_blueprint(concept):
+            yield sse_event('token', {'text': text})
+            for module in parser.feed(text):
+                yield sse_event('module', module)
+        
+        spec = services.save_spec(user, concept, json.loads(parser.text))
+        yield sse_event('spec', SpecSerializer(spec).data)
+        
+    except ValueError as e:
+        yield sse_event('error', {"error": f"Invalid response from AI service: {str(e)}"})
+    except Exception as e:
+        yield sse_event('error', {"error": str(e)})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer, EventStreamRenderer])
+@ai_rate_limit('generate')
+def generate_spec_stream(request):
+    """Stream blueprint generation as Server-Sent Events (token, module, spec, error)"""
+    serializer = SpecGenerateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not ai_service.validate_api_key():
+        return Response(
+            {"error": "OpenAI API key not configured"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    
+    events = _blueprint_events(request.user, serializer.validated_data['idea'])
+    if isinstance(request._request, ASGIRequest):
+        events = iterate_in_thread(events)
+    
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _batch_events(user, concepts):
+    """Yield an SSE 'item' message per idea as it finishes, then 'done' with the totals."""
+    finished = []
+    try:
+        for results in services.iter_batch(user, concepts):
+            finished.extend(results)
+            for result in results:
+                yield sse_event('item', SpecBatchResultSerializer(result).data)
+        yield sse_event('done', services.batch_counts(finished))
+    except Exception as e:
+        yield sse_event('error', {"error": str(e)})
+
+
+def _batch_response(results):
+    """201 if any blueprint was created; 503 if the upstream circuit failed them all, else 500."""
+    counts = services.batch_counts(results)
+    retry_after = services.batch_retry_after(results)
+    headers = {'Retry-After': str(retry_after)} if retry_after is not None else None
+    if counts['created']:
+        code = status.HTTP_201_CREATED
+    elif retry_after is not None:
+        code = status.HTTP_503_SERVICE_UNAVAILABLE
+    else:
+        code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    return _with_cache_status(
+        Response({"results": SpecBatchResultSerializer(results, many=True).data, **counts}, status=code, headers=headers),
+        hit=bool(counts['created']) and all(result['cached'] for result in results if result['status'] == services.BATCH_OK)
+    )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer, EventStreamRenderer])
+@ai_rate_limit('generate', cost=lambda request: services.batch_cost(request.data))
+def generate_spec_batch(request):
+    """
+    Generate a blueprint for each of several ideas, concurrently.
+
+    Returns every idea's status (and blueprint or error) once all are done,
+    or with `Accept: text/event-stream` an 'item' event as each one finishes.
+    Each idea takes one token from the user's generate rate limit.
+    """
+    serializer = SpecBatchGenerateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    concepts = serializer.validated_data['ideas']
+    
+    if not ai_service.validate_api_key():
+        return Response(
+            {"error": "OpenAI API key not configured"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    
+    if request.accepted_renderer.format == EventStreamRenderer.format:
+        events = _batch_events(request.user, concepts)
+        if isinstance(request._request, ASGIRequest):
+            events = iterate_in_thread(events)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    try:
+        results = services.generate_batch(request.user, concepts)
+    except Exception as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    
+    return _batch_response(results)
+
+
 @api_view(['GET'])
+@authentication_classes(READ_ONLY_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@conditional_read(spec_validators)
 def get_spec(request, spec_id):
     """Get a specific specification by ID (only user's own specs)"""
     try:
@@ -68,16 +257,112 @@ def get_spec(request, spec_id):
 
 
 @api_view(['GET'])
+@authentication_classes(READ_ONLY_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@conditional_read(list_validators)
 def list_specs(request):
-    """Get the latest 10 specifications for the authenticated user"""
-    specs = Spec.objects.filter(user=request.user)[:10]
-    serializer = SpecSerializer(specs, many=True)
-    return Response(serializer.data)
+    """List the authenticated user's specifications, newest first, one cursor page at a time"""
+    specs = Spec.objects.filter(user=request.user).only(*SpecSummarySerializer.Meta.fields)
+    paginator = SpecCursorPagination()
+    page = paginator.paginate_queryset(specs, request)
+    serializer = SpecSummarySerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+@authentication_classes(READ_ONLY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def search_specs(request):
+    """Full-text search over the authenticated user's blueprints, best match first"""
+    query = request.query_params.get('q', '').strip()
+    if not search.query_terms(query):
+        return Response(
+            {"error": "Query parameter 'q' is required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 50)
+    except ValueError:
+        return Response(
+            {"error": "limit must be an integer"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    results = []
+    for hit in search.search_specs(query, user=request.user, limit=limit):
+        results.append({
+            **SpecSummarySerializer(hit['spec']).data,
+            'rank': hit['rank'],
+            'highlights': hit['highlights'],
+        })
+    return Response({"query": query, "results": results})
+
+
+@api_view(['GET'])
+@authentication_classes(READ_ONLY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer, NDJSONRenderer])
+def export_specs(request):
+    """
+    Download every blueprint the user owns as NDJSON, oldest first.
+
+    Streamed straight from the database, so memory does not grow with the
+    account. ?compress=gzip returns a .ndjson.gz file instead.
+    """
+    compress = request.query_params.get('compress', '')
+    if compress not in ('', 'gzip'):
+        return Response(
+            {"error": "compress must be gzip"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    chunks = portability.export_lines(request.user)
+    filename = 'blueprints.ndjson'
+    if compress:
+        chunks = portability.gzip_stream(chunks)
+        filename += '.gz'
+    if isinstance(request._request, ASGIRequest):
+        chunks = iterate_in_thread(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type='application/gzip' if compress else NDJSONRenderer.media_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer, NDJSONRenderer])
+def import_specs(request):
+    """
+    Create blueprints from an NDJSON export (one blueprint per line).
+
+    The body is read and inserted a batch at a time rather than parsed as a
+    whole; send it gzipped with Content-Encoding: gzip or Content-Type:
+    application/gzip. ?dry_run=true validates without saving.
+    """
+    content_type = request.content_type.split(';')[0].strip().lower()
+    compressed = (
+        content_type == 'application/gzip'
+        or request.headers.get('Content-Encoding', '').lower() == 'gzip'
+    )
+    dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    try:
+        # The underlying HttpRequest, read as a stream; request.data would buffer the whole body
+        result = portability.import_specs(
+            request.user, portability.read_rows(request._request, compressed=compressed), dry_run=dry_run
+        )
+    except portability.READ_ERRORS as e:
+        return Response(
+            {"error": f"Could not read the upload: {e}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(result, status=status.HTTP_201_CREATED if result['created'] and not dry_run else status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@ai_rate_limit('refine')
 def refine_spec(request, spec_id):
     """Refine a technical blueprint based on feedback (only user's own specs)"""
     try:
@@ -93,6 +378,7 @@ def refine_spec(request, spec_id):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     instruction = serializer.validated_data['feedback']
+    mode = serializer.validated_data.get('mode')
     
     try:
         if not ai_service.validate_api_key():
@@ -101,15 +387,22 @@ def refine_spec(request, spec_id):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
-        # Refine blueprint using AI service
-        refined_blueprint = ai_service.refine_blueprint(spec.spec_json, instruction)
+        if wants_async(request):
+            job = enqueue_job(
+                request.user,
+                Job.KIND_REFINE,
+                {'spec_id': str(spec.id), 'feedback': instruction, 'mode': mode},
+                spec=spec
+            )
+            return _job_accepted(request, job)
         
-        # Update the spec
-        spec.spec_json = refined_blueprint
-        spec.save()
+        # Refine and save the blueprint using AI service
+        spec = services.refine_spec(spec, instruction, mode)
         
-        return Response(SpecSerializer(spec).data)
+        return _with_cache_status(Response(SpecSerializer(spec).data))
         
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
     except ValueError as e:
         return Response(
             {"error": f"Invalid response from AI service: {str(e)}"},
@@ -122,8 +415,29 @@ def refine_spec(request, spec_id):
         )
 
 
+def _code_bundle_zip(request, spec, modules, language, framework, engine):
+    """Stream the generated modules as a zip, adding each app as soon as it is ready."""
+    manifest = {
+        "blueprint_id": str(spec.id),
+        "title": spec.spec_json.get('title', ''),
+        "language": language,
+        "framework": framework,
+    }
+    chunks = codegen.stream_bundle_zip(
+        codegen.iter_module_implementations(spec.spec_json, modules, engine=engine),
+        manifest
+    )
+    if isinstance(request._request, ASGIRequest):
+        chunks = iterate_in_thread(chunks)
+    
+    response = StreamingHttpResponse(chunks, content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="blueprint-{spec.id}.zip"'
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@ai_rate_limit('code_stubs')
 def generate_code_stubs(request):
     """Generate Django REST Framework implementation code from a technical blueprint (only user's own specs)"""
     serializer = CodeStubSerializer(data=request.data)
@@ -133,6 +447,8 @@ def generate_code_stubs(request):
     spec_id = serializer.validated_data['spec_id']
     language = serializer.validated_data['language']
     framework = serializer.validated_data.get('framework', '')
+    module_names = serializer.validated_data.get('modules')
+    engine = serializer.validated_data.get('engine') or codegen.default_engine()
     
     try:
         spec = Spec.objects.get(id=spec_id, user=request.user)
@@ -142,29 +458,48 @@ def generate_code_stubs(request):
             status=status.HTTP_404_NOT_FOUND
         )
     
+    modules, missing = codegen.select_modules(spec.spec_json, module_names)
+    if missing:
+        return Response(
+            {"modules": [f"Unknown module(s): {', '.join(missing)}"]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
     try:
-        if not ai_service.validate_api_key():
+        if codegen.needs_llm(modules, engine) and not ai_service.validate_api_key():
             return Response(
                 {"error": "OpenAI API key not configured"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
-        # Generate module name from the first module or use a default
-        module_name = "api_module"
-        if spec.spec_json.get('modules') and len(spec.spec_json['modules']) > 0:
-            module_name = spec.spec_json['modules'][0]['name'].lower().replace(' ', '_')
+        if wants_async(request):
+            job = enqueue_job(
+                request.user,
+                Job.KIND_CODE_STUBS,
+                {
+                    'spec_id': str(spec.id),
+                    'language': language,
+                    'framework': framework,
+                    'modules': module_names,
+                    'engine': engine,
+                },
+                spec=spec
+            )
+            return _job_accepted(request, job)
         
-        # Generate implementation code using AI service
-        implementation = ai_service.generate_implementation(spec.spec_json, module_name)
+        if serializer.validated_data['bundle'] == 'zip':
+            return _code_bundle_zip(request, spec, modules, language, framework, engine)
         
-        return Response({
-            "blueprint_id": str(spec_id),
-            "module_name": module_name,
-            "language": language,
-            "framework": framework,
-            "implementation": implementation
-        })
+        # Generate implementation code for every selected module using AI service
+        stubs = services.generate_code_stubs(spec, language, framework, module_names, engine)
+        
+        return _with_cache_status(
+            Response(stubs),
+            hit=all(module['cached'] for module in stubs['modules'])
+        )
         
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
     except ValueError as e:
         return Response(
             {"error": f"Invalid response from AI service: {str(e)}"},
@@ -174,4 +509,149 @@ def generate_code_stubs(request):
         return Response(
             {"error": str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+
+@api_view(['GET'])
+@authentication_classes(READ_ONLY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def list_spec_revisions(request, spec_id):
+    """List the revision history of a blueprint, newest first (only user's own specs)"""
+    if not Spec.objects.filter(id=spec_id, user=request.user).exists():
+        return Response(
+            {"error": "Blueprint not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    history = SpecRevision.objects.filter(spec_id=spec_id).only(
+        'number', 'kind', 'source', 'instruction', 'created_at'
+    )
+    return Response(SpecRevisionSerializer(history, many=True).data)
+
+
+@api_view(['GET'])
+@authentication_classes(READ_ONLY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def get_spec_revision(request, spec_id, number):
+    """Get a blueprint as it was at a given revision (only user's own specs)"""
+    try:
+        spec = Spec.objects.get(id=spec_id, user=request.user)
+        revision = SpecRevision.objects.defer('snapshot', 'patch').get(spec=spec, number=number)
+        blueprint = revisions.reconstruct(spec, number)
+    except Spec.DoesNotExist:
+        return Response(
+            {"error": "Blueprint not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except SpecRevision.DoesNotExist:
+        return Response(
+            {"error": "Revision not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    return Response({**SpecRevisionSerializer(revision).data, "spec_json": blueprint})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def rollback_spec(request, spec_id, number):
+    """Restore a previous revision as the newest revision (only user's own specs)"""
+    try:
+        spec = Spec.objects.get(id=spec_id, user=request.user)
+        revisions.rollback(spec, number)
+    except Spec.DoesNotExist:
+        return Response(
+            {"error": "Blueprint not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except SpecRevision.DoesNotExist:
+        return Response(
+            {"error": "Revision not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    return Response(SpecSerializer(spec).data)
+
+
+@api_view(['GET'])
+@authentication_classes(READ_ONLY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def get_job(request, job_id):
+    """Get the status, progress and result of a background AI job (only user's own jobs)"""
+    try:
+        job = Job.objects.get(id=job_id, user=request.user)
+        return Response(JobSerializer(job).data)
+    except Job.DoesNotExist:
+        return Response(
+            {"error": "Job not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+
+USAGE_MAX_DAYS = 366
+USAGE_GROUPS = {
+    'user': ('user', 'user__email'),
+    'endpoint': ('endpoint',),
+    'model': ('model',),
+    'day': ('day',),
+}
+
+
+def _usage_since(request):
+    """First day of the ?days= window (default 30), or None if the parameter is invalid."""
+    try:
+        days = int(request.query_params.get('days', 30))
+    except ValueError:
+        return None
+    if not 1 <= days <= USAGE_MAX_DAYS:
+        return None
+    return timezone.localdate() - timedelta(days=days - 1)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def my_usage(request):
+    """AI token usage of the current user over the last ?days= days, from the daily rollup"""
+    since = _usage_since(request)
+    if since is None:
+        return Response(
+            {"error": f"days must be an integer from 1 to {USAGE_MAX_DAYS}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    rows = AIUsageDaily.objects.filter(user=request.user, day__gte=since)
+    return Response({
+        'since': since,
+        'totals': usage.summarize(rows)[0],
+        'by_day': sorted(usage.summarize(rows, ['day']), key=lambda row: row['day']),
+        'by_endpoint': usage.summarize(rows, ['endpoint']),
+        'by_model': usage.summarize(rows, ['model']),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def usage_summary(request):
+    """AI token usage across all users, grouped by ?group_by=user|endpoint|model|day (staff only)"""
+    since = _usage_since(request)
+    if since is None:
+        return Response(
+            {"error": f"days must be an integer from 1 to {USAGE_MAX_DAYS}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    group_by = request.query_params.get('group_by', 'user')
+    if group_by not in USAGE_GROUPS:
+        return Response(
+            {"error": f"group_by must be one of: {', '.join(USAGE_GROUPS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        limit = min(max(int(request.query_params.get('limit', 50)), 1), 500)
+    except ValueError:
+        limit = 50
+    rows = AIUsageDaily.objects.filter(day__gte=since)
+    return Response({
+        'since': since,
+        'group_by': group_by,
+        'totals': usage.summarize(rows)[0],
+        'results': usage.summarize(rows, USAGE_GROUPS[group_by], limit),
+    })
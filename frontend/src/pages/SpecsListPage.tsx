@@ -1,11 +1,13 @@
 import React, { useState, useEffect } from "react";
 import { Link } from "react-router-dom";
 import { apiClient } from "../services/api";
-import type { SpecRecord } from "../types/spec";
+import type { SpecSummary } from "../types/spec";
 
 export const SpecsListPage: React.FC = () => {
-  const [specs, setSpecs] = useState<SpecRecord[]>([]);
+  const [specs, setSpecs] = useState<SpecSummary[]>([]);
+  const [next, setNext] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
   useEffect(() => {
@@ -16,7 +18,8 @@ export const SpecsListPage: React.FC = () => {
     setLoading(true);
     try {
       const data = await apiClient.getSpecs();
-      setSpecs(data);
+      setSpecs(data.results);
+      setNext(data.next);
     } catch (err: any) {
       setError(err.response?.data?.error || "Failed to load specifications");
     } finally {
@@ -24,6 +27,20 @@ export const SpecsListPage: React.FC = () => {
     }
   };
 
+  const loadMore = async () => {
+    if (!next) return;
+    setLoadingMore(true);
+    try {
+      const data = await apiClient.getSpecs(next);
+      setSpecs((current) => [...current, ...data.results]);
+      setNext(data.next);
+    } catch (err: any) {
+      setError(err.response?.data?.error || "Failed to load specifications");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   if (loading) {
     return (
       <div className="flex items-center justify-center py-12">
@@ -63,8 +80,16 @@ export const SpecsListPage: React.FC = () => {
             >
               <div className="flex items-start justify-between">
                 <div className="flex-1">
+                  {spec.title && (
+                    <h2 className="text-lg font-semibold text-gray-900 mb-1">
+                      {spec.title}
+                    </h2>
+                  )}
                   <p className="text-gray-600 mb-3 line-clamp-2">{spec.idea}</p>
                   <div className="flex items-center space-x-4 text-sm text-gray-500">
+                    <span>
+                      {spec.module_count} module{spec.module_count === 1 ? "" : "s"}
+                    </span>
                     <span>
                       Created: {new Date(spec.created_at).toLocaleDateString()}
                     </span>
@@ -96,6 +121,17 @@ export const SpecsListPage: React.FC = () => {
               </div>
             </div>
           ))}
+          {next && (
+            <div className="text-center">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="px-6 py-2 bg-white border rounded-lg text-gray-700 hover:bg-gray-50 transition-colors disabled:opacity-50"
+              >
+                {loadingMore ? "Loading..." : "Load more"}
+              </button>
+            </div>
+          )}
         </div>
       ) : (
         <div className="text-center py-12 bg-white rounded-lg shadow-sm border">
@@ -1,6 +1,7 @@
 import axios from "axios";
 import type {
   SpecRecord,
+  SpecSummary,
   GenerateSpecRequest,
   GenerateSpecResponse,
   RefineSpecRequest,
@@ -9,6 +10,8 @@ import type {
   CodeStubsResponse,
   GetSpecsResponse,
   GetSpecResponse,
+  SearchSpecsResponse,
+  UsageResponse,
 } from "../types/spec";
 
 const baseURL =
@@ -66,11 +69,23 @@ export const apiClient = {
   },
 
   /**
-   * Get all specifications (latest 10)
-   * GET /api/specs/
+   * Get one page of specifications, newest first
+   * GET /api/specs/?cursor=...
+   * Pass the `next` URL of the previous page to get the following page.
    */
-  getSpecs: async (): Promise<GetSpecsResponse> => {
-    const response = await api.get<GetSpecsResponse>("/specs/");
+  getSpecs: async (next?: string | null): Promise<GetSpecsResponse> => {
+    const response = await api.get<GetSpecsResponse>(next || "/specs/");
+    return response.data;
+  },
+
+  /**
+   * Full-text search over the user's specifications, best match first
+   * GET /api/specs/search/?q=...
+   */
+  searchSpecs: async (q: string, limit?: number): Promise<SearchSpecsResponse> => {
+    const response = await api.get<SearchSpecsResponse>("/specs/search/", {
+      params: { q, limit },
+    });
     return response.data;
   },
 
@@ -108,11 +123,23 @@ export const apiClient = {
     const response = await api.post<CodeStubsResponse>("/code-stubs/", data);
     return response.data;
   },
+
+  /**
+   * Get the current user's AI token usage over the last `days` days
+   * GET /api/usage/
+   */
+  getUsage: async (days?: number): Promise<UsageResponse> => {
+    const response = await api.get<UsageResponse>("/usage/", {
+      params: { days },
+    });
+    return response.data;
+  },
 };
 
 // Export types for convenience
 export type {
   SpecRecord,
+  SpecSummary,
   GenerateSpecRequest,
   GenerateSpecResponse,
   RefineSpecRequest,
@@ -121,6 +148,8 @@ export type {
   CodeStubsResponse,
   GetSpecsResponse,
   GetSpecResponse,
+  SearchSpecsResponse,
+  UsageResponse,
 };
 
 // Re-export the AppSpec and related types
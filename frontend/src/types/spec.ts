@@ -71,10 +71,25 @@ export interface SpecRecord {
   id: string;
   idea: string;
   spec_json: AppSpec;
+  title: string;
+  module_count: number;
+  revision: number;
   created_at: string;
   updated_at: string;
 }
 
+export interface SpecRevision {
+  number: number;
+  kind: "snapshot" | "diff";
+  source: "generate" | "refine" | "rollback";
+  instruction: string;
+  created_at: string;
+}
+
+export interface SpecRevisionDetail extends SpecRevision {
+  spec_json: AppSpec;
+}
+
 // API Request/Response types
 export interface GenerateSpecRequest {
   idea: string;
@@ -84,6 +99,7 @@ export interface GenerateSpecResponse extends SpecRecord {}
 
 export interface RefineSpecRequest {
   feedback: string;
+  mode?: "patch" | "full";
 }
 
 export interface RefineSpecResponse extends SpecRecord {}
@@ -92,6 +108,29 @@ export interface CodeStubsRequest {
   spec_id: string;
   language?: string;
   framework?: string;
+  modules?: string[];
+  bundle?: "json" | "zip";
+  engine?: CodegenEngine;
+}
+
+export type CodegenEngine = "llm" | "local" | "hybrid";
+
+export interface CodeImplementation {
+  models_py: string;
+  serializers_py: string;
+  views_py: string;
+  urls_py: string;
+}
+
+export interface ModuleCodeResult {
+  module_name: string;
+  name: string;
+  status: "ok" | "failed" | "timeout";
+  engine: CodegenEngine;
+  implementation: CodeImplementation | null;
+  error: string;
+  cached: boolean;
+  elapsed_ms: number;
 }
 
 export interface CodeStubsResponse {
@@ -99,15 +138,58 @@ export interface CodeStubsResponse {
   module_name: string;
   language: string;
   framework: string;
-  implementation: {
-    models_py: string;
-    serializers_py: string;
-    views_py: string;
-    urls_py: string;
+  implementation: CodeImplementation;
+  modules: ModuleCodeResult[];
+}
+
+export interface SpecSummary {
+  id: string;
+  idea: string;
+  title: string;
+  module_count: number;
+  revision: number;
+  created_at: string;
+  updated_at: string;
+}
+
+export interface GetSpecsResponse {
+  next: string | null;
+  previous: string | null;
+  results: SpecSummary[];
+}
+
+export interface SpecSearchResult extends SpecSummary {
+  rank: number | null;
+  // Matched text wrapped in <mark>, per column that matched
+  highlights: {
+    title?: string;
+    structure?: string;
+    idea?: string;
   };
 }
 
-export interface GetSpecsResponse extends Array<SpecRecord> {}
+export interface SearchSpecsResponse {
+  query: string;
+  results: SpecSearchResult[];
+}
 
 export interface GetSpecResponse extends SpecRecord {}
 
+export interface UsageTotals {
+  calls: number;
+  errors: number;
+  prompt_tokens: number;
+  completion_tokens: number;
+  total_tokens: number;
+  latency_ms: number;
+  mean_latency_ms: number;
+}
+
+export interface UsageResponse {
+  since: string;
+  totals: UsageTotals;
+  by_day: (UsageTotals & { day: string })[];
+  by_endpoint: (UsageTotals & { endpoint: string })[];
+  by_model: (UsageTotals & { model: string })[];
+}
+